@@ -0,0 +1,79 @@
+"""
+Measures the aggregate frames/sec of running 1, 2, 4, and 8 HandBrakeCLI x265 encodes of a sample clip at the same time, with each encode limited to, and pinned on, its own share of the cores.
+
+Example command to run:
+
+python3 benchmarks/bench_concurrent_encodes.py -j 1 2 4 8 -c /path/to/sample.mkv
+"""
+import os, time, json, subprocess, tempfile, shutil
+from argparse import ArgumentParser
+from howdy_grabbag import ffmpeg_exec, ffprobe_exec
+from howdy_grabbag.utils.dehydrate import process_single_filename_hcli
+from howdy_grabbag.utils.transcode_scheduler import (
+    get_job_core_sets, get_x265_thread_options, iter_transcode_jobs )
+
+def create_clip( clipfile, duration = 20 ):
+    if os.path.isfile( clipfile ): return clipfile
+    subprocess.check_output(
+        [ ffmpeg_exec, '-v', 'quiet', '-y',
+          '-f', 'lavfi', '-i', 'testsrc2=size=1920x1080:rate=24:duration=%d' % duration,
+          '-f', 'lavfi', '-i', 'sine=duration=%d' % duration,
+          '-c:v', 'libx264', '-crf', '18', '-c:a', 'aac', clipfile ],
+        stderr = subprocess.STDOUT )
+    return clipfile
+
+def get_num_frames( clipfile ):
+    data = json.loads( subprocess.check_output(
+        [ ffprobe_exec, '-v', 'quiet', '-select_streams', 'v:0',
+          '-show_entries', 'stream=avg_frame_rate:format=duration',
+          '-print_format', 'json', clipfile ], stderr = subprocess.STDOUT ) )
+    num, den = map(float, data[ 'streams' ][ 0 ][ 'avg_frame_rate' ].split( '/' ) )
+    return float( data[ 'format' ][ 'duration' ] ) * num / den
+
+def run_concurrent_encodes( clipfile, num_jobs, threads_per_job, quality, outdir ):
+    core_sets = get_job_core_sets( num_jobs, threads_per_job )
+    def _encode( fname, cores ):
+        newfile = os.path.join( outdir, '%s-%s.mkv' % (
+            fname, os.path.basename( clipfile ).split( '.' )[ 0 ] ) )
+        process_single_filename_hcli( clipfile, newfile, qual = quality, cores = cores )
+        os.remove( newfile )
+    #
+    time0 = time.perf_counter( )
+    errors = list(filter(lambda error: error is not None, map(
+        lambda tup: tup[3], iter_transcode_jobs(
+            list(map(lambda idx: 'job%02d' % idx, range( num_jobs ) ) ), _encode,
+            num_jobs = num_jobs, core_sets = core_sets ) ) ) )
+    if len( errors ) > 0: raise errors[ 0 ]
+    return time.perf_counter( ) - time0, core_sets
+
+def main( ):
+    parser = ArgumentParser( )
+    parser.add_argument( '-c', '--clip', dest = 'clip', type = str, action = 'store', default = None,
+                         help = 'The sample clip to encode. Default is a synthetic 20 second 1080p clip generated with ffmpeg.' )
+    parser.add_argument( '-j', '--jobs', dest = 'jobs', type = int, action = 'store', nargs = '+', default = [ 1, 2, 4, 8 ],
+                         help = 'The numbers of concurrent encodes to measure. Default is 1 2 4 8.' )
+    parser.add_argument( '--threads-per-job', dest = 'threads_per_job', type = int, action = 'store', default = None,
+                         help = 'The most threads each encode may use. Default is an equal share of the cores.' )
+    parser.add_argument( '-Q', '--quality', dest = 'quality', type = int, action = 'store', default = 28,
+                         help = 'The x265 quality of the encodes. Default is 28.' )
+    args = parser.parse_args( )
+    assert( all(map(lambda num_jobs: num_jobs >= 1, args.jobs ) ) )
+    #
+    outdir = tempfile.mkdtemp( )
+    try:
+        clipfile = args.clip
+        if clipfile is None: clipfile = create_clip( os.path.join( outdir, 'sample.mp4' ) )
+        num_frames = get_num_frames( clipfile )
+        print( 'CLIP = %s, %d FRAMES, %d CORES.' % ( clipfile, num_frames, os.cpu_count( ) ) )
+        for num_jobs in args.jobs:
+            dt, core_sets = run_concurrent_encodes(
+                clipfile, num_jobs, args.threads_per_job, args.quality, outdir )
+            encopts = 'default'
+            if core_sets is not None: encopts = get_x265_thread_options( len( core_sets[ 0 ] ) )
+            print( 'JOBS = %d, ENCOPTS = %s: %0.3f seconds, AGGREGATE FPS = %0.2f, PER JOB FPS = %0.2f.' % (
+                num_jobs, encopts, dt, num_jobs * num_frames / dt, num_frames / dt ) )
+    finally:
+        shutil.rmtree( outdir, ignore_errors = True )
+
+if __name__ == '__main__':
+    main( )
@@ -0,0 +1,127 @@
+"""
+Measures, with ``python -X importtime``, the milliseconds each console script in ``pyproject.toml`` spends importing its module, and fails if any takes longer than its budget. The imports run with a ``PATH`` holding only the Python interpreter, so that a module that still looks for HandBrakeCLI, ffmpeg, or the other executables at import time also fails.
+
+Budgets come from ``--budget-ms``, or per module from a JSON file of module name to milliseconds. ``--write-budget`` records the current times, times ``--slack``, into that file to regress against later.
+
+Example commands to run:
+
+python3 benchmarks/bench_import_time.py --budget-file benchmarks/import_time_budget.json --write-budget
+python3 benchmarks/bench_import_time.py --budget-file benchmarks/import_time_budget.json
+"""
+import os, sys, re, json, subprocess
+from argparse import ArgumentParser
+from tabulate import tabulate
+try: import tomllib
+except ImportError: import tomli as tomllib
+
+_IMPORTTIME_REGEX = re.compile( r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$' )
+
+def get_console_scripts( pyproject_file ):
+    #
+    ## console script name -> ( module, function )
+    with open( pyproject_file, 'rb' ) as openfile:
+        scripts = tomllib.load( openfile )[ 'project' ][ 'scripts' ]
+    return dict(map(lambda name: ( name, tuple( scripts[ name ].split( ':' ) ) ), scripts ) )
+
+def _get_importtime_entries( code, env ):
+    proc = subprocess.run(
+        [ sys.executable, '-X', 'importtime', '-c', code ],
+        stdout = subprocess.PIPE, stderr = subprocess.PIPE, env = env )
+    lines = proc.stderr.decode( 'utf8', errors = 'replace' ).split( '\n' )
+    if proc.returncode != 0:
+        errors = list(filter(lambda line: len( line.strip( ) ) != 0 and not line.startswith( 'import time:' ), lines ) )
+        return None, errors[ -1 ] if len( errors ) != 0 else 'exit code %d' % proc.returncode
+    #
+    ## ( indent, package, cumulative ms )
+    return list(map(lambda mat: ( len( mat.group( 3 ) ), mat.group( 4 ), int( mat.group( 2 ) ) / 1_000 ),
+                    filter(None, map(_IMPORTTIME_REGEX.match, lines ) ) ) ), None
+
+def measure_import( module, env, startup_packages ):
+    """
+    :param str module: the module to import.
+    :param dict env: the environment in which to import it.
+    :param set startup_packages: the packages that the interpreter imports on startup, which do not count.
+    :returns: a ``( total_ms, slowest, error )`` tuple: the cumulative milliseconds to import ``module``, the :py:class:`list` of ``( package, ms )`` of the slowest top-level packages it pulls in, and the last line of the error if the import failed.
+    :rtype: tuple
+    """
+    entries, error = _get_importtime_entries( 'import %s' % module, env )
+    if error is not None: return None, [ ], error
+    entries = list(filter(lambda entry: entry[1] not in startup_packages, entries ) )
+    min_indent = min(map(lambda entry: entry[0], entries ) )
+    total_ms = sum(map(lambda entry: entry[2], filter(lambda entry: entry[0] == min_indent, entries ) ) )
+    slowest = sorted(map(lambda entry: ( entry[1], entry[2] ), filter(
+        lambda entry: '.' not in entry[1] and entry[1] != module.split( '.' )[ 0 ], entries ) ),
+                     key = lambda entry: -entry[1] )
+    return total_ms, slowest, None
+
+def main( ):
+    parser = ArgumentParser( )
+    parser.add_argument( '-p', '--pyproject', dest = 'pyproject_file', type = str, action = 'store',
+                         default = os.path.join( os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ), 'pyproject.toml' ),
+                         help = 'The pyproject.toml whose console scripts to measure. Default is the one of this repository.' )
+    parser.add_argument( '-r', '--repeats', dest = 'num_repeats', type = int, action = 'store', default = 5,
+                         help = 'The number of times to import each module, of which the fastest counts. Default is 5.' )
+    parser.add_argument( '--budget-ms', dest = 'budget_ms', type = float, action = 'store', default = 500.0,
+                         help = 'The most milliseconds any module may take to import, if not in the budget file. Default is 500.' )
+    parser.add_argument( '--budget-file', dest = 'budget_file', type = str, action = 'store', default = None,
+                         help = 'Optional JSON file of module name to the most milliseconds it may take to import.' )
+    parser.add_argument( '--write-budget', dest = 'do_write_budget', action = 'store_true', default = False,
+                         help = 'If chosen, then write the measured times, times SLACK, into the budget file, and do not check them.' )
+    parser.add_argument( '--slack', dest = 'slack', type = float, action = 'store', default = 1.5,
+                         help = 'With --write-budget, the factor by which to pad the measured times. Default is 1.5.' )
+    args = parser.parse_args( )
+    assert( args.num_repeats >= 1 )
+    assert( args.budget_ms > 0 )
+    assert( args.slack >= 1 )
+    assert( not args.do_write_budget or args.budget_file is not None )
+    #
+    ## no executables on the PATH, other than the Python interpreter
+    env = dict( os.environ )
+    env[ 'PATH' ] = os.path.dirname( sys.executable )
+    startup_entries, error = _get_importtime_entries( 'pass', env )
+    assert( error is None )
+    startup_packages = set(map(lambda entry: entry[1], startup_entries ) )
+    scripts = get_console_scripts( args.pyproject_file )
+    modules = sorted(set(map(lambda name: scripts[ name ][ 0 ], scripts ) ) )
+    budgets = { }
+    if args.budget_file is not None and os.path.isfile( args.budget_file ) and not args.do_write_budget:
+        budgets = json.load( open( args.budget_file, 'r' ) )
+    #
+    results = { }
+    for module in modules:
+        runs = list(map(lambda _: measure_import( module, env, startup_packages ), range( args.num_repeats ) ) )
+        error = runs[ 0 ][ 2 ]
+        if error is not None:
+            results[ module ] = ( None, [ ], error )
+            continue
+        results[ module ] = min( runs, key = lambda run: run[ 0 ] )
+    #
+    data = [ ]
+    num_failed = 0
+    for name in sorted( scripts ):
+        module = scripts[ name ][ 0 ]
+        total_ms, slowest, error = results[ module ]
+        budget_ms = budgets.get( module, args.budget_ms )
+        if error is not None:
+            num_failed += 1
+            data.append( [ name, module, 'N/A', '%0.1f' % budget_ms, 'FAILED: %s' % error ] )
+            continue
+        status = 'OK'
+        if not args.do_write_budget and total_ms > budget_ms:
+            num_failed += 1
+            status = 'OVER BUDGET'
+        data.append( [ name, module, '%0.1f' % total_ms, '%0.1f' % budget_ms,
+                       '%s. SLOWEST: %s' % ( status, ', '.join(map(lambda entry: '%s (%0.1f ms)' % entry, slowest[:3] ) ) ) ] )
+    print( '%s\n' % tabulate( data, headers = [ 'SCRIPT', 'MODULE', 'IMPORT (MS)', 'BUDGET (MS)', 'STATUS' ] ) )
+    if args.do_write_budget:
+        json.dump( dict(map(lambda module: ( module, round( results[ module ][ 0 ] * args.slack, 1 ) ),
+                            filter(lambda module: results[ module ][ 2 ] is None, modules ) ) ),
+                   open( args.budget_file, 'w' ), indent = 1, sort_keys = True )
+        print( 'wrote import time budgets of %d modules into %s.' % ( len( modules ), args.budget_file ) )
+        return
+    if num_failed != 0:
+        print( '%d / %d CONSOLE SCRIPTS FAILED TO IMPORT OR WENT OVER BUDGET.' % ( num_failed, len( scripts ) ) )
+        sys.exit( 1 )
+
+if __name__ == '__main__':
+    main( )
@@ -0,0 +1,81 @@
+"""
+Compares the files/sec of reading MKV and MP4 headers in-process, against forking ffprobe, on a synthetic corpus generated with ffmpeg.
+
+Example command to run:
+
+python3 benchmarks/bench_media_headers.py -n 200 -d /tmp/bench_corpus
+"""
+import os, time, subprocess, tempfile
+from argparse import ArgumentParser
+from howdy_grabbag import ffmpeg_exec, mkvpropedit_exec
+from howdy_grabbag.utils.media_info import MediaInfo, get_ffprobe_media_json
+from howdy_grabbag.utils.media_headers import read_media_info_from_headers
+
+def create_corpus( corpus_dir, num_files ):
+    #
+    ## one short clip per container, then copies of it with distinct names
+    os.makedirs( corpus_dir, exist_ok = True )
+    seeds = [ ]
+    for suffix, codec_args in (
+            ( 'mkv', [ '-c:v', 'libx265', '-c:a', 'aac' ] ),
+            ( 'mp4', [ '-c:v', 'libx264', '-c:a', 'aac' ] ),
+            ( 'm4v', [ '-c:v', 'libx265', '-tag:v', 'hvc1', '-c:a', 'aac', '-f', 'mp4' ] ) ):
+        seed = os.path.join( corpus_dir, 'seed.%s' % suffix )
+        if not os.path.isfile( seed ):
+            subprocess.check_output(
+                [ ffmpeg_exec, '-v', 'quiet', '-y',
+                  '-f', 'lavfi', '-i', 'testsrc=size=1280x720:rate=24:duration=10',
+                  '-f', 'lavfi', '-i', 'sine=duration=10' ] + codec_args + [ seed ],
+                stderr = subprocess.STDOUT )
+            if suffix == 'mkv':
+                subprocess.check_output(
+                    [ mkvpropedit_exec, seed, '--add-track-statistics-tags' ],
+                    stderr = subprocess.STDOUT )
+        seeds.append( seed )
+    fnames = [ ]
+    for idx in range( num_files ):
+        seed = seeds[ idx % len( seeds ) ]
+        fname = os.path.join( corpus_dir, 'file_%05d.%s' % ( idx, seed.split( '.' )[ -1 ] ) )
+        if not os.path.isfile( fname ):
+            with open( seed, 'rb' ) as infile, open( fname, 'wb' ) as outfile:
+                outfile.write( infile.read( ) )
+        fnames.append( fname )
+    return fnames
+
+def main( ):
+    parser = ArgumentParser( )
+    parser.add_argument( '-n', '--numfiles', dest = 'numfiles', type = int, action = 'store', default = 150,
+                         help = 'Number of files in the synthetic corpus. Default is 150.' )
+    parser.add_argument( '-d', '--directory', dest = 'directory', type = str, action = 'store',
+                         default = os.path.join( tempfile.gettempdir( ), 'howdy_grabbag_bench_corpus' ),
+                         help = 'Directory of the synthetic corpus. Default is %s.' % os.path.join(
+                             tempfile.gettempdir( ), 'howdy_grabbag_bench_corpus' ) )
+    args = parser.parse_args( )
+    assert( args.numfiles > 0 )
+    fnames = create_corpus( args.directory, args.numfiles )
+    #
+    time0 = time.perf_counter( )
+    infos_headers = list(map(read_media_info_from_headers, fnames ) )
+    dt_headers = time.perf_counter( ) - time0
+    num_fallback = len(list(filter(lambda info: info is None, infos_headers ) ) )
+    #
+    time0 = time.perf_counter( )
+    infos_ffprobe = list(map(lambda fname: MediaInfo.from_ffprobe_json(
+        fname, get_ffprobe_media_json( fname ) ), fnames ) )
+    dt_ffprobe = time.perf_counter( ) - time0
+    #
+    num_mismatch = len(list(filter(
+        lambda tup: tup[0] is not None and (
+            tup[0].video_codec != tup[1].video_codec or
+            tup[0].num_streams != tup[1].num_streams or
+            abs( tup[0].bit_rate_kbps - tup[1].bit_rate_kbps ) > 0.02 * tup[1].bit_rate_kbps ),
+        zip( infos_headers, infos_ffprobe ) ) ) )
+    print( 'HEADER READER: %d files in %0.3f seconds, %0.1f files/sec, %d fell back to ffprobe.' % (
+        len( fnames ), dt_headers, len( fnames ) / dt_headers, num_fallback ) )
+    print( 'FFPROBE:       %d files in %0.3f seconds, %0.1f files/sec.' % (
+        len( fnames ), dt_ffprobe, len( fnames ) / dt_ffprobe ) )
+    print( 'SPEEDUP = %0.1fx, %d files disagree with ffprobe.' % (
+        dt_ffprobe / dt_headers, num_mismatch ) )
+
+if __name__ == '__main__':
+    main( )
@@ -0,0 +1,125 @@
+"""
+Compares the seconds taken to build and summarize the TV episodes dataframe by :py:meth:`get_all_durations_dataframe <howdy_grabbag.utils.dehydrate.get_all_durations_dataframe>` and :py:meth:`summarize_shows_dataframe <howdy_grabbag.utils.dehydrate.summarize_shows_dataframe>`, against the earlier per-episode and per-show implementations, on a synthetic TV library. It also checks that both give the same answers.
+
+Example command to run:
+
+python3 benchmarks/bench_tv_dataframes.py -n 100000 -s 900
+"""
+import time, numpy, pandas
+from argparse import ArgumentParser
+from howdy_grabbag.utils.dehydrate import (
+    DATAFORMAT, get_all_durations_dataframe, summarize_shows_dataframe )
+
+def create_tvdata( num_episodes, num_shows, seed = 0 ):
+    #
+    ## the same nested layout as the Plex library data: show -> seasons -> season -> episodes -> episode
+    rng = numpy.random.default_rng( seed )
+    show_of_episode = numpy.sort( rng.integers( 0, num_shows, size = num_episodes ) )
+    durations = rng.uniform( 1_200, 3_600, size = num_episodes )
+    bitrates = rng.lognormal( numpy.log( 2_500 ), 0.6, size = num_episodes )
+    sizes = ( bitrates * durations * 1024 / 8 ).astype( int )
+    suffixes = rng.choice( [ 'mkv', 'mp4', 'avi' ], p = [ 0.6, 0.3, 0.1 ], size = num_episodes )
+    tvdata = { }
+    epno_of_show = { }
+    for idx, showno in enumerate( show_of_episode ):
+        show = 'Show %04d' % showno
+        seasno = 1 + epno_of_show.get( show, 0 ) // 20
+        epno = 1 + epno_of_show.get( show, 0 ) % 20
+        epno_of_show[ show ] = epno_of_show.get( show, 0 ) + 1
+        tvdata.setdefault( show, { 'seasons' : { } } )[ 'seasons' ].setdefault(
+            seasno, { 'episodes' : { } } )[ 'episodes' ][ epno ] = {
+                'path' : '/tv/%s/Season %02d/%s - s%02de%02d.%s' % ( show, seasno, show, seasno, epno, suffixes[ idx ] ),
+                'duration' : durations[ idx ], 'size' : sizes[ idx ], 'title' : 'Episode %d' % epno }
+    return tvdata
+
+def get_all_durations_dataframe_legacy( tvdata, min_bitrate = 2000, mode_dataformat = DATAFORMAT.IS_LATER ):
+    sizes = [ ]
+    durations = [ ]
+    shows = [ ]
+    seasons = [ ]
+    epnos = [ ]
+    names = [ ]
+    paths = [ ]
+    for show in tvdata:
+        for seasno in tvdata[show]['seasons']:
+            for epno in tvdata[show]['seasons'][seasno]['episodes']:
+                mypath = tvdata[show]['seasons'][seasno]['episodes'][epno]['path']
+                if mode_dataformat != DATAFORMAT.check_format( mypath ):
+                    continue
+                durations.append( tvdata[show]['seasons'][seasno]['episodes'][epno]['duration'])
+                sizes.append( tvdata[show]['seasons'][seasno]['episodes'][epno]['size'] )
+                shows.append( show )
+                seasons.append( seasno )
+                epnos.append( epno )
+                names.append( tvdata[show]['seasons'][seasno]['episodes'][epno]['title'] )
+                paths.append( mypath )
+    df = pandas.DataFrame({'sizes (MB)' : numpy.array(sizes)/1024**2, 'durations (s)' : durations,
+                           'shows' : shows, 'seasons' : seasons, 'epnos' : epnos, 'names' : names,
+                          'paths' : paths })
+    df['bitrate (kbps)'] = numpy.array( df['sizes (MB)'] ) / numpy.array( df['durations (s)']) * 1024 * 8
+    return df[ (df['bitrate (kbps)'] > min_bitrate ) ].sort_values('bitrate (kbps)', ascending = True).copy( )
+
+def summarize_shows_dataframe_legacy( df_sub ):
+    def _get_num_shows( showname ):
+        return {
+            'num shows' : len( df_sub[ df_sub.shows == showname ] ),
+            'min kbps' : df_sub[ df_sub.shows == showname ]['bitrate (kbps)'].min( ),
+            'med kbps' : numpy.median( df_sub[ df_sub.shows == showname ]['bitrate (kbps)'] ),
+            'max kbps' : df_sub[ df_sub.shows == showname ]['bitrate (kbps)'].max( ),
+            }
+    dict_of_shows = dict(map(lambda showname: ( showname, _get_num_shows( showname ) ),
+                             set( df_sub.shows ) ) )
+    df = pandas.DataFrame( {
+        'shows' : sorted( dict_of_shows ),
+        'num episodes' : list(map(lambda showname: dict_of_shows[ showname ][ 'num shows' ], sorted( dict_of_shows ) ) ),
+        'min kbps'     : list(map(lambda showname: dict_of_shows[ showname ][ 'min kbps'  ], sorted( dict_of_shows ) ) ),
+        'med kbps'     : list(map(lambda showname: dict_of_shows[ showname ][ 'med kbps'  ], sorted( dict_of_shows ) ) ),
+        'max kbps'     : list(map(lambda showname: dict_of_shows[ showname ][ 'max kbps'  ], sorted( dict_of_shows ) ) ),
+        } )
+    return df.sort_values( 'num episodes', ascending = False ).copy( )
+
+def time_func( func, num_repeats ):
+    dts = [ ]
+    for _ in range( num_repeats ):
+        time0 = time.perf_counter( )
+        result = func( )
+        dts.append( time.perf_counter( ) - time0 )
+    return min( dts ), result
+
+def main( ):
+    parser = ArgumentParser( )
+    parser.add_argument( '-n', '--episodes', dest = 'num_episodes', type = int, action = 'store', default = 100_000,
+                         help = 'The number of synthetic episodes. Default is 100000.' )
+    parser.add_argument( '-s', '--shows', dest = 'num_shows', type = int, action = 'store', default = 900,
+                         help = 'The number of synthetic shows. Default is 900.' )
+    parser.add_argument( '-r', '--repeats', dest = 'num_repeats', type = int, action = 'store', default = 3,
+                         help = 'The number of times to run each implementation, of which the fastest counts. Default is 3.' )
+    args = parser.parse_args( )
+    assert( args.num_episodes >= 1 )
+    assert( args.num_shows >= 1 )
+    assert( args.num_repeats >= 1 )
+    #
+    tvdata = create_tvdata( args.num_episodes, args.num_shows )
+    print( 'LIBRARY = %d SHOWS, %d EPISODES.' % ( len( tvdata ), args.num_episodes ) )
+    for mode_dataformat, min_bitrate in ( ( DATAFORMAT.IS_LATER, 2_000 ), ( DATAFORMAT.IS_AVI_OR_MPEG, 0.0 ) ):
+        dt_old, df_old = time_func( lambda: get_all_durations_dataframe_legacy(
+            tvdata, min_bitrate = min_bitrate, mode_dataformat = mode_dataformat ), args.num_repeats )
+        dt_new, df_new = time_func( lambda: get_all_durations_dataframe(
+            tvdata, min_bitrate = min_bitrate, mode_dataformat = mode_dataformat ), args.num_repeats )
+        assert( sorted( df_old.paths ) == sorted( df_new.paths ) )
+        assert( numpy.allclose( numpy.sort( df_old[ 'bitrate (kbps)' ] ), numpy.sort( df_new[ 'bitrate (kbps)' ] ) ) )
+        print( '%s: %d EPISODES. get_all_durations_dataframe: %0.3f SECONDS BEFORE, %0.3f SECONDS AFTER (%0.1fx).' % (
+            mode_dataformat.name, len( df_new ), dt_old, dt_new, dt_old / dt_new ) )
+        #
+        dt_old, dfs_old = time_func( lambda: summarize_shows_dataframe_legacy( df_new ), args.num_repeats )
+        dt_new, dfs_new = time_func( lambda: summarize_shows_dataframe( df_new ), args.num_repeats )
+        dfs_old = dfs_old.sort_values( 'shows' )
+        dfs_new = dfs_new.sort_values( 'shows' )
+        assert( list( dfs_old.shows ) == list( dfs_new.shows ) )
+        assert( list( dfs_old[ 'num episodes' ] ) == list( dfs_new[ 'num episodes' ] ) )
+        assert( all(map(lambda col: numpy.allclose( dfs_old[ col ], dfs_new[ col ] ), ( 'min kbps', 'med kbps', 'max kbps' ) ) ) )
+        print( '%s: %d SHOWS. summarize_shows_dataframe: %0.3f SECONDS BEFORE, %0.3f SECONDS AFTER (%0.1fx).' % (
+            mode_dataformat.name, len( dfs_new ), dt_old, dt_new, dt_old / dt_new ) )
+
+if __name__ == '__main__':
+    main( )
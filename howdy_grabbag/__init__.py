@@ -2,7 +2,6 @@ __author__ = 'Tanim Islam'
 __email__ = 'tanim.islam@gmail.com'
 
 import os
-from howdy.core import core
 from shutil import which
 
 def _find_exec( exec_name = 'ffmpeg' ):
@@ -18,16 +17,46 @@ def _find_exec( exec_name = 'ffmpeg' ):
     if os.access( which_exec, os.X_OK ): return which_exec
     return None
 
-hcli_exec        = _find_exec( 'HandBrakeCLI' )
-mkvpropedit_exec = _find_exec( 'mkvpropedit' )
-mkvmerge_exec    = _find_exec( 'mkvmerge' )
-nice_exec        = _find_exec( 'nice' )
-ffmpeg_exec      = _find_exec( 'ffmpeg' )
-ffprobe_exec     = _find_exec( 'ffprobe' )
-
-assert( hcli_exec        is not None )
-assert( mkvpropedit_exec is not None )
-assert( mkvmerge_exec    is not None )
-assert( nice_exec        is not None )
-assert( ffmpeg_exec      is not None )
-assert( ffprobe_exec     is not None )
+def get_config_directory( ):
+    """
+    :returns: the directory, ``$XDG_CONFIG_HOME/howdy_grabbag`` (by default ``~/.config/howdy_grabbag``), into which ``howdy_grabbag`` stores its persistent state. The directory is created if it does not exist.
+    :rtype: str
+    """
+    config_home = os.environ.get( 'XDG_CONFIG_HOME', '' ).strip( )
+    if len( config_home ) == 0:
+        config_home = os.path.join( os.path.expanduser( '~' ), '.config' )
+    config_dir = os.path.join( config_home, 'howdy_grabbag' )
+    os.makedirs( config_dir, exist_ok = True )
+    return config_dir
+
+#
+## the executables, by the module-level names under which they used to be found at import time
+_EXEC_NAMES = {
+    'hcli_exec'        : 'HandBrakeCLI',
+    'mkvpropedit_exec' : 'mkvpropedit',
+    'mkvmerge_exec'    : 'mkvmerge',
+    'nice_exec'        : 'nice',
+    'ffmpeg_exec'      : 'ffmpeg',
+    'ffprobe_exec'     : 'ffprobe' }
+
+_found_execs = { }
+
+def get_exec( exec_name ):
+    """
+    Finds an executable the first time a tool needs it, and remembers where, so that tools do not pay for, or fail on, executables they never run.
+
+    :param str exec_name: the executable, for instance ``ffmpeg`` or ``HandBrakeCLI``.
+    :returns: the full path to the executable.
+    :rtype: str
+    """
+    if exec_name not in _found_execs:
+        _found_execs[ exec_name ] = _find_exec( exec_name )
+    which_exec = _found_execs[ exec_name ]
+    assert( which_exec is not None ), 'ERROR, could not find executable %s.' % exec_name
+    return which_exec
+
+def __getattr__( name ):
+    #
+    ## so that "from howdy_grabbag import ffmpeg_exec" still works, finding ffmpeg then
+    if name in _EXEC_NAMES: return get_exec( _EXEC_NAMES[ name ] )
+    raise AttributeError( 'module %s has no attribute %s.' % ( __name__, name ) )
@@ -1,4 +1,4 @@
-import os, sys, numpy
+import os, sys, glob
 
 def remove_datetime_epdicts( epdicts ):
     return { seasno : { epno : epdicts[seasno][epno][0] for epno in epdicts[seasno] } for seasno in epdicts }
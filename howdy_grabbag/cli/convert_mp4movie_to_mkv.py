@@ -6,28 +6,22 @@ This converts an MP4 movie, with SRT file, and name and year into an MKV file wi
 20-10-2019: now can use HandBrakeCLI to convert the MP4 movie file to an MKV file that is smaller
 
 Requires titlecase, mutagen
-Requires executables: ffmpeg, mkvmerge, mkvpropedit, HandBrakeCLI
+Requires executables: mkvmerge, HandBrakeCLI
 """
-import signal
-from howdy import signal_handler
-signal.signal( signal.SIGINT, signal_handler )
-#
-import mutagen.mp4, time, os, sys, titlecase
+import signal, time, os, sys
 import uuid, logging, subprocess
-from howdy.core import core_rsync, SSHUploadPaths
-from howdy_grabbag.utils import get_rsync_commands, rsync_upload_mkv
+from howdy_grabbag.utils import get_rsync_commands, rsync_upload_mkv, mux_mp4_to_mkv
+from howdy_grabbag.utils.staging import remove_empty_staging_directories
 from shutil import which
 from argparse import ArgumentParser
 #
-from howdy_grabbag import (
-    ffmpeg_exec, mkvmerge_exec,
-    mkvpropedit_exec, hcli_exec )
+from howdy_grabbag import get_exec
 
 def convert_mp4_movie(
     mp4movie, name, year, quality = 28,
     srtfile = None,
     delete_files = False, outdir = os.getcwd( ) ):
-    #
+    import titlecase
     time0 = time.perf_counter( )
     assert( os.path.isfile( mp4movie ) )
     assert( os.path.basename( mp4movie ).lower( ).endswith( '.mp4' ) )
@@ -43,14 +37,14 @@ def convert_mp4_movie(
             '%s (%d).mkv' % ( titlecase.titlecase( name ), year ) ) )
     put_info_mp4movie( mp4movie, name, year )
     stdout_val = subprocess.check_output(
-        [ hcli_exec, '-i', mp4movie, '-e', 'x264', '-q', '%d' % quality,
+        [ get_exec( 'HandBrakeCLI' ), '-i', mp4movie, '-e', 'x264', '-q', '%d' % quality,
           '-B', '160', '-o', newfile ], stderr = subprocess.STDOUT )
     #
     if srtfile is not None:
         tmpmkv = '%s.mkv' % '-'.join( str( uuid.uuid4( ) ).split('-')[:2] )
         try:
             stdout_val = subprocess.check_output([
-                mkvmerge_exec, '-o', tmpmkv, newfile,
+                get_exec( 'mkvmerge' ), '-o', tmpmkv, newfile,
                 '--language', '0:eng',
                 '--track-name', '0:English', srtfile ], stderr = subprocess.STDOUT )                                                 
         except: pass
@@ -66,6 +60,7 @@ def convert_mp4_movie(
     return os.path.realpath( newfile )
 
 def put_info_mp4movie( mp4movie, name, year, language = None ):
+    import mutagen.mp4
     time0 = time.perf_counter( )
     assert( os.path.isfile( mp4movie ) )
     assert( os.path.basename( mp4movie ).lower( ).endswith('.mp4' ) )
@@ -81,7 +76,7 @@ def create_mkv_file(
     srtfile = None,
     delete_files = False, outdir = os.getcwd( ),
     language = None ):
-    #
+    import titlecase
     time0 = time.perf_counter( )
     assert( os.path.isfile( mp4movie ) )
     assert( os.path.basename( mp4movie ).lower( ).endswith('.mp4' ) )
@@ -92,50 +87,23 @@ def create_mkv_file(
         os.path.join(
             os.path.expanduser( outdir ),
             '%s (%d).mkv' % ( titlecase.titlecase( name ).replace('/','-' ), year ) ) )
-    put_info_mp4movie( mp4movie, name, year )
-    logging.debug( 'FFMPEG COMMAND: %s' % ' '.join(
-        [ ffmpeg_exec, '-y', '-i', mp4movie,
-         '-acodec', 'copy',
-         '-vcodec', 'copy',
-         '-sn', "file:%s" % newfile ] ) )
-    stdout_val = subprocess.check_output(
-        [ ffmpeg_exec, '-y', '-i', mp4movie,
-         '-acodec', 'copy',
-         '-vcodec', 'copy',
-         '-sn', "file:%s" % newfile ],
-        stderr = subprocess.STDOUT )
-    #
-    if srtfile is not None:
-        tmpmkv = '%s.mkv' % '-'.join( str( uuid.uuid4( ) ).split('-')[:2] )
-        logging.debug( 'MKV COMMAND: %s.' % ' '.join(
-             [ mkvmerge_exec, '-o', tmpmkv, newfile,
-             '--language', '0:eng',
-             '--track-name', '0:English', srtfile ] ) )
-        try:
-          stdout_val = subprocess.check_output(
-            [ mkvmerge_exec, '-o', tmpmkv, newfile,
-              '--language', '0:eng',
-              '--track-name', '0:English', srtfile ],
-            stderr = subprocess.STDOUT )
-        except: pass
-        os.rename( tmpmkv, newfile )
     #
-    os.chmod( newfile, 0o644 )
+    ## one mkvmerge pass over the MP4 and the SRT, which also sets the title, year, and audio language
+    try:
+        mux_mp4_to_mkv(
+            mp4movie, newfile, srtfile = srtfile, title = name, year = year,
+            audio_language = language, keep_mp4_subtitles = False )
+    finally: remove_empty_staging_directories( [ newfile, ] )
     if delete_files:
         os.remove( mp4movie )
         try: os.remove( srtfile )
         except: pass
-    if language is not None:
-        logging.info( 'setting audio track language to %s.' % language )
-        stdout_val = subprocess.check_output(
-            [ mkvpropedit_exec, newfile, '--edit', 'track:a1',
-             '--set', 'language=%s' % language ], stderr = subprocess.PIPE )
-        os.chmod( newfile, 0o644 )
-        
     logging.info( 'created %s in %0.3f seconds.' % ( newfile, time.perf_counter( ) - time0 ) )
     return os.path.realpath( newfile )
 
 def main( ):
+    from howdy import signal_handler
+    signal.signal( signal.SIGINT, signal_handler )
     parser = ArgumentParser( )
     parser.add_argument( '-M', '--mp4', dest='mp4', type=str, action='store',
                        help = 'Name of the MP4 movie file name.', required = True )
@@ -0,0 +1,136 @@
+"""
+This converts a whole season of MP4 TV files, each with its SRT file, in a directory into MKV files with subtitles and PLEX convention TV file names. Several remuxes run at once, since remuxing is pure I/O, and the MP4 and SRT files of an episode are only deleted once its MKV file has all their tracks.
+
+Requires executables: mkvmerge, and ffprobe to verify files that mkvmerge writes.
+"""
+import os, sys, time, logging
+from tabulate import tabulate
+from howdy_grabbag.utils import create_epdicts_from_jsonfile, get_mp4_srt_season_files, iter_remux_mp4_srt_files
+from howdy_grabbag.utils.journal import ProgressJournal
+from howdy_grabbag.utils.epdicts_cache import get_tot_epdict_tmdb_cached, set_epdicts_cache_refresh
+from argparse import ArgumentParser
+
+def get_season_epdicts( showname, firstAiredYear = None ):
+    """
+    :param str showname: the name of the TV show on TMDB_.
+    :param int firstAiredYear: optional year in which the first episode of the TV show aired.
+    :returns: the episode map, of season number to episode number to episode name.
+    :rtype: dict
+
+    .. _TMDB: https://www.themoviedb.org
+    """
+    epdicts = get_tot_epdict_tmdb_cached(
+        showname, firstAiredYear = firstAiredYear, showSpecials = True )
+    assert( epdicts is not None )
+    return { seasno : { epno : '; '.join(map(lambda tok: tok.strip( ), epdicts[seasno][epno][0].split('/') ) ) for
+                        epno in epdicts[seasno] } for seasno in epdicts }
+
+def process_season(
+    files, jsonfile, num_workers = 2, delete_files = True ):
+    """
+    Remuxes a season, journals each episode, and prints each episode's time and throughput.
+
+    :param list files: the ``( mp4file, srtfile, newfile )`` tuples to remux, from :py:meth:`get_mp4_srt_season_files <howdy_grabbag.utils.get_mp4_srt_season_files>`.
+    :param str jsonfile: the progress journal. Must end in ``.jsonl``.
+    :param int num_workers: the number of concurrent remuxes. Default is 2.
+    :param bool delete_files: if ``True``, then delete the MP4 and SRT files of each verified remux. Default is ``True``.
+    :returns: the number of episodes that failed or did not verify.
+    :rtype: int
+    """
+    time00 = time.perf_counter( )
+    journal = ProgressJournal( jsonfile )
+    journal.start(
+        list(map(lambda job: job[ 0 ], files ) ),
+        'found %02d episodes to remux with %d workers.' % ( len( files ), num_workers ) )
+    data = [ ]
+    num_bad = 0
+    size_mb = 0.0
+    for idx, job, result, error, dt in iter_remux_mp4_srt_files(
+            files, num_workers = num_workers, delete_files = delete_files ):
+        mp4file, srtfile, newfile = job
+        if error is not None:
+            num_bad += 1
+            data.append( [ os.path.basename( mp4file ), 'N/A', '%0.3f' % dt, 'N/A', 'FAILED' ] )
+            journal.record_file(
+                mp4file, 'failed', encode_time = dt, error = str( error ), mode = 'remux',
+                message = 'failed episode %02d / %02d in %0.3f seconds' % ( idx + 1, len( files ), dt ) )
+            continue
+        if not result[ 'verified' ]: num_bad += 1
+        size_mb += result[ 'size before' ] / 1024**2
+        data.append( [ os.path.basename( newfile ), '%0.1f' % ( result[ 'size before' ] / 1024**2 ), '%0.3f' % dt,
+                       '%0.1f' % result[ 'MB/s' ], 'OK' if result[ 'verified' ] else 'TRACKS DO NOT MATCH, KEPT SOURCES' ] )
+        journal.record_file(
+            mp4file, 'done', size_before = result[ 'size before' ], size_after = result[ 'size after' ],
+            encode_time = dt, output = newfile, verified = result[ 'verified' ], mode = 'remux',
+            **{ 'MB per second' : result[ 'MB/s' ] },
+            message = 'processed episode %02d / %02d in %0.3f seconds (%0.1f MB/s)' % (
+                idx + 1, len( files ), dt, result[ 'MB/s' ] ) )
+    dt00 = time.perf_counter( ) - time00
+    print( '%s\n' % tabulate( data, headers = [ 'EPISODE', 'SIZE (MB)', 'SECONDS', 'MB/S', 'STATUS' ] ) )
+    print( 'took %0.3f seconds to remux %d episodes (%0.1f MB/s overall).' % (
+        dt00, len( files ), size_mb / max( dt00, 1e-6 ) ) )
+    journal.finish( 'took %0.3f seconds to remux %d episodes, %d failed or did not verify.' % (
+        dt00, len( files ), num_bad ) )
+    journal.close( )
+    return num_bad
+
+def main( ):
+    """
+    Example command to run:
+
+    convert_mp4season_to_mkv -d "Eerie Indiana S01" -s "Eerie, Indiana" -S 1 -j 4 -J processed_s01.jsonl
+
+    """
+    parser = ArgumentParser( )
+    parser.add_argument( '-d', '--directory', dest = 'directory', type = str, action = 'store', default = os.getcwd( ),
+                         help = 'The directory of the MP4 and SRT files, into which the MKV files go. Default is %s.' % os.getcwd( ) )
+    parser.add_argument( '-s', '--series', dest = 'seriesName', type = str, action = 'store', required = True,
+                         help = 'Name of the TV show.' )
+    parser.add_argument( '-S', '--season', dest = 'season', type = int, action = 'store', default = 1,
+                         help = 'The season number of the episodes. Default is 1.' )
+    parser.add_argument( '-F', '--firstAiredYear', type = int, action = 'store',
+                         help = 'Year in which the first episode of the TV show aired.' )
+    parser.add_argument( '-E', '--epjson', dest = 'epjson', type = str, action = 'store', default = None,
+                         help = ' '.join([
+                             'Optional JSON file of season number to episode number to episode name.',
+                             'Default is to look up the episodes on TMDB.' ]) )
+    parser.add_argument( '--srtglob', dest = 'srtglob', type = str, action = 'store', default = '*.srt',
+                         help = 'The glob of the SRT files in the directory. Default is "*.srt".' )
+    parser.add_argument( '-j', '--jobs', dest = 'num_workers', type = int, action = 'store', default = 2,
+                         help = 'The number of remuxes to run at once. Default is 2.' )
+    parser.add_argument( '-J', '--jsonfile', dest = 'jsonfile', type = str, action = 'store',
+                         default = 'processed_remux.jsonl',
+                         help = 'Name of the JSON file used to write out the progress of the remuxes. Default = "processed_remux.jsonl".' )
+    parser.add_argument( '--refresh', dest = 'do_refresh', action = 'store_true', default = False,
+                         help = 'If chosen, then look up the TV show episodes on TMDB again, rather than in the local episodes cache.' )
+    parser.add_argument( '--keep', dest = 'do_delete', action = 'store_false', default = True,
+                         help = 'If chosen, then KEEP the MP4 and SRT files.' )
+    parser.add_argument( '--noinfo', dest = 'do_info', action = 'store_false', default = True,
+                         help = 'If chosen, then run with NO INFO logging (less debugging).' )
+    #
+    args = parser.parse_args( )
+    logger = logging.getLogger( )
+    if args.do_info: logger.setLevel( logging.INFO )
+    set_epdicts_cache_refresh( args.do_refresh )
+    #
+    ## error checking
+    directory = os.path.realpath( os.path.expanduser( args.directory ) )
+    assert( os.path.isdir( directory ) )
+    assert( args.num_workers >= 1 )
+    jsonfile = os.path.realpath( os.path.expanduser( args.jsonfile ) )
+    assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
+    #
+    showname = args.seriesName.strip( )
+    if args.epjson is not None: epdicts = create_epdicts_from_jsonfile( os.path.expanduser( args.epjson ) )
+    else: epdicts = get_season_epdicts( showname, firstAiredYear = args.firstAiredYear )
+    if args.season not in epdicts:
+        print( 'ERROR, SEASON %d NOT IN %s.' % ( args.season, showname.upper( ) ) )
+        return
+    files = get_mp4_srt_season_files(
+        epdicts, showname, seasno = args.season, srtglob = args.srtglob, dirname = directory )
+    if len( files ) == 0:
+        print( 'found no MP4 files in %s.' % directory )
+        return
+    num_bad = process_season(
+        files, jsonfile, num_workers = args.num_workers, delete_files = args.do_delete )
+    if num_bad != 0: sys.exit( 1 )
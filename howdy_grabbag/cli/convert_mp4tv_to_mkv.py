@@ -2,12 +2,10 @@
 This converts an MP4 TV file, with SRT file, and given TV show and season and epno, into an MKV with subtitles with PLEX convention TV file name.
 """
 
-import mutagen.mp4, time, os, sys, titlecase
-import uuid, logging, subprocess
-from howdy_grabbag.utils import get_rsync_commands_lowlevel, rsync_upload_mkv
-from howdy_grabbag import ffmpeg_exec, mkvmerge_exec
-from howdy.core import SSHUploadPaths
-from howdy.tv import tv_attic
+import time, os, sys, logging
+from howdy_grabbag.utils import get_rsync_commands_lowlevel, rsync_upload_mkv, mux_mp4_to_mkv
+from howdy_grabbag.utils.staging import remove_empty_staging_directories
+from howdy_grabbag.utils.epdicts_cache import get_tot_epdict_tmdb_cached, set_epdicts_cache_refresh
 from argparse import ArgumentParser
 
 def create_mkv_file(
@@ -23,7 +21,7 @@ def create_mkv_file(
         assert( os.path.basename( srtfile ).lower( ).endswith('.srt' ) )
     #
     ## get the episode info first find the series
-    epdicts = tv_attic.get_tot_epdict_tmdb(
+    epdicts = get_tot_epdict_tmdb_cached(
         tvshow, showFuture = True, minmatch = 10.0, firstAiredYear = firstAiredYear )
     assert( epdicts is not None )
     assert( seasno in epdicts )
@@ -33,29 +31,11 @@ def create_mkv_file(
         os.path.join(
             os.path.expanduser( outdir ),
             '%s - s%02de%02d - %s.mkv' % ( tvshow, seasno, epno, epname ) ) )
-    # put_info_mp4tv( mp4tv, name, year )
-    logging.debug( 'FFMPEG COMMAND: %s' % ' '.join(
-        [ ffmpeg_exec, '-y', '-i', mp4tv,
-         '-codec', 'copy', "file:%s" % newfile ] ) )
-    stdout_val = subprocess.check_output(
-        [ ffmpeg_exec, '-y', '-i', mp4tv,
-         '-codec', 'copy', "file:%s" % newfile ],
-        stderr = subprocess.STDOUT )
     #
-    if srtfile is not None:
-        tmpmkv = '%s.mkv' % '-'.join( str( uuid.uuid4( ) ).split('-')[:2] )
-        logging.debug( 'MKV COMMAND: %s.' % ' '.join(
-             [ mkvmerge_exec, '-o', tmpmkv, newfile,
-             '--language', '0:eng',
-             '--track-name', '0:English', srtfile ] ) )
-        stdout_val = subprocess.check_output(
-            [ mkvmerge_exec, '-o', tmpmkv, newfile,
-             '--language', '0:eng',
-             '--track-name', '0:English', srtfile ],
-            stderr = subprocess.STDOUT )
-        os.rename( tmpmkv, newfile )
-    #
-    os.chmod( newfile, 0o644 )
+    ## one mkvmerge pass over the MP4 and the SRT, with the episode name as title
+    try:
+        mux_mp4_to_mkv( mp4tv, newfile, srtfile = srtfile, title = epname )
+    finally: remove_empty_staging_directories( [ newfile, ] )
     if delete_files:
         os.remove( mp4tv )
         try: os.remove( srtfile )
@@ -82,6 +62,9 @@ def main( ):
     parser.add_argument(
         '--keep', dest='do_delete', action='store_false', default = True,
         help = 'If chosen, then KEEP the MP4 and SRT files.' )
+    parser.add_argument(
+        '--refresh', dest='do_refresh', action='store_true', default = False,
+        help = 'If chosen, then look up the TV show episodes on TMDB again, rather than in the local episodes cache.' )
     parser.add_argument(
         '--noinfo', dest='do_info', action='store_false', default = True,
         help = 'If chosen, then run with NO INFO logging (less debugging).' )
@@ -111,6 +94,7 @@ def main( ):
     ##
     logger = logging.getLogger( )
     if args.do_info: logger.setLevel( logging.INFO )
+    set_epdicts_cache_refresh( args.do_refresh )
     #
     seasepstring = args.epstring.strip( ).upper( )
     if not seasepstring[0] == 'S':
@@ -141,6 +125,7 @@ def main( ):
         'outdir'    : args.outdir,
         'do_ssh'    : False }
     if args.choose_option == 'ssh':
+        from howdy.core import SSHUploadPaths
         joblib_dict[ 'do_ssh' ] = True
         joblib_dict[ 'alias'  ] = args.ssh_alias
         tvshow = joblib_dict[ 'tvshow' ]
@@ -165,6 +150,7 @@ def main( ):
         joblib_dict[ 'tvshow' ], #args.seriesName,
         joblib_dict[ 'seasno' ],
         joblib_dict[ 'epno'   ],
+        firstAiredYear = args.firstAiredYear,
         delete_files = joblib_dict[ 'do_delete' ], #args.do_delete,
         srtfile = joblib_dict[ 'srtfile' ], # args.srt,
         outdir = joblib_dict[ 'outdir' ] ) #args.outdir )
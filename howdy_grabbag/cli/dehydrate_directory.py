@@ -3,14 +3,13 @@ This goes through *multiple* directories you specify, and tries to *shrink*  *sh
 
 .. _HEVC: https://en.wikipedia.org/wiki/High_Efficiency_Video_Coding
 """
-import os, sys, logging, time, pandas, numpy, json, subprocess, shutil, uuid, glob
+import os, sys, logging, time
 from tabulate import tabulate
 from itertools import chain
+from howdy_grabbag.utils import get_directory_names
 from howdy_grabbag.utils.dehydrate import (
-    find_files_to_process,
-    find_files_to_process_AVI,
-    get_fnames_from_directories,
-    get_fnames_from_directories_AVI,
+    find_files_to_process_directories,
+    find_files_to_process_directories_AVI,
     process_multiple_directories,
     process_multiple_directories_AVI,
     process_multiple_directories_subtitles,
@@ -18,29 +17,46 @@ from howdy_grabbag.utils.dehydrate import (
     process_multiple_files,
     process_multiple_files_AVI,
     process_multiple_files_lower_audio )
+from howdy_grabbag.utils.probe_cache import set_probe_cache_enabled
+from howdy_grabbag.utils.transcode_scheduler import get_num_jobs
+from howdy_grabbag.utils.staging import set_scratch_directory
+from howdy_grabbag.utils.ordering import DEFAULT_ORDERING, get_ordering_names
+from howdy_grabbag.utils.probe_engine import parse_mount_concurrency, set_mount_concurrency, set_probe_workers
     
 from argparse import ArgumentParser
 
-def _get_directory_names( all_directories ):
-    directories_not_globs = set(filter(lambda dirname: '*' not in dirname, all_directories ) )
-    directories_globs     = set(filter(lambda dirname: '*' in dirname, all_directories ) )
-    directory_names_1 = set(filter(os.path.isdir, map(lambda dirname: os.path.realpath( os.path.expanduser( dirname ) ), directories_not_globs ) ) )
-    directory_names_2 = set(filter(os.path.isdir, map(lambda dirname: os.path.realpath( os.path.expanduser( dirname ) ),
-                                                      chain.from_iterable(map(lambda globdir: glob.glob( globdir ), directories_globs ) ) ) ) )
-    directory_names   = sorted( directory_names_1 | directory_names_2 )
-    return directory_names
-
-
 def main( ):
     parser = ArgumentParser( )
     parser.add_argument( '-d', '--directories', dest='directories', type=str, action = 'store', nargs = '+', default = [ os.getcwd( ), ],
                         help = 'Name of the directories of MKV and MP4 files to dehydrate. Default is %s.' % [ os.getcwd( ), ] )
+    parser.add_argument( '-R', '--recursive', dest = 'do_recursive', action = 'store_true', default = False,
+                         help = 'If chosen, then also look for files in the subdirectories of the directories.' )
+    parser.add_argument( '--max-depth', dest = 'max_depth', type = int, action = 'store', default = None,
+                         help = 'If --recursive, the maximum depth of subdirectories to look through. 0 only looks in the directories. Default is no limit.' )
+    parser.add_argument( '--incremental', dest = 'do_incremental', action = 'store_true', default = False,
+                         help = ' '.join([
+                             'If chosen, then only look at files that are new or changed since they were last examined,',
+                             'according to the persistent dehydrate manifest.' ]) )
     parser.add_argument( '-M', '--minbitrate', dest = 'minbitrate', type = int, action = 'store', default = 2_000,
                         help = ' '.join([
                             'The minimum total bitrate (in kbps) of episodes to dehydrate. Must be >= 2000 kbps.',
                             'Default is 2000 kbps.']))
     parser.add_argument( '--info', dest='do_info', action='store_true', default = False,
                         help = 'If chosen, then turn on INFO logging.' )
+    parser.add_argument( '-j', '--jobs', dest = 'num_jobs', type = int, action = 'store', default = None,
+                         help = 'The number of files to transcode at the same time. Must be >= 1. Default is the number of cores divided by --threads-per-job.' )
+    parser.add_argument( '--threads-per-job', dest = 'threads_per_job', type = int, action = 'store', default = 16,
+                         help = ' '.join([
+                             'The number of threads that each transcode can use effectively. Must be >= 1. Default is 16.',
+                             'When running more than one transcode, each one is pinned to its own set of at most these many cores.' ]) )
+    parser.add_argument( '--no-probe-cache', dest = 'do_probe_cache', action = 'store_false', default = True,
+                         help = 'If chosen, then do NOT use the persistent ffprobe metadata cache. Default is to use it.' )
+    parser.add_argument( '--probe-workers', dest = 'probe_workers', type = int, action = 'store', default = None,
+                         help = 'The number of files to probe concurrently. Must be >= 1. Default is 4 times the number of cores, at most 32.' )
+    parser.add_argument( '--mount-concurrency', dest = 'mount_concurrency', type = str, action = 'store', nargs = '+', default = [ ],
+                         help = ' '.join([
+                             'Per-filesystem number of files to probe concurrently, each of the form PATH=NUMBER, for example /mnt/nfs=4.',
+                             'Filesystems not listed use the --probe-workers number.' ]) )
     parser.add_argument( '-N', '--nohevc', dest = 'do_hevc', action = 'store_false', default = True,
                         help = 'If chosen, then only process the big episodes that are NOT HEVC. Default is to process everything.' )
     parser.add_argument( '-A', '--doavi', dest = 'do_avi', action = 'store_true', default = False,
@@ -51,8 +67,18 @@ def main( ):
                                   default = 28, help = 'Will dehydrate shows using HEVC video codec with this quality. Default is 28. Must be >= 20.' )
     parser.add_argument( '-B', '--bitrate', dest = 'parser_audio_bitstring', metavar = 'BITRATE', type = str, action = 'store', default = '160',
                          help = 'Will dehydrate shows using this audio bitrate in KBPS, or using value = "copy". Default is 160.' )
-    parser.add_argument( '-J', '--jsonfile', dest = 'parser_dehydrate_jsonfile', metavar = 'JSONFILE', type = str, action = 'store', default = 'processed_stuff.json',
-                                  help = 'Name of the JSON file to store progress-as-you-go-along on directory dehydration. Default file name = "processed_stuff.json".' )
+    parser.add_argument( '-J', '--jsonfile', dest = 'parser_dehydrate_jsonfile', metavar = 'JSONFILE', type = str, action = 'store', default = 'processed_stuff.jsonl',
+                                  help = 'Name of the JSON Lines file to store progress-as-you-go-along on directory dehydration. Default file name = "processed_stuff.jsonl".' )
+    parser.add_argument( '--resume', dest = 'do_resume', action = 'store_true', default = False,
+                         help = 'If chosen, then resume an interrupted run from its JSON Lines file: skip the files it finished, and remove its partial temporary outputs.' )
+    parser.add_argument( '--scratch', dest = 'scratch_dir', type = str, action = 'store', default = None,
+                         help = ' '.join([
+                             'If given, then the fast local scratch directory into which to write encodes, each copied back once when done.',
+                             'Default is to write encodes into a hidden directory on the same filesystem as each file.' ]) )
+    parser.add_argument( '--order', dest = 'ordering', type = str, action = 'store', default = DEFAULT_ORDERING, choices = get_ordering_names( ),
+                         help = ' '.join([
+                             'The order in which to dehydrate files. "savings" does first the files with the most estimated disk space saved per second of encoding,',
+                             'learned from the JSON Lines files of past runs next to JSONFILE. Default is "%s".' % DEFAULT_ORDERING ]) )
     #
     ## parsing arguments
     time0 = time.perf_counter( )
@@ -60,13 +86,19 @@ def main( ):
     assert( args.minbitrate >= 500 )
     logger = logging.getLogger( )
     if args.do_info: logger.setLevel( logging.INFO )
+    num_jobs = get_num_jobs( args.num_jobs, args.threads_per_job )
+    set_scratch_directory( args.scratch_dir )
+    set_probe_cache_enabled( args.do_probe_cache )
+    if args.probe_workers is not None: set_probe_workers( args.probe_workers )
+    set_mount_concurrency( parse_mount_concurrency( args.mount_concurrency ) )
+    assert( args.max_depth is None or args.max_depth >= 0 )
     #
-    directory_names = _get_directory_names( args.directories )
+    directory_names = get_directory_names( args.directories )
     #
     ## dehydrate directory
     quality = args.parser_dehydrate_quality
     jsonfile = os.path.expanduser( args.parser_dehydrate_jsonfile )
-    assert( os.path.basename( jsonfile ).endswith( '.json' ) )
+    assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
     assert( quality >= 20 )
     #
     ##
@@ -79,30 +111,66 @@ def main( ):
             do_hevc = args.do_hevc,
             min_bitrate = args.minbitrate, qual = quality,
             audio_bit_string = audio_bit_string,
-            output_json_file = jsonfile )
+            output_json_file = jsonfile,
+            recursive = args.do_recursive, max_depth = args.max_depth,
+            incremental = args.do_incremental,
+            num_jobs = num_jobs, threads_per_job = args.threads_per_job,
+            resume = args.do_resume, ordering = args.ordering )
     else:
         process_multiple_directories_AVI(
             directory_names = directory_names,
             qual = quality,
-            output_json_file = jsonfile )
+            output_json_file = jsonfile,
+            recursive = args.do_recursive, max_depth = args.max_depth,
+            incremental = args.do_incremental,
+            num_jobs = num_jobs, threads_per_job = args.threads_per_job,
+            resume = args.do_resume, ordering = args.ordering )
 
 def main_lower_audio( ):
     parser = ArgumentParser( )
     parser.add_argument( '-d', '--directories', dest='directories', type=str, action = 'store', nargs = '+', default = [ os.getcwd( ), ],
                         help = 'Name of the directories of MKV and MP4 files to dehydrate. Default is %s.' % [ os.getcwd( ), ] )
+    parser.add_argument( '-R', '--recursive', dest = 'do_recursive', action = 'store_true', default = False,
+                         help = 'If chosen, then also look for files in the subdirectories of the directories.' )
+    parser.add_argument( '--max-depth', dest = 'max_depth', type = int, action = 'store', default = None,
+                         help = 'If --recursive, the maximum depth of subdirectories to look through. 0 only looks in the directories. Default is no limit.' )
+    parser.add_argument( '--incremental', dest = 'do_incremental', action = 'store_true', default = False,
+                         help = ' '.join([
+                             'If chosen, then only look at files that are new or changed since they were last examined,',
+                             'according to the persistent dehydrate manifest.' ]) )
     parser.add_argument( '-M', '--minaudiobitrate', dest = 'minaudiobitrate', type = int, action = 'store', default = 256,
                         help = ' '.join([
                             'The minimum audio bitrate (in kbps) of episodes to lower the audio bitrate. Must be >= 10 kbps.',
                             'Default is 256 kbps.']))
     parser.add_argument( '--info', dest='do_info', action='store_true', default = False,
                         help = 'If chosen, then turn on INFO logging.' )
+    parser.add_argument( '-j', '--jobs', dest = 'num_jobs', type = int, action = 'store', default = None,
+                         help = 'The number of files to transcode at the same time. Must be >= 1. Default is the number of cores divided by --threads-per-job.' )
+    parser.add_argument( '--threads-per-job', dest = 'threads_per_job', type = int, action = 'store', default = 16,
+                         help = ' '.join([
+                             'The number of threads that each transcode can use effectively. Must be >= 1. Default is 16.',
+                             'When running more than one transcode, each one is pinned to its own set of at most these many cores.' ]) )
+    parser.add_argument( '--no-probe-cache', dest = 'do_probe_cache', action = 'store_false', default = True,
+                         help = 'If chosen, then do NOT use the persistent ffprobe metadata cache. Default is to use it.' )
+    parser.add_argument( '--probe-workers', dest = 'probe_workers', type = int, action = 'store', default = None,
+                         help = 'The number of files to probe concurrently. Must be >= 1. Default is 4 times the number of cores, at most 32.' )
+    parser.add_argument( '--mount-concurrency', dest = 'mount_concurrency', type = str, action = 'store', nargs = '+', default = [ ],
+                         help = ' '.join([
+                             'Per-filesystem number of files to probe concurrently, each of the form PATH=NUMBER, for example /mnt/nfs=4.',
+                             'Filesystems not listed use the --probe-workers number.' ]) )
     #
     ## lower_audio arguments
     parser.add_argument( '-B', '--bitrate', dest = 'parser_new_audio_bit_rate', metavar = 'BITRATE', type = int, action = 'store', default = 160,
                          help = 'Will lower the audio bitrate down to these many kbps. Must be >= 10 kbps. Default is 160 kbps.' )
     parser.add_argument( '-J', '--jsonfile', dest = 'parser_lower_audio_jsonfile', metavar = 'JSONFILE', type = str, action = 'store',
-                         default = 'processed_stuff_audio.json',
-                         help = 'Name of the JSON file to store progress-as-you-go-along on directory dehydration. Default file name = "processed_stuff_audio.json".' )
+                         default = 'processed_stuff_audio.jsonl',
+                         help = 'Name of the JSON Lines file to store progress-as-you-go-along on directory dehydration. Default file name = "processed_stuff_audio.jsonl".' )
+    parser.add_argument( '--resume', dest = 'do_resume', action = 'store_true', default = False,
+                         help = 'If chosen, then resume an interrupted run from its JSON Lines file: skip the files it finished, and remove its partial temporary outputs.' )
+    parser.add_argument( '--scratch', dest = 'scratch_dir', type = str, action = 'store', default = None,
+                         help = ' '.join([
+                             'If given, then the fast local scratch directory into which to write encodes, each copied back once when done.',
+                             'Default is to write encodes into a hidden directory on the same filesystem as each file.' ]) )
     #
     ## parsing arguments
     time0 = time.perf_counter( )
@@ -110,19 +178,29 @@ def main_lower_audio( ):
     assert( args.minaudiobitrate >= 10 )
     logger = logging.getLogger( )
     if args.do_info: logger.setLevel( logging.INFO )
+    num_jobs = get_num_jobs( args.num_jobs, args.threads_per_job )
+    set_scratch_directory( args.scratch_dir )
+    set_probe_cache_enabled( args.do_probe_cache )
+    if args.probe_workers is not None: set_probe_workers( args.probe_workers )
+    set_mount_concurrency( parse_mount_concurrency( args.mount_concurrency ) )
+    assert( args.max_depth is None or args.max_depth >= 0 )
     #
-    directory_names = _get_directory_names( args.directories )
+    directory_names = get_directory_names( args.directories )
     #
     ## dehydrate directory
     jsonfile = os.path.expanduser( args.parser_lower_audio_jsonfile )
-    assert( os.path.basename( jsonfile ).endswith( '.json' ) )
+    assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
     assert( args.parser_new_audio_bit_rate >= 10 )
     #
     process_multiple_directories_lower_audio(
         directory_names = directory_names,
         min_audio_bit_rate = args.minaudiobitrate,
         new_audio_bit_rate = args.parser_new_audio_bit_rate,
-        output_json_file = jsonfile )
+        output_json_file = jsonfile,
+        recursive = args.do_recursive, max_depth = args.max_depth,
+        incremental = args.do_incremental,
+        num_jobs = num_jobs, threads_per_job = args.threads_per_job,
+        resume = args.do_resume )
 
 def main_lower_audio_files( ):
     parser = ArgumentParser( )
@@ -136,13 +214,33 @@ def main_lower_audio_files( ):
                             'Default is 256 kbps.']))
     parser.add_argument( '--info', dest='do_info', action='store_true', default = False,
                          help = 'If chosen, then turn on INFO logging.' )
+    parser.add_argument( '-j', '--jobs', dest = 'num_jobs', type = int, action = 'store', default = None,
+                         help = 'The number of files to transcode at the same time. Must be >= 1. Default is the number of cores divided by --threads-per-job.' )
+    parser.add_argument( '--threads-per-job', dest = 'threads_per_job', type = int, action = 'store', default = 16,
+                         help = ' '.join([
+                             'The number of threads that each transcode can use effectively. Must be >= 1. Default is 16.',
+                             'When running more than one transcode, each one is pinned to its own set of at most these many cores.' ]) )
+    parser.add_argument( '--no-probe-cache', dest = 'do_probe_cache', action = 'store_false', default = True,
+                         help = 'If chosen, then do NOT use the persistent ffprobe metadata cache. Default is to use it.' )
+    parser.add_argument( '--probe-workers', dest = 'probe_workers', type = int, action = 'store', default = None,
+                         help = 'The number of files to probe concurrently. Must be >= 1. Default is 4 times the number of cores, at most 32.' )
+    parser.add_argument( '--mount-concurrency', dest = 'mount_concurrency', type = str, action = 'store', nargs = '+', default = [ ],
+                         help = ' '.join([
+                             'Per-filesystem number of files to probe concurrently, each of the form PATH=NUMBER, for example /mnt/nfs=4.',
+                             'Filesystems not listed use the --probe-workers number.' ]) )
     #
     ## lower_audio arguments
     parser.add_argument( '-B', '--bitrate', dest = 'parser_new_audio_bit_rate', metavar = 'BITRATE', type = int, action = 'store', default = 160,
                          help = 'Will lower the audio bitrate down to these many kbps. Must be >= 10 kbps. Default is 160 kbps.' )
     parser.add_argument( '-J', '--jsonfile', dest = 'parser_lower_audio_jsonfile', metavar = 'JSONFILE', type = str, action = 'store',
-                         default = 'processed_stuff_audio.json',
-                        help = 'Name of the JSON file to store progress-as-you-go-along on directory dehydration. Default file name = "processed_stuff_audio.json".' )
+                         default = 'processed_stuff_audio.jsonl',
+                        help = 'Name of the JSON Lines file to store progress-as-you-go-along on directory dehydration. Default file name = "processed_stuff_audio.jsonl".' )
+    parser.add_argument( '--resume', dest = 'do_resume', action = 'store_true', default = False,
+                         help = 'If chosen, then resume an interrupted run from its JSON Lines file: skip the files it finished, and remove its partial temporary outputs.' )
+    parser.add_argument( '--scratch', dest = 'scratch_dir', type = str, action = 'store', default = None,
+                         help = ' '.join([
+                             'If given, then the fast local scratch directory into which to write encodes, each copied back once when done.',
+                             'Default is to write encodes into a hidden directory on the same filesystem as each file.' ]) )
     #
     ## parsing arguments
     time0 = time.perf_counter( )
@@ -150,6 +248,11 @@ def main_lower_audio_files( ):
     assert( args.minaudiobitrate >= 10 )
     logger = logging.getLogger( )
     if args.do_info: logger.setLevel( logging.INFO )
+    num_jobs = get_num_jobs( args.num_jobs, args.threads_per_job )
+    set_scratch_directory( args.scratch_dir )
+    set_probe_cache_enabled( args.do_probe_cache )
+    if args.probe_workers is not None: set_probe_workers( args.probe_workers )
+    set_mount_concurrency( parse_mount_concurrency( args.mount_concurrency ) )
     #
     ## files to go through
     fnames_to_proc = set(filter(os.path.isfile, map(os.path.realpath, args.filelist ) ) )
@@ -161,74 +264,163 @@ def main_lower_audio_files( ):
     #
     ## json file status
     jsonfile = os.path.expanduser( args.parser_lower_audio_jsonfile )
-    assert( os.path.basename( jsonfile ).endswith( '.json' ) )
+    assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
     assert( args.parser_new_audio_bit_rate >= 10 )
     #
     process_multiple_files_lower_audio(
         inputfiles,
         min_audio_bit_rate = args.minaudiobitrate,
         new_audio_bit_rate = args.parser_new_audio_bit_rate,
-        output_json_file = jsonfile )
+        output_json_file = jsonfile,
+        num_jobs = num_jobs, threads_per_job = args.threads_per_job,
+        resume = args.do_resume )
     
 def main_list( ):
     parser = ArgumentParser( )
     parser.add_argument( '-d', '--directories', dest='directories', type=str, action = 'store', nargs = '+', default = [ os.getcwd( ), ],
                         help = 'Name of the directories of MKV and MP4 files to dehydrate. Default is %s.' % [ os.getcwd( ), ] )
+    parser.add_argument( '-R', '--recursive', dest = 'do_recursive', action = 'store_true', default = False,
+                         help = 'If chosen, then also look for files in the subdirectories of the directories.' )
+    parser.add_argument( '--max-depth', dest = 'max_depth', type = int, action = 'store', default = None,
+                         help = 'If --recursive, the maximum depth of subdirectories to look through. 0 only looks in the directories. Default is no limit.' )
+    parser.add_argument( '--incremental', dest = 'do_incremental', action = 'store_true', default = False,
+                         help = ' '.join([
+                             'If chosen, then only look at files that are new or changed since they were last examined,',
+                             'according to the persistent dehydrate manifest.' ]) )
     parser.add_argument( '-M', '--minbitrate', dest = 'minbitrate', type = int, action = 'store', default = 2_000,
                         help = ' '.join([
                             'The minimum total bitrate (in kbps) of episodes to dehydrate.',
                             'Default is 2000 kbps.']))
     parser.add_argument( '--info', dest='do_info', action='store_true', default = False,
                         help = 'If chosen, then turn on INFO logging.' )
+    parser.add_argument( '--no-probe-cache', dest = 'do_probe_cache', action = 'store_false', default = True,
+                         help = 'If chosen, then do NOT use the persistent ffprobe metadata cache. Default is to use it.' )
+    parser.add_argument( '--probe-workers', dest = 'probe_workers', type = int, action = 'store', default = None,
+                         help = 'The number of files to probe concurrently. Must be >= 1. Default is 4 times the number of cores, at most 32.' )
+    parser.add_argument( '--mount-concurrency', dest = 'mount_concurrency', type = str, action = 'store', nargs = '+', default = [ ],
+                         help = ' '.join([
+                             'Per-filesystem number of files to probe concurrently, each of the form PATH=NUMBER, for example /mnt/nfs=4.',
+                             'Filesystems not listed use the --probe-workers number.' ]) )
     parser.add_argument( '-N', '--nohevc', dest = 'do_hevc', action = 'store_false', default = True,
                         help = 'If chosen, then only process the big episodes that are NOT HEVC. Default is to process everything.' )
     parser.add_argument( '-A', '--doavi', dest = 'do_avi', action = 'store_true', default = False,
                         help = 'If chosen, then process AVI and MPEG files for dehydration at higher qualities.' )
+    parser.add_argument( '-E', '--estimate', dest = 'do_estimate', action = 'store_true', default = False,
+                        help = 'If chosen, then rank the files by the estimated GB saved per encode hour, learned from past encodes.' )
+    parser.add_argument( '--budget-hours', dest = 'budget_hours', metavar = 'HOURS', type = float, action = 'store', default = None,
+                        help = 'If given, then only list the files that save the most GB within this many encode hours. Implies --estimate.' )
+    parser.add_argument( '-Q', '--quality', dest = 'quality', metavar = 'QUALITY', type = int, action = 'store', default = None,
+                        help = ' '.join([
+                            'The HEVC quality of the encodes to estimate. If given, or with --estimate, then leave out the files that earlier encodes at this quality could not shrink.',
+                            'Default is 28, or 22 with --doavi.' ]) )
+    parser.add_argument( '--journals', dest = 'journals', metavar = 'JOURNAL', type = str, action = 'store', nargs = '+', default = None,
+                        help = 'The JSON Lines progress files of past encodes from which to learn. Default is every ".jsonl" file in the current directory.' )
     #
     ## parsing arguments
     time0 = time.perf_counter( )
     args = parser.parse_args( )
     assert( args.minbitrate >= 0 )
+    assert( args.budget_hours is None or args.budget_hours > 0 )
     logger = logging.getLogger( )
     if args.do_info: logger.setLevel( logging.INFO )
+    set_probe_cache_enabled( args.do_probe_cache )
+    if args.probe_workers is not None: set_probe_workers( args.probe_workers )
+    set_mount_concurrency( parse_mount_concurrency( args.mount_concurrency ) )
+    assert( args.max_depth is None or args.max_depth >= 0 )
     #
-    directory_names = _get_directory_names( args.directories )
+    directory_names = get_directory_names( args.directories )
     #directory_names = sorted(set(filter(os.path.isdir, map(lambda dirname: os.path.realpath( os.path.expanduser( dirname ) ), args.directories ) ) ) )
     #
     ## list filenames
     if not args.do_avi:
-        fnames_dict = find_files_to_process(
-            get_fnames_from_directories( directory_names ),
-            do_hevc = args.do_hevc, min_bitrate = args.minbitrate )
+        fnames_dict, file_stats = find_files_to_process_directories(
+            directory_names, do_hevc = args.do_hevc, min_bitrate = args.minbitrate,
+            recursive = args.do_recursive, max_depth = args.max_depth,
+            incremental = args.do_incremental, qual = _get_list_quality( args, 28 ) )
         data = list( zip(
             map(os.path.basename, sorted( fnames_dict ) ),
-            map(lambda fname: '%0.1f' % fnames_dict[ fname ][ 'bit_rate_kbps' ], sorted( fnames_dict ) ),
-            map(lambda fname: '%0.1f' % fnames_dict[ fname ][ 'audio_bit_rate_kbps' ], sorted( fnames_dict ) ) ) )
-        print( 'found %02d valid files in %s with min bitrate >= %d kbps.\n' % (
-            len( fnames_dict ), directory_names, args.minbitrate ) )
-        print( '%s\n' % tabulate( data, headers = [ 'FILENAME', 'KBPS', 'AUDIO KBPS' ] ) )
+            map(lambda fname: '%0.1f' % fnames_dict[ fname ].bit_rate_kbps, sorted( fnames_dict ) ),
+            map(lambda fname: _format_kbps( fnames_dict[ fname ].video_bit_rate_estimate_kbps ), sorted( fnames_dict ) ),
+            map(lambda fname: '%0.1f' % fnames_dict[ fname ].audio_bit_rate_kbps, sorted( fnames_dict ) ),
+            map(lambda fname: '%0.1f' % ( file_stats[ fname ].st_size / 1024**2 ), sorted( fnames_dict ) ) ) )
+        print( 'found %02d valid files in %s with min bitrate >= %d kbps, total size = %0.3f GB.\n' % (
+            len( fnames_dict ), directory_names, args.minbitrate,
+            sum(map(lambda fname: file_stats[ fname ].st_size, fnames_dict ) ) / 1024**3 ) )
+        if args.do_estimate or args.budget_hours is not None:
+            _print_estimates( fnames_dict, file_stats, args, 28 )
+            print( 'took %0.3f seconds to process.' % ( time.perf_counter( ) - time0 ) )
+            return
+        print( '%s\n' % tabulate( data, headers = [ 'FILENAME', 'KBPS', 'VIDEO KBPS', 'AUDIO KBPS', 'SIZE (MB)' ] ) )
         return
     #
-    fnames_dict_AVI = find_files_to_process_AVI(
-        get_fnames_from_directories_AVI( directory_names ) )
+    fnames_dict_AVI, file_stats_AVI = find_files_to_process_directories_AVI(
+        directory_names, recursive = args.do_recursive, max_depth = args.max_depth,
+        incremental = args.do_incremental, qual = _get_list_quality( args, 22 ) )
     data_AVI = list( zip(
         map(os.path.basename, sorted( fnames_dict_AVI ) ),
-        map(lambda fname: '%0.1f' % fnames_dict_AVI[ fname ][ 'bit_rate_kbps' ], sorted( fnames_dict_AVI ) ),
-        map(lambda fname: '%0.1f' % fnames_dict_AVI[ fname ][ 'audio_bit_rate_kbps' ], sorted( fnames_dict_AVI ) ) ) )
-    print( 'found %02d valid files in %s with min bitrate >= %d kbps.\n' % (
-        len( fnames_dict_AVI ), directory_names, args.minbitrate ) )
-    print( '%s\n' % tabulate( data_AVI, headers = [ 'FILENAME', 'KBPS', 'AUDIO KBPS' ] ) )
+        map(lambda fname: '%0.1f' % fnames_dict_AVI[ fname ].bit_rate_kbps, sorted( fnames_dict_AVI ) ),
+        map(lambda fname: _format_kbps( fnames_dict_AVI[ fname ].video_bit_rate_estimate_kbps ), sorted( fnames_dict_AVI ) ),
+        map(lambda fname: '%0.1f' % fnames_dict_AVI[ fname ].audio_bit_rate_kbps, sorted( fnames_dict_AVI ) ),
+        map(lambda fname: '%0.1f' % ( file_stats_AVI[ fname ].st_size / 1024**2 ), sorted( fnames_dict_AVI ) ) ) )
+    print( 'found %02d valid files in %s with min bitrate >= %d kbps, total size = %0.3f GB.\n' % (
+        len( fnames_dict_AVI ), directory_names, args.minbitrate,
+        sum(map(lambda fname: file_stats_AVI[ fname ].st_size, fnames_dict_AVI ) ) / 1024**3 ) )
+    if args.do_estimate or args.budget_hours is not None:
+        _print_estimates( fnames_dict_AVI, file_stats_AVI, args, 22 )
+    else:
+        print( '%s\n' % tabulate( data_AVI, headers = [ 'FILENAME', 'KBPS', 'VIDEO KBPS', 'AUDIO KBPS', 'SIZE (MB)' ] ) )
     print( 'took %0.3f seconds to process.' % ( time.perf_counter( ) - time0 ) )
 
+def _get_list_quality( args, default_quality ):
+    #
+    ## a plain listing shows every file above the bit rate, and only leaves out the files not worth encoding again when asked about a quality
+    if args.quality is not None: return args.quality
+    if args.do_estimate or args.budget_hours is not None: return default_quality
+    return None
+
+def _format_kbps( kbps ):
+    if kbps is None: return 'N/A'
+    return '%0.1f' % kbps
+
+def _print_estimates( fnames_dict, file_stats, args, default_quality ):
+    from howdy_grabbag.utils.estimator import (
+        DehydrateEstimator, get_default_journal_files, get_candidates_dataframe, select_within_budget )
+    #
+    ## rank the files by estimated GB saved per encode hour, and possibly keep only those that fit in the budget
+    quality = args.quality if args.quality is not None else default_quality
+    journal_files = args.journals
+    if journal_files is None: journal_files = get_default_journal_files( )
+    estimator = DehydrateEstimator.from_journals( list(map(os.path.expanduser, journal_files ) ) )
+    df_est = estimator.estimate_dataframe( get_candidates_dataframe( fnames_dict, file_stats ), quality = quality )
+    print( 'estimated from %d past encodes at quality %d.' % ( estimator.num_encodes, quality ) )
+    if args.budget_hours is not None:
+        df_est = select_within_budget( df_est, args.budget_hours )
+        print( 'in %0.2f encode hours, dehydrate these %d files to save an estimated %0.2f GB in %0.2f hours.' % (
+            args.budget_hours, len( df_est ), df_est[ 'saved (GB)' ].sum( ), df_est[ 'encode hours' ].sum( ) ) )
+    data = list( zip(
+        map(os.path.basename, df_est.paths ),
+        map(lambda kbps: '%0.1f' % kbps, df_est[ 'bitrate (kbps)' ] ),
+        map(lambda size: '%0.1f' % size, df_est[ 'sizes (MB)' ] ),
+        df_est[ 'saved (GB)' ], df_est[ 'encode hours' ], df_est[ 'GB per hour' ] ) )
+    print( '%s\n' % tabulate( data, headers = [ 'FILENAME', 'KBPS', 'SIZE (MB)', 'EST SAVED (GB)', 'EST HOURS', 'GB/HOUR' ], floatfmt = '.2f' ) )
+
 def main_subtitles( ):
     parser = ArgumentParser( )
     parser.add_argument( '-d', '--directories', dest='directories', type=str, action = 'store', nargs = '+', default = [ os.getcwd( ), ],
                          help = 'Name of the directories of MKV and MP4 files to dehydrate. Default is %s.' % [ os.getcwd( ), ] )
     parser.add_argument( '--info', dest='do_info', action='store_true', default = False,
                          help = 'If chosen, then turn on INFO logging.' )
+    parser.add_argument( '--no-probe-cache', dest = 'do_probe_cache', action = 'store_false', default = True,
+                         help = 'If chosen, then do NOT use the persistent ffprobe metadata cache. Default is to use it.' )
+    parser.add_argument( '--probe-workers', dest = 'probe_workers', type = int, action = 'store', default = None,
+                         help = 'The number of files to probe concurrently. Must be >= 1. Default is 4 times the number of cores, at most 32.' )
+    parser.add_argument( '--mount-concurrency', dest = 'mount_concurrency', type = str, action = 'store', nargs = '+', default = [ ],
+                         help = ' '.join([
+                             'Per-filesystem number of files to probe concurrently, each of the form PATH=NUMBER, for example /mnt/nfs=4.',
+                             'Filesystems not listed use the --probe-workers number.' ]) )
     parser.add_argument( '-J', '--jsonfile', dest = 'parser_dehydrate_jsonfile', metavar = 'JSONFILE', type = str, action = 'store', default =
-                         'processed_stuff.json',
-                         help = 'Name of the JSON file to store progress-as-you-go-along on directory dehydration. Default file name = "processed_stuff.json".' )
+                         'processed_stuff.jsonl',
+                         help = 'Name of the JSON Lines file to store progress-as-you-go-along on directory dehydration. Default file name = "processed_stuff.jsonl".' )
     parser.add_argument( '-S', '--subtitle', dest = 'do_add_subtitle', action = 'store_true', default = False,
                          help = 'If chosen, then AFTER subtitle creation, merge SRT subtitles with original file.' )
     #
@@ -237,8 +429,11 @@ def main_subtitles( ):
     args = parser.parse_args( )
     logger = logging.getLogger( )
     if args.do_info: logger.setLevel( logging.INFO )
+    set_probe_cache_enabled( args.do_probe_cache )
+    if args.probe_workers is not None: set_probe_workers( args.probe_workers )
+    set_mount_concurrency( parse_mount_concurrency( args.mount_concurrency ) )
     jsonfile = os.path.expanduser( args.parser_dehydrate_jsonfile )
-    assert( os.path.basename( jsonfile ).endswith( '.json' ) )
+    assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
     #
     directory_names = sorted(set(filter(os.path.isdir, map(lambda dirname: os.path.realpath(
         os.path.expanduser( dirname ) ), args.directories ) ) ) )
@@ -254,6 +449,20 @@ def main_dehydrate_files( ):
                          help = 'Name of the single olr multiple MKV or MP4 file to dehydrate.' )
     parser.add_argument( '--info', dest='do_info', action='store_true', default = False,
                          help = 'If chosen, then turn on INFO logging.' )
+    parser.add_argument( '-j', '--jobs', dest = 'num_jobs', type = int, action = 'store', default = None,
+                         help = 'The number of files to transcode at the same time. Must be >= 1. Default is the number of cores divided by --threads-per-job.' )
+    parser.add_argument( '--threads-per-job', dest = 'threads_per_job', type = int, action = 'store', default = 16,
+                         help = ' '.join([
+                             'The number of threads that each transcode can use effectively. Must be >= 1. Default is 16.',
+                             'When running more than one transcode, each one is pinned to its own set of at most these many cores.' ]) )
+    parser.add_argument( '--no-probe-cache', dest = 'do_probe_cache', action = 'store_false', default = True,
+                         help = 'If chosen, then do NOT use the persistent ffprobe metadata cache. Default is to use it.' )
+    parser.add_argument( '--probe-workers', dest = 'probe_workers', type = int, action = 'store', default = None,
+                         help = 'The number of files to probe concurrently. Must be >= 1. Default is 4 times the number of cores, at most 32.' )
+    parser.add_argument( '--mount-concurrency', dest = 'mount_concurrency', type = str, action = 'store', nargs = '+', default = [ ],
+                         help = ' '.join([
+                             'Per-filesystem number of files to probe concurrently, each of the form PATH=NUMBER, for example /mnt/nfs=4.',
+                             'Filesystems not listed use the --probe-workers number.' ]) )
     parser.add_argument( '-A', '--doavi', dest = 'do_avi', action = 'store_true', default = False,
                          help = 'If chosen, then process AVI and MPEG files for dehydration at higher qualities.' )
     #
@@ -262,19 +471,34 @@ def main_dehydrate_files( ):
                          default = 28, help = 'Will dehydrate shows using HEVC video codec with this quality. Default is 28. Must be >= 20.' )
     parser.add_argument( '-B', '--bitrate', dest = 'parser_audio_bitstring', metavar = 'BITRATE', type = str, action = 'store', default = '160',
                          help = 'Will dehydrate shows using this audio bitrate in KBPS, or using value = "copy". Default is 160.' )
-    parser.add_argument( '-J', '--jsonfile', dest = 'parser_dehydrate_jsonfile', metavar = 'JSONFILE', type = str, action = 'store', default = 'processed_stuff.json',
-                         help = 'Name of the JSON file to store progress-as-you-go-along on directory dehydration. Default file name = "processed_stuff.json".' )
+    parser.add_argument( '-J', '--jsonfile', dest = 'parser_dehydrate_jsonfile', metavar = 'JSONFILE', type = str, action = 'store', default = 'processed_stuff.jsonl',
+                         help = 'Name of the JSON Lines file to store progress-as-you-go-along on directory dehydration. Default file name = "processed_stuff.jsonl".' )
+    parser.add_argument( '--resume', dest = 'do_resume', action = 'store_true', default = False,
+                         help = 'If chosen, then resume an interrupted run from its JSON Lines file: skip the files it finished, and remove its partial temporary outputs.' )
+    parser.add_argument( '--scratch', dest = 'scratch_dir', type = str, action = 'store', default = None,
+                         help = ' '.join([
+                             'If given, then the fast local scratch directory into which to write encodes, each copied back once when done.',
+                             'Default is to write encodes into a hidden directory on the same filesystem as each file.' ]) )
+    parser.add_argument( '--order', dest = 'ordering', type = str, action = 'store', default = DEFAULT_ORDERING, choices = get_ordering_names( ),
+                         help = ' '.join([
+                             'The order in which to dehydrate files. "savings" does first the files with the most estimated disk space saved per second of encoding,',
+                             'learned from the JSON Lines files of past runs next to JSONFILE. Default is "%s".' % DEFAULT_ORDERING ]) )
     #
     ## parsing arguments
     time0 = time.perf_counter( )
     args = parser.parse_args( )
     logger = logging.getLogger( )
     if args.do_info: logger.setLevel( logging.INFO )
+    num_jobs = get_num_jobs( args.num_jobs, args.threads_per_job )
+    set_scratch_directory( args.scratch_dir )
+    set_probe_cache_enabled( args.do_probe_cache )
+    if args.probe_workers is not None: set_probe_workers( args.probe_workers )
+    set_mount_concurrency( parse_mount_concurrency( args.mount_concurrency ) )
     #
     ## dehydrate files
     quality = args.parser_dehydrate_quality
     jsonfile = os.path.realpath( os.path.expanduser( args.parser_dehydrate_jsonfile ) )
-    assert( os.path.basename( jsonfile ).endswith( '.json' ) )
+    assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
     assert( quality >= 20 )
     #
     ##
@@ -288,9 +512,13 @@ def main_dehydrate_files( ):
         process_multiple_files(
             args.inputfiles, qual = quality,
             audio_bit_string = audio_bit_string,
-            output_json_file = jsonfile )
+            output_json_file = jsonfile,
+            num_jobs = num_jobs, threads_per_job = args.threads_per_job,
+            resume = args.do_resume, ordering = args.ordering )
         return
     #
     process_multiple_files_AVI(
         args.inputfiles, qual = quality,
-        output_json_file = jsonfile )
+        output_json_file = jsonfile,
+        num_jobs = num_jobs, threads_per_job = args.threads_per_job,
+        resume = args.do_resume, ordering = args.ordering )
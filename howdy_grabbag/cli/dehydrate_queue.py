@@ -0,0 +1,129 @@
+r"""
+This dehydrates (using HEVC_ video quality 28) media files across *multiple* machines, through a work queue on a Redis_ server. One machine enqueues candidate files, either from directories or from the TV library on your local Plex_ server; workers on every machine that sees the same files (for instance through NFS) then claim and transcode them.
+
+.. _HEVC: https://en.wikipedia.org/wiki/High_Efficiency_Video_Coding
+.. _Redis: https://redis.io
+.. _Plex: https://plex.tv
+"""
+import logging, time
+from tabulate import tabulate
+from howdy_grabbag.utils import get_directory_names
+from howdy_grabbag.utils.dehydrate import (
+    find_files_to_process,
+    find_files_to_process_directories,
+    find_files_to_process_directories_AVI,
+    get_tv_library_local,
+    get_all_durations_dataframe,
+    enqueue_files_to_process,
+    run_dehydrate_queue_worker )
+from howdy_grabbag.utils.work_queue import TranscodeQueue, get_redis_client
+from howdy_grabbag.utils.probe_cache import set_probe_cache_enabled
+from howdy_grabbag.utils.transcode_scheduler import get_num_jobs
+from howdy_grabbag.utils.staging import set_scratch_directory
+from argparse import ArgumentParser
+
+def main( ):
+    parser = ArgumentParser( )
+    parser.add_argument( '--redis', dest = 'redis_url', type = str, action = 'store', default = 'redis://localhost:6379/0',
+                         help = 'The URL of the Redis server. Default is redis://localhost:6379/0.' )
+    parser.add_argument( '--queue', dest = 'queue_name', type = str, action = 'store', default = 'howdy_grabbag',
+                         help = 'The name of the work queue on the Redis server. Default is howdy_grabbag.' )
+    parser.add_argument( '--lease', dest = 'lease_secs', type = int, action = 'store', default = 120,
+                         help = 'The number of seconds after its last heartbeat that a job goes back onto the queue. Default is 120.' )
+    parser.add_argument( '--info', dest='do_info', action='store_true', default = False,
+                         help = 'If chosen, then turn on INFO logging.' )
+    parser.add_argument( '--no-probe-cache', dest = 'do_probe_cache', action = 'store_false', default = True,
+                         help = 'If chosen, then do NOT use the persistent ffprobe metadata cache. Default is to use it.' )
+    #
+    subparsers = parser.add_subparsers( help = 'Choose whether to enqueue files, run a worker, show the queue status, or requeue jobs with expired leases.',
+                                        dest = 'choose_option' )
+    parser_enqueue = subparsers.add_parser( 'enqueue', help = 'If chosen, then put files to dehydrate onto the queue.' )
+    parser_worker  = subparsers.add_parser( 'worker',  help = 'If chosen, then claim and dehydrate files from the queue until it is empty.' )
+    parser_status  = subparsers.add_parser( 'status',  help = 'If chosen, then show the number of pending, processing, done, and failed jobs.' )
+    parser_requeue = subparsers.add_parser( 'requeue', help = 'If chosen, then put jobs whose workers stopped heartbeating back onto the queue.' )
+    #
+    ## enqueue arguments
+    parser_enqueue.add_argument( '-d', '--directories', dest='directories', type=str, action = 'store', nargs = '+', default = [ ],
+                                 help = 'Name of the directories of MKV and MP4 files to dehydrate.' )
+    parser_enqueue.add_argument( '-t', '--tvlibrary', dest='tvlibrary', type=str, action = 'store', default = None,
+                                 help = 'If given, then the name of the TV library on the local Plex server whose episodes to dehydrate.' )
+    parser_enqueue.add_argument( '-R', '--recursive', dest = 'do_recursive', action = 'store_true', default = False,
+                                 help = 'If chosen, then also look for files in the subdirectories of the directories.' )
+    parser_enqueue.add_argument( '-M', '--minbitrate', dest = 'minbitrate', type = int, action = 'store', default = 2_000,
+                                 help = 'The minimum total bitrate (in kbps) of files to dehydrate. Default is 2000 kbps.' )
+    parser_enqueue.add_argument( '-N', '--nohevc', dest = 'do_hevc', action = 'store_false', default = True,
+                                 help = 'If chosen, then only enqueue the big files that are NOT HEVC. Default is to enqueue everything.' )
+    parser_enqueue.add_argument( '-A', '--doavi', dest = 'do_avi', action = 'store_true', default = False,
+                                 help = 'If chosen, then enqueue AVI and MPEG files in the directories for dehydration at higher qualities.' )
+    parser_enqueue.add_argument( '-Q', '--quality', dest = 'quality', type = int, action = 'store', default = 28,
+                                 help = 'Will dehydrate files using HEVC video codec with this quality. Default is 28. Must be >= 20.' )
+    parser_enqueue.add_argument( '-B', '--bitrate', dest = 'audio_bitstring', type = str, action = 'store', default = '160',
+                                 help = 'Will dehydrate files using this audio bitrate in KBPS, or using value = "copy". Default is 160.' )
+    #
+    ## worker arguments
+    parser_worker.add_argument( '-j', '--jobs', dest = 'num_jobs', type = int, action = 'store', default = None,
+                                help = 'The number of files to transcode at the same time. Must be >= 1. Default is the number of cores divided by --threads-per-job.' )
+    parser_worker.add_argument( '--threads-per-job', dest = 'threads_per_job', type = int, action = 'store', default = 16,
+                                help = 'The number of threads that each transcode can use effectively. Must be >= 1. Default is 16.' )
+    parser_worker.add_argument( '--poll', dest = 'poll_secs', type = int, action = 'store', default = 5,
+                                help = 'The number of seconds to wait for a new job before the worker stops. Default is 5.' )
+    parser_worker.add_argument( '--scratch', dest = 'scratch_dir', type = str, action = 'store', default = None,
+                                help = ' '.join([
+                                    'If given, then the fast local scratch directory into which to write encodes, each copied back once when done.',
+                                    'Default is to write encodes into a hidden directory on the same filesystem as each file.' ]) )
+    #
+    ## parsing arguments
+    time0 = time.perf_counter( )
+    args = parser.parse_args( )
+    logger = logging.getLogger( )
+    if args.do_info: logger.setLevel( logging.INFO )
+    set_probe_cache_enabled( args.do_probe_cache )
+    queue = TranscodeQueue(
+        get_redis_client( args.redis_url ), name = args.queue_name, lease_secs = args.lease_secs )
+    #
+    if args.choose_option == 'enqueue':
+        assert( args.quality >= 20 )
+        audio_bit_string = args.audio_bitstring.strip( ).lower( )
+        if audio_bit_string != 'copy':
+            assert( audio_bit_string.isdigit( ) )
+        params = { 'qual' : args.quality, 'audio_bit_string' : audio_bit_string }
+        directory_names = get_directory_names( args.directories )
+        job_ids = [ ]
+        if len( directory_names ) > 0 and not args.do_avi:
+            fnames_dict, _ = find_files_to_process_directories(
+                directory_names, do_hevc = args.do_hevc, min_bitrate = args.minbitrate,
+                recursive = args.do_recursive )
+            job_ids += enqueue_files_to_process( queue, fnames_dict, mode = 'dehydrate', **params )
+        if len( directory_names ) > 0 and args.do_avi:
+            fnames_dict, _ = find_files_to_process_directories_AVI(
+                directory_names, recursive = args.do_recursive )
+            job_ids += enqueue_files_to_process( queue, fnames_dict, mode = 'dehydrate_avi', **params )
+        if args.tvlibrary is not None:
+            df_sub = get_all_durations_dataframe(
+                get_tv_library_local( library_name = args.tvlibrary ),
+                min_bitrate = args.minbitrate )
+            fnames_dict = find_files_to_process(
+                set( df_sub.paths ), do_hevc = args.do_hevc, min_bitrate = args.minbitrate )
+            job_ids += enqueue_files_to_process( queue, fnames_dict, mode = 'dehydrate', **params )
+        print( 'enqueued %d files onto queue %s in %0.3f seconds.' % (
+            len( job_ids ), args.queue_name, time.perf_counter( ) - time0 ) )
+        return
+    #
+    if args.choose_option == 'worker':
+        num_jobs = get_num_jobs( args.num_jobs, args.threads_per_job )
+        set_scratch_directory( args.scratch_dir )
+        num_jobs_run = run_dehydrate_queue_worker(
+            queue, num_jobs = num_jobs, threads_per_job = args.threads_per_job,
+            poll_secs = args.poll_secs )
+        print( 'ran %d jobs from queue %s in %0.3f seconds.' % (
+            num_jobs_run, args.queue_name, time.perf_counter( ) - time0 ) )
+        return
+    #
+    if args.choose_option == 'requeue':
+        print( 'requeued %d jobs on queue %s.' % ( queue.requeue_expired( ), args.queue_name ) )
+        return
+    #
+    status = queue.get_status( )
+    print( '%s\n' % tabulate(
+        [ list(map(lambda key: status[ key ], ( 'pending', 'processing', 'done', 'failed' ) ) ) ],
+        headers = [ 'PENDING', 'PROCESSING', 'DONE', 'FAILED' ] ) )
@@ -8,230 +8,32 @@ This can *either* tell a table of TV show data on your locally running Plex_ ser
 .. _Plex: https://plex.tv
 .. _HEVC: https://en.wikipedia.org/wiki/High_Efficiency_Video_Coding
 """
-import os, sys, logging, time, pandas, numpy, json, subprocess, shutil, re
-from enum import Enum
-from howdy.core import core, session
-from howdy.tv import tv, get_token, tv_attic, get_tvdb_api, TMDBShowIds
-from howdy.music import music
-from howdy.movie import tmdb_apiKey
-from pathos.multiprocessing import Pool, cpu_count
+import os, sys, logging, time
 from tabulate import tabulate
 from argparse import ArgumentParser
 #
-from howdy_grabbag import (
-    ffmpeg_exec, ffprobe_exec, nice_exec, hcli_exec )
+from howdy_grabbag.utils.dehydrate import (
+    DATAFORMAT, get_tv_library_local, get_all_durations_dataframe, summarize_shows_dataframe,
+    summarize_single_show, process_single_show, process_single_show_avi )
+from howdy_grabbag.utils.probe_engine import (
+    iter_media_infos, parse_mount_concurrency, set_mount_concurrency, set_probe_workers )
+from howdy_grabbag.utils.probe_cache import set_probe_cache_enabled
+from howdy_grabbag.utils.journal import get_resume_paths
+from howdy_grabbag.utils.ordering import DEFAULT_ORDERING, get_ordering_names
+from howdy_grabbag.utils.staging import set_scratch_directory
 
 _MINBITRATE   = 1000
 
-def get_tv_library_local( library_name = 'TV Shows' ):
-    fullURL, token = core.checkServerCredentials( doLocal=True )
-    library_names = list( core.get_libraries( token = token ).values( ) )
-    assert( library_name in library_names )
-    #
-    tvdata = core.get_library_data(
-        library_name, token = token, num_threads = cpu_count( ) )
-    return tvdata
-
-class DATAFORMAT( Enum ):
-    IS_AVI_OR_MPEG = 1
-    IS_LATER = 2
-
-    @classmethod
-    def check_format( cls, fullpath ):
-        basename = os.path.basename( fullpath ).lower( )
-        if any( map(lambda suffix: basename.endswith( '.%s' % suffix ), ( 'avi', 'mpg', 'mpeg' ) ) ):
-            return DATAFORMAT.IS_AVI_OR_MPEG
-        return DATAFORMAT.IS_LATER
-
-def get_all_durations_dataframe( tvdata, min_bitrate = 2000, mode_dataformat = DATAFORMAT.IS_LATER ):
-    if mode_dataformat == DATAFORMAT.IS_LATER: assert( min_bitrate >= _MINBITRATE )
-    sizes = [ ]
-    durations = [ ]
-    shows = [ ]
-    seasons = [ ]
-    epnos = [ ]
-    names = [ ]
-    paths = [ ]
-    
-    for show in tvdata:
-        for seasno in tvdata[show]['seasons']:
-            for epno in tvdata[show]['seasons'][seasno]['episodes']:
-                mypath = tvdata[show]['seasons'][seasno]['episodes'][epno]['path']
-                if mode_dataformat != DATAFORMAT.check_format( mypath ):
-                    continue
-                durations.append( tvdata[show]['seasons'][seasno]['episodes'][epno]['duration'])
-                sizes.append( tvdata[show]['seasons'][seasno]['episodes'][epno]['size'] )
-                shows.append( show )
-                seasons.append( seasno )
-                epnos.append( epno )
-                names.append( tvdata[show]['seasons'][seasno]['episodes'][epno]['title'] )
-                paths.append( mypath )
-    df = pandas.DataFrame({'sizes (MB)' : numpy.array(sizes)/1024**2, 'durations (s)' : durations,
-                           'shows' : shows, 'seasons' : seasons, 'epnos' : epnos, 'names' : names,
-                          'paths' : paths })
-    df['bitrate (kbps)'] = numpy.array( df['sizes (MB)'] ) / numpy.array( df['durations (s)']) * 1024 * 8
-    df_sub = df[ (df['bitrate (kbps)'] > min_bitrate ) ].sort_values('bitrate (kbps)', ascending = True).copy( )
-    return df_sub
-
-def summarize_shows_dataframe( df_sub ):
-    def _get_num_shows( showname ):
-        return {
-            'num shows' : len( df_sub[ df_sub.shows == showname ] ),
-            'min kbps' : df_sub[ df_sub.shows == showname ]['bitrate (kbps)'].min( ),
-            'med kbps' : numpy.median( df_sub[ df_sub.shows == showname ]['bitrate (kbps)'] ),
-            'max kbps' : df_sub[ df_sub.shows == showname ]['bitrate (kbps)'].max( ),
-            }
-    dict_of_shows = dict(map(lambda showname: ( showname, _get_num_shows( showname ) ),
-                             set( df_sub.shows ) ) )
-    df = pandas.DataFrame( {
-        'shows' : sorted( dict_of_shows ),
-        'num episodes' : list(map(lambda showname: dict_of_shows[ showname ][ 'num shows' ], sorted( dict_of_shows ) ) ),
-        'min kbps'     : list(map(lambda showname: dict_of_shows[ showname ][ 'min kbps'  ], sorted( dict_of_shows ) ) ),
-        'med kbps'     : list(map(lambda showname: dict_of_shows[ showname ][ 'med kbps'  ], sorted( dict_of_shows ) ) ),
-        'max kbps'     : list(map(lambda showname: dict_of_shows[ showname ][ 'max kbps'  ], sorted( dict_of_shows ) ) ),
-        } )
-    df = df.sort_values( 'num episodes', ascending = False ).copy( )
-    return df
-
-def single_show_summary_dataframe( df_sub, showname, mode_dataformat = DATAFORMAT.IS_LATER ):
-    df_show = df_sub[ df_sub.shows == showname ].copy( )
-    assert( len( df_show ) != 0 )
-    if mode_dataformat == DATAFORMAT.IS_AVI_OR_MPEG:
-        return df_show
-    #
-    def get_ffprobe_json( filename ):
-        stdout_val = subprocess.check_output(
-            [ _ffprobe_exec, '-v', 'quiet', '-show_streams',
-             '-show_format', '-print_format', 'json', filename ],
-            stderr = subprocess.STDOUT )
-        file_info = json.loads( stdout_val )
-        return file_info
-
-    def is_hevc( filename ):
-        data = get_ffprobe_json( filename )
-        return data['streams'][0]['codec_name'].lower( ) == 'hevc'
-
-    with Pool( processes = min( cpu_count( ), len( df_show ) ) ) as pool:
-        dict_of_episodes_hevc = dict( pool.map(
-            lambda filename: ( filename, is_hevc( filename ) ),
-            list( df_show.paths ) ) )
-        df_show[ 'is hevc' ] = list(map(lambda filename: dict_of_episodes_hevc[ filename ],
-                                        list( df_show.paths ) ) )
-        return df_show
-
-def summarize_single_show( df_sub, showname, minbitrate, mode_dataformat = DATAFORMAT.IS_LATER ):
-    df_show = single_show_summary_dataframe( df_sub, showname, mode_dataformat = mode_dataformat )
-    #
-    ## now report it out
-    print( 'information for %s, which has %d episodes >= %d kbps.\n' % ( showname, len( df_show ), minbitrate ) )
-    data = [ [ 'NUM EPISODES', len( df_show ) ], ]
-    data.append( [ 'MIN KBPS', df_show[ 'bitrate (kbps)' ].min( ) ] )
-    data.append( [ 'MED KBPS', numpy.median( df_show[ 'bitrate (kbps)' ] ) ] )
-    data.append( [ 'MAX KBPS', df_show[ 'bitrate (kbps)' ].max( ) ] )
-    if mode_dataformat == DATAFORMAT.IS_AVI_OR_MPEG:
-        print( '%s\n' % tabulate( data, headers = [ 'PARAMETER', 'INFO' ] ) )
-        return
-    #
-    if len( df_show[ df_show[ 'is hevc' ] == True ] ) == 0:
-        print( '%s\n' % tabulate( data, headers = [ 'PARAMETER', 'INFO' ] ) )
-        return
-    #
-    ## now HEVC episodes
-    df_show_ishevc = df_show[ df_show[ 'is hevc' ] == True ].copy( )
-    data.append( [ 'NUM HEVC EPISODES', len( df_show_ishevc ) ] )
-    data.append( [ 'MIN KBPS HEVC', df_show_ishevc[ 'bitrate (kbps)' ].min( ) ] )
-    data.append( [ 'MED KBPS HEVC', numpy.median( df_show_ishevc[ 'bitrate (kbps)' ] ) ] )
-    data.append( [ 'MAX KBPS HEVC', df_show_ishevc[ 'bitrate (kbps)' ].max( ) ] )
-    print( '%s\n' % tabulate( data, headers = [ 'PARAMETER', 'INFO' ] ) )
-
-def process_single_show( df_sub, showname, do_hevc = True, qual = 28, output_json_file = 'processed_stuff.json' ):
-    df_show = single_show_summary_dataframe( df_sub, showname )
-    df_show_sub = df_show.copy( )
-    if not do_hevc:
-        df_show_sub = df_show[ df_show[ 'is hevc' ] == False ].copy( )
-    #
-    ## now process those shows SLOWLY
-    time00 = time.perf_counter( )
-    df_show_sorted = df_show_sub.sort_values(by=['seasons', 'epnos']).reset_index( )
-    episodes_sorted = list( df_show_sorted.paths )
-    list_processed = [
-        "found %02d files to dehydrate in '%s'." % (
-            len( episodes_sorted ), showname ), ]
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    for idx, filename in enumerate(episodes_sorted):
-        time0 = time.perf_counter( )
-        newfile = os.path.basename( filename )
-        stdout_val = subprocess.check_output([
-            nice_exec, '-n', '19', hcli_exec,
-            '-i', filename, '-e', 'x265', '-q', '%d' % qual, '-E', 'av_aac', '-B', '160',
-            '-a', ','.join(map(lambda num: '%d' % num, range(1,35))),
-            '-s', ','.join(map(lambda num: '%d' % num, range(1,35))),
-            '-o', newfile ],
-            stderr = subprocess.PIPE )
-        #
-        os.chmod(newfile, 0o644 )
-        shutil.move( newfile, filename )
-        dt0 = time.perf_counter( ) - time0
-        list_processed.append( 'processed episode %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( episodes_sorted ), dt0 ) )
-        json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    dt00 = time.perf_counter( ) - time00
-    list_processed.append( "took %0.3f seconds to process %d episodes in '%s'." % (
-        dt00, len( episodes_sorted ), showname ) )
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-
-def process_single_show_avi( df_sub, showname, qual = 20, output_json_file = 'processed_stuff_avi.json' ):
-    df_show_sub = single_show_summary_dataframe(
-        df_sub, showname, mode_dataformat = DATAFORMAT.IS_AVI_OR_MPEG )
-    #
-    ## now process those shows SLOWLY
-    time00 = time.perf_counter( )
-    df_show_sorted = df_show_sub.sort_values(by=['seasons', 'epnos']).reset_index( )
-    episodes_sorted = list( df_show_sorted.paths )
-    list_processed = [
-        "found %02d files to deavify in '%s'." % (
-            len( episodes_sorted ), showname ), ]
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    #
-    ## first go through redis database to see if shows are running
-    for idx, filename in enumerate(episodes_sorted):
-        time0 = time.perf_counter( )
-        dirname = os.path.dirname( filename )
-        newfile = re.sub( r'\.avi$', '.mkv', os.path.basename( filename ) )
-        try:
-            stdout_val = subprocess.check_output([
-                nice_exec, '-n', '19', hcli_exec,
-                '-i', filename, '-e', 'x265', '-q', '%d' % qual, '-B', '160',
-                '-a', ','.join(map(lambda num: '%d' % num, range(1,35))),
-                '-o', newfile ],
-                stderr = subprocess.PIPE )
-            #
-            os.chmod(newfile, 0o644 )
-            shutil.move( newfile, dirname )
-            os.remove( filename )
-            dt0 = time.perf_counter( ) - time0
-            print('processed episode %02d / %02d in %0.3f seconds' % (
-                idx + 1, len( episodes_sorted ), dt0 ) )
-            list_processed.append( 'processed episode %02d / %02d in %0.3f seconds' % (
-                idx + 1, len( episodes_sorted ), dt0 ) )
-        except:
-            try: os.remove( newfile )
-            except: pass
-            dt0 = time.perf_counter( ) - time0
-            print('failed episode %02d / %02d in %0.3f seconds' % (
-                idx + 1, len( episodes_sorted ), dt0 ) )
-            list_processed.append( 'failed episode %02d / %02d in %0.3f seconds' % (
-                idx + 1, len( episodes_sorted ), dt0 ) )
-        json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    dt00 = time.perf_counter( ) - time00
-    print( 'took %0.3f seconds to process %d episodes' % (
-        dt00, len( episodes_sorted ) ) )
-    list_processed.append( 'took %0.3f seconds to process %d episodes' % (
-        dt00, len( episodes_sorted ) ) )
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-        
+def estimate_episodes_dataframe( df_sub, estimator, quality = 28 ):
+    df_est = df_sub.copy( )
+    dict_of_episodes_info = dict( iter_media_infos( set( df_est.paths ) ) )
+    df_est[ 'media info' ] = list(map(lambda filename: dict_of_episodes_info.get( filename ),
+                                      list( df_est.paths ) ) )
+    return estimator.estimate_dataframe( df_est, quality = quality )
 
 def main( ):
+    from howdy_grabbag.utils.plex_snapshot import invalidate_shows
+    from howdy_grabbag.utils.estimator import DehydrateEstimator, get_default_journal_files, select_within_budget
     parser = ArgumentParser( )
     #
     ## top level arguments
@@ -243,6 +45,28 @@ def main( ):
                             'Default is 2000 kbps.']))
     parser.add_argument( '--info', dest='do_info', action='store_true', default = False,
                         help = 'If chosen, then turn on INFO logging.' )
+    parser.add_argument( '--confirm-margin', dest = 'confirm_margin', metavar = 'PERCENT', type = float, action = 'store', default = 20.0,
+                        help = ' '.join([
+                            'Episodes whose bitrates, estimated from size and duration, are within this percent of the minimum bitrate are probed,',
+                            'and classified by their video and audio stream bitrates instead. 0 trusts every estimate. Default is 20.' ]) )
+    parser.add_argument( '--snapshot-ttl', dest = 'snapshot_ttl', metavar = 'HOURS', type = float, action = 'store', default = 24.0,
+                        help = 'The hours for which to use the local snapshot of the TV library without checking the Plex server. Default is 24.' )
+    parser.add_argument( '--refresh', dest = 'do_refresh', action = 'store_true', default = False,
+                        help = 'If chosen, then check the Plex server now, and fetch the TV shows that changed since the local snapshot.' )
+    parser.add_argument( '--no-snapshot', dest = 'do_snapshot', action = 'store_false', default = True,
+                        help = 'If chosen, then do NOT use the local snapshot of the TV library, and fetch all of it from the Plex server.' )
+    parser.add_argument( '--scratch', dest = 'scratch_dir', type = str, action = 'store', default = None,
+                        help = ' '.join([
+                            'If given, then the fast local scratch directory into which to write encodes, each copied back once when done.',
+                            'Default is to write encodes into a hidden directory on the same filesystem as each episode.' ]) )
+    parser.add_argument( '--no-probe-cache', dest = 'do_probe_cache', action = 'store_false', default = True,
+                        help = 'If chosen, then do NOT use the persistent ffprobe metadata cache. Default is to use it.' )
+    parser.add_argument( '--probe-workers', dest = 'probe_workers', type = int, action = 'store', default = None,
+                        help = 'The number of files to probe concurrently. Must be >= 1. Default is 4 times the number of cores, at most 32.' )
+    parser.add_argument( '--mount-concurrency', dest = 'mount_concurrency', type = str, action = 'store', nargs = '+', default = [ ],
+                        help = ' '.join([
+                            'Per-filesystem number of files to probe concurrently, each of the form PATH=NUMBER, for example /mnt/nfs=4.',
+                            'Filesystems not listed use the --probe-workers number.' ]) )
     #
     ## check on which TV shows are candidates for dehydration, or to dehydrate specific TV shows.
     subparsers = parser.add_subparsers( help = 'Choose on whether to list the TV shows to dehydrate, or to dehydrate a TV show.',
@@ -251,6 +75,14 @@ def main( ):
     parser_dehydrate      = subparsers.add_parser( 'dehydrate', help = 'If chosen, then dehydrate a single TV show.' )
     #
     ## list TV shows, do nothing more
+    parser_listcandidates.add_argument( '-E', '--estimate', dest = 'parser_list_do_estimate', action = 'store_true', default = False,
+                                       help = 'If chosen, then rank the TV shows by the estimated GB saved per encode hour, learned from past encodes.' )
+    parser_listcandidates.add_argument( '--budget-hours', dest = 'parser_list_budget_hours', metavar = 'HOURS', type = float, action = 'store', default = None,
+                                       help = 'If given, then also list the episodes that save the most GB within this many encode hours. Implies --estimate.' )
+    parser_listcandidates.add_argument( '-Q', '--quality', dest = 'parser_list_quality', metavar = 'QUALITY', type = int, action = 'store', default = 28,
+                                       help = 'The HEVC quality of the encodes to estimate. Default is 28.' )
+    parser_listcandidates.add_argument( '--journals', dest = 'parser_list_journals', metavar = 'JOURNAL', type = str, action = 'store', nargs = '+', default = None,
+                                       help = 'The JSON Lines progress files of past encodes from which to learn. Default is every ".jsonl" file in the current directory.' )
     #
     ## dehydrate a single TV show
     parser_dehydrate.add_argument( '-s', '--show', metavar = 'SHOW', dest = 'parser_dehydrate_show', type = str, action = 'store',
@@ -261,18 +93,49 @@ def main( ):
                                   default = 28, help = 'Will dehydrate shows using HEVC video codec with this quality. Default is 28. Must be >= 20.' )
     parser_dehydrate.add_argument( '-N', '--nohevc', dest = 'parser_dehydrate_do_hevc', action = 'store_false', default = True,
                                   help = 'If chosen, then only process the big episodes that are NOT HEVC. Default is to process everything.' )
-    parser_dehydrate.add_argument( '-J', '--jsonfile', dest = 'parser_dehydrate_jsonfile', metavar = 'JSONFILE', type = str, action = 'store', default = 'processed_stuff.json',
-                                  help = 'Name of the JSON file to store progress-as-you-go-along on TV show dehydration. Default file name = "processed_stuff.json".' )
+    parser_dehydrate.add_argument( '-J', '--jsonfile', dest = 'parser_dehydrate_jsonfile', metavar = 'JSONFILE', type = str, action = 'store', default = 'processed_stuff.jsonl',
+                                  help = 'Name of the JSON Lines file to store progress-as-you-go-along on TV show dehydration. Default file name = "processed_stuff.jsonl".' )
+    parser_dehydrate.add_argument( '--resume', dest = 'parser_dehydrate_do_resume', action = 'store_true', default = False,
+                                  help = 'If chosen, then resume an interrupted dehydration from its JSON Lines file, without asking the Plex server for the episodes again.' )
+    parser_dehydrate.add_argument( '--order', dest = 'parser_dehydrate_ordering', type = str, action = 'store', default = DEFAULT_ORDERING, choices = get_ordering_names( ),
+                                  help = ' '.join([
+                                      'The order in which to dehydrate episodes. "savings" does first the episodes with the most estimated disk space saved per second of encoding,',
+                                      'learned from the JSON Lines files of past runs next to JSONFILE. Default is "%s".' % DEFAULT_ORDERING ]) )
     #
     ## parsing arguments
     time0 = time.perf_counter( )
     args = parser.parse_args( )
     assert( args.minbitrate >= _MINBITRATE )
+    assert( args.confirm_margin >= 0 and args.confirm_margin < 100 )
     logger = logging.getLogger( )
     if args.do_info: logger.setLevel( logging.INFO )
+    set_scratch_directory( args.scratch_dir )
+    set_probe_cache_enabled( args.do_probe_cache )
+    if args.probe_workers is not None: set_probe_workers( args.probe_workers )
+    set_mount_concurrency( parse_mount_concurrency( args.mount_concurrency ) )
+    #
+    ## resuming an interrupted dehydration needs nothing from the Plex server
+    if args.choose_option == 'dehydrate' and args.parser_dehydrate_do_resume and not args.parser_dehydrate_do_info:
+        jsonfile = os.path.expanduser( args.parser_dehydrate_jsonfile )
+        assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
+        assert( args.parser_dehydrate_quality >= 20 )
+        if get_resume_paths( jsonfile ) is not None:
+            process_single_show( None, args.parser_dehydrate_show, do_hevc = args.parser_dehydrate_do_hevc,
+                                 qual = args.parser_dehydrate_quality, output_json_file = jsonfile, resume = True )
+            invalidate_shows( args.tvlibrary, [ args.parser_dehydrate_show ] )
+            return
+    #
+    ## leave out the episodes that earlier encodes at this quality could not shrink
+    quality = None
+    if args.choose_option == 'list': quality = args.parser_list_quality
+    elif args.choose_option == 'dehydrate': quality = args.parser_dehydrate_quality
     df_sub = get_all_durations_dataframe(
-        get_tv_library_local( library_name = args.tvlibrary ),
-        min_bitrate = args.minbitrate )
+        get_tv_library_local(
+            library_name = args.tvlibrary, use_snapshot = args.do_snapshot,
+            ttl_secs = 3_600 * args.snapshot_ttl, refresh = args.do_refresh ),
+        min_bitrate = args.minbitrate,
+        confirm_margin = args.confirm_margin / 100 if args.confirm_margin > 0 else None,
+        qual = quality )
     shownames = set( df_sub.shows )
     #
     ## list TV shows
@@ -280,10 +143,42 @@ def main( ):
         df_shows = summarize_shows_dataframe( df_sub )
         print( 'found %d shows and %d episodes with episodes >= %d kbps.' % (
             len( df_shows ), df_shows['num episodes'].sum( ), args.minbitrate ) )
+        if 'bitrate confirmed' in df_sub.columns:
+            df_confirmed = df_sub[ df_sub[ 'bitrate confirmed' ] ]
+            print( 'confirmed %d borderline episodes by probing: median video = %0.1f kbps, median audio = %0.1f kbps.' % (
+                len( df_confirmed ), df_confirmed[ 'video bitrate (kbps)' ].median( ),
+                df_confirmed[ 'audio bitrate (kbps)' ].median( ) ) )
         data = list(zip( list(df_shows.shows), list( df_shows['num episodes'] ),
                         list( df_shows[ 'min kbps' ] ), list( df_shows[ 'med kbps' ] ),
                         list( df_shows[ 'max kbps' ] ) ) )
-        print( '%s\n' % tabulate( data, headers = [ 'SHOW', 'NUM EPISODES', 'MIN KBPS', 'MED KBPS', 'MAX KPBS' ] ) )
+        if args.parser_list_budget_hours is None and not args.parser_list_do_estimate:
+            print( '%s\n' % tabulate( data, headers = [ 'SHOW', 'NUM EPISODES', 'MIN KBPS', 'MED KBPS', 'MAX KPBS' ] ) )
+            print( 'took %0.3f seconds to process.' % ( time.perf_counter( ) - time0 ) )
+            return
+        #
+        ## rank the shows by estimated GB saved per encode hour
+        journal_files = args.parser_list_journals
+        if journal_files is None: journal_files = get_default_journal_files( )
+        estimator = DehydrateEstimator.from_journals( list(map(os.path.expanduser, journal_files ) ) )
+        df_est = estimate_episodes_dataframe( df_sub, estimator, quality = args.parser_list_quality )
+        df_shows_est = df_est.groupby( 'shows' ).agg(
+            num_episodes = ( 'paths', 'size' ), saved = ( 'saved (GB)', 'sum' ),
+            hours = ( 'encode hours', 'sum' ) ).reset_index( )
+        df_shows_est[ 'GB per hour' ] = df_shows_est.saved / df_shows_est.hours
+        df_shows_est = df_shows_est.sort_values( 'GB per hour', ascending = False )
+        print( 'estimated from %d past encodes at quality %d.' % ( estimator.num_encodes, args.parser_list_quality ) )
+        data = list(zip( list( df_shows_est.shows ), list( df_shows_est.num_episodes ),
+                        list( df_shows_est.saved ), list( df_shows_est.hours ), list( df_shows_est[ 'GB per hour' ] ) ) )
+        print( '%s\n' % tabulate( data, headers = [ 'SHOW', 'NUM EPISODES', 'EST SAVED (GB)', 'EST HOURS', 'GB/HOUR' ], floatfmt = '.2f' ) )
+        if args.parser_list_budget_hours is not None:
+            df_chosen = select_within_budget( df_est, args.parser_list_budget_hours )
+            print( 'in %0.2f encode hours, dehydrate these %d episodes to save an estimated %0.2f GB in %0.2f hours.' % (
+                args.parser_list_budget_hours, len( df_chosen ), df_chosen[ 'saved (GB)' ].sum( ),
+                df_chosen[ 'encode hours' ].sum( ) ) )
+            data = list(zip( list( df_chosen.shows ), list( df_chosen.seasons ), list( df_chosen.epnos ),
+                            list( df_chosen[ 'saved (GB)' ] ), list( df_chosen[ 'encode hours' ] ),
+                            list( df_chosen[ 'GB per hour' ] ) ) )
+            print( '%s\n' % tabulate( data, headers = [ 'SHOW', 'SEASON', 'EPISODE', 'EST SAVED (GB)', 'EST HOURS', 'GB/HOUR' ], floatfmt = '.2f' ) )
         print( 'took %0.3f seconds to process.' % ( time.perf_counter( ) - time0 ) )
         return
     #
@@ -292,7 +187,7 @@ def main( ):
         showname = args.parser_dehydrate_show
         assert( showname in shownames )
         jsonfile = os.path.expanduser( args.parser_dehydrate_jsonfile )
-        assert( os.path.basename( jsonfile ).endswith( '.json' ) )
+        assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
         #
         ## just do info then return
         if args.parser_dehydrate_do_info:
@@ -304,9 +199,11 @@ def main( ):
         quality = args.parser_dehydrate_quality
         assert( quality >= 20 )
         process_single_show( df_sub, showname, do_hevc = args.parser_dehydrate_do_hevc,
-                            qual = quality, output_json_file = jsonfile )
+                            qual = quality, output_json_file = jsonfile, ordering = args.parser_dehydrate_ordering )
+        invalidate_shows( args.tvlibrary, [ showname ] )
 
 def main_avis( ):
+    from howdy_grabbag.utils.plex_snapshot import invalidate_shows
     parser = ArgumentParser( )
     #
     ## top level arguments
@@ -314,6 +211,16 @@ def main_avis( ):
                         help = 'Name of the TV library on the local PLEX server. Default is "TV Shows".' )
     parser.add_argument( '--info', dest='do_info', action='store_true', default = False,
                         help = 'If chosen, then turn on INFO logging.' )
+    parser.add_argument( '--snapshot-ttl', dest = 'snapshot_ttl', metavar = 'HOURS', type = float, action = 'store', default = 24.0,
+                        help = 'The hours for which to use the local snapshot of the TV library without checking the Plex server. Default is 24.' )
+    parser.add_argument( '--refresh', dest = 'do_refresh', action = 'store_true', default = False,
+                        help = 'If chosen, then check the Plex server now, and fetch the TV shows that changed since the local snapshot.' )
+    parser.add_argument( '--no-snapshot', dest = 'do_snapshot', action = 'store_false', default = True,
+                        help = 'If chosen, then do NOT use the local snapshot of the TV library, and fetch all of it from the Plex server.' )
+    parser.add_argument( '--scratch', dest = 'scratch_dir', type = str, action = 'store', default = None,
+                        help = ' '.join([
+                            'If given, then the fast local scratch directory into which to write encodes, each copied back once when done.',
+                            'Default is to write encodes into a hidden directory on the same filesystem as each episode.' ]) )
     #
     ## check on which TV shows are candidates for dehydration, or to deavify specific TV shows.
     subparsers = parser.add_subparsers( help = 'Choose on whether to list the TV shows to deavify, or to deavify a TV show, that have episodes that are AVI files.',
@@ -330,17 +237,38 @@ def main_avis( ):
                                   help = 'If chosen, then only print out info on the selected TV show.' )
     parser_deavify.add_argument( '-Q', '--quality', dest = 'parser_deavify_quality', metavar = 'QUALITY', type = int, action = 'store',
                                   default = 21, help = 'Will deavify shows using HEVC video codec with this quality. Default is 21. Must be >= 18.' )
-    parser_deavify.add_argument( '-J', '--jsonfile', dest = 'parser_deavify_jsonfile', metavar = 'JSONFILE', type = str, action = 'store', default = 'processed_stuff_avi.json',
-                                  help = 'Name of the JSON file to store progress-as-you-go-along on TV show dehydration. Default file name = "processed_stuff_avi.json".' )
+    parser_deavify.add_argument( '-J', '--jsonfile', dest = 'parser_deavify_jsonfile', metavar = 'JSONFILE', type = str, action = 'store', default = 'processed_stuff_avi.jsonl',
+                                  help = 'Name of the JSON Lines file to store progress-as-you-go-along on TV show dehydration. Default file name = "processed_stuff_avi.jsonl".' )
+    parser_deavify.add_argument( '--resume', dest = 'parser_deavify_do_resume', action = 'store_true', default = False,
+                                  help = 'If chosen, then resume an interrupted deavification from its JSON Lines file, without asking the Plex server for the episodes again.' )
+    parser_deavify.add_argument( '--order', dest = 'parser_deavify_ordering', type = str, action = 'store', default = DEFAULT_ORDERING, choices = get_ordering_names( ),
+                                  help = ' '.join([
+                                      'The order in which to deavify episodes. "savings" does first the episodes with the most estimated disk space saved per second of encoding,',
+                                      'learned from the JSON Lines files of past runs next to JSONFILE. Default is "%s".' % DEFAULT_ORDERING ]) )
     #
     ## parsing arguments
     time0 = time.perf_counter( )
     args = parser.parse_args( )
     logger = logging.getLogger( )
     if args.do_info: logger.setLevel( logging.INFO )
+    set_scratch_directory( args.scratch_dir )
+    #
+    ## resuming an interrupted deavification needs nothing from the Plex server
+    if args.choose_option == 'deavify' and args.parser_deavify_do_resume and not args.parser_deavify_do_info:
+        jsonfile = os.path.expanduser( args.parser_deavify_jsonfile )
+        assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
+        assert( args.parser_deavify_quality >= 20 )
+        if get_resume_paths( jsonfile ) is not None:
+            process_single_show_avi( None, args.parser_deavify_show, qual = args.parser_deavify_quality,
+                                     output_json_file = jsonfile, resume = True )
+            invalidate_shows( args.tvlibrary, [ args.parser_deavify_show ] )
+            return
     df_sub = get_all_durations_dataframe(
-        get_tv_library_local( library_name = args.tvlibrary ),
-        min_bitrate = 0.0, mode_dataformat = DATAFORMAT.IS_AVI_OR_MPEG )
+        get_tv_library_local(
+            library_name = args.tvlibrary, use_snapshot = args.do_snapshot,
+            ttl_secs = 3_600 * args.snapshot_ttl, refresh = args.do_refresh ),
+        min_bitrate = 0.0, mode_dataformat = DATAFORMAT.IS_AVI_OR_MPEG,
+        qual = args.parser_deavify_quality if args.choose_option == 'deavify' else None )
     shownames = set( df_sub.shows )
     #
     ## list TV shows
@@ -360,7 +288,7 @@ def main_avis( ):
         showname = args.parser_deavify_show
         assert( showname in shownames )
         jsonfile = os.path.expanduser( args.parser_deavify_jsonfile )
-        assert( os.path.basename( jsonfile ).endswith( '.json' ) )
+        assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
         #
         ## just do info then return
         if args.parser_deavify_do_info:
@@ -371,4 +299,6 @@ def main_avis( ):
         ## now the big thing
         quality = args.parser_deavify_quality
         assert( quality >= 20 )
-        process_single_show_avi( df_sub, showname, qual = quality, output_json_file = jsonfile )
+        process_single_show_avi( df_sub, showname, qual = quality, output_json_file = jsonfile,
+                                 ordering = args.parser_deavify_ordering )
+        invalidate_shows( args.tvlibrary, [ showname ] )
@@ -1,16 +1,17 @@
-import os, sys, logging, subprocess, time, json
-from pathos.multiprocessing import Pool, cpu_count
-from howdy.tv import tv_attic
+import os, sys, logging, subprocess, time
 from howdy_grabbag.utils import (
     get_directory_names, dvd_utils )
-from howdy_grabbag import (
-    nice_exec, hcli_exec, mkvpropedit_exec )
+from howdy_grabbag import get_exec
+from howdy_grabbag.utils.transcode_scheduler import get_encode_fps
+from howdy_grabbag.utils.journal import ProgressJournal
+from howdy_grabbag.utils.epdicts_cache import get_tot_epdict_tmdb_cached, set_epdicts_cache_refresh
 from itertools import chain
 from argparse import ArgumentParser
 
 def find_all_title_tuples_in_order(
     directory_names, min_duration_mins = 19 ):
     #
+    from pathos.multiprocessing import Pool, cpu_count
     with Pool( processes = cpu_count( ) ) as pool:
         directories_from_glob = sorted(
             filter(lambda entry: len( entry[1] ) > 0,
@@ -39,26 +40,27 @@ def process_single_episode_in_order(
     #
     ## now the process
     stdout_val = subprocess.check_output([
-        nice_exec, '-n', '19', hcli_exec,
+        get_exec( 'nice' ), '-n', '19', get_exec( 'HandBrakeCLI' ),
         '-i', inputdir, '-t', '%d' % titnum, '-e', 'x265', '-q', '%d' % quality, '-B', '160',
         '-s', '1,2,3,4,5', '-a', '1,2,3,4,5', '-o', newfile ], stderr = subprocess.STDOUT )
     logging.debug( stdout_val.decode( 'utf8' ) )
+    fps = get_encode_fps( stdout_val )
     #
     stdout_val = subprocess.check_output([
-        nice_exec, '-n', '19', mkvpropedit_exec,
+        get_exec( 'nice' ), '-n', '19', get_exec( 'mkvpropedit' ),
         newfile, '--add-track-statistics-tags' ], stderr = subprocess.STDOUT )
     logging.debug( stdout_val.decode( 'utf8' ) )
-    return newfile
+    return newfile, fps
 
 def process_single_season(
         directory_names, showname, seasno, outdir, jsonfile, quality = 22, min_duration_mins = 19,
         firstAiredYear = None ):
     assert( os.path.isdir( outdir ) )
-    assert( os.path.basename( jsonfile ).endswith( '.json' ) )
+    assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
     title_tuples_in_order = find_all_title_tuples_in_order(
         directory_names, min_duration_mins = min_duration_mins )
     #
-    epdicts = tv_attic.get_tot_epdict_tmdb(
+    epdicts = get_tot_epdict_tmdb_cached(
         showname, firstAiredYear = firstAiredYear, showSpecials = True )
     epdicts_sub = { seasno : { epno : epdicts[seasno][epno][0].replace("/", "; ") for
                                epno in epdicts[seasno] } for seasno in epdicts }
@@ -87,31 +89,37 @@ def process_single_season(
     #
     ##
     time00 = time.perf_counter( )
-    list_processed = [ 'found %02d episodes to process for season %d in "%s".' % (
-        len( title_tuples_in_order ), seasno, directory_names ), ]
-    json.dump( list_processed, open( jsonfile, 'w' ), indent = 1 )
+    #
+    ## each DVD title is journaled as "<VIDEO_TS directory>:<title number>"
+    journal = ProgressJournal( jsonfile )
+    journal.start(
+        list(map(lambda entry: '%s:%d' % entry, title_tuples_in_order ) ),
+        'found %02d episodes to process for season %d in "%s".' % (
+            len( title_tuples_in_order ), seasno, directory_names ) )
     for idx, entry in enumerate( title_tuples_in_order ):
         time0 = time.perf_counter( )
         inputdir, titnum = entry
         #
-        newfile = process_single_episode_in_order(
+        newfile, fps = process_single_episode_in_order(
             showname, epdicts_sub, inputdir, titnum, idx + 1, seasno, outdir, quality = quality )
         #
         os.chmod(newfile, 0o644 )   
         dt0 = time.perf_counter( ) - time0        
-        list_processed.append( 'processed episode %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( title_tuples_in_order ), dt0 ) )
-        json.dump( list_processed, open( jsonfile, 'w' ), indent = 1 )
+        journal.record_file(
+            '%s:%d' % entry, 'done', size_after = os.stat( newfile ).st_size,
+            encode_time = dt0, fps = fps, output = newfile,
+            message = 'processed episode %02d / %02d in %0.3f seconds' % (
+                idx + 1, len( title_tuples_in_order ), dt0 ) )
     dt00 = time.perf_counter( ) - time00
-    list_processed.append( 'took %0.3f seconds to process %d episodes' % (
+    journal.finish( 'took %0.3f seconds to process %d episodes' % (
         dt00, len( title_tuples_in_order ) ) )
-    json.dump( list_processed, open( jsonfile, 'w' ), indent = 1 )
+    journal.close( )
     
 def main( ):
     """
     Example command to run:
 
-    dvd_to_mkv -d "EERIE_INDIANA_DISC_*" -o mov -s "Eerie, Indiana" -S 1 -Q 22 -J processed_s01.json -m 19
+    dvd_to_mkv -d "EERIE_INDIANA_DISC_*" -o mov -s "Eerie, Indiana" -S 1 -Q 22 -J processed_s01.jsonl -m 19
     
     """
     parser = ArgumentParser( )
@@ -130,16 +138,19 @@ def main( ):
     parser.add_argument( '-m', '--min_duration_mins', dest = 'min_duration_mins', type = int, action = 'store', default = 19,
                          help = 'The minimum duration of DVD titles on disk to be considered an episode. Default is 19. Must be >= 12.' )
     parser.add_argument( '-J', '--jsonfile', dest = 'jsonfile', type = str, action = 'store', 
-                         default = 'processed_stuff.json',
+                         default = 'processed_stuff.jsonl',
                          help = ' '.join([
                              'Name of the JSON file used to write out the progress of the DVD ripping.'
-                             'Default = "processed_stuff.json".' ]) )
+                             'Default = "processed_stuff.jsonl".' ]) )
+    parser.add_argument( '--refresh', dest = 'do_refresh', action = 'store_true', default = False,
+                         help = 'If chosen, then look up the TV show episodes on TMDB again, rather than in the local episodes cache.' )
     parser.add_argument( '-D', '--debug', dest = 'do_debug', action = 'store_true', default = False,
                          help = 'If chosen, then turn on DEBUG LOGGING.' )
     #
     args = parser.parse_args( )
     logger = logging.getLogger( )
     if args.do_debug: logger.setLevel( logging.DEBUG )
+    set_epdicts_cache_refresh( args.do_refresh )
     #
     outdir = os.path.realpath( os.path.expanduser( args.outdir ) )
     assert( os.path.isdir( outdir ) )
@@ -147,12 +158,14 @@ def main( ):
     directory_names = get_directory_names( args.directories )
     #
     showname = args.showname.strip( )
-    epdicts = tv_attic.get_tot_epdict_tmdb(
-        showname, firstAiredYear = None, showSpecials = True )
+    #
+    ## the same lookup as in process_single_season, so that one is a cache hit
+    epdicts = get_tot_epdict_tmdb_cached(
+        showname, firstAiredYear = args.firstAiredYear, showSpecials = True )
     seasno = args.season
     assert( seasno in epdicts )
     jsonfile = os.path.realpath( os.path.expanduser( args.jsonfile ) )
-    assert( os.path.basename( jsonfile ).endswith( '.json' ) )
+    assert( os.path.basename( jsonfile ).endswith( '.jsonl' ) )
     #
     assert( args.min_duration_mins >= 15 )
     #
@@ -1,11 +1,7 @@
-import os, sys, numpy, mutagen.mp4, requests, yt_dlp, time, datetime, magic, io, logging, validators
+import os, sys, logging
 from enum import Enum
 from io import BytesIO
-from PIL import Image
 from argparse import ArgumentParser
-#
-from howdy.music.music import get_youtube_file
-from howdy.music import fill_m4a_metadata
 
 class IMAGETYPE( Enum ):
     IS_JPEG = 1
@@ -14,6 +10,7 @@ class IMAGETYPE( Enum ):
     
     @classmethod
     def check_format( cls, fullpath ):
+        import magic
         val = magic.from_file( os.path.abspath( fullpath ) )
         if 'jpeg' in val.lower( ): return IMAGETYPE.IS_JPEG
         if 'png' in val.lower( ): return IMAGETYPE.IS_PNG
@@ -21,6 +18,9 @@ class IMAGETYPE( Enum ):
 
 def download_indiv_song(
         input_data, album_cover_filename_or_URL, youtube_URL ):
+    import mutagen.mp4, validators
+    from howdy.music.music import get_youtube_file
+    from howdy.music import fill_m4a_metadata
     song =   '-'.join(map(lambda tok: tok.strip( ), input_data[ 'song' ].split('/')))
     artist = '-'.join(map(lambda tok: tok.strip( ), input_data[ 'artist' ].split('/')))
     album = input_data[ 'album' ]
@@ -70,6 +70,9 @@ def download_indiv_song(
 
 def download_compilation_song(
         input_data, album_cover_filename_or_URL, youtube_URL ):
+    import mutagen.mp4, validators
+    from howdy.music.music import get_youtube_file
+    from howdy.music import fill_m4a_metadata
     song =   '-'.join(map(lambda tok: tok.strip( ), input_data[ 'song' ].split('/')))
     artist = '-'.join(map(lambda tok: tok.strip( ), input_data[ 'artist' ].split('/')))
     album = input_data[ 'album' ]
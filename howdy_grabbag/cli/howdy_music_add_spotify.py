@@ -1,9 +1,8 @@
 import os, sys, logging, tabulate
 from argparse import ArgumentParser
-#
-from howdy.music import music, get_m4a_metadata
 
 def main( ):
+    from howdy.music import music, get_m4a_metadata
     parser = ArgumentParser( )
     parser.add_argument( '-f', '--filename', dest = 'filename', type = str, action = 'store', required = True,
                         help = 'Name of the M4A filename that we want to add SPOTIFY ID. NOTE THAT THIS FILE MUST BE M4A AND HAVE METADATA.' )
@@ -9,25 +9,96 @@ Requires titlecase, mutagen
 Requires executables: ffmpeg, mkvmerge, HandBrakeCLI
 """
 
-import time, os, sys, titlecase, logging
-from howdy.core import SSHUploadPaths
+import time, os, sys, logging, re, csv, json, glob
+from itertools import chain
 from howdy_grabbag.utils import get_rsync_commands_lowlevel, rsync_upload_mkv
-from howdy.tv import tv_attic
+from howdy_grabbag.utils.epdicts_cache import get_tot_epdict_tmdb_cached, set_epdicts_cache_refresh
 from argparse import ArgumentParser
 
+_SUFFIXES = ( 'avi', 'mp4', 'mpg', 'mkv', 'webm' )
+
+_EPSTRING_REGEX = re.compile( r'(?<![a-z0-9])s(\d{1,2})[ ._-]?e(\d{1,3})(?!\d)', re.IGNORECASE )
+
+def parse_epstring( epstring ):
+    """
+    :param str epstring: the episode string, in the form ``S%02dE%02d``.
+    :returns: the ``( season number, episode number )`` tuple.
+    :rtype: tuple
+    :raises ValueError: if ``epstring`` is not a valid episode string.
+    """
+    seasepstring = epstring.strip( ).upper( )
+    if not seasepstring.startswith( 'S' ):
+        raise ValueError( 'Error, first string must be an s or S.' )
+    splitseaseps = seasepstring[1:].split('E')[:2]
+    if len( splitseaseps ) != 2:
+        raise ValueError( 'Error, string must have a SEASON and EPISODE part.' )
+    try: seasno = int( splitseaseps[0] )
+    except: raise ValueError( 'Error, invalid season number.' )
+    try: epno = int( splitseaseps[1] )
+    except: raise ValueError( 'Error, invalid episode number.' )
+    return seasno, epno
+
+def find_epstring( filename ):
+    """
+    :param str filename: a TV file whose name contains an ``SxxEyy`` episode string, for instance ``eerie.indiana.s01e02.mkv``.
+    :returns: the ``( season number, episode number )`` tuple of the first episode string in the base name of ``filename``, or ``None`` if there is none.
+    :rtype: tuple
+    """
+    mat = _EPSTRING_REGEX.search( os.path.basename( filename ) )
+    if mat is None: return None
+    return int( mat.group( 1 ) ), int( mat.group( 2 ) )
+
+def read_rename_manifest( manifest ):
+    """
+    Reads the files to rename, and their episodes, from a manifest. A CSV manifest has a ``file,SxxEyy`` row per file, with an optional header row. A JSON manifest is either an object of file to ``SxxEyy``, or a list of ``[ file, SxxEyy ]`` pairs. Relative file names are relative to the directory of the manifest.
+
+    :param str manifest: the manifest file, ending in ``.csv`` or ``.json``.
+    :returns: the :py:class:`list` of ``( file, season number, episode number )`` tuples, in order.
+    :rtype: list
+    """
+    assert( os.path.isfile( manifest ) )
+    assert( os.path.basename( manifest ).lower( ).endswith( ( '.csv', '.json' ) ) )
+    if manifest.lower( ).endswith( '.json' ):
+        data = json.load( open( manifest, 'r' ) )
+        pairs = list( data.items( ) ) if isinstance( data, dict ) else list(map(tuple, data ) )
+    else:
+        with open( manifest, 'r', newline = '' ) as openfile:
+            pairs = list(map(lambda row: ( row[0].strip( ), row[1].strip( ) ),
+                             filter(lambda row: len( row ) >= 2, csv.reader( openfile ) ) ) )
+        if len( pairs ) != 0 and pairs[0][0].lower( ) == 'file': pairs = pairs[1:]
+    dirname = os.path.dirname( os.path.abspath( manifest ) )
+    return list(map(lambda pair: ( os.path.join( dirname, os.path.expanduser( pair[0] ) ), ) + parse_epstring( pair[1] ), pairs ) )
+
+def find_season_subdir( alias, tvshow, seasno ):
+    """
+    :param str alias: the alias of the remote TV media directory collection.
+    :param str tvshow: the name of the TV show directory in the collection.
+    :param int seasno: the season number.
+    :returns: the season directory, ``<tvshow>/Season <seasno>`` or ``<tvshow>/Season <seasno, zero padded>``, that exists in the collection, or ``None`` if neither does.
+    :rtype: str
+    """
+    from howdy.core import SSHUploadPaths
+    valid_subdirs = sorted(filter(lambda subdir: get_rsync_commands_lowlevel(
+        alias, subdir, "", mediatype = SSHUploadPaths.MediaType.tv ) is not None,
+                                  set([ os.path.join( tvshow, 'Season %d' % seasno ),
+                                        os.path.join( tvshow, 'Season %02d' % seasno ) ] ) ) )
+    if len( valid_subdirs ) == 0: return None
+    return valid_subdirs[ 0 ]
+
 def rename_mkv_file(
     mkvtv, tvshow, seasno, epno,
-    firstAiredYear = None, outdir = os.getcwd( ) ):
+    firstAiredYear = None, outdir = os.getcwd( ), epdicts = None ):
     #
     time0 = time.perf_counter( )
     assert( os.path.isfile( mkvtv ) )
     assert( any(map(lambda suffix: os.path.basename( mkvtv ).lower( ).endswith('.%s' %suffix ),
-                    ( 'avi', 'mp4', 'mpg', 'mkv', 'webm' ) ) ) )
+                    _SUFFIXES ) ) )
     actual_suffix = os.path.basename( mkvtv ).lower( ).split('.')[-1].strip( )
     #
-    ## get the episode info first find the series
-    epdicts = tv_attic.get_tot_epdict_tmdb(
-        tvshow, showFuture = True, minmatch = 10.0, firstAiredYear = firstAiredYear )
+    ## get the episode info first find the series, unless a batch already has
+    if epdicts is None:
+        epdicts = get_tot_epdict_tmdb_cached(
+            tvshow, showFuture = True, minmatch = 10.0, firstAiredYear = firstAiredYear )
     assert( epdicts is not None )
     assert( seasno in epdicts )
     assert( epno in epdicts[ seasno ] )
@@ -42,6 +113,34 @@ def rename_mkv_file(
         os.path.realpath( newfile ), time.perf_counter( ) - time0 ) )
     return os.path.realpath( newfile )
 
+def rename_mkv_files(
+    entries, tvshow, firstAiredYear = None, outdir = None ):
+    """
+    Renames many TV files of one show, with a single lookup of its episodes. Every episode is checked before any file is renamed.
+
+    :param list entries: the ``( file, season number, episode number )`` tuples of the files to rename.
+    :param str tvshow: the name of the TV show.
+    :param int firstAiredYear: optional year in which the first episode of the TV show aired.
+    :param str outdir: the directory into which to move the renamed files. Default is to keep each file in its own directory.
+    :returns: the :py:class:`list` of ``( renamed file, season number )`` tuples, in the order of ``entries``.
+    :rtype: list
+    """
+    time0 = time.perf_counter( )
+    epdicts = get_tot_epdict_tmdb_cached(
+        tvshow, showFuture = True, minmatch = 10.0, firstAiredYear = firstAiredYear )
+    assert( epdicts is not None ), "ERROR, COULD NOT FIND EPISODES OF %s." % tvshow
+    missing = list(filter(lambda entry: entry[1] not in epdicts or entry[2] not in epdicts[ entry[1] ], entries ) )
+    assert( len( missing ) == 0 ), "ERROR, THESE EPISODES ARE NOT IN %s: %s." % (
+        tvshow, ', '.join(map(lambda entry: 'S%02dE%02d (%s)' % ( entry[1], entry[2], entry[0] ), missing ) ) )
+    seaseps = list(map(lambda entry: entry[1:], entries ) )
+    assert( len( set( seaseps ) ) == len( seaseps ) ), "ERROR, SOME EPISODES APPEAR MORE THAN ONCE."
+    outputs = list(map(lambda entry: ( rename_mkv_file(
+        entry[0], tvshow, entry[1], entry[2], epdicts = epdicts,
+        outdir = outdir if outdir is not None else os.path.dirname( os.path.abspath( entry[0] ) ) ), entry[1] ),
+                       entries ) )
+    logging.info( 'renamed %d files in %0.3f seconds.' % ( len( outputs ), time.perf_counter( ) - time0 ) )
+    return outputs
+
 def main( ):
     parser = ArgumentParser( )
     parser.add_argument( '-i', dest='inputmkv', type=str, action='store',
@@ -56,6 +155,9 @@ def main( ):
     parser.add_argument(
         '-o', '--outdir', dest='outdir', action='store', type=str, default = os.getcwd( ),
         help = 'The directory into which we save the final MKV file. Default is %s.' % os.getcwd( ) )
+    parser.add_argument(
+        '--refresh', dest='do_refresh', action='store_true', default = False,
+        help = 'If chosen, then look up the TV show episodes on TMDB again, rather than in the local episodes cache.' )
     parser.add_argument(
         '--noinfo', dest='do_info', action='store_false', default = True,
         help = 'If chosen, then run with NO INFO logging (less debugging).' )
@@ -78,30 +180,16 @@ def main( ):
     assert( os.path.isdir( args.outdir ) )
     assert( os.path.isfile( args.inputmkv ) )
     assert( any(map(lambda suffix: os.path.basename( args.inputmkv ).lower( ).endswith('.%s' %suffix ),
-                    ( 'avi', 'mp4', 'mpg', 'mkv', 'webm' ) ) ) )
+                    _SUFFIXES ) ) )
     #
     ##
     logger = logging.getLogger( )
     if args.do_info: logger.setLevel( logging.INFO )
+    set_epdicts_cache_refresh( args.do_refresh )
     #
-    seasepstring = args.epstring.strip( ).upper( )
-    if not seasepstring[0] == 'S':
-        print( 'Error, first string must be an s or S.' )
-        return
-    seasepstring = seasepstring[1:]
-    splitseaseps = seasepstring.split('E')[:2]
-    if len( splitseaseps ) != 2:
-        print( 'Error, string must have a SEASON and EPISODE part.' )
-        return
-    try:
-        seasno = int( splitseaseps[0] )
-    except:
-        print( 'Error, invalid season number.' )
-        return
-    try:
-        epno = int( splitseaseps[1] )
-    except:
-        print( 'Error, invalid episode number.' )
+    try: seasno, epno = parse_epstring( args.epstring )
+    except ValueError as e:
+        print( str( e ) )
         return
     joblib_dict = {
         'mkvtv'  : args.inputmkv,
@@ -111,6 +199,7 @@ def main( ):
         'outdir' : args.outdir,
         'do_ssh' : False }
     if args.choose_option == 'ssh':
+        from howdy.core import SSHUploadPaths
         joblib_dict[ 'do_ssh' ] = True
         joblib_dict[ 'alias'  ] = args.ssh_alias
         tvshow = joblib_dict[ 'tvshow' ]
@@ -122,13 +211,9 @@ def main( ):
         print( data_init )
         if data_init is None:
             return
-        valid_subdirs = sorted(filter(lambda subdir: get_rsync_commands_lowlevel(
-            joblib_dict[ 'alias' ], subdir, "", mediatype = SSHUploadPaths.MediaType.tv ) is not None,
-                                    set([ os.path.join( tvshow, 'Season %d' % seasno ),
-                                          os.path.join( tvshow, 'Season %02d' % seasno ) ] ) ) )
-        if len( valid_subdirs ) == 0:
+        joblib_dict[ 'subdir' ] = find_season_subdir( joblib_dict[ 'alias' ], tvshow, seasno )
+        if joblib_dict[ 'subdir' ] is None:
             return
-        joblib_dict[ 'subdir' ] = valid_subdirs[ 0 ]
     #
     #outputfile = rename_mkv_file(
     #    args.inputmkv, args.seriesName, seasno, epno,
@@ -138,6 +223,7 @@ def main( ):
         joblib_dict[ 'tvshow' ],
         joblib_dict[ 'seasno' ],
         joblib_dict[ 'epno'   ],
+        firstAiredYear = args.firstAiredYear,
         outdir = joblib_dict[ 'outdir' ] )
     if joblib_dict[ 'do_ssh' ]:
         mycmd, mxcmd = get_rsync_commands_lowlevel(
@@ -146,3 +232,90 @@ def main( ):
             outputfile,
             mediatype = SSHUploadPaths.MediaType.tv )
         rsync_upload_mkv( mycmd, mxcmd, numtries = 10 )
+
+def main_batch( ):
+    """
+    Example commands to run:
+
+    rename_mkv_tv_batch -S "Eerie, Indiana" -M season1.csv
+    rename_mkv_tv_batch -S "Eerie, Indiana" -A tv_alias -i eerie.indiana.s01e*.mkv
+
+    """
+    parser = ArgumentParser( )
+    parser.add_argument( '-S', '--series', dest='seriesName', type=str, action='store',
+                       help = 'Name of the TV show.', required = True )
+    parser.add_argument( '-F', '--firstAiredYear', type=int, action='store',
+                       help = 'Year in which the first episode of the TV show aired.' )
+    input_group = parser.add_mutually_exclusive_group( required = True )
+    input_group.add_argument( '-M', '--manifest', dest = 'manifest', type = str, action = 'store',
+                              help = 'CSV or JSON manifest of the TV files to rename, and their episode strings, in the form S%%02dE%%02d.' )
+    input_group.add_argument( '-i', '--inputs', dest = 'inputs', type = str, action = 'store', nargs = '+',
+                              help = 'The TV files, or glob patterns of TV files, to rename. Their episodes come from the S%%02dE%%02d in their names.' )
+    #
+    parser.add_argument(
+        '-o', '--outdir', dest='outdir', action='store', type=str, default = None,
+        help = 'The directory into which we move the renamed files. Default is to keep each file in its own directory.' )
+    parser.add_argument(
+        '--refresh', dest='do_refresh', action='store_true', default = False,
+        help = 'If chosen, then look up the TV show episodes on TMDB again, rather than in the local episodes cache.' )
+    parser.add_argument(
+        '--noinfo', dest='do_info', action='store_false', default = True,
+        help = 'If chosen, then run with NO INFO logging (less debugging).' )
+    #
+    ## SSH all files to remote directory
+    parser.add_argument( '-A', '--alias', dest = 'ssh_alias', type = str, action = 'store', default = None,
+                         help = ' '.join([
+                             'Optional alias to identify the remote tv media directory collection.',
+                             'If given, then upload the renamed files to the remote SSH server, in one rsync session per season.' ]) )
+    parser.add_argument( '-T', '--tvshow', dest = 'tvshow', type = str, action = 'store', default = None,
+                         help = 'Optional name of the TV show directory into which to put the TV media files, when uploading.' )
+    #
+    args = parser.parse_args( )
+    logger = logging.getLogger( )
+    if args.do_info: logger.setLevel( logging.INFO )
+    set_epdicts_cache_refresh( args.do_refresh )
+    if args.outdir is not None: assert( os.path.isdir( args.outdir ) )
+    #
+    ## the files and their episodes
+    if args.manifest is not None:
+        try: entries = read_rename_manifest( os.path.expanduser( args.manifest ) )
+        except ValueError as e:
+            print( str( e ) )
+            return
+    else:
+        fnames = sorted(set(filter(os.path.isfile, map(os.path.expanduser, chain.from_iterable(map(
+            lambda name: glob.glob( os.path.expanduser( name ) ) if '*' in name else [ name, ], args.inputs ) ) ) ) ) )
+        seaseps = dict(map(lambda filename: ( filename, find_epstring( filename ) ), fnames ) )
+        unparsed = sorted(filter(lambda filename: seaseps[ filename ] is None, fnames ) )
+        if len( unparsed ) != 0:
+            print( 'ERROR, COULD NOT FIND AN SxxEyy EPISODE STRING IN %s.' % unparsed )
+            return
+        entries = list(map(lambda filename: ( filename, ) + seaseps[ filename ], fnames ) )
+    bad_files = list(filter(lambda entry: not os.path.isfile( entry[0] ) or not any(map(
+        lambda suffix: entry[0].lower( ).endswith( '.%s' % suffix ), _SUFFIXES ) ), entries ) )
+    if len( entries ) == 0 or len( bad_files ) != 0:
+        print( 'ERROR, NO FILES TO RENAME, OR THESE ARE NOT TV FILES: %s.' % list(map(lambda entry: entry[0], bad_files ) ) )
+        return
+    #
+    ## check the remote season directories before renaming anything
+    season_subdirs = { }
+    if args.ssh_alias is not None:
+        tvshow = args.seriesName if args.tvshow is None else args.tvshow
+        for seasno in sorted(set(map(lambda entry: entry[1], entries ) ) ):
+            season_subdirs[ seasno ] = find_season_subdir( args.ssh_alias, tvshow, seasno )
+            if season_subdirs[ seasno ] is None:
+                print( 'ERROR, COULD NOT FIND SEASON %d OF %s IN %s.' % ( seasno, tvshow, args.ssh_alias ) )
+                return
+    #
+    outputs = rename_mkv_files(
+        entries, args.seriesName, firstAiredYear = args.firstAiredYear, outdir = args.outdir )
+    if args.ssh_alias is None: return
+    #
+    ## one rsync session per season
+    from howdy.core import SSHUploadPaths
+    from howdy_grabbag.utils.rsync_batch import RsyncBatchUploader
+    uploader = RsyncBatchUploader( mediatype = SSHUploadPaths.MediaType.tv )
+    for outputfile, seasno in outputs:
+        uploader.add( args.ssh_alias, season_subdirs[ seasno ], outputfile )
+    statuses = uploader.upload( )
+    if any(map(lambda status: status != 'SUCCESS', statuses.values( ) ) ): sys.exit( 1 )
@@ -1,18 +1,18 @@
-import os, sys, numpy, glob, pandas, time, datetime, logging
-from howdy.music import music_spotify
+import os, sys, glob, time, datetime, logging
 from itertools import chain
-from pathos.multiprocessing import Pool, cpu_count
 from argparse import ArgumentParser
 
 def main( ):
+    import pandas
+    from howdy.music import music_spotify
     parser = ArgumentParser( )
     parser.add_argument( '-i', '--input', dest = 'input', type = str, action = 'store', required = True,
                         help = 'The input HDF5 serialized Pandas DataFrame containing the playlist info.' )
     parser.add_argument( '-o', '--output', dest = 'output', type = str, action = 'store', required = True,
                         help = 'The output HDF5 serialized Pandas DataFrame containing the playlist info containing SPOTIFY IDs.' )
-    parser.add_argument( '-N', '--nprocs', dest = 'nprocs', type = int, action = 'store', default = cpu_count( ),
+    parser.add_argument( '-N', '--nprocs', dest = 'nprocs', type = int, action = 'store', default = os.cpu_count( ),
                         help = 'The number of processors over which to split the work of getting SPOTIFY IDs. Must be >= 1. Default = %d.' %
-                        cpu_count( ) )
+                        os.cpu_count( ) )
     parser.add_argument( '-I', '--info', dest = 'do_info', action = 'store_true', default = False,
                         help = 'If chosen, turn on INFO logging.' )
     #
@@ -62,12 +62,15 @@ def main( ):
         time.perf_counter( ) - time0 ) )
     
 def main_fix_bad( ):
+    import pandas
+    from pathos.multiprocessing import Pool
+    from howdy.music import music_spotify
     parser = ArgumentParser( )
     parser.add_argument( '-i', '--input', dest = 'input', type = str, action = 'store', required = True,
                         help = 'The output HDF5 serialized Pandas DataFrame containing the playlist info containing SPOTIFY IDs.' )
-    parser.add_argument( '-N', '--nprocs', dest = 'nprocs', type = int, action = 'store', default = cpu_count( ),
+    parser.add_argument( '-N', '--nprocs', dest = 'nprocs', type = int, action = 'store', default = os.cpu_count( ),
                         help = 'The number of processors over which to split the work of getting SPOTIFY IDs. Must be >= 1. Default = %d.' %
-                        cpu_count( ) )
+                        os.cpu_count( ) )
     parser.add_argument( '-I', '--info', dest = 'do_info', action = 'store_true', default = False,
                         help = 'If chosen, turn on INFO logging.' )
     #
@@ -1,13 +1,13 @@
-import os, sys, numpy, glob, pandas, time, datetime, logging, tabulate
-from pathos.multiprocessing import Pool, cpu_count
-from plexapi.server import PlexServer
-from howdy.core import core
-from howdy.music import music, music_spotify
+import os, sys, glob, time, datetime, logging, tabulate
 from argparse import ArgumentParser
 
 #
 ## prints out the AUDIO playlists on the local Plex server
 def get_plex_audio_playlists( ):
+    import numpy, pandas
+    from pathos.multiprocessing import Pool, cpu_count
+    from plexapi.server import PlexServer
+    from howdy.core import core
     fullURL, token = core.checkServerCredentials( doLocal=True )
     plex = PlexServer( fullURL, token )
     playlists = list(filter(lambda playlist: playlist.playlistType == 'audio', plex.playlists( ) ) )
@@ -51,6 +51,7 @@ def print_plex_audio_playlists( df_plex_playlists_summary ):
         headers = headers ) )
 
 def create_spotify_public_playlist( name, description ):
+    from howdy.music import music_spotify
     oauth2_access_token = music_spotify.get_or_push_spotify_oauth2_token( )
     assert( oauth2_access_token is not None )
     status = music_spotify.create_public_playlist(
@@ -61,6 +62,7 @@ def create_spotify_public_playlist( name, description ):
     print( "SUCCESSFULLY CREATED SPOTIFY PUBLIC PLAYLIST WITH NAME = %s." % name )
 
 def print_spotify_public_playlists( ):
+    from howdy.music import music_spotify
     oauth2_access_token = music_spotify.get_or_push_spotify_oauth2_token( )
     assert( oauth2_access_token is not None )
     spotify_data_playlists = music_spotify.get_public_playlists( oauth2_access_token )
@@ -73,8 +75,12 @@ def print_spotify_public_playlists( ):
 def push_plex_to_spotify_playlist(
     plex_playlist_name,
     spotify_playlist_name,
-    numprocs = cpu_count( ),
+    numprocs = os.cpu_count( ),
     npurify = 1 ):
+    from pathos.multiprocessing import Pool
+    from plexapi.server import PlexServer
+    from howdy.core import core
+    from howdy.music import music, music_spotify
     assert( numprocs >= 1 )
     assert( npurify >= 0 )
     #
@@ -220,8 +226,8 @@ def main( ):
         '-o', '--output', dest = 'spotify_output', type = str, action = 'store',
         help = "The output public SPOTIFY playlist. Intent = the public SPOTIFY playlist's songs will MATCH the PLEX AUDIO playlist's collection of SPOTIFY identified songs." )
     subparsers_push.add_argument(
-        '-N', '--nprocs', dest = 'numprocs', type = int, action = 'store', default = cpu_count( ),
-        help = 'The number of processors used to perform the calculations. Must be >= 1. Default = %d.' % cpu_count( ) )
+        '-N', '--nprocs', dest = 'numprocs', type = int, action = 'store', default = os.cpu_count( ),
+        help = 'The number of processors used to perform the calculations. Must be >= 1. Default = %d.' % os.cpu_count( ) )
     subparsers_push.add_argument(
         '-M', '--npurify', dest = 'npurify', type = int, action = 'store', default = 0,
         help = ' '.join([
@@ -1,99 +1,151 @@
-import os, sys, time, subprocess, glob, json, titlecase, re, logging, shlex
-from howdy.core import core_rsync, SSHUploadPaths
+import os, sys, time, subprocess, glob, json, re, logging, shlex, tempfile
 from itertools import chain
-from howdy_grabbag import ffprobe_exec, ffmpeg_exec, mkvmerge_exec
+from xml.sax.saxutils import escape
+from howdy_grabbag import get_exec
+from howdy_grabbag.utils.staging import get_staging_file, commit_staged_file, remove_empty_staging_directories
+from howdy_grabbag.utils.transcode_scheduler import iter_transcode_jobs
+from howdy_grabbag.utils.probe_cache import ProbeCache, get_probe_cache
+from howdy_grabbag.utils.media_info import MediaInfo, get_media_info
 
 def get_ffprobe_json( filename ):
+    #
+    ## first look in the persistent probe cache
+    cache = get_probe_cache( )
+    key = None
+    if cache is not None:
+        try:
+            key = ProbeCache.get_key( filename )
+            file_info = cache.lookup( key )
+            if file_info is not None: return file_info
+        except Exception as e:
+            logging.debug( 'PROBE CACHE LOOKUP FAILED FOR %s. ERROR MESSAGE = %s.' % (
+                os.path.realpath( filename ), str( e ) ) )
     stdout_val = subprocess.check_output(
-        [ ffprobe_exec, '-v', 'quiet', '-show_streams',
+        [ get_exec( 'ffprobe' ), '-v', 'quiet', '-show_streams',
          '-show_format', '-print_format', 'json', filename ],
         stderr = subprocess.STDOUT )
     file_info = json.loads( stdout_val )
+    if key is not None:
+        try: cache.store( key, file_info )
+        except Exception as e:
+            logging.debug( 'PROBE CACHE STORE FAILED FOR %s. ERROR MESSAGE = %s.' % (
+                os.path.realpath( filename ), str( e ) ) )
     return file_info
 
 def is_hevc( filename ):
-    data = get_ffprobe_json( filename )
-    return data['streams'][0]['codec_name'].lower( ) == 'hevc'
+    info = get_media_info( filename )
+    return info is not None and info.is_hevc
 
 def get_hevc_bitrate( filename ):
-    try:
-        data = get_ffprobe_json( filename )
-        info = {
-            'is_hevc' :  data['streams'][0]['codec_name'].lower( ) == 'hevc',
-            'bit_rate_kbps' : float( data['format']['bit_rate' ] ) / 1_024, }
-        audio_streams = list(filter(lambda entry: entry['codec_type'] == 'audio', data['streams'] ) )
-        try:
-            bit_rate_audio_1 = sum(map(lambda entry: float( entry[ 'bit_rate' ] ) / 1_024, audio_streams ) )
-        except Exception as e:
-            bit_rate_audio_1 = 0
-        try:
-            bit_rate_audio_2 = sum(map(lambda entry: float( entry[ 'tags']['BPS'] ) / 1_024, audio_streams ) )
-        except Exception as e:
-            bit_rate_audio_2 = 0
-        info[ 'audio_bit_rate_kbps' ] = max( bit_rate_audio_1, bit_rate_audio_2 )
-        return info
-    except Exception as e:
-        logging.debug( 'PROBLEM WITH %s. ERROR MESSAGE = %s.' % (
-            os.path.realpath( filename ), str( e ) ) )
-        return None
+    info = get_media_info( filename )
+    if info is None or info.bit_rate_kbps is None: return None
+    return {
+        'is_hevc' : info.is_hevc,
+        'bit_rate_kbps' : info.bit_rate_kbps,
+        'audio_bit_rate_kbps' : info.audio_bit_rate_kbps, }
 
 def get_bitrate_AVI( filename ):
-    try:
-        data = get_ffprobe_json( filename )
-        info = { 
-            'bit_rate_kbps' : float( data['format']['bit_rate' ] ) / 1_024, }
-        audio_streams = list(filter(lambda entry: entry['codec_type'] == 'audio', data['streams'] ) )
-        try:
-            bit_rate_audio_1 = sum(map(lambda entry: float( entry[ 'bit_rate' ] ) / 1_024, audio_streams ) )
-        except: bit_rate_audio_1 = 0
-        try:
-            bit_rate_audio_2 = sum(map(lambda entry: float( entry[ 'tags']['BPS'] ) / 1_024, audio_streams ) )
-        except: bit_rate_audio_2 = 0
-        info[ 'audio_bit_rate_kbps' ] = max( bit_rate_audio_1, bit_rate_audio_2 )
-        return info
-    except: return None
+    info = get_media_info( filename )
+    if info is None or info.bit_rate_kbps is None: return None
+    return {
+        'bit_rate_kbps' : info.bit_rate_kbps,
+        'audio_bit_rate_kbps' : info.audio_bit_rate_kbps, }
 
 def get_directory_names( all_directories ):
-    directories_not_globs = set(filter(lambda dirname: '*' not in dirname, all_directories ) )
-    directories_globs     = set(filter(lambda dirname: '*' in dirname, all_directories ) )
-    directory_names_1 = set(filter(os.path.isdir, map(lambda dirname: os.path.realpath( os.path.expanduser( dirname ) ), directories_not_globs ) ) )
-    directory_names_2 = set(filter(os.path.isdir, map(lambda dirname: os.path.realpath( os.path.expanduser( dirname ) ),
-                                                      chain.from_iterable(map(lambda globdir: glob.glob( globdir ), directories_globs ) ) ) ) )
-    directory_names   = sorted( directory_names_1 | directory_names_2 )
+    """
+    :param list all_directories: directory names, or glob patterns of directory names (those with a ``*``).
+    :returns: the sorted real paths of the existing directories that ``all_directories`` name or match.
+    :rtype: list
+    """
+    directory_names = sorted(set(filter(os.path.isdir, map(
+        lambda dirname: os.path.realpath( os.path.expanduser( dirname ) ),
+        chain.from_iterable(map(
+            lambda dirname: glob.glob( os.path.expanduser( dirname ) ) if '*' in dirname else [ dirname, ],
+            all_directories ) ) ) ) ) )
     return directory_names
 
-def find_valid_aliases( mediatype = SSHUploadPaths.MediaType.movie ):
-    data_remote_collections = core_rsync.get_remote_connections( )
+_remote_connections = None
+_checked_remote_paths = set( )
+
+def _get_core_rsync( mediatype ):
+    #
+    ## the remote media directory collections live in howdy, which is slow to import, so only import it to upload
+    from howdy.core import core_rsync, SSHUploadPaths
+    if mediatype is None: mediatype = SSHUploadPaths.MediaType.movie
+    return core_rsync, mediatype
+
+def get_remote_connections( ):
+    """
+    :returns: the remote media directory collections, with their passwords, from :py:meth:`get_remote_connections <howdy.core.core_rsync.get_remote_connections>`. They are looked up once, and cached for the lifetime of the process.
+    :rtype: dict
+    """
+    global _remote_connections
+    if _remote_connections is None:
+        core_rsync, _ = _get_core_rsync( None )
+        _remote_connections = core_rsync.get_remote_connections( show_password = True )
+    return _remote_connections
+
+def check_remote_path( sshpath, password, finaldir ):
+    """
+    :param str sshpath: the ``user@host`` SSH path of the remote server.
+    :param str password: the SSH password.
+    :param str finaldir: the remote directory.
+    :returns: whether ``finaldir`` exists on the remote server, from :py:meth:`check_remote_connection_paths <howdy.core.core_rsync.check_remote_connection_paths>`. Directories that exist are cached for the lifetime of the process.
+    :rtype: bool
+    """
+    if ( sshpath, finaldir ) in _checked_remote_paths: return True
+    core_rsync, _ = _get_core_rsync( None )
+    status = core_rsync.check_remote_connection_paths( sshpath, password, finaldir )
+    if status != 'SUCCESS':
+        logging.debug( "ERROR MESSAGE: %s." % status )
+        return False
+    _checked_remote_paths.add( ( sshpath, finaldir ) )
+    return True
+
+def find_valid_aliases( mediatype = None ):
+    _, mediatype = _get_core_rsync( mediatype )
+    data_remote_collections = get_remote_connections( )
     valid_aliases = sorted(
         set( filter(lambda alias: data_remote_collections[ alias ][ 'media type' ] == mediatype.name,
                     data_remote_collections ) ) )
     return valid_aliases
 
-def get_rsync_commands_lowlevel(
-    alias, subdir, outputfile, mediatype = SSHUploadPaths.MediaType.movie ):
-    #
+def get_remote_upload_target( alias, subdir, mediatype = None ):
+    """
+    :param str alias: the alias of the remote media directory collection.
+    :param str subdir: the sub directory, of the main directory of the collection, into which to upload.
+    :param mediatype: the :py:class:`MediaType <howdy.core.SSHUploadPaths.MediaType>` of the collection. Default is ``movie``.
+    :returns: the ``( sshpath, password, remote directory )`` tuple to which to upload, or ``None`` if the alias or remote directory is not valid.
+    :rtype: tuple
+    """
+    _, mediatype = _get_core_rsync( mediatype )
     valid_aliases = find_valid_aliases( mediatype = mediatype )
     if alias not in valid_aliases:
         print( "ERROR, chosen alias = %s for remote %s media directory collection not one of %s." % (
             alias, mediatype.name, valid_aliases ) )
         return None
-    remote_collection = core_rsync.get_remote_connections( show_password = True )[ alias ]
+    remote_collection = get_remote_connections( )[ alias ]
     sshpath = remote_collection[ 'ssh path' ]
     maindir = remote_collection[ 'main directory' ]
     finaldir = os.path.join( maindir, subdir )
     #
-    logging.info( 'MOVIE FILE TO UPLOAD: %s.' % outputfile )
     logging.info( 'REMOTE %s MEDIA DIRECTORY COLLECTION SSH PATH: %s.' % ( mediatype.name.upper( ), sshpath ) )
     logging.info( 'REMOTE %s MEDIA DIRECTORY COLLECTION UPLOAD DIRECTORY: %s.' % ( mediatype.name.upper( ), finaldir ) )
-    status = core_rsync.check_remote_connection_paths(
-        sshpath, remote_collection[ 'password' ], finaldir )
-    if status != 'SUCCESS':
-        logging.debug( "ERROR MESSAGE: %s." % status )
-        return None
+    if not check_remote_path( sshpath, remote_collection[ 'password' ], finaldir ): return None
+    return sshpath, remote_collection[ 'password' ], finaldir
+
+def get_rsync_commands_lowlevel(
+    alias, subdir, outputfile, mediatype = None ):
+    #
+    core_rsync, mediatype = _get_core_rsync( mediatype )
+    logging.info( 'MOVIE FILE TO UPLOAD: %s.' % outputfile )
+    target = get_remote_upload_target( alias, subdir, mediatype = mediatype )
+    if target is None: return None
+    sshpath, password, finaldir = target
     #
     ## now the command to upload via rsync
     data_rsync = {
-        'password'  : remote_collection[ 'password' ],
+        'password'  : password,
         'sshpath'   : sshpath,
         'subdir'    : finaldir,
         'local_dir' : '' }
@@ -103,14 +155,15 @@ def get_rsync_commands_lowlevel(
     return mycmd, mxcmd
 
 def get_rsync_commands(
-    alias, outputfile, subdir = None, mediatype = SSHUploadPaths.MediaType.movie ):
+    alias, outputfile, subdir = None, mediatype = None ):
     #
+    core_rsync, mediatype = _get_core_rsync( mediatype )
     valid_aliases = find_valid_aliases( mediatype = mediatype )
     if alias not in valid_aliases:
         print( "ERROR, chosen alias = %s for remote %s media directory collection not one of %s." % (
             alias, mediatype.name, valid_aliases ) )
         return None
-    remote_collection = core_rsync.get_remote_connections( show_password = True )[ alias ]
+    remote_collection = get_remote_connections( )[ alias ]
     sshpath = remote_collection[ 'ssh path' ]
     maindir = remote_collection[ 'main directory' ]
     if len( remote_collection[ 'sub directories' ] ) == 0:
@@ -169,6 +222,7 @@ def rsync_upload_mkv( mycmd, mxcmd, numtries = 10 ):
     return 'FAILURE', '\n'.join( mystr_split )
 
 def create_epdicts_from_jsonfile( jsonfile ):
+    import titlecase
     assert( os.path.exists( jsonfile ) )
     epdicts_sub = json.load( open( jsonfile, 'r' ) )
     epdicts = { int(seasno) : { int(idx) : titlecase.titlecase( epdicts_sub[seasno][idx] )
@@ -190,75 +244,193 @@ def rename_files_in_directory( epdicts, series_name, seasno = 1, dirname = "." )
     print( 'processed %02d files in %0.3f seconds.' % (
         len( filedict ), time.perf_counter( ) - time0 ) )
 
-def process_mp4_srt_eps_to_mkv(
-    epdicts, series_name, seasno = 1, srtglob = '*.srt',
-    dirname = "." ):
+def get_mkvmerge_track_ids( filename, track_type = 'audio' ):
+    """
+    :param str filename: the media file, which ``mkvmerge`` identifies from its headers.
+    :param str track_type: the type of track, one of ``video``, ``audio``, or ``subtitles``. Default is ``audio``.
+    :returns: the :py:class:`list` of ``mkvmerge`` track IDs of that type, in order.
+    :rtype: list
+    """
+    stdout_val = subprocess.check_output(
+        [ get_exec( 'mkvmerge' ), '-J', filename ], stderr = subprocess.PIPE )
+    return list(map(lambda track: track[ 'id' ], filter(
+        lambda track: track[ 'type' ] == track_type, json.loads( stdout_val )[ 'tracks' ] ) ) )
+
+def _write_mkv_tags_file( title = None, year = None ):
+    simple_tags = [ ]
+    if title is not None: simple_tags.append( ( 'TITLE', title ) )
+    if year is not None: simple_tags.append( ( 'DATE_RELEASED', '%d' % year ) )
+    if len( simple_tags ) == 0: return None
+    with tempfile.NamedTemporaryFile( 'w', suffix = '.xml', delete = False ) as openfile:
+        openfile.write( '\n'.join([
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<Tags><Tag><Targets><TargetTypeValue>50</TargetTypeValue></Targets>' ] + list(map(
+                lambda tup: '<Simple><Name>%s</Name><String>%s</String></Simple>' % ( tup[0], escape( tup[1] ) ),
+                simple_tags ) ) + [ '</Tag></Tags>', ] ) )
+    return openfile.name
+
+def mux_mp4_to_mkv(
+    mp4file, newfile, srtfile = None, title = None, year = None, audio_language = None,
+    keep_mp4_subtitles = True, subtitle_language = 'eng', subtitle_name = 'English' ):
+    """
+    Remuxes an MP4 file, and optionally an SRT subtitle file, into an MKV file with one ``mkvmerge`` pass, so that every byte is written once. The title, release year, and audio language go into the same pass, rather than into the MP4 beforehand or the MKV afterwards. ``mkvmerge`` writes into the :py:meth:`staging directory <howdy_grabbag.utils.staging.get_staging_directory>` of ``newfile``, which then atomically replaces ``newfile``. Concurrent remuxes may share that staging directory, so the caller removes it with :py:meth:`remove_empty_staging_directories <howdy_grabbag.utils.staging.remove_empty_staging_directories>` once they are all done.
+
+    :param str mp4file: the MP4 file.
+    :param str newfile: the MKV file to create.
+    :param str srtfile: optional SRT subtitle file to add as a subtitle track.
+    :param str title: optional title of the MKV file.
+    :param int year: optional release year, stored as a ``DATE_RELEASED`` tag.
+    :param str audio_language: optional language of the first audio track, for instance ``eng``.
+    :param bool keep_mp4_subtitles: if ``False``, then leave out the subtitle tracks of ``mp4file``. Default is ``True``.
+    :param str subtitle_language: the language of the SRT subtitle track. Default is ``eng``.
+    :param str subtitle_name: the name of the SRT subtitle track. Default is ``English``.
+    :returns: the MKV file.
+    :rtype: str
+    """
+    time0 = time.perf_counter( )
+    assert( os.path.isfile( mp4file ) )
+    if srtfile is not None: assert( os.path.isfile( srtfile ) )
+    tmpmkv = get_staging_file( mp4file, target = newfile, suffix = 'mkv' )
+    tagsfile = _write_mkv_tags_file( title = title, year = year )
+    cmd = [ get_exec( 'mkvmerge' ), '-o', tmpmkv ]
+    if title is not None: cmd += [ '--title', title ]
+    if tagsfile is not None: cmd += [ '--global-tags', tagsfile ]
+    if audio_language is not None:
+        audio_ids = get_mkvmerge_track_ids( mp4file, 'audio' )
+        if len( audio_ids ) != 0: cmd += [ '--language', '%d:%s' % ( audio_ids[ 0 ], audio_language ) ]
+    if not keep_mp4_subtitles: cmd += [ '--no-subtitles' ]
+    cmd.append( mp4file )
+    if srtfile is not None:
+        cmd += [ '--language', '0:%s' % subtitle_language, '--track-name', '0:%s' % subtitle_name, srtfile ]
+    logging.debug( 'MKVMERGE COMMAND: %s.' % shlex.join( cmd ) )
     #
+    ## mkvmerge exits with 1 on warnings, after having written the whole output
+    try:
+        proc = subprocess.run( cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT )
+        if proc.returncode == 1:
+            logging.warning( 'MKVMERGE WARNINGS FOR %s: %s' % ( newfile, proc.stdout.decode( 'utf8', errors = 'replace' ) ) )
+        elif proc.returncode != 0:
+            raise subprocess.CalledProcessError( proc.returncode, cmd, output = proc.stdout )
+        os.chmod( tmpmkv, 0o644 )
+        commit_staged_file( tmpmkv, newfile )
+    except Exception:
+        if os.path.isfile( tmpmkv ): os.remove( tmpmkv )
+        raise
+    finally:
+        if tagsfile is not None: os.remove( tagsfile )
+    logging.info( 'muxed %s into %s in %0.3f seconds.' % ( mp4file, newfile, time.perf_counter( ) - time0 ) )
+    return newfile
+
+def verify_mkv_tracks( mp4file, newfile, srtfile = None, keep_mp4_subtitles = True ):
+    """
+    Checks, through the :py:meth:`probe layer <howdy_grabbag.utils.media_info.get_media_info>`, that a remuxed MKV file has every video and audio track of its MP4 file, and the subtitle tracks it should have, before the sources are deleted.
+
+    :param str mp4file: the MP4 file.
+    :param str newfile: the MKV file remuxed from ``mp4file``.
+    :param str srtfile: optional SRT subtitle file that was added as a subtitle track.
+    :param bool keep_mp4_subtitles: whether the subtitle tracks of ``mp4file`` were kept. Default is ``True``.
+    :returns: whether ``newfile`` has the expected numbers of video, audio, and subtitle tracks.
+    :rtype: bool
+    """
+    info_mp4 = get_media_info( mp4file )
+    info_mkv = get_media_info( newfile )
+    if info_mp4 is None or info_mkv is None: return False
+    num_subtitle_streams = ( info_mp4.num_subtitle_streams if keep_mp4_subtitles else 0 ) + int( srtfile is not None )
+    expected = ( info_mp4.num_video_streams, info_mp4.num_audio_streams, num_subtitle_streams )
+    found = ( info_mkv.num_video_streams, info_mkv.num_audio_streams, info_mkv.num_subtitle_streams )
+    if found != expected:
+        logging.warning( 'MKV FILE %s HAS ( VIDEO, AUDIO, SUBTITLE ) TRACKS = %s, EXPECTED %s.' % (
+            newfile, found, expected ) )
+        return False
+    return True
+
+def get_mp4_srt_season_files(
+    epdicts, series_name, seasno = 1, srtglob = '*.srt', dirname = "." ):
+    """
+    Matches the MP4 files, and the SRT files, in a directory, in sorted order, to the episodes of a season in order.
+
+    :param dict epdicts: the episode map, of season number to episode number to episode name.
+    :param str series_name: the name of the TV show.
+    :param int seasno: the season number. Default is 1.
+    :param str srtglob: the glob of the SRT files. Default is ``*.srt``.
+    :param str dirname: the directory of the MP4 and SRT files, into which the MKV files go. Default is the current directory.
+    :returns: the :py:class:`list` of ``( mp4file, srtfile, newfile )`` tuples, where ``newfile`` is the MKV file with the Plex_ TV file name.
+    :rtype: list
+
+    .. _Plex: https://plex.tv
+    """
     mp4files = sorted(glob.glob( os.path.join( dirname, '*.mp4' ) ) )
     srtfiles = sorted(glob.glob( os.path.join( dirname, srtglob ) ) )
     assert( len(mp4files) == len(srtfiles)), "ERROR, %d MP4 FILES != %d SRT FILES." % (
       len( mp4files ), len( srtfiles ) )
-    #epdicts_max = set(map(lambda idx: idx + starteps, range(len(mp4files))))
-    #assert( len( epdicts_max - set( epdicts[ seasno ] ) ) == 0 )
+    assert( seasno in epdicts )
+    epnos = sorted( epdicts[ seasno ] )
+    assert( len( mp4files ) <= len( epnos ) ), "ERROR, %d MP4 FILES > %d EPISODES IN SEASON %d." % (
+        len( mp4files ), len( epnos ), seasno )
+    return list(map(lambda tup: (
+        tup[1], tup[2], os.path.join( dirname, '%s - s%02de%02d - %s.mkv' % (
+            series_name, seasno, tup[0], epdicts[seasno][tup[0]].replace( '/', ', ' ) ) ) ),
+                    zip( epnos, mp4files, srtfiles ) ) )
+
+def iter_remux_mp4_srt_files( files, num_workers = 1, delete_files = True ):
+    """
+    Remuxes MP4 files, and their SRT files, into MKV files with :py:meth:`mux_mp4_to_mkv <howdy_grabbag.utils.mux_mp4_to_mkv>`, with at most ``num_workers`` at a time. Remuxing is pure I/O, so on fast disks several remuxes run side by side. The sources of a remux are deleted only if :py:meth:`verify_mkv_tracks <howdy_grabbag.utils.verify_mkv_tracks>` passes.
+
+    :param list files: the ``( mp4file, srtfile, newfile )`` tuples to remux, for instance from :py:meth:`get_mp4_srt_season_files <howdy_grabbag.utils.get_mp4_srt_season_files>`. ``srtfile`` may be ``None``.
+    :param int num_workers: the number of concurrent remuxes. Default is 1.
+    :param bool delete_files: if ``True``, then delete the MP4 and SRT files of each verified remux. Default is ``True``.
+    :returns: a generator, in order of completion, of ``( idx, ( mp4file, srtfile, newfile ), result, error, dt )`` tuples, as from :py:meth:`iter_transcode_jobs <howdy_grabbag.utils.transcode_scheduler.iter_transcode_jobs>`. ``result`` is a :py:class:`dict` with the ``size before`` of the sources and ``size after`` of the MKV file in bytes, the throughput in ``MB/s``, and whether the remux was ``verified``.
+    """
+    def _remux_job( job, cores ):
+        time0 = time.perf_counter( )
+        mp4file, srtfile, newfile = job
+        size_before = sum(map(lambda filename: os.stat( filename ).st_size, filter(None, ( mp4file, srtfile ) ) ) )
+        mux_mp4_to_mkv( mp4file, newfile, srtfile = srtfile )
+        dt = time.perf_counter( ) - time0
+        verified = verify_mkv_tracks( mp4file, newfile, srtfile = srtfile )
+        if verified and delete_files:
+            os.remove( mp4file )
+            if srtfile is not None: os.remove( srtfile )
+        return {
+            'size before' : size_before,
+            'size after'  : os.stat( newfile ).st_size,
+            'MB/s'        : size_before / 1024**2 / max( dt, 1e-6 ),
+            'verified'    : verified }
     #
+    ## concurrent remuxes share staging directories, so only remove them once every remux is done
+    files = list( files )
+    try: yield from iter_transcode_jobs( files, _remux_job, num_jobs = num_workers )
+    finally: remove_empty_staging_directories( list(map(lambda job: job[ 2 ], files ) ) )
+
+def _process_mp4_srt_files( files, num_workers = 1 ):
     time00 = time.perf_counter( )
-    for idx, tup in enumerate(zip( mp4files, srtfiles ) ):
-        time0 = time.perf_counter( )
-        epno = sorted( epdicts[ seasno ] )[ idx ]
-        mp4file, srtfile = tup
-        newfile = os.path.join( dirname, '%s - s%02de%02d - %s.mkv' % (
-            series_name, seasno, epno,
-            epdicts[seasno][epno].replace( '/', ', ' ) ) )
-        stdout_val = subprocess.check_output([
-            ffmpeg_exec, '-y', '-i', mp4file, '-codec', 'copy', 'file:%s' % newfile ],
-                                             stderr = subprocess.PIPE )
-        try:
-            stdout_val = subprocess.check_output([
-                mkvmerge_exec, '-o', os.path.join( dirname, 'default.mkv' ), newfile,
-                '--language', '0:eng', '--track-name', '0:English', srtfile ],
-                                                 stderr = subprocess.PIPE )
-        except Exception as e:
-            pass
-        os.rename( os.path.join( dirname, 'default.mkv' ), newfile )
-        os.chmod( newfile, 0o644 )
-        os.remove( mp4file )
-        os.remove( srtfile )
-        print( 'processed file %02d / %02d in %0.3f seconds.' % (
-            idx + 1, len( mp4files ), time.perf_counter( ) - time0 ) )
+    for idx, job, result, error, dt in iter_remux_mp4_srt_files( files, num_workers = num_workers ):
+        if error is not None:
+            print( 'failed file %02d / %02d (%s) in %0.3f seconds: %s.' % (
+                idx + 1, len( files ), os.path.basename( job[ 0 ] ), dt, str( error ) ) )
+            continue
+        print( 'processed file %02d / %02d in %0.3f seconds (%0.1f MB/s)%s.' % (
+            idx + 1, len( files ), dt, result[ 'MB/s' ],
+            '' if result[ 'verified' ] else ', KEPT SOURCES SINCE TRACKS DO NOT MATCH' ) )
     #
     print( 'processed all %02d files in %0.3f seconds.' % (
-        len( mp4files ), time.perf_counter( ) - time00 ) ) 
+        len( files ), time.perf_counter( ) - time00 ) )
+
+def process_mp4_srt_eps_to_mkv(
+    epdicts, series_name, seasno = 1, srtglob = '*.srt',
+    dirname = ".", num_workers = 1 ):
+    #
+    files = get_mp4_srt_season_files(
+        epdicts, series_name, seasno = seasno, srtglob = srtglob, dirname = dirname )
+    _process_mp4_srt_files( files, num_workers = num_workers )
 
 def process_mp4_srt_eps_to_mkv_simple(
-    srtglob = '*.srt', dirname = "." ):
+    srtglob = '*.srt', dirname = ".", num_workers = 1 ):
     #
     mp4files = sorted(glob.glob( os.path.join( dirname, '*.mp4' ) ) )
     srtfiles = sorted(glob.glob( os.path.join( dirname, srtglob ) ) )
     assert( len(mp4files) == len(srtfiles))
-    #epdicts_max = set(map(lambda idx: idx + starteps, range(len(mp4files))))
-    #assert( len( epdicts_max - set( epdicts[ seasno ] ) ) == 0 )
-    #
-    time00 = time.perf_counter( )
-    for idx, tup in enumerate(zip( mp4files, srtfiles ) ):
-        time0 = time.perf_counter( )
-        mp4file, srtfile = tup
-        newfile = os.path.join( dirname, os.path.basename( mp4file ).replace( '.mp4', '.mkv' ) )
-        stdout_val = subprocess.check_output([
-            ffmpeg_exec, '-y', '-i', mp4file, '-codec', 'copy', 'file:%s' % newfile ],
-                                             stderr = subprocess.PIPE )
-        try:
-            stdout_val = subprocess.check_output([
-                mkvmerge_exec, '-o', os.path.join( dirname, 'default.mkv' ), newfile,
-                '--language', '0:eng', '--track-name', '0:English', srtfile ],
-                                                 stderr = subprocess.PIPE )
-        except Exception as e:
-            pass
-        os.rename( os.path.join( dirname, 'default.mkv' ), newfile )
-        os.chmod( newfile, 0o644 )
-        os.remove( mp4file )
-        os.remove( srtfile )
-        print( 'processed file %02d / %02d in %0.3f seconds.' % (
-            idx + 1, len( mp4files ), time.perf_counter( ) - time0 ) )
-    #
-    print( 'processed all %02d files in %0.3f seconds.' % (
-        len( mp4files ), time.perf_counter( ) - time00 ) ) 
+    files = list(map(lambda tup: (
+        tup[0], tup[1], os.path.join( dirname, os.path.basename( tup[0] ).replace( '.mp4', '.mkv' ) ) ),
+                     zip( mp4files, srtfiles ) ) )
+    _process_mp4_srt_files( files, num_workers = num_workers )
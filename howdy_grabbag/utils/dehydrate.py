@@ -8,20 +8,40 @@ This can *either* tell a table of TV show data on your locally running Plex_ ser
 .. _Plex: https://plex.tv
 .. _HEVC: https://en.wikipedia.org/wiki/High_Efficiency_Video_Coding
 """
-import os, sys, time, pandas, numpy, json, subprocess, shutil, re, redis, glob, uuid, logging
+import os, sys, time, json, subprocess, logging, threading
 from enum import Enum
-from howdy.core import core, session
-from howdy.tv import tv, get_token, tv_attic, get_tvdb_api, TMDBShowIds
-from howdy.music import music
-from howdy.movie import tmdb_apiKey
-from pathos.multiprocessing import Pool, cpu_count
 from tabulate import tabulate
-from itertools import chain
 #
-from howdy_grabbag import ffmpeg_exec, nice_exec, hcli_exec, mkvpropedit_exec
-from howdy_grabbag.utils import is_hevc, get_hevc_bitrate, get_bitrate_AVI
+from howdy_grabbag import get_exec
+from howdy_grabbag.utils.probe_engine import iter_media_infos
+from howdy_grabbag.utils.dir_scanner import VIDEO_SUFFIXES, AVI_SUFFIXES, get_file_stats_from_directories
+from howdy_grabbag.utils.manifest import MANIFEST_DECISION, MIN_SAVINGS_FRACTION, get_dehydrate_manifest
+from howdy_grabbag.utils.transcode_scheduler import (
+    iter_transcode_jobs, get_job_core_sets, get_x265_thread_options, run_with_affinity,
+    get_encode_fps, HCLI_FPS_REGEX, FFMPEG_FPS_REGEX )
+from howdy_grabbag.utils.journal import ProgressJournal, get_resume_paths
+from howdy_grabbag.utils.ordering import DEFAULT_ORDERING, order_files_to_process
+from howdy_grabbag.utils.staging import (
+    get_staging_file, commit_staged_file, remove_orphaned_temp_files, remove_empty_staging_directories )
+from howdy_grabbag.utils.work_queue import run_worker
 
-def get_tv_library_local( library_name = 'TV Shows' ):
+def get_tv_library_local( library_name = 'TV Shows', use_snapshot = False, ttl_secs = 86_400, refresh = False ):
+    """
+    :param str library_name: the name of the TV library on the local Plex_ server.
+    :param bool use_snapshot: if ``True``, then use, and incrementally refresh, the local :py:meth:`snapshot <howdy_grabbag.utils.plex_snapshot.get_tv_library_snapshot>` of the library. Otherwise fetch the whole library from the server.
+    :param float ttl_secs: if ``use_snapshot``, the seconds for which the snapshot is used without checking the server.
+    :param bool refresh: if ``use_snapshot``, then check the server now.
+    :returns: the TV library data.
+    :rtype: dict
+    """
+    #
+    ## the Plex server libraries are slow to import, and only needed here
+    from howdy.core import core
+    from pathos.multiprocessing import cpu_count
+    from howdy_grabbag.utils.plex_snapshot import get_tv_library_snapshot
+    if use_snapshot:
+        return get_tv_library_snapshot(
+            library_name, ttl_secs = ttl_secs, refresh = refresh, num_threads = cpu_count( ) )
     _, token = core.checkServerCredentials( doLocal=True )
     library_names = list( core.get_libraries( token = token ).values( ) )
     assert( library_name in library_names )
@@ -30,24 +50,21 @@ def get_tv_library_local( library_name = 'TV Shows' ):
         library_name, token = token, num_threads = cpu_count( ) )
     return tvdata
 
-def get_fnames_from_directories( directory_names ):
-    fnames = sorted(set(
-        chain.from_iterable(map(
-            lambda directory_name:
-            glob.glob( os.path.join( directory_name, '*.mp4'  ) ) +
-            glob.glob( os.path.join( directory_name, '*.mkv'  ) ) +
-            glob.glob( os.path.join( directory_name, '*.webm' ) ) +
-            glob.glob( os.path.join( directory_name, '*.m4v'  ) ), directory_names ) ) ) )
-    return fnames
-
-def get_fnames_from_directories_AVI( directory_names ):
-    fnames = sorted(set(
-        chain.from_iterable(map(
-            lambda directory_name:
-            glob.glob( os.path.join( directory_name, '*.avi' ) ) +
-            glob.glob( os.path.join( directory_name, '*.wmv' ) ) +
-            glob.glob( os.path.join( directory_name, '*.mpg' ) ), directory_names ) ) ) )
-    return fnames
+def get_fnames_from_directories( directory_names, recursive = False, max_depth = None ):
+    """
+    :returns: a :py:class:`dict`, sorted by file name, of MKV, MP4, WEBM, and M4V files to their :py:class:`os.stat_result`. See :py:meth:`get_file_stats_from_directories <howdy_grabbag.utils.dir_scanner.get_file_stats_from_directories>`.
+    :rtype: dict
+    """
+    return get_file_stats_from_directories(
+        directory_names, suffixes = VIDEO_SUFFIXES, recursive = recursive, max_depth = max_depth )
+
+def get_fnames_from_directories_AVI( directory_names, recursive = False, max_depth = None ):
+    """
+    :returns: a :py:class:`dict`, sorted by file name, of AVI, WMV, and MPG files to their :py:class:`os.stat_result`.
+    :rtype: dict
+    """
+    return get_file_stats_from_directories(
+        directory_names, suffixes = AVI_SUFFIXES, recursive = recursive, max_depth = max_depth )
 
 class DATAFORMAT( Enum ):
     IS_AVI_OR_MPEG = 1
@@ -62,7 +79,7 @@ class DATAFORMAT( Enum ):
 
 #
 ## process_single_filename_hcli
-def process_single_filename_hcli( filename, newfile, qual = 28, audio_bit_string = '160' ):
+def process_single_filename_hcli( filename, newfile, qual = 28, audio_bit_string = '160', cores = None ):
     def _get_audio_entry_hcli( bit_string ):
         if bit_string.strip( ).isdigit( ):
             num_kbps = int( bit_string )
@@ -76,91 +93,142 @@ def process_single_filename_hcli( filename, newfile, qual = 28, audio_bit_string
     audio_entry_hcli = _get_audio_entry_hcli( audio_bit_string )
     if audio_entry_hcli is None:
         raise ValueError("Error, invalid audio bit string = %s." % audio_bit_string )
-    logging.debug( 'FILENAME = %s, NEWFILE = %s, AUDIO ENTRY HCLI = %s.' % (
-        filename, newfile, audio_entry_hcli ) )
-    stdout_val = subprocess.check_output([
-        nice_exec, '-n', '19', hcli_exec,
-        '-i', filename, '-e', 'x265', '-q', '%d' % qual,
+    #
+    ## when running alongside other encodes, limit x265 to the cores of this job
+    encopts_hcli = [ ]
+    if cores is not None:
+        encopts_hcli = [ '--encopts', get_x265_thread_options( len( cores ) ) ]
+    logging.debug( 'FILENAME = %s, NEWFILE = %s, AUDIO ENTRY HCLI = %s, ENCOPTS HCLI = %s.' % (
+        filename, newfile, audio_entry_hcli, encopts_hcli ) )
+    proc = run_with_affinity([
+        get_exec( 'nice' ), '-n', '19', get_exec( 'HandBrakeCLI' ),
+        '-i', filename, '-e', 'x265', '-q', '%d' % qual ] + encopts_hcli + [
         audio_entry_hcli[0], audio_entry_hcli[1],
         '-a', ','.join(map(lambda num: '%d' % num, range(1,35))),
         '-s', ','.join(map(lambda num: '%d' % num, range(1,35))),
-        '-o', newfile ], stderr = subprocess.PIPE )
-    logging.debug( stdout_val.decode( 'utf8' ) )
+        '-o', newfile ], cores )
+    logging.debug( proc.stdout.decode( 'utf8', errors = 'replace' ) )
     if newfile.endswith( '.mkv' ):
         stdout_val = subprocess.check_output([
-            nice_exec, '-n', '19', mkvpropedit_exec,
+            get_exec( 'nice' ), '-n', '19', get_exec( 'mkvpropedit' ),
             newfile, '--add-track-statistics-tags' ], stderr = subprocess.PIPE )
         logging.debug( stdout_val.decode( 'utf8' ) )
+    return get_encode_fps( proc.stderr + proc.stdout, HCLI_FPS_REGEX )
 
 #
 ## process single file to lower audio bitrate alone
-def process_single_filename_lower_audio( filename, newfile, audio_bit_rate_new = 160 ):
+def process_single_filename_lower_audio( filename, newfile, audio_bit_rate_new = 160, cores = None ):
     assert( audio_bit_rate_new > 10 )
     logging.debug( 'FILENAME = %s, NEWFILE = %s, NEW AUDIO BIT RATE = %d.' % (
         filename, newfile, audio_bit_rate_new ) )
-    stdout_val = subprocess.check_output([
-        nice_exec, '-n', '19', ffmpeg_exec,
+    proc = run_with_affinity([
+        get_exec( 'nice' ), '-n', '19', get_exec( 'ffmpeg' ),
         '-i', 'file:%s' % filename,
         '-vcodec', 'copy',
         '-scodec', 'copy',
         '-acodec', 'aac', '-ab', '%dk' % audio_bit_rate_new,
-        'file:%s' % newfile ], stderr = subprocess.PIPE )
-    logging.debug( stdout_val.decode( 'utf8' ) )
+        'file:%s' % newfile ], cores )
+    logging.debug( proc.stdout.decode( 'utf8', errors = 'replace' ) )
     if newfile.endswith( '.mkv' ):
         stdout_val = subprocess.check_output([
-            nice_exec, '-n', '19', mkvpropedit_exec,
+            get_exec( 'nice' ), '-n', '19', get_exec( 'mkvpropedit' ),
             newfile, '--add-track-statistics-tags' ], stderr = subprocess.PIPE )
         logging.debug( stdout_val.decode( 'utf8' ) )
+    return get_encode_fps( proc.stderr, FFMPEG_FPS_REGEX )
         
-def get_all_durations_dataframe( tvdata, min_bitrate = 2000, mode_dataformat = DATAFORMAT.IS_LATER ):
+def get_all_durations_dataframe( tvdata, min_bitrate = 2000, mode_dataformat = DATAFORMAT.IS_LATER, confirm_margin = None, qual = None ):
+    """
+    Estimates each episode's bit rate from its size and duration. Files with large attachments, or many audio tracks, can look bigger this way than their streams are. So, optionally, the episodes whose estimates are borderline -- within ``confirm_margin`` of ``min_bitrate`` -- are probed (see :py:meth:`iter_media_infos <howdy_grabbag.utils.probe_engine.iter_media_infos>`), and classified by the sum of their video and audio stream bit rates instead.
+
+    Optionally, the episodes that an earlier transcode at ``qual``, or at a higher ``qual`` number, could not shrink are dropped (see :py:meth:`find_no_retry <howdy_grabbag.utils.manifest.DehydrateManifest.find_no_retry>`).
+
+    :param dict tvdata: the TV library data from the Plex_ server, for instance from :py:meth:`get_tv_library_local <howdy_grabbag.utils.dehydrate.get_tv_library_local>`.
+    :param float min_bitrate: the episodes to keep must have total bit rates, in kbps, above this.
+    :param mode_dataformat: whether to keep the :py:attr:`AVI and MPEG <howdy_grabbag.utils.dehydrate.DATAFORMAT.IS_AVI_OR_MPEG>` episodes, or the :py:attr:`others <howdy_grabbag.utils.dehydrate.DATAFORMAT.IS_LATER>`.
+    :param float confirm_margin: if given, the fraction of ``min_bitrate``, for example 0.2, within which to confirm estimated bit rates by probing. Default is to trust every estimate.
+    :param int qual: if given, the x265 quality of the transcodes to come, at which to drop the episodes not worth transcoding again. Default is to keep every episode.
+    :returns: a :py:class:`DataFrame <pandas.DataFrame>` of the episodes, one row each, with columns ``sizes (MB)``, ``durations (s)``, ``shows``, ``seasons``, ``epnos``, ``names``, ``paths``, and ``bitrate (kbps)``, sorted by increasing bit rate. With ``confirm_margin``, there are also columns ``video bitrate (kbps)`` and ``audio bitrate (kbps)``, which are ``NaN`` for the episodes not probed, and ``bitrate confirmed``.
+    :rtype: pandas.DataFrame
+    """
+    import pandas
     if mode_dataformat == DATAFORMAT.IS_LATER: assert( min_bitrate >= 1000 )
-    sizes = [ ]
-    durations = [ ]
-    shows = [ ]
-    seasons = [ ]
-    epnos = [ ]
-    names = [ ]
-    paths = [ ]
-    
-    for show in tvdata:
-        for seasno in tvdata[show]['seasons']:
-            for epno in tvdata[show]['seasons'][seasno]['episodes']:
-                mypath = tvdata[show]['seasons'][seasno]['episodes'][epno]['path']
-                if mode_dataformat != DATAFORMAT.check_format( mypath ):
-                    continue
-                durations.append( tvdata[show]['seasons'][seasno]['episodes'][epno]['duration'])
-                sizes.append( tvdata[show]['seasons'][seasno]['episodes'][epno]['size'] )
-                shows.append( show )
-                seasons.append( seasno )
-                epnos.append( epno )
-                names.append( tvdata[show]['seasons'][seasno]['episodes'][epno]['title'] )
-                paths.append( mypath )
-    df = pandas.DataFrame({'sizes (MB)' : numpy.array(sizes)/1024**2, 'durations (s)' : durations,
-                           'shows' : shows, 'seasons' : seasons, 'epnos' : epnos, 'names' : names,
-                          'paths' : paths })
-    df['bitrate (kbps)'] = numpy.array( df['sizes (MB)'] ) / numpy.array( df['durations (s)']) * 1024 * 8
-    df_sub = df[ (df['bitrate (kbps)'] > min_bitrate ) ].sort_values('bitrate (kbps)', ascending = True).copy( )
-    return df_sub
+    #
+    ## one flattening pass over the nested library, then column operations on the whole table
+    episodes = [
+        ( episode[ 'size' ], episode[ 'duration' ], show, seasno, epno, episode[ 'title' ], episode[ 'path' ] )
+        for show, showdata in tvdata.items( )
+        for seasno, seasondata in showdata[ 'seasons' ].items( )
+        for epno, episode in seasondata[ 'episodes' ].items( ) ]
+    df = pandas.DataFrame.from_records(
+        episodes, columns = [ 'sizes (MB)', 'durations (s)', 'shows', 'seasons', 'epnos', 'names', 'paths' ] )
+    is_avi_or_mpeg = df.paths.str.lower( ).str.contains( r'\.(?:avi|mpg|mpeg)$', regex = True ).to_numpy( dtype = bool )
+    df = df[ is_avi_or_mpeg == ( mode_dataformat == DATAFORMAT.IS_AVI_OR_MPEG ) ]
+    sizes_mb = df[ 'sizes (MB)' ].to_numpy( dtype = float ) / 1024**2
+    bitrates = sizes_mb / df[ 'durations (s)' ].to_numpy( dtype = float ) * 1024 * 8
+    df = df.assign( **{ 'sizes (MB)' : sizes_mb, 'bitrate (kbps)' : bitrates } )
+    if confirm_margin is None or min_bitrate <= 0:
+        df_sub = df[ bitrates > min_bitrate ].sort_values('bitrate (kbps)', ascending = True).copy( )
+        return _remove_no_retry_episodes( df_sub, qual )
+    #
+    ## the estimates well above the threshold stand, and only the borderline ones are probed
+    assert( confirm_margin > 0 )
+    df = df[ bitrates > min_bitrate * ( 1 - confirm_margin ) ]
+    df = _confirm_borderline_bitrates( df, min_bitrate, confirm_margin )
+    df_sub = df[ df[ 'bitrate (kbps)' ] > min_bitrate ].sort_values('bitrate (kbps)', ascending = True).copy( )
+    return _remove_no_retry_episodes( df_sub, qual )
+
+def _remove_no_retry_episodes( df_sub, qual ):
+    import numpy
+    if qual is None or len( df_sub ) == 0: return df_sub
+    #
+    ## the sizes in MB are exact multiples of 1 / 1024**2, so this recovers the sizes in bytes
+    file_sizes = dict( zip( df_sub.paths, numpy.rint( df_sub[ 'sizes (MB)' ].to_numpy( dtype = float ) * 1024**2 ).astype( int ) ) )
+    paths_no_retry = find_no_retry( file_sizes, qual )
+    if len( paths_no_retry ) == 0: return df_sub
+    return df_sub[ ~df_sub.paths.isin( paths_no_retry ) ].copy( )
+
+def _confirm_borderline_bitrates( df, min_bitrate, confirm_margin ):
+    import numpy
+    is_borderline = ( df[ 'bitrate (kbps)' ] <= min_bitrate * ( 1 + confirm_margin ) ).to_numpy( dtype = bool )
+    paths_borderline = list( df.paths[ is_borderline ] )
+    dict_of_infos = dict( iter_media_infos( set( paths_borderline ) ) )
+    #
+    ## attachments and other non-stream data do not count toward the confirmed bit rate
+    def _get_kbps( info ):
+        if info is None: return numpy.nan, numpy.nan, numpy.nan
+        video_kbps = info.video_bit_rate_estimate_kbps
+        audio_kbps = info.audio_bit_rate_kbps
+        if info.video_bit_rate_kbps is None: return info.bit_rate_kbps, video_kbps, audio_kbps
+        return video_kbps + audio_kbps, video_kbps, audio_kbps
+    kbps_borderline = numpy.array( list(map(lambda path: _get_kbps( dict_of_infos.get( path ) ), paths_borderline ) ),
+                                   dtype = float ).reshape( -1, 3 )
+    bitrates = df[ 'bitrate (kbps)' ].to_numpy( dtype = float ).copy( )
+    video_bitrates = numpy.full( len( df ), numpy.nan )
+    audio_bitrates = numpy.full( len( df ), numpy.nan )
+    is_confirmed = numpy.zeros( len( df ), dtype = bool )
+    is_confirmed[ is_borderline ] = ~numpy.isnan( kbps_borderline[ :, 0 ] )
+    bitrates[ is_confirmed ] = kbps_borderline[ ~numpy.isnan( kbps_borderline[ :, 0 ] ), 0 ]
+    video_bitrates[ is_borderline ] = kbps_borderline[ :, 1 ]
+    audio_bitrates[ is_borderline ] = kbps_borderline[ :, 2 ]
+    logging.info( 'CONFIRMED %d / %d BORDERLINE EPISODES BY PROBING, %d NOW BELOW %d KBPS.' % (
+        is_confirmed.sum( ), is_borderline.sum( ), ( bitrates[ is_confirmed ] <= min_bitrate ).sum( ), min_bitrate ) )
+    return df.assign( **{
+        'bitrate (kbps)' : bitrates, 'video bitrate (kbps)' : video_bitrates,
+        'audio bitrate (kbps)' : audio_bitrates, 'bitrate confirmed' : is_confirmed } )
 
 
 def summarize_shows_dataframe( df_sub ):
-    def _get_num_shows( showname ):
-        return {
-            'num shows' : len( df_sub[ df_sub.shows == showname ] ),
-            'min kbps' : df_sub[ df_sub.shows == showname ]['bitrate (kbps)'].min( ),
-            'med kbps' : numpy.median( df_sub[ df_sub.shows == showname ]['bitrate (kbps)'] ),
-            'max kbps' : df_sub[ df_sub.shows == showname ]['bitrate (kbps)'].max( ),
-            }
-    dict_of_shows = dict(map(lambda showname: ( showname, _get_num_shows( showname ) ),
-                             set( df_sub.shows ) ) )
-    df = pandas.DataFrame( {
-        'shows' : sorted( dict_of_shows ),
-        'num episodes' : list(map(lambda showname: dict_of_shows[ showname ][ 'num shows' ], sorted( dict_of_shows ) ) ),
-        'min kbps'     : list(map(lambda showname: dict_of_shows[ showname ][ 'min kbps'  ], sorted( dict_of_shows ) ) ),
-        'med kbps'     : list(map(lambda showname: dict_of_shows[ showname ][ 'med kbps'  ], sorted( dict_of_shows ) ) ),
-        'max kbps'     : list(map(lambda showname: dict_of_shows[ showname ][ 'max kbps'  ], sorted( dict_of_shows ) ) ),
-        } )
-    df = df.sort_values( 'num episodes', ascending = False ).copy( )
+    """
+    :param df_sub: the :py:class:`DataFrame <pandas.DataFrame>` of episodes from :py:meth:`get_all_durations_dataframe <howdy_grabbag.utils.dehydrate.get_all_durations_dataframe>`.
+    :returns: a :py:class:`DataFrame <pandas.DataFrame>` of the shows, one row each, with columns ``shows``, ``num episodes``, ``min kbps``, ``med kbps``, and ``max kbps``, sorted from most to fewest episodes.
+    :rtype: pandas.DataFrame
+    """
+    df = df_sub.groupby( 'shows', sort = True ).agg( **{
+        'num episodes' : ( 'bitrate (kbps)', 'size' ),
+        'min kbps'     : ( 'bitrate (kbps)', 'min' ),
+        'med kbps'     : ( 'bitrate (kbps)', 'median' ),
+        'max kbps'     : ( 'bitrate (kbps)', 'max' ) } ).reset_index( )
+    df = df.sort_values( 'num episodes', ascending = False, kind = 'mergesort' ).copy( )
     return df
 
 def single_show_summary_dataframe( df_sub, showname, mode_dataformat = DATAFORMAT.IS_LATER ):
@@ -169,15 +237,15 @@ def single_show_summary_dataframe( df_sub, showname, mode_dataformat = DATAFORMA
     if mode_dataformat == DATAFORMAT.IS_AVI_OR_MPEG:
         return df_show
     #
-    with Pool( processes = min( cpu_count( ), len( df_show ) ) ) as pool:
-        dict_of_episodes_hevc = dict( pool.map(
-            lambda filename: ( filename, is_hevc( filename ) ),
-            list( df_show.paths ) ) )
-        df_show[ 'is hevc' ] = list(map(lambda filename: dict_of_episodes_hevc[ filename ],
-                                        list( df_show.paths ) ) )
-        return df_show
+    dict_of_episodes_info = dict( iter_media_infos( set( df_show.paths ) ) )
+    df_show[ 'media info' ] = list(map(lambda filename: dict_of_episodes_info[ filename ],
+                                       list( df_show.paths ) ) )
+    df_show[ 'is hevc' ] = list(map(lambda info: info is not None and info.is_hevc,
+                                    df_show[ 'media info' ] ) )
+    return df_show
 
 def summarize_single_show( df_sub, showname, minbitrate, mode_dataformat = DATAFORMAT.IS_LATER ):
+    import numpy
     df_show = single_show_summary_dataframe( df_sub, showname, mode_dataformat = mode_dataformat )
     #
     ## now report it out
@@ -190,6 +258,12 @@ def summarize_single_show( df_sub, showname, minbitrate, mode_dataformat = DATAF
         print( '%s\n' % tabulate( data, headers = [ 'PARAMETER', 'INFO' ] ) )
         return
     #
+    ## the streams that are actually bloated
+    infos = list(filter(None, df_show[ 'media info' ] ) )
+    video_kbps = list(filter(lambda kbps: kbps is not None, map(lambda info: info.video_bit_rate_estimate_kbps, infos ) ) )
+    if len( video_kbps ) != 0: data.append( [ 'MED VIDEO KBPS', numpy.median( video_kbps ) ] )
+    if len( infos ) != 0: data.append( [ 'MED AUDIO KBPS', numpy.median( list(map(lambda info: info.audio_bit_rate_kbps, infos ) ) ) ] )
+    #
     if len( df_show[ df_show[ 'is hevc' ] == True ] ) == 0:
         print( '%s\n' % tabulate( data, headers = [ 'PARAMETER', 'INFO' ] ) )
         return
@@ -202,370 +276,565 @@ def summarize_single_show( df_sub, showname, minbitrate, mode_dataformat = DATAF
     data.append( [ 'MAX KBPS HEVC', df_show_ishevc[ 'bitrate (kbps)' ].max( ) ] )
     print( '%s\n' % tabulate( data, headers = [ 'PARAMETER', 'INFO' ] ) )
 
-def process_single_show( df_sub, showname, do_hevc = True, qual = 28, audio_bit_string = '160' ):
+def process_single_show( df_sub, showname, do_hevc = True, qual = 28, audio_bit_string = '160',
+                         output_json_file = 'processed_stuff.jsonl', resume = False, ordering = DEFAULT_ORDERING ):
+    assert( os.path.basename( output_json_file ).endswith( '.jsonl' ) )
     #
-    df_show = single_show_summary_dataframe( df_sub, showname )
-    df_show_sub = df_show.copy( )
-    if not do_hevc:
-        df_show_sub = df_show[ df_show[ 'is hevc' ] == False ].copy( )
+    def _find_episodes( ):
+        df_show = single_show_summary_dataframe( df_sub, showname )
+        df_show_sub = df_show.copy( )
+        if not do_hevc:
+            df_show_sub = df_show[ df_show[ 'is hevc' ] == False ].copy( )
+        return _order_fnames(
+            dict( zip( df_show_sub.paths, df_show_sub[ 'media info' ] ) ), ordering, qual, output_json_file )
     #
     ## now process those shows SLOWLY
-    time00 = time.perf_counter( )
-    df_show_sorted = df_show_sub.sort_values(by=['seasons', 'epnos']).reset_index( )
-    episodes_sorted = sorted( set( df_show_sorted.paths ) )
-    list_processed = [ ]
-    for idx, filename in enumerate(episodes_sorted):
-        time0 = time.perf_counter( )
-        newfile = os.path.basename( filename )
-        #
-        process_single_filename_hcli(
-            filename, newfile, qual = qual,
-            audio_bit_string = audio_bit_string )
-        #
-        os.chmod(newfile, 0o644 )   
-        shutil.move( newfile, filename )
-        dt0 = time.perf_counter( ) - time0
-        print('processed episode %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( episodes_sorted ), dt0 ) )
-        list_processed.append( 'processed episode %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( episodes_sorted ), dt0 ) )
-        json.dump( list_processed, open( 'processed_stuff.json', 'w' ), indent = 1 )
-    dt00 = time.perf_counter( ) - time00
-    print( 'took %0.3f seconds to process %d episodes' % (
-        dt00, len( episodes_sorted ) ) )
-    list_processed.append( 'took %0.3f seconds to process %d episodes' % (
-        dt00, len( episodes_sorted ) ) )
-    json.dump( list_processed, open( 'processed_stuff.json', 'w' ), indent = 1 )
+    episodes_sorted, do_append = _get_fnames_to_process( output_json_file, resume, _find_episodes )
+    with ProgressJournal( output_json_file, append = do_append ) as journal:
+        journal.start( episodes_sorted, 'found %02d episodes of %s to dehydrate.' % (
+            len( episodes_sorted ), showname ) )
+        _run_transcode_jobs(
+            episodes_sorted,
+            lambda filename, cores: _dehydrate_job( filename, cores = cores, qual = qual, audio_bit_string = audio_bit_string ),
+            journal, mode = 'dehydrate', detail = 'quality = %d' % qual )
 
-def process_single_show_avi( df_sub, showname, qual = 20, audio_bit_string = '160' ):
+def process_single_show_avi( df_sub, showname, qual = 20, audio_bit_string = '160',
+                             output_json_file = 'processed_stuff_avi.jsonl', resume = False, ordering = DEFAULT_ORDERING ):
+    assert( os.path.basename( output_json_file ).endswith( '.jsonl' ) )
     #
-    df_show_sub = single_show_summary_dataframe(
-        df_sub, showname, mode_dataformat = DATAFORMAT.IS_AVI_OR_MPEG )
+    def _find_episodes( ):
+        df_show_sub = single_show_summary_dataframe(
+            df_sub, showname, mode_dataformat = DATAFORMAT.IS_AVI_OR_MPEG )
+        return _order_fnames( dict.fromkeys( df_show_sub.paths ), ordering, qual, output_json_file )
     #
     ## now process those shows SLOWLY
-    time00 = time.perf_counter( )
-    df_show_sorted = df_show_sub.sort_values(by=['seasons', 'epnos']).reset_index( )
-    episodes_sorted = sorted( set( df_show_sorted.paths ) )
-    list_processed = [ ]
+    episodes_sorted, do_append = _get_fnames_to_process( output_json_file, resume, _find_episodes )
+    with ProgressJournal( output_json_file, append = do_append ) as journal:
+        journal.start( episodes_sorted, 'found %02d episodes of %s to dehydrate.' % (
+            len( episodes_sorted ), showname ) )
+        _run_transcode_jobs(
+            episodes_sorted,
+            lambda filename, cores: _dehydrate_job_AVI( filename, cores = cores, qual = qual, audio_bit_string = audio_bit_string ),
+            journal, mode = 'dehydrate_avi', transcoded_mode = 'dehydrate',
+            detail = 'quality = %d' % qual )
+
+def find_no_retry( file_sizes, qual ):
+    """
+    :param dict file_sizes: the :py:class:`dict` of file name to its size in bytes.
+    :param int qual: the x265 quality of the transcodes to come.
+    :returns: the :py:class:`set` of files that an earlier transcode at ``qual``, or at a higher ``qual`` number, could not shrink by :py:data:`MIN_SAVINGS_FRACTION <howdy_grabbag.utils.manifest.MIN_SAVINGS_FRACTION>`, and so are not worth transcoding again.
+    :rtype: set
+    """
+    manifest = get_dehydrate_manifest( )
+    if manifest is None or len( file_sizes ) == 0: return set( )
+    try: fnames_no_retry = manifest.find_no_retry( file_sizes, qual )
+    except Exception as e:
+        logging.debug( 'COULD NOT LOOK UP FILES NOT WORTH TRANSCODING AGAIN. ERROR MESSAGE = %s.' % str( e ) )
+        return set( )
+    if len( fnames_no_retry ) != 0:
+        logging.info( 'SKIPPING %d / %d FILES NOT WORTH TRANSCODING AGAIN AT QUALITY %d.' % (
+            len( fnames_no_retry ), len( file_sizes ), qual ) )
+    return fnames_no_retry
+
+def _remove_no_retry( fnames_dict, qual, file_stats = None ):
+    if qual is None: return fnames_dict
+    if file_stats is None: file_stats = { }
+    fnames_no_retry = find_no_retry( dict(map(lambda fname: (
+        fname, ( file_stats.get( fname ) or os.stat( fname ) ).st_size ), fnames_dict ) ), qual )
+    return dict(filter(lambda tup: tup[0] not in fnames_no_retry, fnames_dict.items( ) ) )
+
+def _iter_probed( fnames, file_stats = None, probe_failures = None ):
+    for fname, info in iter_media_infos( fnames, file_stats = file_stats ):
+        if info is None and probe_failures is not None: probe_failures.add( fname )
+        yield fname, info
+
+def find_files_to_process( fnames, do_hevc = True, min_bitrate = 2_000, file_stats = None, qual = None, probe_failures = None ):
+    fnames_dict = dict(filter(
+        lambda tup: tup[1] is not None and tup[1].bit_rate_kbps is not None and
+        tup[1].bit_rate_kbps >= min_bitrate and ( do_hevc or not tup[1].is_hevc ),
+        _iter_probed( fnames, file_stats = file_stats, probe_failures = probe_failures ) ) )
+    return _remove_no_retry( fnames_dict, qual, file_stats = file_stats )
+
+def find_files_to_process_AVI( fnames_AVI, file_stats = None, qual = None, probe_failures = None ):
+    fnames_dict = dict(filter(
+        lambda tup: tup[1] is not None and tup[1].bit_rate_kbps is not None,
+        _iter_probed( fnames_AVI, file_stats = file_stats, probe_failures = probe_failures ) ) )
+    return _remove_no_retry( fnames_dict, qual, file_stats = file_stats )
+
+def _find_files_in_directories( file_stats, find_func, mode, criteria, incremental ):
     #
-    ## first go through redis database to see if shows are running
-    for idx, filename in enumerate(episodes_sorted):
-        time0 = time.perf_counter( )
-        dirname = os.path.dirname( filename )
-        newfile = re.sub( r'\.avi$', '.mkv', os.path.basename( filename ) )
-        try:
-            process_single_filename_hcli(
-                filename, newfile, qual = qual,
-                audio_bit_string = audio_bit_string )
-            os.chmod(newfile, 0o644 )
-            shutil.move( newfile, dirname )
-            os.remove( filename )
-            dt0 = time.perf_counter( ) - time0
-            print('processed episode %02d / %02d in %0.3f seconds' % (
-                idx + 1, len( episodes_sorted ), dt0 ) )
-            list_processed.append( 'processed episode %02d / %02d in %0.3f seconds' % (
-                idx + 1, len( episodes_sorted ), dt0 ) )
-        except:
-            try: os.remove( newfile )
-            except: pass
-            dt0 = time.perf_counter( ) - time0
-            print('failed episode %02d / %02d in %0.3f seconds' % (
-                idx + 1, len( episodes_sorted ), dt0 ) )
-            list_processed.append( 'failed episode %02d / %02d in %0.3f seconds' % (
-                idx + 1, len( episodes_sorted ), dt0 ) )
-        json.dump( list_processed, open( 'processed_stuff_avi.json', 'w' ), indent = 1 )
-    dt00 = time.perf_counter( ) - time00
-    print( 'took %0.3f seconds to process %d episodes' % (
-        dt00, len( episodes_sorted ) ) )
-    list_processed.append( 'took %0.3f seconds to process %d episodes' % (
-        dt00, len( episodes_sorted ) ) )
-    json.dump( list_processed, open( 'processed_stuff_avi.json', 'w' ), indent = 1 )
-
-def find_files_to_process( fnames, do_hevc = True, min_bitrate = 2_000 ):
-    with Pool( processes = cpu_count( ) ) as pool:
-        list_of_files_hevc_br = list(filter(
-            lambda tup: tup[1] is not None and tup[1]['bit_rate_kbps'] >= min_bitrate,
-            pool.map(lambda fname: ( fname, get_hevc_bitrate( fname ) ), fnames ) ) )
-        if not do_hevc:
-            list_of_files_hevc_br = list(filter(lambda tup: tup[1]['is_hevc'] == False,
-                                                list_of_files_hevc_br ) )
-        return dict( list_of_files_hevc_br )
+    ## in incremental mode, only look at files that are new or changed since the last run
+    manifest = get_dehydrate_manifest( )
+    fnames_to_examine = file_stats
+    if incremental and manifest is not None:
+        fnames_to_examine = manifest.filter_changed( file_stats, mode = mode, criteria = criteria )
+        logging.info( 'INCREMENTAL: examining %d / %d files that are new or changed.' % (
+            len( fnames_to_examine ), len( file_stats ) ) )
+    #
+    ## files that could not be probed stay out of the manifest, so that they are examined again next time
+    probe_failures = set( )
+    fnames_dict = find_func( fnames_to_examine, probe_failures )
+    if manifest is not None:
+        manifest.record_many(
+            filter(lambda fname: fname not in fnames_dict and fname not in probe_failures, fnames_to_examine ),
+            MANIFEST_DECISION.BELOW_THRESHOLD, mode = mode, file_stats = file_stats, criteria = criteria )
+    return fnames_dict
+
+def _get_criteria( criteria, qual ):
+    #
+    ## a file left out as not worth transcoding again at one quality may be worth it at another
+    if qual is None: return criteria
+    return ':'.join(filter(lambda tok: len( tok ) != 0, [ criteria, 'qual=%d' % qual ] ) )
+
+def _record_decision( filename, decision, mode, detail = '' ):
+    manifest = get_dehydrate_manifest( )
+    if manifest is None: return
+    try: manifest.record( filename, decision, mode = mode, detail = detail )
+    except Exception as e:
+        logging.debug( 'COULD NOT RECORD %s IN DEHYDRATE MANIFEST. ERROR MESSAGE = %s.' % ( filename, str( e ) ) )
+
+def find_files_to_process_directories(
+        directory_names, do_hevc = True, min_bitrate = 2_000,
+        recursive = False, max_depth = None, incremental = False, qual = None ):
+    """
+    Finds the MKV, MP4, WEBM, and M4V files to dehydrate in directories, and records in the :py:class:`DehydrateManifest <howdy_grabbag.utils.manifest.DehydrateManifest>` those found below threshold. Files that could not be probed are not recorded, so that they are examined again.
 
-def find_files_to_process_AVI( fnames_AVI ):
-    with Pool( processes = cpu_count( ) ) as pool:
-        return dict( 
-        pool.map(lambda fname: ( fname, get_bitrate_AVI( fname ) ), fnames_AVI ) )
+    :param list directory_names: the directories to scan.
+    :param bool do_hevc: if ``False``, then do not select HEVC files.
+    :param int min_bitrate: the minimum total bit rate, in kbps, of files to select.
+    :param bool recursive: if ``True``, then also scan subdirectories.
+    :param int max_depth: if ``recursive``, the maximum depth of subdirectories to scan.
+    :param bool incremental: if ``True``, then only examine files that are new or changed since they were last recorded in the manifest.
+    :param int qual: if given, the x265 quality of the transcodes to come, at which to leave out the files not worth transcoding again (see :py:meth:`find_no_retry <howdy_grabbag.utils.dehydrate.find_no_retry>`).
+    :returns: a ``( fnames_dict, file_stats )`` tuple. ``fnames_dict`` is the :py:class:`dict` of selected file to its :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>`, and ``file_stats`` is the :py:class:`dict` of every scanned file to its :py:class:`os.stat_result`.
+    :rtype: tuple
+    """
+    file_stats = get_fnames_from_directories(
+        directory_names, recursive = recursive, max_depth = max_depth )
+    fnames_dict = _find_files_in_directories(
+        file_stats,
+        lambda fnames, probe_failures: find_files_to_process(
+            fnames, do_hevc = do_hevc, min_bitrate = min_bitrate, file_stats = file_stats, qual = qual,
+            probe_failures = probe_failures ),
+        'dehydrate', _get_criteria( 'do_hevc=%d:min_bitrate=%d' % ( do_hevc, min_bitrate ), qual ), incremental )
+    return fnames_dict, file_stats
+
+def find_files_to_process_directories_AVI(
+        directory_names, recursive = False, max_depth = None, incremental = False, qual = None ):
+    """
+    The same as :py:meth:`find_files_to_process_directories <howdy_grabbag.utils.dehydrate.find_files_to_process_directories>`, but for AVI, WMV, and MPG files.
+    """
+    file_stats = get_fnames_from_directories_AVI(
+        directory_names, recursive = recursive, max_depth = max_depth )
+    fnames_dict = _find_files_in_directories(
+        file_stats,
+        lambda fnames, probe_failures: find_files_to_process_AVI(
+            fnames, file_stats = file_stats, qual = qual, probe_failures = probe_failures ),
+        'dehydrate_avi', _get_criteria( '', qual ), incremental )
+    return fnames_dict, file_stats
 
 def process_multiple_directories_subtitles(
-    directory_names = [ os.getcwd( ), ], output_json_file = 'processed_stuff.json',
+    directory_names = [ os.getcwd( ), ], output_json_file = 'processed_stuff.jsonl',
     do_add_subtitle = False ):
-    assert( os.path.basename( output_json_file ).endswith( '.json' ) )
+    assert( os.path.basename( output_json_file ).endswith( '.jsonl' ) )
     #
     ## check whether whisper exists
-    _whisper_exec  = which( 'whisper' )
-    assert( _whisper_exec is not None )
+    _whisper_exec  = get_exec( 'whisper' )
     #
     ## if adding subtitle check whether mkvmerge exists
     if do_add_subtitle:
-      _mkvmerge_exec = which( 'mkvmerge' )
-      assert( _mkvmerge_exec is not None )
+      _mkvmerge_exec = get_exec( 'mkvmerge' )
     fnames_dict = find_files_to_process(
         get_fnames_from_directories( directory_names ),
         do_hevc = True, min_bitrate = 100 )
     time00 = time.perf_counter( )
-    list_processed = [ 'found %02d files to subtitle in %s.' % (
-      len( fnames_dict ), os.path.abspath( directory_name ) ), ]
     if do_add_subtitle: # all files must end in mkv
       assert( all(map(lambda fname: os.path.basename( fname ).endswith('.mkv' ), fnames_dict ) ) )
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    for idx, filename in enumerate(sorted( fnames_dict ) ):
-      time0 = time.perf_counter( )
-      stdout_val = subprocess.check_output(
-        [ nice_exec, '-n', '19', _whisper_exec,
-          filename, '--output_format', 'srt', '--language', 'en' ],
-        stderr = subprocess.PIPE )
-      #
-      ## if adding subtitle
-      if do_add_subtitle:
-        subfile = os.path.basename( filename ).replace( '.mkv', '.srt' )
-        assert( os.path.isfile( subfile ) )
-        newfile = '%s-%s' % ( str( uuid.uuid4( ) ).split('-')[0].strip( ), os.path.basename( filename ).replace(":", "-" ) )
+    with ProgressJournal( output_json_file ) as journal:
+      journal.start( sorted( fnames_dict ), 'found %02d files to subtitle in %s.' % (
+        len( fnames_dict ), ', '.join(map(os.path.abspath, directory_names ) ) ) )
+      for idx, filename in enumerate(sorted( fnames_dict ) ):
+        time0 = time.perf_counter( )
         stdout_val = subprocess.check_output(
-          [ _mkvmerge_exec, '-o', newfile, filename, '--language', '0:eng', '--track-name', '0:English', subfile ],
+          [ get_exec( 'nice' ), '-n', '19', _whisper_exec,
+            filename, '--output_format', 'srt', '--language', 'en' ],
           stderr = subprocess.PIPE )
-        os.chmod( newfile, 0o644 )
-        os.rename( newfile, filename )
-        os.remove( subfile )
-      dt0 = time.perf_counter( ) - time0
-      logging.info( 'processed file %02d / %02d in %0.3f seconds' % (
-        idx + 1, len( fnames_dict ), dt0 ) )
-      list_processed.append( 'processed file %02d / %02d in %0.3f seconds' % (
-        idx + 1, len( fnames_dict ), dt0 ) )
-      json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    dt00 = time.perf_counter( ) - time00
-    logging.info( 'took %0.3f seconds to process %d files' % (
-      dt00, len( fnames_dict ) ) )
-    list_processed.append( 'took %0.3f seconds to process %d files' % (
-      dt00, len( fnames_dict ) ) )
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-
-def process_multiple_directories(
-        directory_names = [ os.getcwd( ), ], do_hevc = True, min_bitrate = 2_000,
-        qual = 28, output_json_file = 'processed_stuff.json', audio_bit_string = '160' ):
-    assert( os.path.basename( output_json_file ).endswith( '.json' ) )
-    fnames_dict = find_files_to_process(
-        get_fnames_from_directories( directory_names ),
-        do_hevc = do_hevc,
-        min_bitrate = min_bitrate )
-    time00 = time.perf_counter( )
-    list_processed = [ 'found %02d files to dehydrate in %s.' % (
-        len( fnames_dict ), list(map(os.path.abspath, directory_names ) ) ), ]
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    for idx, filename in enumerate(sorted( fnames_dict ) ):
-        time0 = time.perf_counter( )
-        newfile = '%s-%s' % ( str( uuid.uuid4( ) ).split('-')[0].strip( ), os.path.basename( filename ).replace(":", "-" ) )
-        #
-        process_single_filename_hcli(
-            filename, newfile, qual = qual,
-            audio_bit_string = audio_bit_string )
         #
-        os.chmod(newfile, 0o644 )
-        shutil.move( newfile, filename )
+        ## if adding subtitle
+        if do_add_subtitle:
+          subfile = os.path.basename( filename ).replace( '.mkv', '.srt' )
+          assert( os.path.isfile( subfile ) )
+          newfile = get_staging_file( filename )
+          stdout_val = subprocess.check_output(
+            [ _mkvmerge_exec, '-o', newfile, filename, '--language', '0:eng', '--track-name', '0:English', subfile ],
+            stderr = subprocess.PIPE )
+          os.chmod( newfile, 0o644 )
+          commit_staged_file( newfile, filename )
+          os.remove( subfile )
         dt0 = time.perf_counter( ) - time0
         logging.info( 'processed file %02d / %02d in %0.3f seconds' % (
+          idx + 1, len( fnames_dict ), dt0 ) )
+        journal.record_file(
+          filename, 'done', encode_time = dt0,
+          message = 'processed file %02d / %02d in %0.3f seconds' % (
             idx + 1, len( fnames_dict ), dt0 ) )
-        list_processed.append( 'processed file %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( fnames_dict ), dt0 ) )
-        json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    dt00 = time.perf_counter( ) - time00
-    logging.info( 'took %0.3f seconds to process %d files' % (
+      dt00 = time.perf_counter( ) - time00
+      logging.info( 'took %0.3f seconds to process %d files' % (
         dt00, len( fnames_dict ) ) )
-    list_processed.append( 'took %0.3f seconds to process %d files' % (
+      journal.finish( 'took %0.3f seconds to process %d files' % (
         dt00, len( fnames_dict ) ) )
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
 
-def process_multiple_directories_lower_audio(
-    directory_names = [ os.getcwd( ), ], min_audio_bit_rate = 256,
-        output_json_file = 'processed_audio_stuff.json', new_audio_bit_rate = 160 ):
+def _order_fnames( fnames_dict, ordering, qual, output_json_file, file_stats = None ):
+    from howdy_grabbag.utils.estimator import get_default_journal_files
+    #
+    ## the savings ordering learns from the journals of past runs, which sit next to this run's journal
+    return order_files_to_process(
+        fnames_dict, ordering = ordering, file_stats = file_stats, quality = qual,
+        journal_files = get_default_journal_files( os.path.dirname( os.path.abspath( output_json_file ) ) ) )
+
+def _get_fnames_to_process( output_json_file, resume, find_fnames ):
+    #
+    ## when resuming, take the files still pending from the journal instead of listing and probing everything again
+    if resume:
+        fnames = get_resume_paths( output_json_file )
+        if fnames is not None:
+            fnames = list(filter(os.path.isfile, fnames ) )
+            remove_orphaned_temp_files( fnames )
+            return fnames, True
+    return find_fnames( ), False
+
+def _transcode_job( filename, newfile, transcode_func ):
+    from howdy_grabbag.utils.estimator import probe_source_features
+    #
+    ## the sizes, encoder speed, and source features that go into the journal, from which the estimator learns
+    size_before = os.stat( filename ).st_size
+    source = probe_source_features( filename )
+    try: fps = transcode_func( filename, newfile )
+    except Exception:
+        if os.path.isfile( newfile ): os.remove( newfile )
+        raise
+    os.chmod(newfile, 0o644 )
+    return {
+        'size before' : size_before, 'size after' : os.stat( newfile ).st_size, 'fps' : fps,
+        'source' : source, 'quality' : None }
+
+def commit_if_smaller( filename, newfile, target = None ):
+    """
+    Replaces a file with its transcoded output, but only if the output is smaller. Otherwise the output is thrown away, and the original stays.
+
+    :param str filename: the original file.
+    :param str newfile: the staged transcoded output, from :py:meth:`get_staging_file <howdy_grabbag.utils.staging.get_staging_file>`.
+    :param str target: the file that the output replaces or creates. Default is ``filename``. If different, then ``filename`` is removed once the output is committed.
+    :returns: a ``( copy_time, output, kept_original )`` tuple: the seconds spent committing the output, the file that stays, and whether that is the original.
+    :rtype: tuple
+    """
+    if target is None: target = filename
+    if os.stat( newfile ).st_size >= os.stat( filename ).st_size:
+        logging.info( 'TRANSCODED %s IS NO SMALLER. KEEPING THE ORIGINAL.' % filename )
+        os.remove( newfile )
+        return 0.0, filename, True
+    copy_time = commit_staged_file( newfile, target )
+    if os.path.abspath( target ) != os.path.abspath( filename ): os.remove( filename )
+    return copy_time, target, False
+
+def record_no_retry( filename, size_before, size_after, qual ):
+    """
+    Records in the :py:class:`DehydrateManifest <howdy_grabbag.utils.manifest.DehydrateManifest>` that a file is not worth transcoding again at ``qual``, or at a lower ``qual`` number, if its transcode did not save at least :py:data:`MIN_SAVINGS_FRACTION <howdy_grabbag.utils.manifest.MIN_SAVINGS_FRACTION>` of its size.
+
+    :param str filename: the file that stays after the transcode.
+    :param int size_before: the size, in bytes, of the original.
+    :param int size_after: the size, in bytes, of the transcoded output.
+    :param int qual: the x265 quality of the transcode.
+    :returns: whether the file was recorded as not worth transcoding again.
+    :rtype: bool
+    """
+    if size_after < size_before * ( 1 - MIN_SAVINGS_FRACTION ): return False
+    manifest = get_dehydrate_manifest( )
+    if manifest is None: return False
+    try: manifest.record_no_retry( filename, qual )
+    except Exception as e:
+        logging.debug( 'COULD NOT RECORD %s AS NOT WORTH TRANSCODING AGAIN. ERROR MESSAGE = %s.' % ( filename, str( e ) ) )
+        return False
+    logging.info( 'TRANSCODING %s AT QUALITY %d SAVED %0.1f%%. WILL NOT TRY AGAIN AT QUALITY <= %d.' % (
+        filename, qual, 100 * ( 1 - size_after / size_before ), qual ) )
+    return True
+
+def _commit_dehydrated( result, filename, newfile, target, qual ):
+    result[ 'quality' ] = qual
+    result[ 'copy time' ], result[ 'output' ], result[ 'kept original' ] = commit_if_smaller(
+        filename, newfile, target = target )
+    return result
+
+def _dehydrate_job( filename, cores = None, qual = 28, audio_bit_string = '160' ):
+    newfile = get_staging_file( filename )
+    result = _transcode_job( filename, newfile, lambda filename, newfile: process_single_filename_hcli(
+        filename, newfile, qual = qual, audio_bit_string = audio_bit_string, cores = cores ) )
+    return _commit_dehydrated( result, filename, newfile, filename, qual )
+
+def _dehydrate_job_AVI( filename, cores = None, qual = 22, audio_bit_string = '160' ):
+    replacfile = os.path.join(
+        os.path.dirname( filename ), '.'.join( os.path.basename( filename ).split('.')[:-1] + [ 'mkv', ] ) )
+    newfile = get_staging_file( filename, target = replacfile, suffix = 'mkv' )
+    result = _transcode_job( filename, newfile, lambda filename, newfile: process_single_filename_hcli(
+        filename, newfile, qual = qual, audio_bit_string = audio_bit_string, cores = cores ) )
+    return _commit_dehydrated( result, filename, newfile, replacfile, qual )
+
+def _lower_audio_job( filename, cores = None, new_audio_bit_rate = 160 ):
+    newfile = get_staging_file( filename )
+    result = _transcode_job( filename, newfile, lambda filename, newfile: process_single_filename_lower_audio(
+        filename, newfile, new_audio_bit_rate, cores = cores ) )
+    result[ 'copy time' ] = commit_staged_file( newfile, filename )
+    result[ 'output' ] = filename
+    return result
+
+def _record_transcoded( result, mode, transcoded_mode, detail ):
     #
-    assert( os.path.basename( output_json_file ).endswith( '.json' ) )
-    fnames_dict = dict(
-        filter(lambda entry: entry[1][ 'audio_bit_rate_kbps' ] > min_audio_bit_rate,
-               find_files_to_process(
-                   get_fnames_from_directories( directory_names ),
-                   do_hevc = True, min_bitrate = 0 ).items( ) ) )
+    ## an original kept in place is still in the format of this mode, not of the transcoded outputs
+    kept_original = result.get( 'kept original', False )
+    _record_decision(
+        result[ 'output' ], MANIFEST_DECISION.TRANSCODED,
+        mode if kept_original else transcoded_mode, detail = detail )
+    if result[ 'quality' ] is not None:
+        record_no_retry( result[ 'output' ], result[ 'size before' ], result[ 'size after' ], result[ 'quality' ] )
+
+def _run_transcode_jobs(
+        fnames, job_func, journal, mode = 'dehydrate', transcoded_mode = None,
+        detail = '', num_jobs = 1, threads_per_job = None ):
     #
+    ## run up to num_jobs transcodes at once, each pinned to its own cores. Only this thread writes to the journal and manifest.
+    if transcoded_mode is None: transcoded_mode = mode
+    core_sets = get_job_core_sets( num_jobs, threads_per_job )
+    if core_sets is not None:
+        logging.info( 'running %d jobs at once, each on %d cores.' % ( num_jobs, len( core_sets[ 0 ] ) ) )
     time00 = time.perf_counter( )
-    list_processed = [ 'found %02d files in %s with audio sizes > %d kbps. Will lower audio bit rate to %d kbps.' % (
-        len( fnames_dict ), list(map(os.path.abspath, directory_names ) ), min_audio_bit_rate, new_audio_bit_rate ), ]
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    for idx, filename in enumerate(sorted( fnames_dict ) ):
-        time0 = time.perf_counter( )
-        newfile = '%s-%s' % ( str( uuid.uuid4( ) ).split('-')[0].strip( ), os.path.basename( filename ).replace(":", "-" ) )
-        #
-        process_single_filename_lower_audio( filename, newfile, new_audio_bit_rate )
-        #
-        os.chmod(newfile, 0o644 )
-        shutil.move( newfile, filename )
-        dt0 = time.perf_counter( ) - time0
+    num_done = 0
+    for idx, filename, result, error, dt0 in iter_transcode_jobs(
+            fnames, job_func, num_jobs = num_jobs, core_sets = core_sets ):
+        num_done += 1
+        if isinstance( error, subprocess.CalledProcessError ):
+            logging.error( 'FAILED TO PROCESS %s. ERROR MESSAGE = %s.' % ( filename, str( error ) ) )
+            _record_decision( filename, MANIFEST_DECISION.FAILED, mode, detail = str( error ) )
+            journal.record_file(
+                filename, 'failed', encode_time = dt0, error = str( error ),
+                message = 'failed to process file %02d / %02d (%d done)' % (
+                    idx + 1, len( fnames ), num_done ) )
+            continue
+        if error is not None: raise error
+        _record_transcoded( result, mode, transcoded_mode, detail )
         logging.info( 'processed file %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( fnames_dict ), dt0 ) )
-        list_processed.append( 'processed file %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( fnames_dict ), dt0 ) )
-        json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
+            idx + 1, len( fnames ), dt0 ) )
+        journal.record_file(
+            filename, 'done', size_before = result[ 'size before' ], size_after = result[ 'size after' ],
+            encode_time = dt0, fps = result[ 'fps' ], copy_time = result[ 'copy time' ], output = result[ 'output' ],
+            source = result[ 'source' ], quality = result[ 'quality' ], mode = mode,
+            **{ 'kept original' : result.get( 'kept original', False ) },
+            message = 'processed file %02d / %02d in %0.3f seconds (%d done)' % (
+                idx + 1, len( fnames ), dt0, num_done ) )
+    remove_empty_staging_directories( fnames )
     dt00 = time.perf_counter( ) - time00
     logging.info( 'took %0.3f seconds to process %d files' % (
-        dt00, len( fnames_dict ) ) )
-    list_processed.append( 'took %0.3f seconds to process %d files' % (
-        dt00, len( fnames_dict ) ) )
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
+        dt00, len( fnames ) ) )
+    journal.finish( 'took %0.3f seconds to process %d files' % (
+        dt00, len( fnames ) ) )
+
+def process_multiple_directories(
+        directory_names = [ os.getcwd( ), ], do_hevc = True, min_bitrate = 2_000,
+        qual = 28, output_json_file = 'processed_stuff.jsonl', audio_bit_string = '160',
+        recursive = False, max_depth = None, incremental = False, num_jobs = 1,
+        threads_per_job = None, resume = False, ordering = DEFAULT_ORDERING ):
+    assert( os.path.basename( output_json_file ).endswith( '.jsonl' ) )
+    def _find_fnames( ):
+        fnames_dict, file_stats = find_files_to_process_directories(
+            directory_names,
+            do_hevc = do_hevc,
+            min_bitrate = min_bitrate,
+            recursive = recursive, max_depth = max_depth,
+            incremental = incremental, qual = qual )
+        return _order_fnames( fnames_dict, ordering, qual, output_json_file, file_stats = file_stats )
+    fnames, do_append = _get_fnames_to_process( output_json_file, resume, _find_fnames )
+    with ProgressJournal( output_json_file, append = do_append ) as journal:
+        journal.start( fnames, 'found %02d files to dehydrate in %s.' % (
+            len( fnames ), list(map(os.path.abspath, directory_names ) ) ) )
+        _run_transcode_jobs(
+            fnames,
+            lambda filename, cores: _dehydrate_job( filename, cores = cores, qual = qual, audio_bit_string = audio_bit_string ),
+            journal, mode = 'dehydrate', detail = 'quality = %d' % qual,
+            num_jobs = num_jobs, threads_per_job = threads_per_job )
+
+def process_multiple_directories_lower_audio(
+    directory_names = [ os.getcwd( ), ], min_audio_bit_rate = 256,
+        output_json_file = 'processed_audio_stuff.jsonl', new_audio_bit_rate = 160,
+        recursive = False, max_depth = None, incremental = False, num_jobs = 1,
+        threads_per_job = None, resume = False ):
+    #
+    assert( os.path.basename( output_json_file ).endswith( '.jsonl' ) )
+    def _find_fnames( ):
+        file_stats = get_fnames_from_directories(
+            directory_names, recursive = recursive, max_depth = max_depth )
+        return sorted( _find_files_in_directories(
+            file_stats,
+            lambda fnames, probe_failures: dict(
+                filter(lambda entry: entry[1].audio_bit_rate_kbps > min_audio_bit_rate,
+                       find_files_to_process(
+                           fnames, do_hevc = True, min_bitrate = 0,
+                           file_stats = file_stats, probe_failures = probe_failures ).items( ) ) ),
+            'lower_audio', 'min_audio_bit_rate=%d' % min_audio_bit_rate, incremental ) )
+    #
+    fnames, do_append = _get_fnames_to_process( output_json_file, resume, _find_fnames )
+    with ProgressJournal( output_json_file, append = do_append ) as journal:
+        journal.start( fnames, 'found %02d files in %s with audio sizes > %d kbps. Will lower audio bit rate to %d kbps.' % (
+            len( fnames ), list(map(os.path.abspath, directory_names ) ), min_audio_bit_rate, new_audio_bit_rate ) )
+        _run_transcode_jobs(
+            fnames,
+            lambda filename, cores: _lower_audio_job( filename, cores = cores, new_audio_bit_rate = new_audio_bit_rate ),
+            journal, mode = 'lower_audio', detail = 'audio bit rate = %d kbps' % new_audio_bit_rate,
+            num_jobs = num_jobs, threads_per_job = threads_per_job )
     
 def process_multiple_directories_AVI(
     directory_names = [ os.getcwd( ), ],
     qual = 22,
-    output_json_file = 'processed_stuff.json',
+    output_json_file = 'processed_stuff.jsonl',
     audio_bit_string = '160',
+    recursive = False,
+    max_depth = None,
+    incremental = False,
+    num_jobs = 1,
+    threads_per_job = None,
+    resume = False,
+    ordering = DEFAULT_ORDERING,
 ):
-    assert( os.path.basename( output_json_file ).endswith( '.json' ) )
-    fnames_dict = find_files_to_process_AVI(
-        get_fnames_from_directories_AVI( directory_names ) )
-    time00 = time.perf_counter( )
-    list_processed = [ 'found %02d files to dehydrate in %s.' % (
-        len( fnames_dict ), list(map(os.path.abspath, directory_names ) ) ), ]
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    for idx, filename in enumerate(sorted( fnames_dict ) ):
-        time0 = time.perf_counter( )
-        directory_name = os.path.dirname( filename )
-        replacfile = os.path.join(
-            directory_name, os.path.basename( filename ).replace('.avi', '.mkv' ) )
-        newfile = '.'.join(
-            os.path.basename( filename ).replace(":", "-").split('.')[:-1] + [ 'mkv', ] )
-        newfile = '%s-%s' % ( str( uuid.uuid4( ) ).split('-')[0].strip( ), newfile )
-        #
-        process_single_filename_hcli(
-            filename, newfile, qual = qual, audio_bit_string = audio_bit_string )
+    assert( os.path.basename( output_json_file ).endswith( '.jsonl' ) )
+    def _find_fnames( ):
+        fnames_dict, file_stats = find_files_to_process_directories_AVI(
+            directory_names, recursive = recursive, max_depth = max_depth,
+            incremental = incremental, qual = qual )
+        return _order_fnames( fnames_dict, ordering, qual, output_json_file, file_stats = file_stats )
+    fnames, do_append = _get_fnames_to_process( output_json_file, resume, _find_fnames )
+    with ProgressJournal( output_json_file, append = do_append ) as journal:
+        journal.start( fnames, 'found %02d files to dehydrate in %s.' % (
+            len( fnames ), list(map(os.path.abspath, directory_names ) ) ) )
         #
-        os.chmod(newfile, 0o644 )
-        os.rename( newfile, replacfile )
-        os.remove( filename )
-        dt0 = time.perf_counter( ) - time0
-        logging.info( 'processed file %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( fnames_dict ), dt0 ) )
-        list_processed.append( 'processed file %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( fnames_dict ), dt0 ) )
-        json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    dt00 = time.perf_counter( ) - time00
-    logging.info( 'took %0.3f seconds to process %d files' % (
-        dt00, len( fnames_dict ) ) )
-    list_processed.append( 'took %0.3f seconds to process %d files' % (
-        dt00, len( fnames_dict ) ) )
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
+        ## the new MKV files are already dehydrated, so a later run need not look at them again
+        _run_transcode_jobs(
+            fnames,
+            lambda filename, cores: _dehydrate_job_AVI( filename, cores = cores, qual = qual, audio_bit_string = audio_bit_string ),
+            journal, mode = 'dehydrate_avi', transcoded_mode = 'dehydrate',
+            detail = 'quality = %d' % qual,
+            num_jobs = num_jobs, threads_per_job = threads_per_job )
 
 def process_multiple_files(
-    file_names, qual = 28, output_json_file = 'processed_stuff.json',
-    audio_bit_string = '160',
+    file_names, qual = 28, output_json_file = 'processed_stuff.jsonl',
+    audio_bit_string = '160', num_jobs = 1, threads_per_job = None, resume = False,
+    ordering = DEFAULT_ORDERING,
 ):
     #
-    assert( os.path.basename( output_json_file ).endswith( '.json' ) )
-    act_file_names = sorted(filter(os.path.isfile,
-                                   set(map(os.path.realpath, file_names))))
-    time00 = time.perf_counter( )
-    list_processed = [ 'found %02d files to dehydrate.' % ( len( act_file_names ) ), ]
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    for idx, filename in enumerate( act_file_names ):
-        time0 = time.perf_counter( )
-        newfile = '%s-%s' % ( str( uuid.uuid4( ) ).split('-')[0].strip( ), os.path.basename( filename ).replace(":", "-" ) )
-        #
-        process_single_filename_hcli(
-            filename, newfile, qual = qual,
-            audio_bit_string = audio_bit_string )
-        #
-        os.chmod(newfile, 0o644 )
-        shutil.move( newfile, filename )
-        dt0 = time.perf_counter( ) - time0
-        logging.info( 'processed file %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( act_file_names ), dt0 ) )
-        list_processed.append( 'processed file %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( act_file_names ), dt0 ) )
-        json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    dt00 = time.perf_counter( ) - time00
-    logging.info( 'took %0.3f seconds to process %d files' % (
-        dt00, len( act_file_names ) ) )
-    list_processed.append( 'took %0.3f seconds to process %d files' % (
-        dt00, len( act_file_names ) ) )
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
+    assert( os.path.basename( output_json_file ).endswith( '.jsonl' ) )
+    act_file_names, do_append = _get_fnames_to_process(
+        output_json_file, resume, lambda: _order_fnames(
+            dict.fromkeys(filter(os.path.isfile, set(map(os.path.realpath, file_names)))),
+            ordering, qual, output_json_file ) )
+    with ProgressJournal( output_json_file, append = do_append ) as journal:
+        journal.start( act_file_names, 'found %02d files to dehydrate.' % ( len( act_file_names ) ) )
+        _run_transcode_jobs(
+            act_file_names,
+            lambda filename, cores: _dehydrate_job( filename, cores = cores, qual = qual, audio_bit_string = audio_bit_string ),
+            journal, mode = 'dehydrate', detail = 'quality = %d' % qual,
+            num_jobs = num_jobs, threads_per_job = threads_per_job )
 
 
 def process_multiple_files_AVI(
     file_names, qual = 28,
-    output_json_file = 'processed_stuff.json',
-    audio_bit_string = '160' ):
+    output_json_file = 'processed_stuff.jsonl',
+    audio_bit_string = '160', num_jobs = 1, threads_per_job = None, resume = False,
+    ordering = DEFAULT_ORDERING ):
     #
-    assert( os.path.basename( output_json_file ).endswith( '.json' ) )
-    act_file_names = sorted(filter(os.path.isfile,
-                                   set(map(os.path.realpath, file_names))))
-    time00 = time.perf_counter( )
-    list_processed = [ 'found %02d files to dehydrate.' % ( len( act_file_names ) ), ]
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    for idx, filename in enumerate( act_file_names ):
-        time0 = time.perf_counter( )
-        replacfile = os.path.join(
-            directory_name, os.path.basename( filename ).replace('.avi', '.mkv' ).replace( ".mpg", ".mkv" ) )
-        newfile = '.'.join(
-            os.path.basename( filename ).replace(":", "-").split('.')[:-1] + [ 'mkv', ] )
-        newfile = '%s-%s' % ( str( uuid.uuid4( ) ).split('-')[0].strip( ), newfile )
-        #
-        process_single_filename_hcli(
-            filename, newfile, qual = qual,
-            audio_bit_string = audio_bit_string )
-        #
-        os.chmod(newfile, 0o644 )
-        os.rename( newfile, replacfile )
-        os.remove( filename )
-        dt0 = time.perf_counter( ) - time0
-        logging.info( 'processed file %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( fnames_dict ), dt0 ) )
-        list_processed.append( 'processed file %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( fnames_dict ), dt0 ) )
-        json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    dt00 = time.perf_counter( ) - time00
-    logging.info( 'took %0.3f seconds to process %d files' % (
-        dt00, len( act_file_names ) ) )
-    list_processed.append( 'took %0.3f seconds to process %d files' % (
-        dt00, len( act_file_names ) ) )
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
+    assert( os.path.basename( output_json_file ).endswith( '.jsonl' ) )
+    act_file_names, do_append = _get_fnames_to_process(
+        output_json_file, resume, lambda: _order_fnames(
+            dict.fromkeys(filter(os.path.isfile, set(map(os.path.realpath, file_names)))),
+            ordering, qual, output_json_file ) )
+    with ProgressJournal( output_json_file, append = do_append ) as journal:
+        journal.start( act_file_names, 'found %02d files to dehydrate.' % ( len( act_file_names ) ) )
+        _run_transcode_jobs(
+            act_file_names,
+            lambda filename, cores: _dehydrate_job_AVI( filename, cores = cores, qual = qual, audio_bit_string = audio_bit_string ),
+            journal, mode = 'dehydrate_avi', transcoded_mode = 'dehydrate',
+            detail = 'quality = %d' % qual,
+            num_jobs = num_jobs, threads_per_job = threads_per_job )
 
 
 def process_multiple_files_lower_audio(
     file_names, min_audio_bit_rate = 256,
-    output_json_file = 'processed_audio_stuff.json', new_audio_bit_rate = 160 ):
+    output_json_file = 'processed_audio_stuff.jsonl', new_audio_bit_rate = 160, num_jobs = 1,
+    threads_per_job = None, resume = False ):
     #
-    assert( os.path.basename( output_json_file ).endswith( '.json' ) )
-    act_file_names = sorted(filter(
-        os.path.isfile, set(map(os.path.realpath, file_names))))
-    fnames_dict = dict(filter(lambda entry: entry[1][ 'audio_bit_rate_kbps' ] > min_audio_bit_rate, find_files_to_process(
-        act_file_names, do_hevc = True, min_bitrate = 0 ).items( ) ) )
-    time00 = time.perf_counter( )
-    list_processed = [ 'found %02d files with audio sizes > %d kbps. Will lower audio bit rate to %d kbps.' % (
-        len( fnames_dict ), min_audio_bit_rate, new_audio_bit_rate ), ]
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    for idx, filename in enumerate(sorted( fnames_dict ) ):
+    assert( os.path.basename( output_json_file ).endswith( '.jsonl' ) )
+    def _find_fnames( ):
+        act_file_names = sorted(filter(
+            os.path.isfile, set(map(os.path.realpath, file_names))))
+        return sorted(dict(filter(lambda entry: entry[1].audio_bit_rate_kbps > min_audio_bit_rate, find_files_to_process(
+            act_file_names, do_hevc = True, min_bitrate = 0 ).items( ) ) ) )
+    fnames, do_append = _get_fnames_to_process( output_json_file, resume, _find_fnames )
+    with ProgressJournal( output_json_file, append = do_append ) as journal:
+        journal.start( fnames, 'found %02d files with audio sizes > %d kbps. Will lower audio bit rate to %d kbps.' % (
+            len( fnames ), min_audio_bit_rate, new_audio_bit_rate ) )
+        _run_transcode_jobs(
+            fnames,
+            lambda filename, cores: _lower_audio_job( filename, cores = cores, new_audio_bit_rate = new_audio_bit_rate ),
+            journal, mode = 'lower_audio', detail = 'audio bit rate = %d kbps' % new_audio_bit_rate,
+            num_jobs = num_jobs, threads_per_job = threads_per_job )
+
+#
+## the transcodes that Redis queue workers know how to run
+_QUEUE_JOB_FUNCS = {
+    'dehydrate'     : ( _dehydrate_job,     'dehydrate' ),
+    'dehydrate_avi' : ( _dehydrate_job_AVI, 'dehydrate' ),
+    'lower_audio'   : ( _lower_audio_job,   'lower_audio' ) }
+
+def enqueue_files_to_process( queue, fnames, mode = 'dehydrate', **params ):
+    """
+    Puts files onto a Redis work queue, so that :py:meth:`run_dehydrate_queue_worker <howdy_grabbag.utils.dehydrate.run_dehydrate_queue_worker>` processes on one or more machines can transcode them.
+
+    :param queue: the :py:class:`TranscodeQueue <howdy_grabbag.utils.work_queue.TranscodeQueue>`.
+    :param fnames: the files to transcode, for instance the output of :py:meth:`find_files_to_process <howdy_grabbag.utils.dehydrate.find_files_to_process>`, or the ``paths`` of :py:meth:`get_all_durations_dataframe <howdy_grabbag.utils.dehydrate.get_all_durations_dataframe>`.
+    :param str mode: one of ``dehydrate``, ``dehydrate_avi``, or ``lower_audio``.
+    :param params: the keyword arguments of the transcode: ``qual`` and ``audio_bit_string`` when dehydrating, and ``new_audio_bit_rate`` when lowering the audio bit rate.
+    :returns: the :py:class:`list` of new job ids. Files already on the queue are skipped.
+    :rtype: list
+    """
+    assert( mode in _QUEUE_JOB_FUNCS )
+    return queue.enqueue_many( sorted( fnames ), mode = mode, params = params )
+
+def run_dehydrate_queue_worker( queue, num_jobs = 1, threads_per_job = None, poll_secs = 5 ):
+    """
+    Runs ``num_jobs`` queue workers at once on this machine, each pinned to its own cores, until the queue is empty.
+
+    :param queue: the :py:class:`TranscodeQueue <howdy_grabbag.utils.work_queue.TranscodeQueue>`.
+    :param int num_jobs: the number of concurrent transcodes.
+    :param int threads_per_job: the most threads that each transcode should use.
+    :param int poll_secs: the number of seconds each worker waits for a pending job before it stops.
+    :returns: the number of jobs run.
+    :rtype: int
+    """
+    def _job_func( job, cores ):
+        job_func, transcoded_mode = _QUEUE_JOB_FUNCS[ job[ 'mode' ] ]
+        filename = job[ 'filename' ]
         time0 = time.perf_counter( )
-        newfile = '%s-%s' % ( str( uuid.uuid4( ) ).split('-')[0].strip( ), os.path.basename( filename ).replace(":", "-" ) )
-        #
-        process_single_filename_lower_audio( filename, newfile, new_audio_bit_rate )
-        #
-        os.chmod(newfile, 0o644 )
-        shutil.move( newfile, filename )
-        dt0 = time.perf_counter( ) - time0
-        logging.info( 'processed file %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( fnames_dict ), dt0 ) )
-        list_processed.append( 'processed file %02d / %02d in %0.3f seconds' % (
-            idx + 1, len( fnames_dict ), dt0 ) )
-        json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
-    dt00 = time.perf_counter( ) - time00
-    logging.info( 'took %0.3f seconds to process %d files' % (
-        dt00, len( fnames_dict ) ) )
-    list_processed.append( 'took %0.3f seconds to process %d files' % (
-        dt00, len( fnames_dict ) ) )
-    json.dump( list_processed, open( output_json_file, 'w' ), indent = 1 )
+        try: result = job_func( filename, cores = cores, **job[ 'params' ] )
+        except subprocess.CalledProcessError as e:
+            _record_decision( filename, MANIFEST_DECISION.FAILED, job[ 'mode' ], detail = str( e ) )
+            raise
+        _record_transcoded( result, job[ 'mode' ], transcoded_mode, json.dumps( job[ 'params' ] ) )
+        result[ 'encode time' ] = time.perf_counter( ) - time0
+        return result
+    #
+    core_sets = get_job_core_sets( num_jobs, threads_per_job )
+    num_jobs_run = [ 0 ] * num_jobs
+    def _worker( slot ):
+        num_jobs_run[ slot ] = run_worker(
+            queue, _job_func, cores = core_sets[ slot ] if core_sets is not None else None,
+            poll_secs = poll_secs )
+    workers = list(map(lambda slot: threading.Thread( target = _worker, args = ( slot, ) ), range( num_jobs ) ) )
+    for worker in workers: worker.start( )
+    for worker in workers: worker.join( )
+    return sum( num_jobs_run )
@@ -0,0 +1,67 @@
+"""
+A streaming directory scanner built on :py:meth:`os.scandir`. Each directory is read exactly once, file names are matched against a set of suffixes, and the :py:class:`os.stat_result` of each matching file is kept, so that the probe cache and size calculations downstream do not stat the file again.
+"""
+import os, logging
+
+#
+## suffixes of the media files to dehydrate, and of the older media files (AVI, WMV, MPEG) to dehydrate at higher quality
+VIDEO_SUFFIXES = frozenset([ 'mp4', 'mkv', 'webm', 'm4v' ])
+AVI_SUFFIXES   = frozenset([ 'avi', 'wmv', 'mpg' ])
+
+def iter_media_entries( directory_names, suffixes = VIDEO_SUFFIXES, recursive = False, max_depth = None ):
+    """
+    Walks through directories, and yields the files whose suffixes are in ``suffixes``. Like :py:meth:`glob.glob`, hidden files and directories (names that start with ``.``) are skipped. Each directory is visited at most once, even when it is reachable from more than one of ``directory_names``.
+
+    :param directory_names: an iterable of directories to scan.
+    :param suffixes: the file suffixes, without the leading ``.``, to match. Default is :py:data:`VIDEO_SUFFIXES <howdy_grabbag.utils.dir_scanner.VIDEO_SUFFIXES>`.
+    :param bool recursive: if ``True``, then also scan subdirectories. Default is ``False``.
+    :param int max_depth: if ``recursive``, the maximum depth of subdirectories to scan, where ``0`` only scans ``directory_names``. Default is ``None``, with no limit.
+    :returns: a generator of :py:class:`os.DirEntry` of matching files.
+    """
+    assert( max_depth is None or max_depth >= 0 )
+    suffixes = frozenset( suffixes )
+    if not recursive: max_depth = 0
+    visited = set( )
+    stack = list(map(lambda dirname: ( os.path.abspath( os.path.expanduser( dirname ) ), 0 ),
+                     reversed( list( directory_names ) ) ) )
+    while len( stack ) > 0:
+        dirname, depth = stack.pop( )
+        realdir = os.path.realpath( dirname )
+        if realdir in visited: continue
+        visited.add( realdir )
+        subdirs = [ ]
+        try:
+            with os.scandir( dirname ) as entries:
+                for entry in entries:
+                    if entry.name.startswith( '.' ): continue
+                    try:
+                        if entry.is_dir( ):
+                            if max_depth is None or depth < max_depth:
+                                subdirs.append( entry.path )
+                            continue
+                        if not entry.is_file( ): continue
+                    except OSError: continue
+                    _, _, suffix = entry.name.rpartition( '.' )
+                    if suffix in suffixes: yield entry
+        except OSError as e:
+            logging.debug( 'PROBLEM SCANNING %s. ERROR MESSAGE = %s.' % ( dirname, str( e ) ) )
+            continue
+        stack.extend(map(lambda subdir: ( subdir, depth + 1 ), sorted( subdirs, reverse = True ) ) )
+
+def get_file_stats_from_directories(
+        directory_names, suffixes = VIDEO_SUFFIXES, recursive = False, max_depth = None ):
+    """
+    :param directory_names: an iterable of directories to scan.
+    :param suffixes: the file suffixes, without the leading ``.``, to match. Default is :py:data:`VIDEO_SUFFIXES <howdy_grabbag.utils.dir_scanner.VIDEO_SUFFIXES>`.
+    :param bool recursive: if ``True``, then also scan subdirectories.
+    :param int max_depth: if ``recursive``, the maximum depth of subdirectories to scan.
+    :returns: a :py:class:`dict` of file name to its :py:class:`os.stat_result`, in sorted order of file name. See :py:meth:`iter_media_entries <howdy_grabbag.utils.dir_scanner.iter_media_entries>`.
+    :rtype: dict
+    """
+    file_stats = { }
+    for entry in iter_media_entries(
+            directory_names, suffixes = suffixes, recursive = recursive, max_depth = max_depth ):
+        try: file_stats[ entry.path ] = entry.stat( )
+        except OSError as e:
+            logging.debug( 'PROBLEM WITH %s. ERROR MESSAGE = %s.' % ( entry.path, str( e ) ) )
+    return dict(map(lambda fname: ( fname, file_stats[ fname ] ), sorted( file_stats ) ) )
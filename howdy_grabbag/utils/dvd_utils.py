@@ -1,6 +1,6 @@
 import os, sys, glob, subprocess, logging, time, json, re, datetime
 from shutil import which
-from howdy_grabbag import hcli_exec
+from howdy_grabbag import get_exec
 
 def _get_dvd_chapter_infos_from_stdout( 
     stdout_val_line_split, min_duration_mins = 19 ):
@@ -36,7 +36,7 @@ def _get_dvd_chapter_infos_from_stdout(
 
 def _get_stdout_val_line_split( video_ts_dir ):
     stdout_val = subprocess.check_output(
-        [ hcli_exec, '-i', video_ts_dir, '-t', '0' ],
+        [ get_exec( 'HandBrakeCLI' ), '-i', video_ts_dir, '-t', '0' ],
         stderr = subprocess.STDOUT )
     stdout_val_line_split = list(
         map(lambda line: line.strip( ),
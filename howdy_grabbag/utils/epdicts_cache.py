@@ -0,0 +1,141 @@
+"""
+A persistent, on-disk cache of the TMDB_ episode dictionaries that :py:meth:`get_tot_epdict_tmdb <howdy.tv.tv_attic.get_tot_epdict_tmdb>` returns, stored in a SQLite database under :py:meth:`get_config_directory <howdy_grabbag.get_config_directory>`, so that renaming or converting a season one file at a time looks up the series on TMDB_ once rather than once per file.
+
+Each entry is keyed by the show name, the year in which its first episode aired, and the other keyword arguments of the lookup. An entry expires after a time to live, since new episodes and corrected episode names show up on TMDB_. Entries hold the episode dictionary pickled as is, because its keys are integers and its values tuples of episode names and air dates, which JSON does not round-trip.
+
+.. _TMDB: https://www.themoviedb.org
+"""
+import os, sqlite3, json, time, pickle, logging, threading
+from howdy_grabbag import get_config_directory
+
+_DEFAULT_TTL_SECS = 3 * 86_400
+
+_epdicts_cache_refresh = False
+_refreshed_keys = set( )
+_epdicts_cache = None
+
+class EpdictsCache( object ):
+    """
+    A time-to-live cache of TMDB_ episode dictionaries, keyed by ``( show, first aired year, keyword arguments )``.
+
+    :param str dbfile: the SQLite database file. Default is ``epdicts_cache.db`` in the ``howdy_grabbag`` configuration directory.
+    :param float ttl_secs: the number of seconds after which an entry expires. Default is 3 days.
+    """
+    def __init__( self, dbfile = None, ttl_secs = _DEFAULT_TTL_SECS ):
+        assert( ttl_secs > 0 )
+        if dbfile is None:
+            dbfile = os.path.join( get_config_directory( ), 'epdicts_cache.db' )
+        self.dbfile = os.path.realpath( os.path.expanduser( dbfile ) )
+        self.ttl_secs = ttl_secs
+        self._local = threading.local( )
+
+    def _get_connection( self ):
+        #
+        ## one connection per process and per thread
+        conn = getattr( self._local, 'conn', None )
+        if conn is not None and self._local.pid == os.getpid( ):
+            return conn
+        conn = sqlite3.connect( self.dbfile, timeout = 60 )
+        conn.execute( 'PRAGMA journal_mode=WAL' )
+        conn.execute( ' '.join([
+            'CREATE TABLE IF NOT EXISTS epdicts (',
+            'show TEXT NOT NULL, first_aired_year INTEGER NOT NULL, kwargs TEXT NOT NULL,',
+            'data BLOB NOT NULL, stored REAL NOT NULL,',
+            'PRIMARY KEY ( show, first_aired_year, kwargs ) )' ]) )
+        conn.commit( )
+        self._local.conn = conn
+        self._local.pid  = os.getpid( )
+        return conn
+
+    @classmethod
+    def get_key( cls, showname, firstAiredYear = None, **kwargs ):
+        """
+        :param str showname: the name of the TV show.
+        :param int firstAiredYear: optional year in which the first episode of the TV show aired.
+        :param kwargs: the other keyword arguments of the lookup, for instance ``showSpecials = True``.
+        :returns: the ``( show, first aired year, keyword arguments )`` cache key. The show name is case folded, a missing year is 0, and the keyword arguments are sorted JSON.
+        :rtype: tuple
+        """
+        return ( showname.strip( ).casefold( ), firstAiredYear if firstAiredYear is not None else 0,
+                 json.dumps( kwargs, sort_keys = True ) )
+
+    def lookup( self, key ):
+        """
+        :param tuple key: the cache key from :py:meth:`get_key <howdy_grabbag.utils.epdicts_cache.EpdictsCache.get_key>`.
+        :returns: the cached episode dictionary, or ``None`` if there is no entry or it has expired.
+        :rtype: dict
+        """
+        row = self._get_connection( ).execute(
+            'SELECT data, stored FROM epdicts WHERE show = ? AND first_aired_year = ? AND kwargs = ?', key ).fetchone( )
+        if row is None: return None
+        if time.time( ) - row[1] > self.ttl_secs: return None
+        return pickle.loads( row[0] )
+
+    def store( self, key, epdicts ):
+        """
+        :param tuple key: the cache key from :py:meth:`get_key <howdy_grabbag.utils.epdicts_cache.EpdictsCache.get_key>`.
+        :param dict epdicts: the episode dictionary to store.
+        """
+        conn = self._get_connection( )
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO epdicts VALUES ( ?, ?, ?, ?, ? )',
+                key + ( pickle.dumps( epdicts ), time.time( ) ) )
+
+def set_epdicts_cache_refresh( refresh = False ):
+    """
+    Globally makes the next lookup of each show go to TMDB_ rather than to the cache, for instance from a ``--refresh`` command line flag. Later lookups of the same show, in the same process, use the refreshed entry.
+
+    :param bool refresh: whether to refresh the cached episode dictionaries.
+    """
+    global _epdicts_cache_refresh
+    _epdicts_cache_refresh = refresh
+    _refreshed_keys.clear( )
+
+def get_epdicts_cache( ):
+    """
+    :returns: the process-wide :py:class:`EpdictsCache <howdy_grabbag.utils.epdicts_cache.EpdictsCache>`, or ``None`` if it cannot be opened.
+    """
+    global _epdicts_cache
+    if _epdicts_cache is None:
+        try:
+            cache = EpdictsCache( )
+            cache._get_connection( )
+            _epdicts_cache = cache
+        except Exception as e:
+            logging.debug( 'COULD NOT OPEN EPISODES CACHE. ERROR MESSAGE = %s.' % str( e ) )
+            return None
+    return _epdicts_cache
+
+def get_tot_epdict_tmdb_cached( showname, firstAiredYear = None, **kwargs ):
+    """
+    A drop-in replacement for :py:meth:`get_tot_epdict_tmdb <howdy.tv.tv_attic.get_tot_epdict_tmdb>` that first looks in the :py:class:`episodes cache <howdy_grabbag.utils.epdicts_cache.EpdictsCache>`. Failed lookups are not cached.
+
+    :param str showname: the name of the TV show.
+    :param int firstAiredYear: optional year in which the first episode of the TV show aired.
+    :param kwargs: the other keyword arguments of :py:meth:`get_tot_epdict_tmdb <howdy.tv.tv_attic.get_tot_epdict_tmdb>`, for instance ``showSpecials = True``.
+    :returns: the episode dictionary, of season number to episode number to ``( episode name, air date )``, or ``None`` if the show could not be found.
+    :rtype: dict
+    """
+    cache = get_epdicts_cache( )
+    key = EpdictsCache.get_key( showname, firstAiredYear = firstAiredYear, **kwargs )
+    do_refresh = _epdicts_cache_refresh and key not in _refreshed_keys
+    if cache is not None and not do_refresh:
+        try:
+            epdicts = cache.lookup( key )
+            if epdicts is not None: return epdicts
+        except Exception as e:
+            logging.debug( 'EPISODES CACHE LOOKUP FAILED FOR %s. ERROR MESSAGE = %s.' % ( showname, str( e ) ) )
+    #
+    time0 = time.perf_counter( )
+    from howdy.tv import tv_attic
+    epdicts = tv_attic.get_tot_epdict_tmdb( showname, firstAiredYear = firstAiredYear, **kwargs )
+    logging.info( 'took %0.3f seconds to look up the episodes of %s on TMDB.' % (
+        time.perf_counter( ) - time0, showname ) )
+    if epdicts is None: return None
+    _refreshed_keys.add( key )
+    if cache is not None:
+        try: cache.store( key, epdicts )
+        except Exception as e:
+            logging.debug( 'EPISODES CACHE STORE FAILED FOR %s. ERROR MESSAGE = %s.' % ( showname, str( e ) ) )
+    return epdicts
@@ -0,0 +1,242 @@
+"""
+Estimates how many bytes dehydrating a file will save, and how long its encode will take, so that one can plan which files to dehydrate in the time at hand.
+
+The estimates are learned from past encodes in the progress journals (see :py:mod:`journal <howdy_grabbag.utils.journal>`). Each journaled encode records its source's video codec, resolution, bit rate, and duration, along with the quality of the encode, the size before and after, and the encode time. From these the :py:class:`DehydrateEstimator <howdy_grabbag.utils.estimator.DehydrateEstimator>` learns the median output/input size ratio, and the median encode speed, for each combination of source codec, resolution, bit rate class, and quality. Encode speed is measured in seconds of media encoded per second of wall-clock time, which, unlike frames per second, does not need the source's frame rate to turn into an encode time.
+
+With too few past encodes for a combination, the estimator falls back to coarser combinations, and then to rough built-in defaults.
+"""
+import os, glob, logging, numpy, pandas
+from howdy_grabbag.utils.journal import read_journal
+from howdy_grabbag.utils.media_info import get_media_info
+
+#
+## rough output/input size ratios of x265 quality 28 encodes by source video codec, and encode speeds by resolution, before there is any history
+_DEFAULT_SIZE_RATIOS = {
+    'hevc'       : 0.85,
+    'h264'       : 0.50,
+    'vc1'        : 0.45,
+    'mpeg4'      : 0.40,
+    'msmpeg4v3'  : 0.40,
+    'mpeg2video' : 0.35 }
+_DEFAULT_SIZE_RATIO = 0.50
+_DEFAULT_SPEEDS = {
+    'SD'    : 6.0,
+    '720p'  : 3.0,
+    '1080p' : 1.5,
+    '2160p' : 0.4 }
+_DEFAULT_QUALITY = 28
+
+_BITRATE_EDGES = ( 1_000, 2_000, 4_000, 8_000 )
+_BITRATE_CLASSES = ( '<1000', '1000-2000', '2000-4000', '4000-8000', '>=8000' )
+
+#
+## from the finest to the coarsest combination of source features. Size ratios depend mostly on the source codec, and encode speeds on resolution, so neither falls back past those
+_SIZE_GROUPINGS = (
+    ( 'video codec', 'resolution', 'bitrate class', 'quality' ),
+    ( 'video codec', 'resolution', 'quality' ),
+    ( 'video codec', 'quality' ), )
+_SPEED_GROUPINGS = (
+    ( 'video codec', 'resolution', 'bitrate class', 'quality' ),
+    ( 'video codec', 'resolution', 'quality' ),
+    ( 'resolution', 'quality' ),
+    ( 'resolution', ) )
+
+def get_resolution_class( height ):
+    """
+    :param int height: the height of a video stream, in pixels.
+    :returns: ``SD``, ``720p``, ``1080p``, or ``2160p``, or ``None`` if ``height`` is ``None``.
+    :rtype: str
+    """
+    if height is None: return None
+    if height <= 576: return 'SD'
+    if height <= 720: return '720p'
+    if height <= 1080: return '1080p'
+    return '2160p'
+
+def get_bitrate_class( bit_rate_kbps ):
+    """
+    :param float bit_rate_kbps: a total bit rate in kbps.
+    :returns: the bit rate class, for example ``2000-4000``, or ``None`` if ``bit_rate_kbps`` is ``None``.
+    :rtype: str
+    """
+    if bit_rate_kbps is None: return None
+    return _BITRATE_CLASSES[ int( numpy.digitize( bit_rate_kbps, _BITRATE_EDGES ) ) ]
+
+def get_source_features( info ):
+    """
+    :param info: the :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>` of a file about to be encoded.
+    :returns: the JSON-serializable :py:class:`dict` of the source features that a journal records with each encode, or ``None`` if ``info`` is ``None``.
+    :rtype: dict
+    """
+    if info is None: return None
+    return {
+        'video codec'   : info.video_codec,
+        'width'         : info.width,
+        'height'        : info.height,
+        'bit rate kbps' : info.bit_rate_kbps,
+        'duration'      : info.duration }
+
+def probe_source_features( filename ):
+    """
+    :param str filename: a file about to be encoded.
+    :returns: its :py:meth:`source features <howdy_grabbag.utils.estimator.get_source_features>`, from the probe cache if possible, or ``None`` if it could not be probed.
+    :rtype: dict
+    """
+    try: return get_source_features( get_media_info( filename ) )
+    except Exception as e:
+        logging.debug( 'COULD NOT PROBE %s. ERROR MESSAGE = %s.' % ( filename, str( e ) ) )
+        return None
+
+def get_default_journal_files( directory = None ):
+    """
+    :param str directory: the directory in which to look for progress journals. Default is the current directory.
+    :returns: the sorted :py:class:`list` of the ``.jsonl`` progress journals in ``directory``.
+    :rtype: list
+    """
+    if directory is None: directory = os.getcwd( )
+    return sorted( glob.glob( os.path.join( directory, '*.jsonl' ) ) )
+
+def get_encode_history( journal_files ):
+    """
+    :param journal_files: the progress journals of past runs.
+    :returns: a :py:class:`DataFrame <pandas.DataFrame>` of the finished encodes in the journals whose source features were recorded, with columns ``video codec``, ``resolution``, ``bitrate class``, ``quality``, ``size ratio``, ``speed``, and ``fps``.
+    :rtype: pandas.DataFrame
+    """
+    columns = ( 'video codec', 'resolution', 'bitrate class', 'quality', 'size ratio', 'speed', 'fps' )
+    rows = [ ]
+    for journal_file in journal_files:
+        if not os.path.isfile( journal_file ): continue
+        for record in read_journal( journal_file ):
+            if record.get( 'event' ) != 'file' or record.get( 'status' ) != 'done': continue
+            source = record.get( 'source' )
+            if source is None or record.get( 'quality' ) is None: continue
+            if not record.get( 'size before' ) or not record.get( 'size after' ): continue
+            if not record.get( 'encode time' ) or not source.get( 'duration' ): continue
+            rows.append( (
+                ( source[ 'video codec' ] or '' ).lower( ),
+                get_resolution_class( source[ 'height' ] ),
+                get_bitrate_class( source[ 'bit rate kbps' ] ),
+                record[ 'quality' ],
+                record[ 'size after' ] / record[ 'size before' ],
+                source[ 'duration' ] / record[ 'encode time' ],
+                record.get( 'fps' ) ) )
+    return pandas.DataFrame( rows, columns = columns )
+
+def get_candidates_dataframe( fnames_dict, file_stats ):
+    """
+    :param dict fnames_dict: the :py:class:`dict` of file to its :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>`, or ``None`` if it could not be probed, for instance the output of :py:meth:`find_files_to_process <howdy_grabbag.utils.dehydrate.find_files_to_process>`.
+    :param dict file_stats: the :py:class:`dict` of file to its :py:class:`os.stat_result`.
+    :returns: a :py:class:`DataFrame <pandas.DataFrame>` of the files, with the columns that :py:meth:`estimate_dataframe <howdy_grabbag.utils.estimator.DehydrateEstimator.estimate_dataframe>` needs.
+    :rtype: pandas.DataFrame
+    """
+    fnames = sorted( fnames_dict )
+    return pandas.DataFrame( {
+        'paths'          : fnames,
+        'sizes (MB)'     : list(map(lambda fname: file_stats[ fname ].st_size / 1024**2, fnames ) ),
+        'durations (s)'  : list(map(lambda fname: fnames_dict[ fname ].duration if fnames_dict[ fname ] is not None else None, fnames ) ),
+        'bitrate (kbps)' : list(map(lambda fname: fnames_dict[ fname ].bit_rate_kbps if fnames_dict[ fname ] is not None else None, fnames ) ),
+        'media info'     : list(map(lambda fname: fnames_dict[ fname ], fnames ) ) } )
+
+class DehydrateEstimator( object ):
+    """
+    Estimates the output/input size ratio and encode speed of dehydrating a file, from the medians of past encodes of similar files.
+
+    :param df_history: the :py:class:`DataFrame <pandas.DataFrame>` of past encodes, the output of :py:meth:`get_encode_history <howdy_grabbag.utils.estimator.get_encode_history>`. If ``None``, then only use the built-in defaults.
+    :param int min_samples: the fewest past encodes of a combination of source features from which to estimate. Default is 3.
+    """
+    def __init__( self, df_history = None, min_samples = 3 ):
+        assert( min_samples >= 1 )
+        self.min_samples = min_samples
+        self.num_encodes = 0 if df_history is None else len( df_history )
+        #
+        ## median size ratio and speed of each combination with enough samples
+        self._medians = { }
+        if df_history is None or len( df_history ) == 0: return
+        for grouping in sorted( set( _SIZE_GROUPINGS + _SPEED_GROUPINGS ) ):
+            df_agg = df_history.groupby( list( grouping ) ).agg(
+                size_ratio = ( 'size ratio', 'median' ), speed = ( 'speed', 'median' ),
+                count = ( 'size ratio', 'size' ) )
+            df_agg = df_agg[ df_agg[ 'count' ] >= min_samples ]
+            self._medians[ grouping ] = dict(map(
+                lambda tup: ( tup[0] if isinstance( tup[0], tuple ) else ( tup[0], ), ( tup[1], tup[2] ) ),
+                zip( df_agg.index, df_agg.size_ratio, df_agg.speed ) ) )
+
+    @classmethod
+    def from_journals( cls, journal_files, min_samples = 3 ):
+        """
+        :param journal_files: the progress journals of past runs.
+        :param int min_samples: see :py:class:`DehydrateEstimator <howdy_grabbag.utils.estimator.DehydrateEstimator>`.
+        :returns: the :py:class:`DehydrateEstimator <howdy_grabbag.utils.estimator.DehydrateEstimator>` learned from ``journal_files``.
+        """
+        df_history = get_encode_history( journal_files )
+        logging.info( 'LEARNED FROM %d PAST ENCODES IN %s.' % ( len( df_history ), list( journal_files ) ) )
+        return cls( df_history, min_samples = min_samples )
+
+    def estimate( self, info, quality = _DEFAULT_QUALITY ):
+        """
+        :param info: the :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>` of the file to dehydrate.
+        :param int quality: the x265 quality of the encode.
+        :returns: a ``( size ratio, speed )`` tuple: the estimated output/input size ratio, and the estimated seconds of media encoded per second.
+        :rtype: tuple
+        """
+        features = {
+            'video codec'   : ( info.video_codec or '' ).lower( ),
+            'resolution'    : get_resolution_class( info.height ),
+            'bitrate class' : get_bitrate_class( info.bit_rate_kbps ),
+            'quality'       : quality }
+        def _get_median( groupings, which ):
+            for grouping in groupings:
+                medians = self._medians.get( grouping, { } ).get(
+                    tuple(map(lambda feature: features[ feature ], grouping ) ) )
+                if medians is not None: return medians[ which ]
+            return None
+        size_ratio = _get_median( _SIZE_GROUPINGS, 0 )
+        speed = _get_median( _SPEED_GROUPINGS, 1 )
+        #
+        ## x265 output roughly doubles in size for every 6 steps down in quality
+        if size_ratio is None:
+            size_ratio = min( 1.0, _DEFAULT_SIZE_RATIOS.get( features[ 'video codec' ], _DEFAULT_SIZE_RATIO ) *
+                              2**( ( _DEFAULT_QUALITY - quality ) / 6 ) )
+        if speed is None:
+            speed = _DEFAULT_SPEEDS.get( features[ 'resolution' ], _DEFAULT_SPEEDS[ '1080p' ] )
+        return size_ratio, speed
+
+    def estimate_dataframe( self, df, quality = _DEFAULT_QUALITY ):
+        """
+        :param df: a :py:class:`DataFrame <pandas.DataFrame>` of files to dehydrate, with columns ``sizes (MB)``, ``durations (s)``, and ``media info``, for instance from :py:meth:`get_candidates_dataframe <howdy_grabbag.utils.estimator.get_candidates_dataframe>`.
+        :param int quality: the x265 quality of the encodes.
+        :returns: a copy of ``df``, with the estimated ``saved (GB)``, ``encode hours``, and ``GB per hour`` of each file, sorted from the most to the least GB saved per encode hour.
+        :rtype: pandas.DataFrame
+        """
+        df_est = df.copy( )
+        estimates = list(map(lambda info: self.estimate( info, quality = quality ) if info is not None else ( 1.0, None ),
+                             df_est[ 'media info' ] ) )
+        durations = list(map(lambda tup: tup[1].duration if tup[1] is not None and tup[1].duration else tup[0],
+                             zip( df_est[ 'durations (s)' ], df_est[ 'media info' ] ) ) )
+        df_est[ 'saved (GB)' ] = list(map(lambda tup: tup[0] * ( 1 - tup[1][0] ) / 1024,
+                                          zip( df_est[ 'sizes (MB)' ], estimates ) ) )
+        df_est[ 'encode hours' ] = list(map(
+            lambda tup: tup[0] / tup[1][1] / 3_600 if tup[1][1] is not None and tup[0] else numpy.nan,
+            zip( durations, estimates ) ) )
+        df_est[ 'GB per hour' ] = df_est[ 'saved (GB)' ] / df_est[ 'encode hours' ]
+        return df_est.sort_values( 'GB per hour', ascending = False, kind = 'mergesort', na_position = 'last' ).copy( )
+
+def select_within_budget( df_est, budget_hours ):
+    """
+    Greedily picks the files that save the most GB per encode hour, until the estimated encode hours would exceed the budget.
+
+    :param df_est: the output of :py:meth:`estimate_dataframe <howdy_grabbag.utils.estimator.DehydrateEstimator.estimate_dataframe>`.
+    :param float budget_hours: the number of encode hours available.
+    :returns: the subset of ``df_est`` to dehydrate, in order.
+    :rtype: pandas.DataFrame
+    """
+    assert( budget_hours > 0 )
+    df_sorted = df_est[ df_est[ 'saved (GB)' ] > 0 ].dropna( subset = [ 'encode hours' ] ).sort_values(
+        'GB per hour', ascending = False )
+    hours = 0.0
+    chosen = [ ]
+    for idx, encode_hours in zip( df_sorted.index, df_sorted[ 'encode hours' ] ):
+        if hours + encode_hours > budget_hours: continue
+        hours += encode_hours
+        chosen.append( idx )
+    return df_sorted.loc[ chosen ].copy( )
@@ -0,0 +1,224 @@
+"""
+The progress journal that the dehydration and conversion tools write as they go along. It is an append-only `JSON Lines`_ file, one record per line, so that writing progress costs the same for the last file of a run as for the first, and a crash can at worst lose the last, partially written, line.
+
+Each record is a :py:class:`dict` with an ``event`` and a ``time``:
+
+* ``start`` begins a run, and lists the ``paths`` the run will process.
+* ``file`` records the outcome of one file: its ``path``, its ``status`` (``done`` or ``failed``), its ``size before`` and ``size after`` in bytes, its ``encode time`` in seconds, the encoder's ``fps``, and the ``copy time`` in seconds from a scratch directory. A finished encode also records the ``source`` features of the original file and the ``quality`` of the encode, from which the :py:mod:`estimator <howdy_grabbag.utils.estimator>` learns, and whether it ``kept original`` because the encode was no smaller.
+* ``message`` is any other progress message.
+* ``finish`` ends a run.
+
+:py:meth:`get_run_state <howdy_grabbag.utils.journal.get_run_state>` reads a journal back, and reconstructs which files are done, which failed, and which are still pending.
+
+A new run does not throw away the journal of the last run under the same name: that is first renamed to a timestamped journal next to it (see :py:meth:`rotate_journal <howdy_grabbag.utils.journal.rotate_journal>`), so that the :py:mod:`estimator <howdy_grabbag.utils.estimator>` keeps learning from every past run.
+
+.. _`JSON Lines`: https://jsonlines.org
+"""
+import os, json, time, logging, threading
+
+class ProgressJournal( object ):
+    """
+    An append-only `JSON Lines`_ progress journal. Each record is flushed to the operating system as soon as it is written, but only forced to disk (with :py:meth:`os.fsync`) every ``fsync_every`` records or ``fsync_secs`` seconds, and when the journal closes. Writes are serialized under a lock.
+
+    :param str journal_file: the journal file. Must end in ``.jsonl``.
+    :param bool append: if ``True``, then add to an existing journal, for instance when resuming a run. Otherwise start a new journal, after moving any existing one out of the way with :py:meth:`rotate_journal <howdy_grabbag.utils.journal.rotate_journal>`. Default is ``False``.
+    :param int fsync_every: the most records written between calls to :py:meth:`os.fsync`. Default is 16.
+    :param float fsync_secs: the most seconds between calls to :py:meth:`os.fsync`. Default is 5.
+    """
+    def __init__( self, journal_file, append = False, fsync_every = 16, fsync_secs = 5.0 ):
+        assert( os.path.basename( journal_file ).endswith( '.jsonl' ) )
+        assert( fsync_every >= 1 )
+        self.journal_file = journal_file
+        self.fsync_every = fsync_every
+        self.fsync_secs = fsync_secs
+        self._lock = threading.Lock( )
+        if not append: rotate_journal( journal_file )
+        self._file = open( journal_file, 'a' if append else 'w' )
+        #
+        ## end a last line cut short by a crash, so that it does not swallow the next record
+        if append and self._file.tell( ) > 0:
+            with open( journal_file, 'rb' ) as openfile:
+                openfile.seek( -1, os.SEEK_END )
+                if openfile.read( 1 ) != b'\n': self._file.write( '\n' )
+        self._num_unsynced = 0
+        self._last_sync = time.time( )
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc_value, traceback ):
+        self.close( )
+
+    def _write( self, record ):
+        record[ 'time' ] = time.time( )
+        line = json.dumps( record )
+        with self._lock:
+            self._file.write( '%s\n' % line )
+            self._file.flush( )
+            self._num_unsynced += 1
+            if self._num_unsynced >= self.fsync_every or time.time( ) - self._last_sync >= self.fsync_secs:
+                self._sync( )
+
+    def _sync( self ):
+        self._file.flush( )
+        os.fsync( self._file.fileno( ) )
+        self._num_unsynced = 0
+        self._last_sync = time.time( )
+
+    def start( self, paths, message = '', **fields ):
+        """
+        Records the start of a run.
+
+        :param list paths: the files the run will process, in order.
+        :param str message: a progress message.
+        :param fields: any other JSON-serializable fields, for instance the run's parameters.
+        """
+        record = { 'event' : 'start', 'paths' : list( paths ), 'message' : message }
+        record.update( fields )
+        self._write( record )
+
+    def record_file( self, path, status, size_before = None, size_after = None,
+                     encode_time = None, fps = None, copy_time = None, message = '', **fields ):
+        """
+        Records the outcome of processing one file.
+
+        :param str path: the file.
+        :param str status: ``done`` or ``failed``.
+        :param int size_before: the size, in bytes, of the file before processing.
+        :param int size_after: the size, in bytes, of the output.
+        :param float encode_time: the wall-clock time, in seconds, spent processing the file.
+        :param float fps: the frames per second at which the encoder ran.
+        :param float copy_time: the seconds spent copying the output back from a scratch directory, if any.
+        :param str message: a progress message.
+        :param fields: any other JSON-serializable fields, for instance the ``output`` file.
+        """
+        record = {
+            'event' : 'file', 'path' : path, 'status' : status,
+            'size before' : size_before, 'size after' : size_after,
+            'encode time' : encode_time, 'fps' : fps, 'copy time' : copy_time, 'message' : message }
+        record.update( fields )
+        self._write( record )
+
+    def append( self, message ):
+        """
+        Records a progress message.
+
+        :param str message: the progress message.
+        """
+        self._write( { 'event' : 'message', 'message' : message } )
+
+    def finish( self, message = '' ):
+        """
+        Records the end of a run, and forces the journal to disk.
+
+        :param str message: a progress message.
+        """
+        self._write( { 'event' : 'finish', 'message' : message } )
+        with self._lock: self._sync( )
+
+    def close( self ):
+        with self._lock:
+            if self._file.closed: return
+            self._sync( )
+            self._file.close( )
+
+def rotate_journal( journal_file ):
+    """
+    Renames a non-empty journal to a journal in the same directory, named after the time it was last written, for instance ``processed_stuff.20201012-134501.jsonl``.
+
+    :param str journal_file: the journal file. Must end in ``.jsonl``.
+    :returns: the renamed journal, or ``None`` if there was no non-empty journal to rename.
+    :rtype: str
+    """
+    assert( os.path.basename( journal_file ).endswith( '.jsonl' ) )
+    try: stat_result = os.stat( journal_file )
+    except OSError: return None
+    if stat_result.st_size == 0: return None
+    prefix = '%s.%s' % ( journal_file[ : -len( '.jsonl' ) ], time.strftime(
+        '%Y%m%d-%H%M%S', time.localtime( stat_result.st_mtime ) ) )
+    rotated_file = '%s.jsonl' % prefix
+    num = 1
+    while os.path.exists( rotated_file ):
+        rotated_file = '%s-%d.jsonl' % ( prefix, num )
+        num += 1
+    os.rename( journal_file, rotated_file )
+    logging.info( 'MOVED THE JOURNAL OF THE LAST RUN, %s, TO %s.' % ( journal_file, rotated_file ) )
+    return rotated_file
+
+def read_journal( journal_file ):
+    """
+    :param str journal_file: the journal file.
+    :returns: a generator of the records in the journal, in order. Lines that are not valid JSON, such as a last line cut short by a crash, are skipped.
+    """
+    with open( journal_file, 'r' ) as openfile:
+        for line in openfile:
+            line = line.strip( )
+            if len( line ) == 0: continue
+            try: yield json.loads( line )
+            except ValueError:
+                logging.debug( 'SKIPPING INVALID LINE IN JOURNAL %s.' % journal_file )
+
+def get_run_state( journal_file ):
+    """
+    Reconstructs the state of a run, possibly resumed several times, from its journal. A file counts as ``done`` if any run finished it, and as ``failed`` if its last outcome was a failure.
+
+    :param str journal_file: the journal file.
+    :returns: a :py:class:`dict` with these keys:
+
+      * ``paths``, the :py:class:`list` of all files that the runs set out to process, in order.
+      * ``done``, the :py:class:`dict` of finished file to its last ``file`` record.
+      * ``failed``, the :py:class:`dict` of failed file to its last ``file`` record.
+      * ``pending``, the :py:class:`list` of files in ``paths`` that are neither done nor failed, in order.
+      * ``num runs``, the number of ``start`` records.
+      * ``finished``, whether the last run finished.
+
+    :rtype: dict
+    """
+    paths = [ ]
+    seen_paths = set( )
+    done = { }
+    failed = { }
+    num_runs = 0
+    finished = False
+    for record in read_journal( journal_file ):
+        event = record.get( 'event' )
+        if event == 'start':
+            num_runs += 1
+            finished = False
+            for path in record.get( 'paths', [ ] ):
+                if path in seen_paths: continue
+                seen_paths.add( path )
+                paths.append( path )
+        elif event == 'file':
+            path = record[ 'path' ]
+            if record.get( 'status' ) == 'done':
+                done[ path ] = record
+                failed.pop( path, None )
+            elif path not in done:
+                failed[ path ] = record
+        elif event == 'finish':
+            finished = True
+    return {
+        'paths'    : paths,
+        'done'     : done,
+        'failed'   : failed,
+        'pending'  : list(filter(lambda path: path not in done and path not in failed, paths ) ),
+        'num runs' : num_runs,
+        'finished' : finished }
+
+def get_resume_paths( journal_file, retry_failed = False ):
+    """
+    The files that an interrupted run still has to process, so that resuming it skips the files that are done without listing (and probing) everything again.
+
+    :param str journal_file: the journal file.
+    :param bool retry_failed: if ``True``, then also return the files that failed. Default is ``False``.
+    :returns: the :py:class:`list` of files to process, in their original order, or ``None`` if there is no run to resume in ``journal_file``.
+    :rtype: list
+    """
+    if not os.path.isfile( journal_file ): return None
+    state = get_run_state( journal_file )
+    if state[ 'num runs' ] == 0: return None
+    logging.info( 'RESUMING %s: %d DONE, %d FAILED, %d PENDING.' % (
+        journal_file, len( state[ 'done' ] ), len( state[ 'failed' ] ), len( state[ 'pending' ] ) ) )
+    if not retry_failed: return state[ 'pending' ]
+    return list(filter(lambda path: path not in state[ 'done' ], state[ 'paths' ] ) )
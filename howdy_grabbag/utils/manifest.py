@@ -0,0 +1,216 @@
+"""
+A persistent manifest of what the directory dehydration tools decided for each file they examined, stored in a SQLite database under :py:meth:`get_config_directory <howdy_grabbag.get_config_directory>`.
+
+Each entry records the file's stat signature (size, modification time in nanoseconds, and inode) alongside the decision, so that an *incremental* run only has to look at files that are new, or that changed since the last run.
+
+The manifest also remembers the files that a transcode could not shrink, by their :py:meth:`content signature <howdy_grabbag.utils.manifest.get_content_signature>` rather than by path, so that they are not transcoded again at the same or a higher quality even after they are renamed, moved, or copied.
+"""
+import os, sqlite3, time, logging, threading, hashlib
+from enum import Enum
+from howdy_grabbag import get_config_directory
+
+_manifest = None
+
+_SIGNATURE_CHUNK_SIZE = 1024**2
+
+#
+## a transcode must save at least this fraction of a file's size for a later one to be worth trying
+MIN_SAVINGS_FRACTION = 0.05
+
+def get_content_signature( filename, stat_result = None ):
+    """
+    :param str filename: the media file.
+    :param stat_result: optional :py:class:`os.stat_result` of the file, if one already exists.
+    :returns: the ``( size, digest )`` content signature of the file, where ``digest`` is the SHA-1 hex digest of its first and last MiB. This only reads 2 MiB of each file, and does not change when the file is renamed or moved.
+    :rtype: tuple
+    """
+    if stat_result is None: stat_result = os.stat( filename )
+    size = stat_result.st_size
+    sha1 = hashlib.sha1( )
+    with open( filename, 'rb' ) as openfile:
+        sha1.update( openfile.read( _SIGNATURE_CHUNK_SIZE ) )
+        if size > _SIGNATURE_CHUNK_SIZE:
+            openfile.seek( max( _SIGNATURE_CHUNK_SIZE, size - _SIGNATURE_CHUNK_SIZE ) )
+            sha1.update( openfile.read( _SIGNATURE_CHUNK_SIZE ) )
+    return ( size, sha1.hexdigest( ) )
+
+class MANIFEST_DECISION( Enum ):
+    BELOW_THRESHOLD = 1
+    TRANSCODED = 2
+    FAILED = 3
+
+class DehydrateManifest( object ):
+    """
+    The decisions made on each file, keyed by ``( path, mode )``. The ``mode`` separates the different tools -- for instance, ``dehydrate`` from ``lower_audio`` -- and the ``criteria`` string records the thresholds under which a file was found to be :py:attr:`BELOW_THRESHOLD <howdy_grabbag.utils.manifest.MANIFEST_DECISION.BELOW_THRESHOLD>`.
+
+    :param str dbfile: the SQLite database file. Default is ``dehydrate_manifest.db`` in the ``howdy_grabbag`` configuration directory.
+    """
+    def __init__( self, dbfile = None ):
+        if dbfile is None:
+            dbfile = os.path.join( get_config_directory( ), 'dehydrate_manifest.db' )
+        self.dbfile = os.path.realpath( os.path.expanduser( dbfile ) )
+        self._local = threading.local( )
+
+    def _get_connection( self ):
+        #
+        ## one connection per process and per thread
+        conn = getattr( self._local, 'conn', None )
+        if conn is not None and self._local.pid == os.getpid( ):
+            return conn
+        conn = sqlite3.connect( self.dbfile, timeout = 60 )
+        conn.execute( 'PRAGMA journal_mode=WAL' )
+        conn.execute( 'PRAGMA synchronous=NORMAL' )
+        conn.execute( ' '.join([
+            'CREATE TABLE IF NOT EXISTS manifest (',
+            'path TEXT NOT NULL, mode TEXT NOT NULL,',
+            'size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, inode INTEGER NOT NULL,',
+            'decision TEXT NOT NULL, criteria TEXT NOT NULL, detail TEXT NOT NULL, timestamp REAL NOT NULL,',
+            'PRIMARY KEY ( path, mode ) )' ]) )
+        conn.execute( ' '.join([
+            'CREATE TABLE IF NOT EXISTS no_retry (',
+            'size INTEGER NOT NULL, digest TEXT NOT NULL, quality INTEGER NOT NULL,',
+            'path TEXT NOT NULL, timestamp REAL NOT NULL,',
+            'PRIMARY KEY ( size, digest ) )' ]) )
+        conn.commit( )
+        self._local.conn = conn
+        self._local.pid  = os.getpid( )
+        return conn
+
+    @classmethod
+    def get_signature( cls, stat_result ):
+        """
+        :param stat_result: the :py:class:`os.stat_result` of a file.
+        :returns: the ``( size, mtime_ns, inode )`` stat signature of the file.
+        :rtype: tuple
+        """
+        return ( stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino )
+
+    def lookup( self, filename, mode = 'dehydrate' ):
+        """
+        :param str filename: the media file.
+        :param str mode: the tool that made the decision.
+        :returns: a :py:class:`dict` with keys ``signature``, ``decision`` (a :py:class:`MANIFEST_DECISION <howdy_grabbag.utils.manifest.MANIFEST_DECISION>`), ``criteria``, ``detail``, and ``timestamp``. Returns ``None`` if there is no entry.
+        :rtype: dict
+        """
+        row = self._get_connection( ).execute(
+            'SELECT size, mtime_ns, inode, decision, criteria, detail, timestamp FROM manifest WHERE path = ? AND mode = ?',
+            ( os.path.abspath( filename ), mode ) ).fetchone( )
+        if row is None: return None
+        return {
+            'signature' : tuple( row[:3] ),
+            'decision'  : MANIFEST_DECISION[ row[3] ],
+            'criteria'  : row[4],
+            'detail'    : row[5],
+            'timestamp' : row[6] }
+
+    def record_many( self, fnames, decision, mode = 'dehydrate', file_stats = None, criteria = '', detail = '' ):
+        """
+        Records the same decision for many files, in a single transaction.
+
+        :param fnames: an iterable of media files.
+        :param decision: the :py:class:`MANIFEST_DECISION <howdy_grabbag.utils.manifest.MANIFEST_DECISION>`.
+        :param str mode: the tool that made the decision.
+        :param dict file_stats: optional :py:class:`dict` of file name to :py:class:`os.stat_result`. Files not in here are stat'ed.
+        :param str criteria: the thresholds under which the decision was made.
+        :param str detail: any additional information, for instance an error message.
+        """
+        if file_stats is None: file_stats = { }
+        now = time.time( )
+        rows = [ ]
+        for fname in fnames:
+            try: stat_result = file_stats.get( fname ) or os.stat( fname )
+            except OSError: continue
+            rows.append( ( os.path.abspath( fname ), mode ) + self.get_signature( stat_result ) +
+                         ( decision.name, criteria, detail, now ) )
+        if len( rows ) == 0: return
+        conn = self._get_connection( )
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO manifest VALUES ( ?, ?, ?, ?, ?, ?, ?, ?, ? )', rows )
+
+    def record( self, filename, decision, mode = 'dehydrate', stat_result = None, criteria = '', detail = '' ):
+        """
+        Records the decision for a single file. See :py:meth:`record_many <howdy_grabbag.utils.manifest.DehydrateManifest.record_many>`.
+        """
+        file_stats = { }
+        if stat_result is not None: file_stats[ filename ] = stat_result
+        self.record_many(
+            [ filename, ], decision, mode = mode, file_stats = file_stats,
+            criteria = criteria, detail = detail )
+
+    def filter_changed( self, file_stats, mode = 'dehydrate', criteria = '' ):
+        """
+        Finds the files that must be examined again: those not in the manifest, those whose stat signatures changed, and those found :py:attr:`BELOW_THRESHOLD <howdy_grabbag.utils.manifest.MANIFEST_DECISION.BELOW_THRESHOLD>` under different ``criteria``. Files that were transcoded, or that failed, are only examined again once they change.
+
+        :param dict file_stats: the :py:class:`dict` of file name to :py:class:`os.stat_result`.
+        :param str mode: the tool.
+        :param str criteria: the current thresholds.
+        :returns: the :py:class:`dict` of file name to :py:class:`os.stat_result` of the files to examine.
+        :rtype: dict
+        """
+        entries = dict(map(
+            lambda row: ( row[0], ( tuple( row[1:4] ), row[4], row[5] ) ),
+            self._get_connection( ).execute(
+                'SELECT path, size, mtime_ns, inode, decision, criteria FROM manifest WHERE mode = ?',
+                ( mode, ) ) ) )
+        def _is_unchanged( fname ):
+            entry = entries.get( os.path.abspath( fname ) )
+            if entry is None: return False
+            signature, decision, entry_criteria = entry
+            if signature != self.get_signature( file_stats[ fname ] ): return False
+            return decision != MANIFEST_DECISION.BELOW_THRESHOLD.name or entry_criteria == criteria
+        #
+        return dict(filter(lambda tup: not _is_unchanged( tup[0] ), file_stats.items( ) ) )
+
+    def record_no_retry( self, filename, quality, stat_result = None ):
+        """
+        Records that transcoding a file at x265 ``quality`` did not shrink it enough to be worth doing again, neither at ``quality`` nor at any higher quality (lower ``quality`` number). If the file already has an entry, the higher ``quality`` number of the two stands.
+
+        :param str filename: the media file that stays after the transcode.
+        :param int quality: the x265 quality of the transcode.
+        :param stat_result: optional :py:class:`os.stat_result` of the file.
+        """
+        size, digest = get_content_signature( filename, stat_result = stat_result )
+        conn = self._get_connection( )
+        with conn:
+            conn.execute( ' '.join([
+                'INSERT INTO no_retry VALUES ( ?, ?, ?, ?, ? )',
+                'ON CONFLICT ( size, digest ) DO UPDATE SET',
+                'quality = MAX( quality, excluded.quality ), path = excluded.path, timestamp = excluded.timestamp' ]),
+                ( size, digest, int( quality ), os.path.abspath( filename ), time.time( ) ) )
+
+    def find_no_retry( self, file_sizes, quality ):
+        """
+        Finds the files that are not worth transcoding at x265 ``quality``, because an earlier transcode of the same content at ``quality``, or at a higher ``quality`` number, did not shrink them enough. Only the files whose sizes match an entry are read for their :py:meth:`content signatures <howdy_grabbag.utils.manifest.get_content_signature>`.
+
+        :param dict file_sizes: the :py:class:`dict` of file name to its size in bytes.
+        :param int quality: the x265 quality of the transcode to come.
+        :returns: the :py:class:`set` of files not to transcode.
+        :rtype: set
+        """
+        conn = self._get_connection( )
+        sizes = set(map(lambda row: row[0], conn.execute(
+            'SELECT size FROM no_retry WHERE quality >= ?', ( int( quality ), ) ) ) )
+        fnames_no_retry = set( )
+        for fname in filter(lambda fname: file_sizes[ fname ] in sizes, file_sizes ):
+            try: size, digest = get_content_signature( fname )
+            except OSError: continue
+            row = conn.execute(
+                'SELECT quality FROM no_retry WHERE size = ? AND digest = ?', ( size, digest ) ).fetchone( )
+            if row is not None and row[0] >= quality: fnames_no_retry.add( fname )
+        return fnames_no_retry
+
+def get_dehydrate_manifest( ):
+    """
+    :returns: the process-wide :py:class:`DehydrateManifest <howdy_grabbag.utils.manifest.DehydrateManifest>`, or ``None`` if it cannot be opened.
+    """
+    global _manifest
+    if _manifest is None:
+        try:
+            manifest = DehydrateManifest( )
+            manifest._get_connection( )
+            _manifest = manifest
+        except Exception as e:
+            logging.debug( 'COULD NOT OPEN DEHYDRATE MANIFEST. ERROR MESSAGE = %s.' % str( e ) )
+            return None
+    return _manifest
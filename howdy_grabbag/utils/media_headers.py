@@ -0,0 +1,449 @@
+"""
+An in-process reader of MKV_ and MP4_ container headers, which fills in a :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>` from a few KB of reads rather than forking ffprobe_.
+
+For MKV_ files this reads the EBML_ header, and the Segment Info, Tracks, Tags, and Attachments elements (through the SeekHead where they live after the Clusters). Per-track bit rates come from the statistics tags (``BPS``) that ``mkvpropedit --add-track-statistics-tags`` writes. For MP4_ files this reads the ``moov`` atom, and computes per-track bit rates from the sample size tables.
+
+:py:meth:`read_media_info_from_headers <howdy_grabbag.utils.media_headers.read_media_info_from_headers>` returns ``None`` whenever it cannot give the same answer ffprobe_ would -- containers it does not parse (AVI, MPG, WMV), fragmented or damaged files, unknown codecs, or MKV_ tracks without statistics tags -- so that callers fall back to ffprobe_.
+
+.. _MKV: https://en.wikipedia.org/wiki/Matroska
+.. _MP4: https://en.wikipedia.org/wiki/MPEG-4_Part_14
+.. _EBML: https://www.rfc-editor.org/rfc/rfc8794
+.. _ffprobe: https://ffmpeg.org/ffprobe.html
+"""
+import os, struct, logging
+from howdy_grabbag.utils.media_info import MediaInfo
+
+_MAX_ELEMENT_BYTES = 16 * 1024**2
+_MAX_MOOV_BYTES    = 64 * 1024**2
+
+#
+## EBML and Matroska element IDs
+_EBML_ID         = 0x1A45DFA3
+_DOCTYPE_ID      = 0x4282
+_SEGMENT_ID      = 0x18538067
+_SEEKHEAD_ID     = 0x114D9B74
+_SEEK_ID         = 0x4DBB
+_SEEKID_ID       = 0x53AB
+_SEEKPOSITION_ID = 0x53AC
+_INFO_ID         = 0x1549A966
+_TIMESCALE_ID    = 0x2AD7B1
+_DURATION_ID     = 0x4489
+_TRACKS_ID       = 0x1654AE6B
+_TRACKENTRY_ID   = 0xAE
+_TRACKUID_ID     = 0x73C5
+_TRACKTYPE_ID    = 0x83
+_CODECID_ID      = 0x86
+_LANGUAGE_ID     = 0x22B59C
+_VIDEO_ID        = 0xE0
+_PIXELWIDTH_ID   = 0xB0
+_PIXELHEIGHT_ID  = 0xBA
+_TAGS_ID         = 0x1254C367
+_TAG_ID          = 0x7373
+_TARGETS_ID      = 0x63C0
+_TAGTRACKUID_ID  = 0x63C5
+_SIMPLETAG_ID    = 0x67C8
+_TAGNAME_ID      = 0x45A3
+_TAGSTRING_ID    = 0x4487
+_ATTACHMENTS_ID  = 0x1941A469
+_ATTACHEDFILE_ID = 0x61A7
+_CLUSTER_ID      = 0x1F43B675
+
+_MKV_CODECS = {
+    'V_MPEGH/ISO/HEVC'   : 'hevc',
+    'V_MPEG4/ISO/AVC'    : 'h264',
+    'V_MPEG4/ISO/ASP'    : 'mpeg4',
+    'V_MPEG4/ISO/SP'     : 'mpeg4',
+    'V_MPEG4/ISO/AP'     : 'mpeg4',
+    'V_MPEG2'            : 'mpeg2video',
+    'V_MPEG1'            : 'mpeg1video',
+    'V_VP8'              : 'vp8',
+    'V_VP9'              : 'vp9',
+    'V_AV1'              : 'av1',
+    'V_THEORA'           : 'theora',
+    'A_AAC'              : 'aac',
+    'A_AC3'              : 'ac3',
+    'A_EAC3'             : 'eac3',
+    'A_DTS'              : 'dts',
+    'A_TRUEHD'           : 'truehd',
+    'A_OPUS'             : 'opus',
+    'A_VORBIS'           : 'vorbis',
+    'A_FLAC'             : 'flac',
+    'A_MPEG/L3'          : 'mp3',
+    'A_MPEG/L2'          : 'mp2',
+    'S_TEXT/UTF8'        : 'subrip',
+    'S_TEXT/ASS'         : 'ass',
+    'S_TEXT/SSA'         : 'ass',
+    'S_TEXT/WEBVTT'      : 'webvtt',
+    'S_HDMV/PGS'         : 'hdmv_pgs_subtitle',
+    'S_VOBSUB'           : 'dvd_subtitle', }
+
+_MP4_CODECS = {
+    b'hvc1' : 'hevc',
+    b'hev1' : 'hevc',
+    b'avc1' : 'h264',
+    b'avc3' : 'h264',
+    b'mp4v' : 'mpeg4',
+    b'av01' : 'av1',
+    b'vp09' : 'vp9',
+    b'mp4a' : 'aac',
+    b'ac-3' : 'ac3',
+    b'ec-3' : 'eac3',
+    b'Opus' : 'opus',
+    b'fLaC' : 'flac',
+    b'.mp3' : 'mp3',
+    b'tx3g' : 'mov_text',
+    b'c608' : 'eia_608', }
+
+def _get_mkv_codec( codec_id ):
+    if codec_id in _MKV_CODECS: return _MKV_CODECS[ codec_id ]
+    if codec_id.startswith( 'A_AAC' ): return 'aac'
+    if codec_id.startswith( 'A_PCM' ): return 'pcm'
+    return None
+
+#
+## EBML primitives
+def _read_vint( data, pos, keep_marker = False ):
+    first = data[ pos ]
+    if first == 0: raise ValueError( 'INVALID EBML VINT AT %d.' % pos )
+    length = 1
+    mask = 0x80
+    while not ( first & mask ):
+        mask >>= 1
+        length += 1
+    value = first if keep_marker else ( first & ( mask - 1 ) )
+    for byte in data[ pos + 1 : pos + length ]:
+        value = ( value << 8 ) | byte
+    if len( data ) < pos + length: raise ValueError( 'TRUNCATED EBML VINT AT %d.' % pos )
+    is_unknown = ( not keep_marker ) and value == ( 1 << ( 7 * length ) ) - 1
+    return value, length, is_unknown
+
+def _read_element_header( data, pos ):
+    elem_id, id_len, _ = _read_vint( data, pos, keep_marker = True )
+    size, size_len, is_unknown = _read_vint( data, pos + id_len )
+    return elem_id, ( None if is_unknown else size ), pos + id_len + size_len
+
+def _iter_children( data, start = 0, end = None ):
+    if end is None: end = len( data )
+    pos = start
+    while pos < end:
+        elem_id, size, data_pos = _read_element_header( data, pos )
+        if size is None: raise ValueError( 'UNKNOWN-SIZED CHILD ELEMENT.' )
+        yield elem_id, data_pos, data_pos + size
+        pos = data_pos + size
+
+def _get_uint( data, start, end ):
+    return int.from_bytes( data[ start : end ], 'big' )
+
+def _get_float( data, start, end ):
+    if end - start == 4: return struct.unpack( '>f', data[ start : end ] )[ 0 ]
+    if end - start == 8: return struct.unpack( '>d', data[ start : end ] )[ 0 ]
+    return 0.0
+
+def _get_string( data, start, end ):
+    return data[ start : end ].split( b'\x00' )[ 0 ].decode( 'utf8', 'ignore' )
+
+#
+## Matroska
+def _parse_mkv_info( data ):
+    timescale = 1_000_000
+    duration = None
+    for elem_id, start, end in _iter_children( data ):
+        if elem_id == _TIMESCALE_ID: timescale = _get_uint( data, start, end )
+        elif elem_id == _DURATION_ID: duration = _get_float( data, start, end )
+    if duration is None: return None
+    return duration * timescale / 1e9
+
+def _parse_mkv_tracks( data ):
+    tracks = [ ]
+    for elem_id, start, end in _iter_children( data ):
+        if elem_id != _TRACKENTRY_ID: continue
+        track = { 'uid' : None, 'type' : None, 'codec_id' : '', 'language' : 'eng', 'width' : None, 'height' : None }
+        for sub_id, sub_start, sub_end in _iter_children( data, start, end ):
+            if sub_id == _TRACKUID_ID: track[ 'uid' ] = _get_uint( data, sub_start, sub_end )
+            elif sub_id == _TRACKTYPE_ID: track[ 'type' ] = _get_uint( data, sub_start, sub_end )
+            elif sub_id == _CODECID_ID: track[ 'codec_id' ] = _get_string( data, sub_start, sub_end )
+            elif sub_id == _LANGUAGE_ID: track[ 'language' ] = _get_string( data, sub_start, sub_end )
+            elif sub_id == _VIDEO_ID:
+                for vid_id, vid_start, vid_end in _iter_children( data, sub_start, sub_end ):
+                    if vid_id == _PIXELWIDTH_ID: track[ 'width' ] = _get_uint( data, vid_start, vid_end )
+                    elif vid_id == _PIXELHEIGHT_ID: track[ 'height' ] = _get_uint( data, vid_start, vid_end )
+        tracks.append( track )
+    return tracks
+
+def _parse_mkv_tags( data ):
+    #
+    ## returns a dict of track UID -> dict of tag name -> tag value
+    tags_by_uid = { }
+    for elem_id, start, end in _iter_children( data ):
+        if elem_id != _TAG_ID: continue
+        uids = [ ]
+        simple_tags = { }
+        for sub_id, sub_start, sub_end in _iter_children( data, start, end ):
+            if sub_id == _TARGETS_ID:
+                uids = list(map(
+                    lambda entry: _get_uint( data, entry[1], entry[2] ),
+                    filter(lambda entry: entry[0] == _TAGTRACKUID_ID,
+                           _iter_children( data, sub_start, sub_end ) ) ) )
+            elif sub_id == _SIMPLETAG_ID:
+                name = None
+                value = None
+                for st_id, st_start, st_end in _iter_children( data, sub_start, sub_end ):
+                    if st_id == _TAGNAME_ID: name = _get_string( data, st_start, st_end )
+                    elif st_id == _TAGSTRING_ID: value = _get_string( data, st_start, st_end )
+                if name is not None: simple_tags[ name ] = value
+        for uid in uids:
+            tags_by_uid.setdefault( uid, { } ).update( simple_tags )
+    return tags_by_uid
+
+def _parse_mkv_seekhead( data ):
+    positions = { }
+    for elem_id, start, end in _iter_children( data ):
+        if elem_id != _SEEK_ID: continue
+        seek_id = None
+        seek_pos = None
+        for sub_id, sub_start, sub_end in _iter_children( data, start, end ):
+            if sub_id == _SEEKID_ID: seek_id = _get_uint( data, sub_start, sub_end )
+            elif sub_id == _SEEKPOSITION_ID: seek_pos = _get_uint( data, sub_start, sub_end )
+        if seek_id is not None and seek_pos is not None:
+            positions.setdefault( seek_id, seek_pos )
+    return positions
+
+def _read_at( fileobj, offset, nbytes ):
+    fileobj.seek( offset )
+    return fileobj.read( nbytes )
+
+def _read_mkv_element( fileobj, offset ):
+    header = _read_at( fileobj, offset, 12 )
+    elem_id, size, data_pos = _read_element_header( header, 0 )
+    if size is None or size > _MAX_ELEMENT_BYTES: return elem_id, None
+    return elem_id, _read_at( fileobj, offset + data_pos, size )
+
+def _read_mkv_media_info( filename, fileobj, file_size ):
+    header = _read_at( fileobj, 0, 4_096 )
+    elem_id, size, data_pos = _read_element_header( header, 0 )
+    if elem_id != _EBML_ID or size is None: return None
+    doctype = None
+    for sub_id, sub_start, sub_end in _iter_children( header, data_pos, data_pos + size ):
+        if sub_id == _DOCTYPE_ID: doctype = _get_string( header, sub_start, sub_end )
+    if doctype not in ( 'matroska', 'webm' ): return None
+    #
+    ## the segment
+    segment_pos = data_pos + size
+    elem_id, _, segment_data_pos = _read_element_header(
+        _read_at( fileobj, segment_pos, 12 ), 0 )
+    if elem_id != _SEGMENT_ID: return None
+    segment_data_pos += segment_pos
+    #
+    ## walk the top level children of the segment until the first cluster
+    elements = { }
+    seek_positions = { }
+    pos = segment_data_pos
+    while pos < file_size:
+        header = _read_at( fileobj, pos, 12 )
+        if len( header ) < 2: break
+        elem_id, size, data_pos = _read_element_header( header, 0 )
+        if elem_id == _CLUSTER_ID or size is None: break
+        if elem_id in ( _SEEKHEAD_ID, _INFO_ID, _TRACKS_ID, _TAGS_ID, _ATTACHMENTS_ID ):
+            if size > _MAX_ELEMENT_BYTES: return None
+            body = _read_at( fileobj, pos + data_pos, size )
+            if elem_id == _SEEKHEAD_ID:
+                for seek_id, seek_pos in _parse_mkv_seekhead( body ).items( ):
+                    seek_positions.setdefault( seek_id, seek_pos )
+            else: elements.setdefault( elem_id, body )
+        pos += data_pos + size
+    #
+    ## elements that live after the clusters
+    for elem_id in ( _INFO_ID, _TRACKS_ID, _TAGS_ID, _ATTACHMENTS_ID ):
+        if elem_id in elements or elem_id not in seek_positions: continue
+        found_id, body = _read_mkv_element( fileobj, segment_data_pos + seek_positions[ elem_id ] )
+        if found_id == elem_id and body is not None: elements[ elem_id ] = body
+    if _INFO_ID not in elements or _TRACKS_ID not in elements: return None
+    #
+    duration = _parse_mkv_info( elements[ _INFO_ID ] )
+    if not duration: return None
+    tracks = _parse_mkv_tracks( elements[ _TRACKS_ID ] )
+    tags_by_uid = _parse_mkv_tags( elements.get( _TAGS_ID, b'' ) )
+    num_attachments = len(list(filter(
+        lambda entry: entry[0] == _ATTACHEDFILE_ID,
+        _iter_children( elements.get( _ATTACHMENTS_ID, b'' ) ) ) ) )
+    #
+    def _get_track_kbps( track ):
+        tags = tags_by_uid.get( track[ 'uid' ], { } )
+        for tag_name in ( 'BPS', 'BPS-eng' ):
+            try: return float( tags[ tag_name ] ) / 1_024
+            except: pass
+        return None
+    video_tracks    = list(filter(lambda track: track[ 'type' ] ==  1, tracks ) )
+    audio_tracks    = list(filter(lambda track: track[ 'type' ] ==  2, tracks ) )
+    subtitle_tracks = list(filter(lambda track: track[ 'type' ] == 17, tracks ) )
+    if len( video_tracks ) == 0: return None
+    #
+    ## unknown codecs, or missing statistics tags, means ffprobe has to do it
+    if any(map(lambda track: _get_mkv_codec( track[ 'codec_id' ] ) is None, video_tracks + audio_tracks ) ):
+        return None
+    video_bit_rate_kbps = _get_track_kbps( video_tracks[ 0 ] )
+    audio_bit_rates_kbps = list(map(_get_track_kbps, audio_tracks ) )
+    if video_bit_rate_kbps is None or any(map(lambda kbps: kbps is None, audio_bit_rates_kbps ) ):
+        return None
+    return MediaInfo(
+        filename,
+        container = 'matroska,webm',
+        duration = duration,
+        bit_rate_kbps = 8 * file_size / duration / 1_024,
+        video_codec = _get_mkv_codec( video_tracks[ 0 ][ 'codec_id' ] ),
+        width  = video_tracks[ 0 ][ 'width'  ],
+        height = video_tracks[ 0 ][ 'height' ],
+        video_bit_rate_kbps = video_bit_rate_kbps,
+        audio_bit_rates_kbps = audio_bit_rates_kbps,
+        audio_languages = list(map(lambda track: track[ 'language' ], audio_tracks ) ),
+        subtitle_languages = list(map(lambda track: track[ 'language' ], subtitle_tracks ) ),
+        num_video_streams = len( video_tracks ),
+        num_streams = len( tracks ) + num_attachments )
+
+#
+## MP4
+def _iter_atoms( data, start = 0, end = None ):
+    if end is None: end = len( data )
+    pos = start
+    while pos + 8 <= end:
+        size, atom_type = struct.unpack( '>I4s', data[ pos : pos + 8 ] )
+        header_len = 8
+        if size == 1:
+            size = struct.unpack( '>Q', data[ pos + 8 : pos + 16 ] )[ 0 ]
+            header_len = 16
+        elif size == 0: size = end - pos
+        if size < header_len or pos + size > end: raise ValueError( 'INVALID MP4 ATOM AT %d.' % pos )
+        yield atom_type, pos + header_len, pos + size
+        pos += size
+
+def _find_atom( data, path, start = 0, end = None ):
+    for atom_type, atom_start, atom_end in _iter_atoms( data, start, end ):
+        if atom_type != path[ 0 ]: continue
+        if len( path ) == 1: return atom_start, atom_end
+        return _find_atom( data, path[ 1: ], atom_start, atom_end )
+    return None
+
+def _parse_mp4_duration( data, start ):
+    #
+    ## mvhd and mdhd share the same layout up to the language field
+    version = data[ start ]
+    if version == 1:
+        timescale, duration = struct.unpack( '>IQ', data[ start + 20 : start + 32 ] )
+        lang_pos = start + 32
+    else:
+        timescale, duration = struct.unpack( '>II', data[ start + 12 : start + 20 ] )
+        lang_pos = start + 20
+    if timescale == 0: return None, lang_pos
+    return duration / timescale, lang_pos
+
+def _parse_mp4_language( data, pos ):
+    packed = struct.unpack( '>H', data[ pos : pos + 2 ] )[ 0 ]
+    language = ''.join(map(lambda shift: chr( ( ( packed >> shift ) & 0x1F ) + 0x60 ), ( 10, 5, 0 ) ) )
+    if not language.isalpha( ): return 'und'
+    return language
+
+def _parse_mp4_trak( data, start, end ):
+    mdia = _find_atom( data, [ b'mdia' ], start, end )
+    if mdia is None: return None
+    mdhd = _find_atom( data, [ b'mdhd' ], *mdia )
+    hdlr = _find_atom( data, [ b'hdlr' ], *mdia )
+    stbl = _find_atom( data, [ b'minf', b'stbl' ], *mdia )
+    if mdhd is None or hdlr is None or stbl is None: return None
+    duration, lang_pos = _parse_mp4_duration( data, mdhd[ 0 ] )
+    track = {
+        'handler'  : data[ hdlr[ 0 ] + 8 : hdlr[ 0 ] + 12 ],
+        'duration' : duration,
+        'language' : _parse_mp4_language( data, lang_pos ),
+        'format'   : None, 'width' : None, 'height' : None, 'nbytes' : None }
+    stsd = _find_atom( data, [ b'stsd' ], *stbl )
+    if stsd is not None and stsd[ 1 ] - stsd[ 0 ] >= 16:
+        entry_pos = stsd[ 0 ] + 8
+        track[ 'format' ] = data[ entry_pos + 4 : entry_pos + 8 ]
+        if track[ 'handler' ] == b'vide' and entry_pos + 36 <= stsd[ 1 ]:
+            track[ 'width' ], track[ 'height' ] = struct.unpack( '>HH', data[ entry_pos + 32 : entry_pos + 36 ] )
+    stsz = _find_atom( data, [ b'stsz' ], *stbl )
+    if stsz is not None:
+        sample_size, sample_count = struct.unpack( '>II', data[ stsz[ 0 ] + 4 : stsz[ 0 ] + 12 ] )
+        if sample_size != 0: track[ 'nbytes' ] = sample_size * sample_count
+        elif sample_count > 0:
+            sizes = struct.unpack( '>%dI' % sample_count, data[ stsz[ 0 ] + 12 : stsz[ 0 ] + 12 + 4 * sample_count ] )
+            track[ 'nbytes' ] = sum( sizes )
+    return track
+
+def _read_mp4_media_info( filename, fileobj, file_size ):
+    #
+    ## find the moov atom among the top level atoms, wherever it is
+    pos = 0
+    moov = None
+    while pos + 8 <= file_size:
+        header = _read_at( fileobj, pos, 16 )
+        size, atom_type = struct.unpack( '>I4s', header[ : 8 ] )
+        header_len = 8
+        if size == 1:
+            size = struct.unpack( '>Q', header[ 8 : 16 ] )[ 0 ]
+            header_len = 16
+        elif size == 0: size = file_size - pos
+        if size < header_len: return None
+        if pos == 0 and atom_type != b'ftyp': return None
+        if atom_type == b'moof': return None
+        if atom_type == b'moov':
+            if size > _MAX_MOOV_BYTES: return None
+            moov = _read_at( fileobj, pos + header_len, size - header_len )
+            break
+        pos += size
+    if moov is None: return None
+    #
+    mvhd = _find_atom( moov, [ b'mvhd' ] )
+    if mvhd is None: return None
+    duration, _ = _parse_mp4_duration( moov, mvhd[ 0 ] )
+    if not duration: return None
+    tracks = list(filter(None, map(
+        lambda entry: _parse_mp4_trak( moov, entry[1], entry[2] ),
+        filter(lambda entry: entry[0] == b'trak', _iter_atoms( moov ) ) ) ) )
+    #
+    def _get_track_kbps( track ):
+        if track[ 'nbytes' ] is None or not track[ 'duration' ]: return None
+        return 8 * track[ 'nbytes' ] / track[ 'duration' ] / 1_024
+    video_tracks    = list(filter(lambda track: track[ 'handler' ] == b'vide', tracks ) )
+    audio_tracks    = list(filter(lambda track: track[ 'handler' ] == b'soun', tracks ) )
+    subtitle_tracks = list(filter(lambda track: track[ 'handler' ] in ( b'sbtl', b'subt' ) or
+                                  track[ 'format' ] == b'tx3g', tracks ) )
+    if len( video_tracks ) == 0: return None
+    if any(map(lambda track: track[ 'format' ] not in _MP4_CODECS, video_tracks + audio_tracks ) ):
+        return None
+    video_bit_rate_kbps = _get_track_kbps( video_tracks[ 0 ] )
+    audio_bit_rates_kbps = list(map(_get_track_kbps, audio_tracks ) )
+    if video_bit_rate_kbps is None or any(map(lambda kbps: kbps is None, audio_bit_rates_kbps ) ):
+        return None
+    return MediaInfo(
+        filename,
+        container = 'mov,mp4,m4a,3gp,3g2,mj2',
+        duration = duration,
+        bit_rate_kbps = 8 * file_size / duration / 1_024,
+        video_codec = _MP4_CODECS[ video_tracks[ 0 ][ 'format' ] ],
+        width  = video_tracks[ 0 ][ 'width'  ],
+        height = video_tracks[ 0 ][ 'height' ],
+        video_bit_rate_kbps = video_bit_rate_kbps,
+        audio_bit_rates_kbps = audio_bit_rates_kbps,
+        audio_languages = list(map(lambda track: track[ 'language' ], audio_tracks ) ),
+        subtitle_languages = list(map(lambda track: track[ 'language' ], subtitle_tracks ) ),
+        num_video_streams = len( video_tracks ),
+        num_streams = len( tracks ) )
+
+def read_media_info_from_headers( filename ):
+    """
+    :param str filename: the media file.
+    :returns: the :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>` of an MKV_, WEBM, MP4_, or M4V file read directly from its headers, or ``None`` if ffprobe_ must be used instead.
+    """
+    suffix = os.path.basename( filename ).lower( ).split( '.' )[ -1 ]
+    if suffix in ( 'mkv', 'webm' ): reader = _read_mkv_media_info
+    elif suffix in ( 'mp4', 'm4v' ): reader = _read_mp4_media_info
+    else: return None
+    try:
+        with open( filename, 'rb' ) as fileobj:
+            file_size = os.fstat( fileobj.fileno( ) ).st_size
+            return reader( filename, fileobj, file_size )
+    except Exception as e:
+        logging.debug( 'COULD NOT READ HEADERS OF %s. ERROR MESSAGE = %s.' % (
+            os.path.realpath( filename ), str( e ) ) )
+        return None
@@ -0,0 +1,231 @@
+"""
+A compact record of the media information that the dehydration pipeline needs for each file, parsed once from a single ffprobe_ call that only asks for the needed fields.
+
+.. _ffprobe: https://ffmpeg.org/ffprobe.html
+"""
+import os, subprocess, json, logging
+from howdy_grabbag import get_exec
+from howdy_grabbag.utils.probe_cache import ProbeCache, get_probe_cache
+
+_SHOW_ENTRIES = ':'.join([
+    'format=format_name,duration,bit_rate,size',
+    'stream=index,codec_type,codec_name,bit_rate,width,height',
+    'stream_tags=BPS,BPS-eng,language',
+    'stream_disposition=attached_pic' ])
+
+def _get_kbps( value ):
+    try:
+        kbps = float( value ) / 1_024
+        if kbps > 0: return kbps
+    except: pass
+    return None
+
+class MediaInfo( object ):
+    """
+    The media information of a single file. Bit rates are in kbps, and durations are in seconds.
+
+    :param str filename: the media file.
+    :param str container: the container format name that ffprobe_ reports, for example ``matroska,webm``.
+    :param float duration: the duration in seconds.
+    :param float bit_rate_kbps: the total bit rate.
+    :param str video_codec: the codec name of the first (non cover art) video stream, for example ``hevc``.
+    :param int width: the width of the first video stream.
+    :param int height: the height of the first video stream.
+    :param float video_bit_rate_kbps: the bit rate of the first video stream, or ``None`` if it is not known.
+    :param tuple audio_bit_rates_kbps: the bit rate of each audio stream.
+    :param tuple audio_languages: the language of each audio stream.
+    :param tuple subtitle_languages: the language of each subtitle stream.
+    :param int num_video_streams: the number of (non cover art) video streams.
+    :param int num_streams: the total number of streams.
+    """
+    __slots__ = (
+        'filename', 'container', 'duration', 'bit_rate_kbps',
+        'video_codec', 'width', 'height', 'video_bit_rate_kbps',
+        'audio_bit_rates_kbps', 'audio_languages', 'subtitle_languages',
+        'num_video_streams', 'num_streams' )
+
+    def __init__(
+        self, filename, container = None, duration = None, bit_rate_kbps = None,
+        video_codec = None, width = None, height = None, video_bit_rate_kbps = None,
+        audio_bit_rates_kbps = ( ), audio_languages = ( ), subtitle_languages = ( ),
+        num_video_streams = 0, num_streams = 0 ):
+        self.filename = filename
+        self.container = container
+        self.duration = duration
+        self.bit_rate_kbps = bit_rate_kbps
+        self.video_codec = video_codec
+        self.width = width
+        self.height = height
+        self.video_bit_rate_kbps = video_bit_rate_kbps
+        self.audio_bit_rates_kbps = tuple( audio_bit_rates_kbps )
+        self.audio_languages = tuple( audio_languages )
+        self.subtitle_languages = tuple( subtitle_languages )
+        self.num_video_streams = num_video_streams
+        self.num_streams = num_streams
+
+    def __repr__( self ):
+        return 'MediaInfo(%s)' % ', '.join(map(
+            lambda slot: '%s=%r' % ( slot, getattr( self, slot ) ), self.__slots__ ) )
+
+    def __getstate__( self ):
+        return self.to_dict( )
+
+    def __setstate__( self, state ):
+        for slot in self.__slots__: setattr( self, slot, state.get( slot ) )
+
+    @property
+    def is_hevc( self ):
+        """whether the video stream is HEVC."""
+        return self.video_codec is not None and self.video_codec.lower( ) == 'hevc'
+
+    @property
+    def audio_bit_rate_kbps( self ):
+        """the total bit rate of all the audio streams."""
+        return sum( self.audio_bit_rates_kbps )
+
+    @property
+    def video_bit_rate_estimate_kbps( self ):
+        """the bit rate of the first video stream if known, otherwise the total bit rate less that of the audio streams, or ``None`` if neither is known."""
+        if self.video_bit_rate_kbps is not None: return self.video_bit_rate_kbps
+        if self.bit_rate_kbps is None: return None
+        return max( 0.0, self.bit_rate_kbps - self.audio_bit_rate_kbps )
+
+    @property
+    def num_audio_streams( self ):
+        return len( self.audio_bit_rates_kbps )
+
+    @property
+    def num_subtitle_streams( self ):
+        return len( self.subtitle_languages )
+
+    def to_dict( self ):
+        """
+        :returns: a JSON-serializable :py:class:`dict` of this record, the form stored in the probe cache.
+        :rtype: dict
+        """
+        data = dict(map(lambda slot: ( slot, getattr( self, slot ) ), self.__slots__ ) )
+        for slot in ( 'audio_bit_rates_kbps', 'audio_languages', 'subtitle_languages' ):
+            data[ slot ] = list( data[ slot ] )
+        return data
+
+    @classmethod
+    def from_dict( cls, data ):
+        return cls( **data )
+
+    @classmethod
+    def from_ffprobe_json( cls, filename, data ):
+        """
+        :param str filename: the media file.
+        :param dict data: the JSON output of ffprobe_ on the file, either the full output or that limited by ``-show_entries``.
+        :returns: the :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>` of the file.
+        """
+        def _get_stream_kbps( stream ):
+            tags = stream.get( 'tags', { } )
+            return max( filter(None, map(_get_kbps, (
+                stream.get( 'bit_rate' ), tags.get( 'BPS' ), tags.get( 'BPS-eng' ) ) ) ), default = None )
+        #
+        format_data = data[ 'format' ]
+        streams = sorted( data.get( 'streams', [ ] ), key = lambda stream: stream.get( 'index', 0 ) )
+        video_streams = list(filter(
+            lambda stream: stream.get( 'codec_type' ) == 'video' and
+            stream.get( 'disposition', { } ).get( 'attached_pic', 0 ) == 0, streams ) )
+        audio_streams    = list(filter(lambda stream: stream.get( 'codec_type' ) == 'audio', streams ) )
+        subtitle_streams = list(filter(lambda stream: stream.get( 'codec_type' ) == 'subtitle', streams ) )
+        #
+        duration = None
+        try: duration = float( format_data[ 'duration' ] )
+        except: pass
+        bit_rate_kbps = _get_kbps( format_data.get( 'bit_rate' ) )
+        if bit_rate_kbps is None and duration:
+            bit_rate_kbps = _get_kbps( 8 * float( format_data.get( 'size', 0 ) ) / duration )
+        video_stream = None
+        if len( video_streams ) > 0: video_stream = video_streams[ 0 ]
+        return cls(
+            filename,
+            container = format_data.get( 'format_name' ),
+            duration = duration,
+            bit_rate_kbps = bit_rate_kbps,
+            video_codec = video_stream.get( 'codec_name' ) if video_stream is not None else None,
+            width  = video_stream.get( 'width'  ) if video_stream is not None else None,
+            height = video_stream.get( 'height' ) if video_stream is not None else None,
+            video_bit_rate_kbps = _get_stream_kbps( video_stream ) if video_stream is not None else None,
+            audio_bit_rates_kbps = list(map(lambda stream: _get_stream_kbps( stream ) or 0.0, audio_streams ) ),
+            audio_languages = list(map(lambda stream: stream.get( 'tags', { } ).get( 'language', 'und' ), audio_streams ) ),
+            subtitle_languages = list(map(lambda stream: stream.get( 'tags', { } ).get( 'language', 'und' ), subtitle_streams ) ),
+            num_video_streams = len( video_streams ),
+            num_streams = len( streams ) )
+
+def get_ffprobe_media_cmd( filename ):
+    """
+    :param str filename: the media file.
+    :returns: the ffprobe_ command, limited with ``-show_entries`` to the fields that :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>` needs.
+    :rtype: list
+    """
+    return [ get_exec( 'ffprobe' ), '-v', 'quiet', '-show_entries', _SHOW_ENTRIES,
+             '-print_format', 'json', filename ]
+
+def get_ffprobe_media_json( filename ):
+    """
+    :param str filename: the media file.
+    :returns: the JSON output of :py:meth:`get_ffprobe_media_cmd <howdy_grabbag.utils.media_info.get_ffprobe_media_cmd>`.
+    :rtype: dict
+    """
+    stdout_val = subprocess.check_output(
+        get_ffprobe_media_cmd( filename ), stderr = subprocess.STDOUT )
+    return json.loads( stdout_val )
+
+def lookup_cached_media_info( filename, stat_result = None ):
+    """
+    :param str filename: the media file.
+    :param stat_result: optional :py:class:`os.stat_result` of the file, if one already exists.
+    :returns: a ``( key, info )`` tuple. ``key`` is the probe cache key, or ``None`` if the probe cache is off. ``info`` is the cached :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>`, or ``None`` on a cache miss.
+    :rtype: tuple
+    """
+    cache = get_probe_cache( )
+    if cache is None: return None, None
+    try:
+        key = ProbeCache.get_key( filename, stat_result = stat_result )
+        data = cache.lookup( key, kind = 'mediainfo' )
+        if data is None: return key, None
+        data[ 'filename' ] = filename
+        return key, MediaInfo.from_dict( data )
+    except Exception as e:
+        logging.debug( 'PROBE CACHE LOOKUP FAILED FOR %s. ERROR MESSAGE = %s.' % (
+            os.path.realpath( filename ), str( e ) ) )
+        return None, None
+
+def store_cached_media_info( key, info ):
+    """
+    :param tuple key: the probe cache key from :py:meth:`lookup_cached_media_info <howdy_grabbag.utils.media_info.lookup_cached_media_info>`. Nothing is stored if it is ``None``.
+    :param info: the :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>` to store.
+    """
+    cache = get_probe_cache( )
+    if key is None or cache is None or info is None: return
+    try: cache.store( key, info.to_dict( ), kind = 'mediainfo' )
+    except Exception as e:
+        logging.debug( 'PROBE CACHE STORE FAILED FOR %s. ERROR MESSAGE = %s.' % (
+            key[ 0 ], str( e ) ) )
+
+def get_media_info( filename, stat_result = None ):
+    """
+    Probes a media file at most once: first looks in the persistent probe cache, then tries to read MKV and MP4 headers directly (see :py:meth:`read_media_info_from_headers <howdy_grabbag.utils.media_headers.read_media_info_from_headers>`), and otherwise runs ffprobe_. The result is stored in the probe cache.
+
+    :param str filename: the media file.
+    :param stat_result: optional :py:class:`os.stat_result` of the file, if one already exists.
+    :returns: the :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>` of the file, or ``None`` if it could not be probed.
+    """
+    key, info = lookup_cached_media_info( filename, stat_result = stat_result )
+    if info is not None: return info
+    #
+    ## read MKV and MP4 headers in-process, only fork ffprobe when that does not work
+    from howdy_grabbag.utils.media_headers import read_media_info_from_headers
+    info = read_media_info_from_headers( filename )
+    if info is None:
+        try:
+            info = MediaInfo.from_ffprobe_json( filename, get_ffprobe_media_json( filename ) )
+        except Exception as e:
+            logging.debug( 'PROBLEM WITH %s. ERROR MESSAGE = %s.' % (
+                os.path.realpath( filename ), str( e ) ) )
+            return None
+    store_cached_media_info( key, info )
+    return info
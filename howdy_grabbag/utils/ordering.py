@@ -0,0 +1,80 @@
+"""
+The order in which the dehydrate pipeline transcodes its files. When a run gets cut short, the files done first are the only ones that count, so by default the files that reclaim the most disk space per second of encoding go first.
+
+An ordering strategy takes the :py:class:`DataFrame <pandas.DataFrame>` of candidates from :py:meth:`get_candidates_dataframe <howdy_grabbag.utils.estimator.get_candidates_dataframe>`, and returns it sorted. These come built in:
+
+* ``alphabetical``, by file name.
+* ``largest``, the largest files first.
+* ``bitrate``, the files of highest total bit rate first.
+* ``savings``, the files of highest estimated GB saved per encode second first (see :py:class:`DehydrateEstimator <howdy_grabbag.utils.estimator.DehydrateEstimator>`). This is the default.
+
+:py:meth:`register_ordering <howdy_grabbag.utils.ordering.register_ordering>` adds others.
+"""
+import os, logging
+from howdy_grabbag.utils.probe_engine import iter_media_infos
+
+DEFAULT_ORDERING = 'savings'
+
+def _order_alphabetical( df, quality, journal_files ):
+    return df.sort_values( 'paths' )
+
+def _order_largest( df, quality, journal_files ):
+    return df.sort_values( 'paths' ).sort_values( 'sizes (MB)', ascending = False, kind = 'mergesort' )
+
+def _order_bitrate( df, quality, journal_files ):
+    return df.sort_values( 'paths' ).sort_values(
+        'bitrate (kbps)', ascending = False, kind = 'mergesort', na_position = 'last' )
+
+def _order_savings( df, quality, journal_files ):
+    from howdy_grabbag.utils.estimator import DehydrateEstimator, get_default_journal_files
+    if journal_files is None: journal_files = get_default_journal_files( )
+    estimator = DehydrateEstimator.from_journals( journal_files )
+    return estimator.estimate_dataframe( df.sort_values( 'paths' ), quality = quality )
+
+_ORDERINGS = {
+    'alphabetical' : _order_alphabetical,
+    'largest'      : _order_largest,
+    'bitrate'      : _order_bitrate,
+    'savings'      : _order_savings }
+
+def register_ordering( name, order_func ):
+    """
+    Adds an ordering strategy.
+
+    :param str name: the name of the strategy, for instance as chosen on the command line.
+    :param order_func: the function ``order_func( df, quality, journal_files )`` that returns the :py:class:`DataFrame <pandas.DataFrame>` of candidates ``df`` sorted in the order to transcode them.
+    """
+    assert( name not in _ORDERINGS )
+    _ORDERINGS[ name ] = order_func
+
+def get_ordering_names( ):
+    """
+    :returns: the sorted :py:class:`list` of the names of the ordering strategies.
+    :rtype: list
+    """
+    return sorted( _ORDERINGS )
+
+def order_files_to_process( fnames_dict, ordering = DEFAULT_ORDERING, file_stats = None, quality = 28, journal_files = None ):
+    """
+    :param dict fnames_dict: the :py:class:`dict` of file to transcode to its :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>`, which may be ``None`` if not yet probed.
+    :param str ordering: the name of the ordering strategy. Default is ``savings``.
+    :param dict file_stats: optional :py:class:`dict` of file to its :py:class:`os.stat_result`.
+    :param int quality: the x265 quality of the encodes, from which the ``savings`` strategy estimates.
+    :param journal_files: the progress journals from which the ``savings`` strategy learns. Default is every ``.jsonl`` file in the current directory.
+    :returns: the :py:class:`list` of files in the order to transcode them.
+    :rtype: list
+    """
+    assert( ordering in _ORDERINGS ), 'ordering %s not one of %s.' % ( ordering, get_ordering_names( ) )
+    #
+    ## the estimator pulls in pandas, so only import it when there is something to order
+    from howdy_grabbag.utils.estimator import get_candidates_dataframe
+    if len( fnames_dict ) == 0: return [ ]
+    if ordering == 'alphabetical': return sorted( fnames_dict )
+    fnames_dict = dict( fnames_dict )
+    fnames_missing = list(filter(lambda fname: fnames_dict[ fname ] is None, fnames_dict ) )
+    if len( fnames_missing ) != 0: fnames_dict.update( iter_media_infos( fnames_missing ) )
+    if file_stats is None: file_stats = { }
+    file_stats = dict(map(lambda fname: ( fname, file_stats[ fname ] if fname in file_stats else os.stat( fname ) ), fnames_dict ) )
+    df_ordered = _ORDERINGS[ ordering ]( get_candidates_dataframe( fnames_dict, file_stats ), quality, journal_files )
+    logging.info( 'ORDERED %d FILES BY %s.' % ( len( df_ordered ), ordering ) )
+    return list( df_ordered.paths )
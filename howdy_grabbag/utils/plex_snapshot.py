@@ -0,0 +1,194 @@
+"""
+A local snapshot of the episodes in a Plex_ TV library, so that listing the TV shows to dehydrate, and then narrowing down to one of them, does not fetch the whole library from the server every time.
+
+The snapshot is an HDF5_ file, written through :py:meth:`pandas.DataFrame.to_hdf`, under :py:meth:`get_config_directory <howdy_grabbag.get_config_directory>`. It holds three tables: ``episodes``, one row per episode; ``shows``, one row per show with its ``ratingKey``, ``updatedAt``, ``addedAt``, and number of episodes; and ``meta``, the library's ``updatedAt`` and when the snapshot was last checked against the server.
+
+A snapshot younger than its time to live is used as is. An older one is refreshed incrementally: if the library's ``updatedAt`` has not changed, nothing is fetched; otherwise only the episodes of the shows that are new, or whose ``updatedAt``, ``addedAt``, or number of episodes changed, are fetched.
+
+.. _Plex: https://plex.tv
+.. _HDF5: https://www.hdfgroup.org/solutions/hdf5
+"""
+import os, re, time, logging, pandas
+from concurrent.futures import ThreadPoolExecutor
+from howdy_grabbag import get_config_directory
+
+_EPISODE_COLUMNS = ( 'shows', 'rating key', 'seasons', 'epnos', 'names', 'paths', 'sizes', 'durations' )
+_SHOW_COLUMNS = ( 'shows', 'rating key', 'updated at', 'added at', 'num episodes' )
+
+def get_snapshot_file( library_name = 'TV Shows' ):
+    """
+    :param str library_name: the name of the TV library on the Plex_ server.
+    :returns: the HDF5 snapshot file of that library, ``plex_snapshot_<library name>.h5`` in the ``howdy_grabbag`` configuration directory.
+    :rtype: str
+    """
+    return os.path.join(
+        get_config_directory( ), 'plex_snapshot_%s.h5' % re.sub( r'[^A-Za-z0-9]+', '_', library_name ).strip( '_' ) )
+
+def _get_timestamp( datetime_value ):
+    if datetime_value is None: return 0
+    return int( datetime_value.timestamp( ) )
+
+def read_snapshot( snapshot_file ):
+    """
+    :param str snapshot_file: the HDF5 snapshot file.
+    :returns: a ``( df_meta, df_shows, df_episodes )`` tuple of the snapshot's tables, or ``None`` if there is no readable snapshot.
+    :rtype: tuple
+    """
+    if not os.path.isfile( snapshot_file ): return None
+    try:
+        return tuple(map(lambda key: pandas.read_hdf( snapshot_file, key ), ( 'meta', 'shows', 'episodes' ) ) )
+    except Exception as e:
+        logging.warning( 'COULD NOT READ PLEX SNAPSHOT %s. ERROR MESSAGE = %s.' % ( snapshot_file, str( e ) ) )
+        return None
+
+def write_snapshot( snapshot_file, df_meta, df_shows, df_episodes ):
+    """
+    Writes the snapshot's tables into a temporary file, and then swaps it in, so that a reader never sees a partial snapshot.
+
+    :param str snapshot_file: the HDF5 snapshot file.
+    :param df_meta: the one-row :py:class:`DataFrame <pandas.DataFrame>` with columns ``library``, ``updated at``, and ``checked at``.
+    :param df_shows: the :py:class:`DataFrame <pandas.DataFrame>` of shows.
+    :param df_episodes: the :py:class:`DataFrame <pandas.DataFrame>` of episodes.
+    """
+    tempfile = '%s.tmp' % snapshot_file
+    try:
+        for key, df in ( ( 'meta', df_meta ), ( 'shows', df_shows ), ( 'episodes', df_episodes ) ):
+            df.reset_index( drop = True ).to_hdf( tempfile, key = key, mode = 'a', format = 'fixed', complevel = 5 )
+        os.replace( tempfile, snapshot_file )
+    except Exception as e:
+        logging.warning( 'COULD NOT WRITE PLEX SNAPSHOT %s. ERROR MESSAGE = %s.' % ( snapshot_file, str( e ) ) )
+    finally:
+        if os.path.isfile( tempfile ): os.remove( tempfile )
+
+def _get_show_episodes( show ):
+    #
+    ## one request for all of a show's episodes
+    rows = [ ]
+    for episode in show.episodes( ):
+        parts = [ part for media in episode.media for part in media.parts ]
+        if len( parts ) == 0: continue
+        rows.append( (
+            show.title, int( show.ratingKey ), episode.parentIndex, episode.index, episode.title,
+            parts[ 0 ].file, parts[ 0 ].size, 1e-3 * ( episode.duration or 0 ) ) )
+    return rows
+
+def get_tvdata_from_episodes( df_episodes ):
+    """
+    :param df_episodes: the :py:class:`DataFrame <pandas.DataFrame>` of episodes in a snapshot.
+    :returns: the TV library data in the nested layout that :py:meth:`get_all_durations_dataframe <howdy_grabbag.utils.dehydrate.get_all_durations_dataframe>` takes: show name, then ``seasons``, then season number, then ``episodes``, then episode number, to a :py:class:`dict` with the episode's ``path``, ``size`` in bytes, ``duration`` in seconds, and ``title``.
+    :rtype: dict
+    """
+    tvdata = { }
+    for show, seasno, epno, title, path, size, duration in zip(
+            df_episodes.shows, df_episodes.seasons, df_episodes.epnos, df_episodes.names,
+            df_episodes.paths, df_episodes.sizes, df_episodes.durations ):
+        tvdata.setdefault( show, { 'seasons' : { } } )[ 'seasons' ].setdefault(
+            seasno, { 'episodes' : { } } )[ 'episodes' ][ epno ] = {
+                'path' : path, 'size' : size, 'duration' : duration, 'title' : title }
+    return tvdata
+
+def refresh_snapshot( section, snapshot = None, num_threads = 8 ):
+    """
+    Brings a snapshot up to date with the TV library on the Plex_ server, fetching only the episodes of shows that changed.
+
+    :param section: the :py:class:`ShowSection <plexapi.library.ShowSection>` of the TV library.
+    :param tuple snapshot: the ``( df_meta, df_shows, df_episodes )`` tuple of the current snapshot, or ``None`` to fetch everything.
+    :param int num_threads: the number of shows to fetch concurrently.
+    :returns: the refreshed ``( df_meta, df_shows, df_episodes )`` tuple.
+    :rtype: tuple
+    """
+    assert( num_threads >= 1 )
+    time0 = time.perf_counter( )
+    section_updated_at = _get_timestamp( section.updatedAt )
+    df_meta = pandas.DataFrame( {
+        'library' : [ section.title ], 'updated at' : [ section_updated_at ], 'checked at' : [ time.time( ) ] } )
+    if snapshot is not None and int( snapshot[ 0 ][ 'updated at' ].iloc[ 0 ] ) == section_updated_at:
+        logging.info( 'PLEX LIBRARY %s UNCHANGED SINCE LAST SNAPSHOT.' % section.title )
+        return df_meta, snapshot[ 1 ], snapshot[ 2 ]
+    #
+    ## which shows are new or changed since the last snapshot
+    shows = section.all( )
+    df_shows = pandas.DataFrame.from_records( list(map(lambda show: (
+        show.title, int( show.ratingKey ), _get_timestamp( show.updatedAt ),
+        _get_timestamp( show.addedAt ), int( show.leafCount or 0 ) ), shows ) ), columns = _SHOW_COLUMNS )
+    show_of_key = dict(map(lambda show: ( int( show.ratingKey ), show ), shows ) )
+    if snapshot is None:
+        changed_keys = set( df_shows[ 'rating key' ] )
+        df_episodes_kept = pandas.DataFrame( columns = _EPISODE_COLUMNS )
+    else:
+        df_merged = df_shows.merge( snapshot[ 1 ], on = 'rating key', how = 'left', suffixes = ( '', ' old' ) )
+        is_changed = ( df_merged[ 'updated at old' ].isna( ) |
+                       ( df_merged[ 'updated at' ] != df_merged[ 'updated at old' ] ) |
+                       ( df_merged[ 'added at' ] != df_merged[ 'added at old' ] ) |
+                       ( df_merged[ 'num episodes' ] != df_merged[ 'num episodes old' ] ) )
+        changed_keys = set( df_merged[ 'rating key' ][ is_changed ] )
+        df_episodes_old = snapshot[ 2 ]
+        df_episodes_kept = df_episodes_old[
+            df_episodes_old[ 'rating key' ].isin( set( df_shows[ 'rating key' ] ) - changed_keys ) ]
+    #
+    ## a show that cannot be fetched now keeps its old episodes, and is fetched again next time
+    def _fetch( rating_key ):
+        try: return rating_key, _get_show_episodes( show_of_key[ rating_key ] )
+        except Exception as e:
+            logging.warning( 'COULD NOT FETCH EPISODES OF %s. ERROR MESSAGE = %s.' % (
+                show_of_key[ rating_key ].title, str( e ) ) )
+            return rating_key, None
+    rows = [ ]
+    failed_keys = set( )
+    with ThreadPoolExecutor( max_workers = num_threads ) as executor:
+        for rating_key, show_rows in executor.map( _fetch, sorted( changed_keys ) ):
+            if show_rows is None: failed_keys.add( rating_key )
+            else: rows += show_rows
+    df_episodes_new = pandas.DataFrame.from_records( rows, columns = _EPISODE_COLUMNS )
+    df_episodes_list = [ df_episodes_kept, df_episodes_new ]
+    if len( failed_keys ) != 0:
+        df_shows.loc[ df_shows[ 'rating key' ].isin( failed_keys ), 'updated at' ] = -1
+        if snapshot is not None:
+            df_episodes_list.append( snapshot[ 2 ][ snapshot[ 2 ][ 'rating key' ].isin( failed_keys ) ] )
+    df_episodes = pandas.concat( list(filter(lambda df: len( df ) != 0, df_episodes_list ) ) or [ df_episodes_new ],
+                                 ignore_index = True )
+    logging.info( 'REFRESHED PLEX SNAPSHOT OF %s: FETCHED %d / %d SHOWS IN %0.3f SECONDS.' % (
+        section.title, len( changed_keys ), len( df_shows ), time.perf_counter( ) - time0 ) )
+    return df_meta, df_shows, df_episodes
+
+def get_tv_library_snapshot( library_name = 'TV Shows', ttl_secs = 86_400, refresh = False, num_threads = 8 ):
+    """
+    :param str library_name: the name of the TV library on the local Plex_ server.
+    :param float ttl_secs: the seconds for which a snapshot is used without checking the server. Default is 86400, one day.
+    :param bool refresh: if ``True``, then check the server now, even if the snapshot is younger than ``ttl_secs``.
+    :param int num_threads: the number of shows to fetch concurrently.
+    :returns: the TV library data, in the layout of :py:meth:`get_tvdata_from_episodes <howdy_grabbag.utils.plex_snapshot.get_tvdata_from_episodes>`.
+    :rtype: dict
+    """
+    assert( ttl_secs >= 0 )
+    snapshot_file = get_snapshot_file( library_name )
+    snapshot = read_snapshot( snapshot_file )
+    if snapshot is not None and not refresh:
+        age = time.time( ) - float( snapshot[ 0 ][ 'checked at' ].iloc[ 0 ] )
+        if age < ttl_secs:
+            logging.info( 'USING PLEX SNAPSHOT %s, %0.1f HOURS OLD.' % ( snapshot_file, age / 3_600 ) )
+            return get_tvdata_from_episodes( snapshot[ 2 ] )
+    #
+    from plexapi.server import PlexServer
+    from howdy.core import core
+    fullURL, token = core.checkServerCredentials( doLocal = True )
+    section = PlexServer( fullURL, token ).library.section( library_name )
+    snapshot = refresh_snapshot( section, snapshot = snapshot, num_threads = num_threads )
+    write_snapshot( snapshot_file, *snapshot )
+    return get_tvdata_from_episodes( snapshot[ 2 ] )
+
+def invalidate_shows( library_name, shownames ):
+    """
+    Marks shows in a snapshot as changed, so that the next refresh fetches their episodes again -- for instance after dehydrating them, which changes their sizes without necessarily changing their ``updatedAt``. The library's ``updatedAt`` and check time are also reset, so that the next call to :py:meth:`get_tv_library_snapshot <howdy_grabbag.utils.plex_snapshot.get_tv_library_snapshot>` checks the server.
+
+    :param str library_name: the name of the TV library on the Plex_ server.
+    :param shownames: the names of the shows.
+    """
+    snapshot_file = get_snapshot_file( library_name )
+    snapshot = read_snapshot( snapshot_file )
+    if snapshot is None: return
+    df_meta, df_shows, df_episodes = snapshot
+    df_meta = df_meta.assign( **{ 'updated at' : -1, 'checked at' : 0.0 } )
+    df_shows = df_shows.copy( )
+    df_shows.loc[ df_shows.shows.isin( set( shownames ) ), 'updated at' ] = -1
+    write_snapshot( snapshot_file, df_meta, df_shows, df_episodes )
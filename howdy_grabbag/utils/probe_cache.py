@@ -0,0 +1,153 @@
+"""
+A persistent, on-disk cache of ffprobe_ output, stored in a SQLite database under :py:meth:`get_config_directory <howdy_grabbag.get_config_directory>`.
+
+Each entry is keyed by the file's real path, and is only valid while the file's size, modification time (in nanoseconds), and inode are unchanged. The cache is bounded in size; when it grows too large, the least recently used entries are evicted.
+
+.. _ffprobe: https://ffmpeg.org/ffprobe.html
+"""
+import os, sqlite3, json, time, logging, threading
+from howdy_grabbag import get_config_directory
+
+_DEFAULT_MAX_BYTES = 256 * 1024**2
+_ACCESS_UPDATE_SECS = 3_600
+
+_probe_cache_enabled = True
+_probe_cache = None
+
+class ProbeCache( object ):
+    """
+    A size-bounded LRU cache of probe results, keyed by ``( realpath, size, mtime_ns, inode )``.
+
+    :param str dbfile: the SQLite database file. Default is ``probe_cache.db`` in the ``howdy_grabbag`` configuration directory.
+    :param int max_bytes: the maximum total size, in bytes, of cached probe payloads. Default is 256 MB.
+    """
+    def __init__( self, dbfile = None, max_bytes = _DEFAULT_MAX_BYTES ):
+        assert( max_bytes > 0 )
+        if dbfile is None:
+            dbfile = os.path.join( get_config_directory( ), 'probe_cache.db' )
+        self.dbfile = os.path.realpath( os.path.expanduser( dbfile ) )
+        self.max_bytes = max_bytes
+        self._local = threading.local( )
+        self._total_bytes = None
+        self._lock = threading.Lock( )
+
+    def _get_connection( self ):
+        #
+        ## one connection per process and per thread
+        conn = getattr( self._local, 'conn', None )
+        if conn is not None and self._local.pid == os.getpid( ):
+            return conn
+        conn = sqlite3.connect( self.dbfile, timeout = 60 )
+        conn.execute( 'PRAGMA journal_mode=WAL' )
+        conn.execute( 'PRAGMA synchronous=NORMAL' )
+        conn.execute( ' '.join([
+            'CREATE TABLE IF NOT EXISTS probes (',
+            'path TEXT NOT NULL, kind TEXT NOT NULL,',
+            'size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, inode INTEGER NOT NULL,',
+            'data TEXT NOT NULL, nbytes INTEGER NOT NULL, last_access REAL NOT NULL,',
+            'PRIMARY KEY ( path, kind ) )' ]) )
+        conn.execute( 'CREATE INDEX IF NOT EXISTS probes_last_access ON probes ( last_access )' )
+        conn.commit( )
+        self._local.conn = conn
+        self._local.pid  = os.getpid( )
+        return conn
+
+    @classmethod
+    def get_key( cls, filename, stat_result = None ):
+        """
+        :param str filename: the media file.
+        :param stat_result: optional :py:class:`os.stat_result` of the file, if one already exists.
+        :returns: the ``( realpath, size, mtime_ns, inode )`` cache key of the file.
+        :rtype: tuple
+        """
+        realpath = os.path.realpath( filename )
+        if stat_result is None: stat_result = os.stat( realpath )
+        return ( realpath, stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino )
+
+    def lookup( self, key, kind = 'ffprobe' ):
+        """
+        :param tuple key: the cache key from :py:meth:`get_key <howdy_grabbag.utils.probe_cache.ProbeCache.get_key>`.
+        :param str kind: the kind of probe payload.
+        :returns: the cached probe data, or ``None`` if there is no valid entry.
+        """
+        realpath, size, mtime_ns, inode = key
+        conn = self._get_connection( )
+        row = conn.execute(
+            'SELECT size, mtime_ns, inode, data, last_access FROM probes WHERE path = ? AND kind = ?',
+            ( realpath, kind ) ).fetchone( )
+        if row is None: return None
+        if tuple( row[:3] ) != ( size, mtime_ns, inode ): return None
+        #
+        ## only touch the access time every so often, so warm runs are read-mostly
+        now = time.time( )
+        if now - row[4] > _ACCESS_UPDATE_SECS:
+            with conn:
+                conn.execute( 'UPDATE probes SET last_access = ? WHERE path = ? AND kind = ?',
+                              ( now, realpath, kind ) )
+        return json.loads( row[3] )
+
+    def store( self, key, data, kind = 'ffprobe' ):
+        """
+        :param tuple key: the cache key from :py:meth:`get_key <howdy_grabbag.utils.probe_cache.ProbeCache.get_key>`.
+        :param data: the JSON-serializable probe data to store.
+        :param str kind: the kind of probe payload.
+        """
+        realpath, size, mtime_ns, inode = key
+        payload = json.dumps( data, separators = ( ',', ':' ) )
+        conn = self._get_connection( )
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO probes VALUES ( ?, ?, ?, ?, ?, ?, ?, ? )',
+                ( realpath, kind, size, mtime_ns, inode, payload, len( payload ), time.time( ) ) )
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = conn.execute( 'SELECT COALESCE( SUM( nbytes ), 0 ) FROM probes' ).fetchone( )[0]
+            else: self._total_bytes += len( payload )
+            if self._total_bytes > self.max_bytes:
+                self._evict( conn )
+
+    def _evict( self, conn ):
+        #
+        ## evict down to 90% of the bound, least recently used first
+        total_bytes = conn.execute( 'SELECT COALESCE( SUM( nbytes ), 0 ) FROM probes' ).fetchone( )[0]
+        target_bytes = int( 0.9 * self.max_bytes )
+        if total_bytes <= target_bytes:
+            self._total_bytes = total_bytes
+            return
+        paths_kinds = [ ]
+        removed = 0
+        for path, kind, nbytes in conn.execute(
+                'SELECT path, kind, nbytes FROM probes ORDER BY last_access ASC' ):
+            if total_bytes - removed <= target_bytes: break
+            paths_kinds.append( ( path, kind ) )
+            removed += nbytes
+        with conn:
+            conn.executemany( 'DELETE FROM probes WHERE path = ? AND kind = ?', paths_kinds )
+        self._total_bytes = total_bytes - removed
+        logging.info( 'EVICTED %d ENTRIES (%0.1f MB) FROM PROBE CACHE %s.' % (
+            len( paths_kinds ), removed / 1024**2, self.dbfile ) )
+
+def set_probe_cache_enabled( enabled = True ):
+    """
+    Globally turns the persistent probe cache on or off, for instance from a ``--no-probe-cache`` command line flag.
+
+    :param bool enabled: whether to use the probe cache.
+    """
+    global _probe_cache_enabled
+    _probe_cache_enabled = enabled
+
+def get_probe_cache( ):
+    """
+    :returns: the process-wide :py:class:`ProbeCache <howdy_grabbag.utils.probe_cache.ProbeCache>`, or ``None`` if the probe cache is turned off or cannot be opened.
+    """
+    global _probe_cache
+    if not _probe_cache_enabled: return None
+    if _probe_cache is None:
+        try:
+            _probe_cache = ProbeCache( )
+            _probe_cache._get_connection( )
+        except Exception as e:
+            logging.debug( 'COULD NOT OPEN PROBE CACHE. ERROR MESSAGE = %s.' % str( e ) )
+            set_probe_cache_enabled( False )
+            _probe_cache = None
+    return _probe_cache
@@ -0,0 +1,169 @@
+"""
+An asyncio_ probe engine that limits concurrency *per filesystem*. Files are grouped by the device (``st_dev``) they live on, and each device gets its own semaphore, so a slow NFS mount can be probed with a few concurrent ffprobe_ processes while a local disk is probed with many.
+
+:py:meth:`async_iter_media_infos <howdy_grabbag.utils.probe_engine.async_iter_media_infos>` is the async API, and :py:meth:`iter_media_infos <howdy_grabbag.utils.probe_engine.iter_media_infos>` is its synchronous wrapper.
+
+.. _asyncio: https://docs.python.org/3/library/asyncio.html
+.. _ffprobe: https://ffmpeg.org/ffprobe.html
+"""
+import os, json, asyncio, logging
+from concurrent.futures import ThreadPoolExecutor
+from howdy_grabbag.utils.media_info import (
+    MediaInfo, get_ffprobe_media_cmd, lookup_cached_media_info, store_cached_media_info )
+from howdy_grabbag.utils.media_headers import read_media_info_from_headers
+
+_probe_workers = min( 32, 4 * ( os.cpu_count( ) or 1 ) )
+_mount_concurrency = { }
+
+def set_probe_workers( num_workers ):
+    """
+    Sets the default number of concurrent probes on each filesystem, for instance from a ``--probe-workers`` command line argument. Probing waits on disk reads or on ffprobe_ child processes, so this can be set independently of the number of cores.
+
+    :param int num_workers: the number of concurrent probes. Must be >= 1.
+    """
+    global _probe_workers
+    assert( num_workers >= 1 )
+    _probe_workers = num_workers
+
+def get_probe_workers( ):
+    """
+    :returns: the default number of concurrent probes on each filesystem. Default is 4 times the number of cores, at most 32.
+    :rtype: int
+    """
+    return _probe_workers
+
+def set_mount_concurrency( mount_concurrency ):
+    """
+    Sets the number of concurrent probes on specific filesystems. Devices that are not given here use :py:meth:`get_probe_workers <howdy_grabbag.utils.probe_engine.get_probe_workers>`.
+
+    :param dict mount_concurrency: a :py:class:`dict` of path on the filesystem (usually its mount point) to the number of concurrent probes, which must be >= 1.
+    """
+    global _mount_concurrency
+    assert( all(map(lambda num: num >= 1, mount_concurrency.values( ) ) ) )
+    _mount_concurrency = dict(map(
+        lambda path: ( os.stat( os.path.expanduser( path ) ).st_dev, mount_concurrency[ path ] ),
+        mount_concurrency ) )
+
+def parse_mount_concurrency( entries ):
+    """
+    :param list entries: command line entries of the form ``PATH=NUMBER``, for example ``/mnt/nfs=4``.
+    :returns: the :py:class:`dict` of path to number of concurrent probes, suitable for :py:meth:`set_mount_concurrency <howdy_grabbag.utils.probe_engine.set_mount_concurrency>`.
+    :rtype: dict
+    """
+    mount_concurrency = { }
+    for entry in entries:
+        path, _, num = entry.rpartition( '=' )
+        if len( path ) == 0 or not num.strip( ).isdigit( ):
+            raise ValueError( 'Error, mount concurrency entry = %s is not of the form PATH=NUMBER.' % entry )
+        mount_concurrency[ path ] = int( num )
+    return mount_concurrency
+
+async def _async_probe_ffprobe( filename ):
+    proc = await asyncio.create_subprocess_exec(
+        *get_ffprobe_media_cmd( filename ),
+        stdout = asyncio.subprocess.PIPE, stderr = asyncio.subprocess.DEVNULL )
+    stdout_val, _ = await proc.communicate( )
+    if proc.returncode != 0:
+        raise ValueError( 'ffprobe exited with return code %d.' % proc.returncode )
+    return MediaInfo.from_ffprobe_json( filename, json.loads( stdout_val ) )
+
+def _lookup_or_read_headers( filename, stat_result ):
+    key, info = lookup_cached_media_info( filename, stat_result = stat_result )
+    if info is not None: return key, info, True
+    return key, read_media_info_from_headers( filename ), False
+
+async def async_get_media_info( filename, semaphore, stat_result = None, executor = None ):
+    """
+    The async counterpart of :py:meth:`get_media_info <howdy_grabbag.utils.media_info.get_media_info>`. Cache lookups and header reads run on a worker thread, and ffprobe_ runs as an asyncio subprocess, all while holding ``semaphore``.
+
+    :param str filename: the media file.
+    :param semaphore: the :py:class:`asyncio.Semaphore` of the filesystem on which the file lives.
+    :param stat_result: optional :py:class:`os.stat_result` of the file, if one already exists.
+    :param executor: optional :py:class:`concurrent.futures.ThreadPoolExecutor` on which to run the cache lookups and header reads. Default is the event loop's default executor.
+    :returns: the :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>` of the file, or ``None`` if it could not be probed.
+    """
+    loop = asyncio.get_running_loop( )
+    async with semaphore:
+        try:
+            key, info, is_cached = await loop.run_in_executor(
+                executor, _lookup_or_read_headers, filename, stat_result )
+            if is_cached: return info
+            if info is None: info = await _async_probe_ffprobe( filename )
+        except Exception as e:
+            logging.debug( 'PROBLEM WITH %s. ERROR MESSAGE = %s.' % (
+                os.path.realpath( filename ), str( e ) ) )
+            return None
+    await loop.run_in_executor( executor, store_cached_media_info, key, info )
+    return info
+
+async def async_iter_media_infos( fnames, default_concurrency = None, file_stats = None ):
+    """
+    Probes files with one semaphore per filesystem, and yields results as they complete. At most twice as many files as the sum of the per-filesystem limits are in flight at any time, so memory does not grow with the number of files. The stat calls, cache lookups, and header reads run on a dedicated thread pool with one thread per file in flight, so that a stalled filesystem does not block the event loop, and large per-filesystem limits are not capped by the size of the default executor.
+
+    :param fnames: an iterable of media files.
+    :param int default_concurrency: the number of concurrent probes on filesystems not set by :py:meth:`set_mount_concurrency <howdy_grabbag.utils.probe_engine.set_mount_concurrency>`. Default is :py:meth:`get_probe_workers <howdy_grabbag.utils.probe_engine.get_probe_workers>`.
+    :param dict file_stats: optional :py:class:`dict` of file name to :py:class:`os.stat_result`, so that files are not stat'ed twice.
+    :returns: an async generator of ``( fname, info )`` tuples, where ``info`` is a :py:class:`MediaInfo <howdy_grabbag.utils.media_info.MediaInfo>` or ``None``.
+    """
+    if default_concurrency is None: default_concurrency = get_probe_workers( )
+    assert( default_concurrency >= 1 )
+    if file_stats is None: file_stats = { }
+    max_in_flight = 2 * ( default_concurrency + sum( _mount_concurrency.values( ) ) )
+    loop = asyncio.get_running_loop( )
+    executor = ThreadPoolExecutor( max_workers = max_in_flight )
+    semaphores = { }
+    def _get_semaphore( st_dev ):
+        if st_dev not in semaphores:
+            semaphores[ st_dev ] = asyncio.Semaphore(
+                _mount_concurrency.get( st_dev, default_concurrency ) )
+        return semaphores[ st_dev ]
+    #
+    async def _probe( fname ):
+        stat_result = file_stats.get( fname )
+        try:
+            if stat_result is None: stat_result = await loop.run_in_executor( executor, os.stat, fname )
+        except Exception as e:
+            logging.debug( 'PROBLEM WITH %s. ERROR MESSAGE = %s.' % ( fname, str( e ) ) )
+            return fname, None
+        return fname, await async_get_media_info(
+            fname, _get_semaphore( stat_result.st_dev ), stat_result = stat_result, executor = executor )
+    #
+    fnames_iter = iter( fnames )
+    pending = set( )
+    def _fill( ):
+        while len( pending ) < max_in_flight:
+            fname = next( fnames_iter, None )
+            if fname is None: return
+            pending.add( asyncio.ensure_future( _probe( fname ) ) )
+    try:
+        _fill( )
+        while len( pending ) > 0:
+            done, _ = await asyncio.wait( pending, return_when = asyncio.FIRST_COMPLETED )
+            pending.difference_update( done )
+            _fill( )
+            for task in done: yield task.result( )
+    finally:
+        for task in pending: task.cancel( )
+        await asyncio.gather( *pending, return_exceptions = True )
+        executor.shutdown( wait = False )
+
+def iter_media_infos( fnames, default_concurrency = None, file_stats = None ):
+    """
+    The synchronous wrapper around :py:meth:`async_iter_media_infos <howdy_grabbag.utils.probe_engine.async_iter_media_infos>`. It drives its own event loop, and still yields results as they complete.
+
+    :param fnames: an iterable of media files.
+    :param int default_concurrency: the number of concurrent probes on filesystems not set by :py:meth:`set_mount_concurrency <howdy_grabbag.utils.probe_engine.set_mount_concurrency>`.
+    :param dict file_stats: optional :py:class:`dict` of file name to :py:class:`os.stat_result`.
+    :returns: a generator of ``( fname, info )`` tuples.
+    """
+    loop = asyncio.new_event_loop( )
+    agen = async_iter_media_infos(
+        fnames, default_concurrency = default_concurrency, file_stats = file_stats )
+    try:
+        while True:
+            try: yield loop.run_until_complete( agen.__anext__( ) )
+            except StopAsyncIteration: break
+    finally:
+        loop.run_until_complete( agen.aclose( ) )
+        loop.run_until_complete( loop.shutdown_asyncgens( ) )
+        loop.close( )
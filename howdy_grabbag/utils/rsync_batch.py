@@ -0,0 +1,100 @@
+"""
+Uploads many finished files to the remote media directory collections at once. Uploading each file with its own rsync_ process pays for an SSH handshake and authentication every time. :py:class:`RsyncBatchUploader <howdy_grabbag.utils.rsync_batch.RsyncBatchUploader>` instead groups the files by ``( alias, remote directory )``, and pushes each group with a single rsync_ process that reads the files with ``--files-from``. Every rsync_ process shares one SSH ControlMaster_ connection per remote server, which stays open for a minute after the last one finishes.
+
+.. _rsync: https://rsync.samba.org
+.. _ControlMaster: https://man.openbsd.org/ssh_config#ControlMaster
+"""
+import os, time, shlex, tempfile, subprocess, logging
+from howdy_grabbag import get_exec
+from howdy_grabbag.utils import get_remote_upload_target, rsync_upload_mkv
+
+_CONTROL_PERSIST_SECS = 60
+
+def get_ssh_command( password = None ):
+    """
+    :param str password: the SSH password, or ``None`` if the SSH keys suffice.
+    :returns: the SSH command, for rsync_'s ``--rsh``, that opens or reuses the SSH ControlMaster_ connection to the remote server.
+    :rtype: str
+    """
+    #
+    ## %C is a hash of the connection, which keeps the socket path short enough
+    control_path = os.path.join( tempfile.gettempdir( ), 'howdy_grabbag_ssh_%C' )
+    ssh_cmd = ' '.join([
+        get_exec( 'ssh' ), '-o', 'ControlMaster=auto', '-o', shlex.quote( 'ControlPath=%s' % control_path ),
+        '-o', 'ControlPersist=%d' % _CONTROL_PERSIST_SECS ])
+    if not password: return ssh_cmd
+    return '%s -p %s %s' % ( get_exec( 'sshpass' ), shlex.quote( password ), ssh_cmd )
+
+def get_rsync_files_from_commands( sshpath, password, finaldir, files_from ):
+    """
+    :param str sshpath: the ``user@host`` SSH path of the remote server.
+    :param str password: the SSH password, or ``None`` if the SSH keys suffice.
+    :param str finaldir: the remote directory into which to upload.
+    :param str files_from: the file that lists the absolute paths of the local files to upload, each ending in a NUL character.
+    :returns: a ``( mycmd, mxcmd )`` tuple of the rsync_ command that uploads all the files in ``files_from`` into ``finaldir`` in one session, and the same command with the password masked out, for logging.
+    :rtype: tuple
+    """
+    def _get_cmd( password_str ):
+        return ' '.join([
+            get_exec( 'rsync' ), '-P', '-avz', '--protect-args', '--from0', '--no-relative',
+            '--files-from=%s' % shlex.quote( files_from ),
+            '--rsh=%s' % shlex.quote( get_ssh_command( password_str ) ),
+            '/', shlex.quote( '%s:%s/' % ( sshpath, finaldir ) ) ])
+    return _get_cmd( password ), _get_cmd( 'XXXX' if password else password )
+
+class RsyncBatchUploader( object ):
+    """
+    Collects finished files, grouped by ``( alias, sub directory )``, and uploads each group with one rsync_ process. The remote media directory collections, and the remote directories found to exist, are looked up once per process.
+
+    :param mediatype: the :py:class:`MediaType <howdy.core.SSHUploadPaths.MediaType>` of the collections. Default is ``movie``.
+    :param int numtries: the most times to try each rsync_ upload. Default is 10.
+    """
+    def __init__( self, mediatype = None, numtries = 10 ):
+        assert( numtries > 0 )
+        self.mediatype = mediatype
+        self.numtries = numtries
+        self._groups = { }
+
+    def add( self, alias, subdir, filename ):
+        """
+        :param str alias: the alias of the remote media directory collection.
+        :param str subdir: the sub directory, of the main directory of the collection, into which to upload.
+        :param str filename: the finished file to upload.
+        """
+        assert( os.path.isfile( filename ) )
+        self._groups.setdefault( ( alias, subdir ), [ ] ).append( os.path.abspath( filename ) )
+
+    def _upload_group( self, alias, subdir, fnames ):
+        target = get_remote_upload_target( alias, subdir, mediatype = self.mediatype )
+        if target is None: return 'FAILURE'
+        sshpath, password, finaldir = target
+        with tempfile.NamedTemporaryFile( 'wb', suffix = '.files', delete = False ) as openfile:
+            openfile.write( b''.join(map(lambda filename: os.fsencode( filename ) + b'\0', fnames ) ) )
+        files_from = openfile.name
+        time0 = time.perf_counter( )
+        try:
+            mycmd, mxcmd = get_rsync_files_from_commands( sshpath, password, finaldir, files_from )
+            status, _ = rsync_upload_mkv( mycmd, mxcmd, numtries = self.numtries )
+        except subprocess.CalledProcessError as e:
+            logging.error( 'RSYNC TO %s:%s FAILED. ERROR MESSAGE = %s.' % (
+                sshpath, finaldir, e.output.decode( 'utf8', errors = 'replace' ) if e.output else str( e ) ) )
+            status = 'FAILURE'
+        finally:
+            os.remove( files_from )
+        dt = time.perf_counter( ) - time0
+        size_mb = sum(map(lambda filename: os.stat( filename ).st_size if os.path.isfile( filename ) else 0, fnames ) ) / 1024**2
+        logging.info( 'UPLOADED %d FILES (%0.1f MB) TO %s:%s IN %0.3f SECONDS (%0.1f MB/s): %s.' % (
+            len( fnames ), size_mb, sshpath, finaldir, dt, size_mb / max( dt, 1e-6 ), status ) )
+        return status
+
+    def upload( self ):
+        """
+        Uploads every group of files, one rsync_ process per group, and forgets them.
+
+        :returns: a :py:class:`dict` of ``( alias, sub directory )`` to ``SUCCESS`` or ``FAILURE``.
+        :rtype: dict
+        """
+        statuses = dict(map(lambda key: ( key, self._upload_group( key[0], key[1], self._groups[ key ] ) ),
+                            sorted( self._groups ) ) )
+        self._groups = { }
+        return statuses
@@ -0,0 +1,155 @@
+"""
+Where transcodes write their temporary outputs, and how those outputs replace the originals.
+
+By default a temporary output goes into a hidden ``.howdy_grabbag_staging`` directory next to the file it replaces, so it is on the same device, and the final swap is an atomic :py:meth:`os.replace` rather than a multi-gigabyte copy plus delete. Alternatively, encoders can write to a fast local scratch directory (see :py:meth:`set_scratch_directory <howdy_grabbag.utils.staging.set_scratch_directory>`), and each finished output is then copied back to the target's device once, and swapped in atomically.
+"""
+import os, re, time, uuid, shutil, logging
+from itertools import chain
+
+STAGING_DIRNAME = '.howdy_grabbag_staging'
+
+_scratch_directory = None
+
+_TEMPFILE_REGEX = re.compile( r'^[0-9a-f]{8}-(.+)$' )
+
+def set_scratch_directory( directory ):
+    """
+    Sets the scratch directory into which encoders write, for instance from a ``--scratch`` command line argument.
+
+    :param str directory: the scratch directory, which must exist. If ``None``, then stage temporary outputs on the same device as the files they replace.
+    """
+    global _scratch_directory
+    if directory is not None:
+        directory = os.path.realpath( os.path.expanduser( directory ) )
+        assert( os.path.isdir( directory ) )
+    _scratch_directory = directory
+
+def get_scratch_directory( ):
+    """
+    :returns: the scratch directory, or ``None`` if temporary outputs are staged on the same device as the files they replace.
+    :rtype: str
+    """
+    return _scratch_directory
+
+def _get_same_device_directory( target, create = True ):
+    dirname = os.path.dirname( os.path.abspath( target ) )
+    staging_dir = os.path.join( dirname, STAGING_DIRNAME )
+    if create:
+        try: os.makedirs( staging_dir, exist_ok = True )
+        except OSError as e:
+            logging.warning( 'COULD NOT CREATE STAGING DIRECTORY %s. ERROR MESSAGE = %s.' % ( staging_dir, str( e ) ) )
+            return None
+    if not os.path.isdir( staging_dir ): return None
+    #
+    ## something mounted on the staging directory would turn the swap back into a copy
+    if os.stat( staging_dir ).st_dev != os.stat( dirname ).st_dev:
+        logging.warning( 'STAGING DIRECTORY %s IS NOT ON THE SAME DEVICE AS %s.' % ( staging_dir, dirname ) )
+        return None
+    return staging_dir
+
+def get_staging_directory( target ):
+    """
+    :param str target: the file that a transcode will replace or create.
+    :returns: the directory into which to write the temporary output: the scratch directory if one is set, otherwise the hidden staging directory on the same device as ``target``, otherwise the current directory.
+    :rtype: str
+    """
+    if _scratch_directory is not None: return _scratch_directory
+    staging_dir = _get_same_device_directory( target )
+    if staging_dir is None: return os.getcwd( )
+    return staging_dir
+
+def get_temp_basename( filename, suffix = None ):
+    """
+    :param str filename: the file to transcode.
+    :param str suffix: optional new suffix, for instance ``mkv``.
+    :returns: the base name of ``filename``, with its suffix replaced by ``suffix``, and colons replaced by dashes.
+    :rtype: str
+    """
+    basename = os.path.basename( filename ).replace(":", "-" )
+    if suffix is not None:
+        basename = '.'.join( basename.split('.')[:-1] + [ suffix, ] )
+    return basename
+
+def get_staging_file( filename, target = None, suffix = None ):
+    """
+    :param str filename: the file to transcode.
+    :param str target: the file that the output will replace or create. Default is ``filename``.
+    :param str suffix: optional new suffix of the output, for instance ``mkv``.
+    :returns: a uniquely named temporary output, ``<8 hex digits>-<file name>``, in the :py:meth:`staging directory <howdy_grabbag.utils.staging.get_staging_directory>` of ``target``.
+    :rtype: str
+    """
+    if target is None: target = filename
+    return os.path.join(
+        get_staging_directory( target ),
+        '%s-%s' % ( str( uuid.uuid4( ) ).split('-')[0].strip( ), get_temp_basename( filename, suffix ) ) )
+
+def commit_staged_file( newfile, target ):
+    """
+    Replaces ``target`` with the temporary output ``newfile``. If both are on the same device, this is an atomic :py:meth:`os.replace`. Otherwise ``newfile`` is first copied into the staging directory of ``target``, and the copy-back time is logged.
+
+    :param str newfile: the temporary output.
+    :param str target: the file to replace or create.
+    :returns: the number of seconds spent copying ``newfile`` back to the device of ``target``, or ``None`` if it was only renamed.
+    :rtype: float
+    """
+    target_dir = os.path.dirname( os.path.abspath( target ) )
+    if os.stat( newfile ).st_dev == os.stat( target_dir ).st_dev:
+        os.replace( newfile, target )
+        return None
+    #
+    ## one copy back onto the target's device, then an atomic swap
+    time0 = time.perf_counter( )
+    staging_dir = _get_same_device_directory( target )
+    if staging_dir is None: staging_dir = target_dir
+    copyfile = os.path.join( staging_dir, os.path.basename( newfile ) )
+    try:
+        shutil.copyfile( newfile, copyfile )
+        shutil.copymode( newfile, copyfile )
+        os.replace( copyfile, target )
+    except Exception:
+        if os.path.isfile( copyfile ): os.remove( copyfile )
+        raise
+    os.remove( newfile )
+    dt = time.perf_counter( ) - time0
+    size_mb = os.stat( target ).st_size / 1024**2
+    logging.info( 'COPIED BACK %s (%0.1f MB) IN %0.3f SECONDS (%0.1f MB/s).' % (
+        target, size_mb, dt, size_mb / max( dt, 1e-6 ) ) )
+    return dt
+
+def remove_orphaned_temp_files( fnames ):
+    """
+    Removes the partial temporary outputs, named ``<8 hex digits>-<file name>``, that transcodes of ``fnames`` interrupted by a crash or reboot left behind -- in their staging directories, in the scratch directory, and in the current directory. A partial output cannot be finished, so the transcode starts over.
+
+    :param fnames: the files whose transcodes were interrupted.
+    :returns: the :py:class:`list` of temporary files removed.
+    :rtype: list
+    """
+    fnames = list( fnames )
+    basenames = set( chain.from_iterable(map(lambda filename: map(
+        lambda suffix: get_temp_basename( filename, suffix ), ( None, 'mkv' ) ), fnames ) ) )
+    directories = set(filter(None, map(lambda filename: _get_same_device_directory( filename, create = False ), fnames ) ) )
+    directories.add( os.getcwd( ) )
+    if _scratch_directory is not None: directories.add( _scratch_directory )
+    #
+    def _is_orphan( entry ):
+        mat = _TEMPFILE_REGEX.match( entry.name )
+        return mat is not None and mat.group( 1 ) in basenames and entry.is_file( )
+    orphans = [ ]
+    for directory in sorted( directories ):
+        with os.scandir( directory ) as entries:
+            orphans += sorted(map(lambda entry: entry.path, filter(_is_orphan, entries ) ) )
+    for tempfile in orphans:
+        logging.info( 'REMOVING ORPHANED TEMPORARY FILE %s.' % tempfile )
+        os.remove( tempfile )
+    return orphans
+
+def remove_empty_staging_directories( fnames ):
+    """
+    Removes the hidden staging directories next to ``fnames`` that are empty, once a run is done with them.
+
+    :param fnames: the files that a run transcoded.
+    """
+    for staging_dir in set(map(lambda filename: os.path.join(
+            os.path.dirname( os.path.abspath( filename ) ), STAGING_DIRNAME ), fnames ) ):
+        try: os.rmdir( staging_dir )
+        except OSError: pass
@@ -0,0 +1,144 @@
+"""
+Runs many transcodes at once. A single x265_ encode only keeps 12 to 16 threads busy, so on a machine with many cores it is faster to run several encodes side by side than one after the other.
+
+The jobs run on a thread pool -- each thread spends its time waiting on a HandBrakeCLI_ or ffmpeg_ child process -- and results are handed back, one at a time, to the calling thread, which is the only one that writes progress.
+
+.. _x265: https://www.videolan.org/developers/x265.html
+.. _HandBrakeCLI: https://handbrake.fr/docs/en/latest/cli/cli-options.html
+.. _ffmpeg: https://ffmpeg.org
+"""
+import os, re, time, logging, subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+_DEFAULT_THREADS_PER_JOB = 16
+
+#
+## HandBrakeCLI logs "average encoding speed for job is 123.456 fps" at the end, ffmpeg its progress as "fps=123"
+HCLI_FPS_REGEX   = re.compile( r'average encoding speed for job is\s+([0-9.]+)\s+fps' )
+FFMPEG_FPS_REGEX = re.compile( r'fps=\s*([0-9.]+)' )
+
+def get_num_jobs( num_jobs = None, threads_per_job = _DEFAULT_THREADS_PER_JOB ):
+    """
+    :param int num_jobs: the number of concurrent transcodes. If ``None``, then derive it from the number of cores.
+    :param int threads_per_job: the number of threads that each transcode can use effectively. Default is 16.
+    :returns: ``num_jobs`` if given, otherwise the number of cores divided by ``threads_per_job``, and at least 1.
+    :rtype: int
+    """
+    assert( threads_per_job >= 1 )
+    if num_jobs is not None:
+        assert( num_jobs >= 1 )
+        return num_jobs
+    return max( 1, ( os.cpu_count( ) or 1 ) // threads_per_job )
+
+def get_job_core_sets( num_jobs = 1, threads_per_job = None ):
+    """
+    Splits the cores this process may run on into disjoint sets, one per concurrent transcode, so that concurrent encoders do not fight over the same cores.
+
+    :param int num_jobs: the number of concurrent transcodes. Must be >= 1.
+    :param int threads_per_job: the most threads that each transcode should use. If ``None``, then each transcode gets an equal share of the cores.
+    :returns: a :py:class:`list` of ``num_jobs`` disjoint :py:class:`tuple` of core ids. Returns ``None`` if there is a single transcode with no thread limit, if there are fewer cores than transcodes, or if this platform cannot set CPU affinity.
+    :rtype: list
+    """
+    assert( num_jobs >= 1 )
+    assert( threads_per_job is None or threads_per_job >= 1 )
+    if num_jobs == 1 and threads_per_job is None: return None
+    if not hasattr( os, 'sched_getaffinity' ): return None
+    cores = sorted( os.sched_getaffinity( 0 ) )
+    num_threads = len( cores ) // num_jobs
+    if num_threads == 0: return None
+    if threads_per_job is not None: num_threads = min( num_threads, threads_per_job )
+    return list(map(lambda idx: tuple( cores[ idx * num_threads : ( idx + 1 ) * num_threads ] ),
+                    range( num_jobs ) ) )
+
+def get_x265_thread_options( num_threads ):
+    """
+    :param int num_threads: the number of threads that a single x265_ encode may use.
+    :returns: the x265_ options string, ``pools=...:frame-threads=...``, to pass to HandBrakeCLI_ with ``--encopts``. The number of frame threads follows x265_'s own defaults for a machine with ``num_threads`` cores.
+    :rtype: str
+    """
+    assert( num_threads >= 1 )
+    frame_threads = 1
+    for min_threads, num_frame_threads in ( ( 32, 6 ), ( 16, 5 ), ( 8, 3 ), ( 4, 2 ) ):
+        if num_threads >= min_threads:
+            frame_threads = num_frame_threads
+            break
+    return 'pools=%d:frame-threads=%d' % ( num_threads, frame_threads )
+
+def run_with_affinity( cmd, cores = None ):
+    """
+    Runs a command to completion, like :py:meth:`subprocess.run` with ``check = True``, but pinned to ``cores``. This is safe to call from the worker threads of :py:meth:`iter_transcode_jobs <howdy_grabbag.utils.transcode_scheduler.iter_transcode_jobs>`: rather than a ``preexec_fn``, which is unsafe when the parent has threads, the child is pinned with :py:meth:`os.sched_setaffinity` right after it starts. Its own children inherit the affinity.
+
+    :param list cmd: the command and its arguments.
+    :param cores: the core ids on which to run the command, or ``None`` to run it anywhere. Ignored if this platform cannot set CPU affinity.
+    :returns: the finished :py:class:`subprocess.CompletedProcess`, with ``stdout`` and ``stderr`` as :py:class:`bytes`.
+    :raises subprocess.CalledProcessError: if the command exits with a nonzero status.
+    """
+    with subprocess.Popen( cmd, stdout = subprocess.PIPE, stderr = subprocess.PIPE ) as proc:
+        if cores is not None and hasattr( os, 'sched_setaffinity' ):
+            #
+            ## the child may already have exited
+            try: os.sched_setaffinity( proc.pid, set( cores ) )
+            except ProcessLookupError: pass
+            except OSError as e: logging.warning( 'could not pin %s to cores %s: %s' % ( cmd[0], cores, e ) )
+        try: stdout, stderr = proc.communicate( )
+        except BaseException:
+            proc.kill( )
+            raise
+        retcode = proc.poll( )
+    if retcode != 0:
+        raise subprocess.CalledProcessError( retcode, cmd, output = stdout, stderr = stderr )
+    return subprocess.CompletedProcess( cmd, retcode, stdout, stderr )
+
+def get_encode_fps( output, fps_regex = HCLI_FPS_REGEX ):
+    """
+    :param output: the :py:class:`bytes` or :py:class:`str` output of an encoder.
+    :param fps_regex: the regular expression that matches the encoder's frames per second, :py:data:`HCLI_FPS_REGEX` for HandBrakeCLI_ and :py:data:`FFMPEG_FPS_REGEX` for ffmpeg_.
+    :returns: the last frames per second that the encoder logged, or ``None`` if it logged none.
+    :rtype: float
+    """
+    if isinstance( output, bytes ): output = output.decode( 'utf8', errors = 'replace' )
+    matches = fps_regex.findall( output )
+    if len( matches ) == 0: return None
+    try: return float( matches[ -1 ] )
+    except ValueError: return None
+
+def iter_transcode_jobs( fnames, job_func, num_jobs = 1, core_sets = None ):
+    """
+    Runs ``job_func`` on each file, with at most ``num_jobs`` running at a time, and yields as each job finishes.
+
+    :param list fnames: the files to transcode, in the order in which to start them.
+    :param job_func: the function that transcodes a single file, called as ``job_func( fname, cores )``, where ``cores`` is the :py:class:`tuple` of core ids the job may run on, or ``None``. It must clean up its own temporary output if it fails.
+    :param int num_jobs: the number of concurrent transcodes. Must be >= 1.
+    :param list core_sets: optional disjoint core sets from :py:meth:`get_job_core_sets <howdy_grabbag.utils.transcode_scheduler.get_job_core_sets>`, one per concurrent transcode. Each running job holds one of these sets until it finishes.
+    :returns: a generator of ``( idx, fname, result, error, dt )`` tuples, where ``idx`` is the index of ``fname`` in ``fnames``, ``result`` is what ``job_func`` returned, ``error`` is the exception it raised (or ``None``), and ``dt`` is the wall-clock time in seconds.
+    """
+    assert( num_jobs >= 1 )
+    assert( core_sets is None or len( core_sets ) >= num_jobs )
+    def _job( fname, cores ):
+        time0 = time.perf_counter( )
+        try: return job_func( fname, cores ), None, time.perf_counter( ) - time0
+        except Exception as e:
+            return None, e, time.perf_counter( ) - time0
+    #
+    fnames_iter = iter( enumerate( fnames ) )
+    with ThreadPoolExecutor( max_workers = num_jobs ) as executor:
+        pending = { }
+        free_slots = list( range( num_jobs ) )
+        def _fill( ):
+            while len( pending ) < num_jobs:
+                idx_fname = next( fnames_iter, None )
+                if idx_fname is None: return
+                slot = free_slots.pop( )
+                cores = core_sets[ slot ] if core_sets is not None else None
+                pending[ executor.submit( _job, idx_fname[1], cores ) ] = idx_fname + ( slot, )
+        _fill( )
+        while len( pending ) > 0:
+            done, _ = wait( list( pending ), return_when = FIRST_COMPLETED )
+            for future in sorted( done, key = lambda future: pending[ future ][ 0 ] ):
+                idx, fname, slot = pending.pop( future )
+                free_slots.append( slot )
+                result, error, dt = future.result( )
+                if error is not None:
+                    logging.debug( 'JOB %d ON %s FAILED. ERROR MESSAGE = %s.' % ( idx, fname, str( error ) ) )
+                yield idx, fname, result, error, dt
+            _fill( )
@@ -0,0 +1,291 @@
+"""
+A work queue of transcode jobs stored in Redis_, so that workers on several machines, which see the same media files through shared (for instance NFS) storage, can dehydrate a library together.
+
+Jobs live in these Redis_ keys, all prefixed by the queue name:
+
+* ``<name>:jobs``, a hash of job id to its JSON description.
+* ``<name>:pending``, a list of job ids waiting to be claimed.
+* ``<name>:processing``, a list of job ids that workers have claimed.
+* ``<name>:leases``, a sorted set of claimed job ids, scored by the time at which their lease runs out. Workers heartbeat to extend their leases.
+* ``<name>:queued``, the set of file names that are pending or processing, so that the same file is not queued twice.
+* ``<name>:done`` and ``<name>:failed``, hashes of job id to the JSON result.
+
+A worker claims a job by atomically moving it from pending to processing. A job whose lease runs out -- because its worker crashed, or lost its network -- goes back onto the pending list, and fails for good after too many attempts. Everything here works against a local ``redis-server``, or against fakeredis_ in tests.
+
+.. _Redis: https://redis.io
+.. _fakeredis: https://github.com/cunla/fakeredis-py
+"""
+import os, json, time, uuid, socket, logging, threading
+
+_DEFAULT_LEASE_SECS = 120
+_DEFAULT_MAX_ATTEMPTS = 3
+
+def get_redis_client( redis_url = 'redis://localhost:6379/0' ):
+    """
+    :param str redis_url: the Redis_ URL.
+    :returns: the :py:class:`redis.Redis` client.
+    """
+    import redis
+    return redis.Redis.from_url( redis_url )
+
+def get_worker_id( ):
+    """
+    :returns: a worker id unique to this host, process, and thread.
+    :rtype: str
+    """
+    return '%s:%d:%d' % ( socket.gethostname( ), os.getpid( ), threading.get_ident( ) )
+
+class TranscodeQueue( object ):
+    """
+    A reliable Redis_ work queue of transcode jobs.
+
+    :param client: the :py:class:`redis.Redis` (or fakeredis_) client.
+    :param str name: the queue name, which prefixes all the Redis_ keys. Default is ``howdy_grabbag``.
+    :param int lease_secs: how long, in seconds, a claimed job's lease lasts without a heartbeat. Default is 120.
+    :param int max_attempts: the number of times a job is claimed before it fails for good. Default is 3.
+    """
+    def __init__( self, client, name = 'howdy_grabbag', lease_secs = _DEFAULT_LEASE_SECS,
+                  max_attempts = _DEFAULT_MAX_ATTEMPTS ):
+        assert( lease_secs > 0 )
+        assert( max_attempts >= 1 )
+        self.client = client
+        self.name = name
+        self.lease_secs = lease_secs
+        self.max_attempts = max_attempts
+
+    def _key( self, suffix ):
+        return '%s:%s' % ( self.name, suffix )
+
+    def enqueue( self, filename, mode = 'dehydrate', params = { } ):
+        """
+        :param str filename: the media file to transcode.
+        :param str mode: the kind of transcode, for instance ``dehydrate``, ``dehydrate_avi``, or ``lower_audio``.
+        :param dict params: the JSON-serializable parameters of the transcode, for instance ``{ 'qual' : 28 }``.
+        :returns: the new job id, or ``None`` if ``filename`` is already pending or processing.
+        :rtype: str
+        """
+        filename = os.path.abspath( filename )
+        if self.client.sadd( self._key( 'queued' ), filename ) == 0: return None
+        job_id = str( uuid.uuid4( ) )
+        job = { 'id' : job_id, 'filename' : filename, 'mode' : mode, 'params' : params,
+                'attempts' : 0, 'enqueued' : time.time( ) }
+        pipe = self.client.pipeline( )
+        pipe.hset( self._key( 'jobs' ), job_id, json.dumps( job ) )
+        pipe.lpush( self._key( 'pending' ), job_id )
+        pipe.execute( )
+        return job_id
+
+    def enqueue_many( self, filenames, mode = 'dehydrate', params = { } ):
+        """
+        :returns: the :py:class:`list` of new job ids. See :py:meth:`enqueue <howdy_grabbag.utils.work_queue.TranscodeQueue.enqueue>`.
+        :rtype: list
+        """
+        return list(filter(None, map(
+            lambda filename: self.enqueue( filename, mode = mode, params = params ), filenames ) ) )
+
+    def claim( self, timeout = 0 ):
+        """
+        Atomically claims the oldest pending job, and starts its lease. Each claim gets a new ``token``, which identifies the worker holding the lease to :py:meth:`heartbeat <howdy_grabbag.utils.work_queue.TranscodeQueue.heartbeat>`, :py:meth:`complete <howdy_grabbag.utils.work_queue.TranscodeQueue.complete>`, and :py:meth:`fail <howdy_grabbag.utils.work_queue.TranscodeQueue.fail>`. Job ids with no description, left over from a job already finished, are dropped.
+
+        :param int timeout: the number of seconds to block waiting for a job. ``0`` does not block.
+        :returns: the job :py:class:`dict`, or ``None`` if no job is pending.
+        :rtype: dict
+        """
+        while True:
+            if timeout > 0:
+                job_id = self.client.blmove(
+                    self._key( 'pending' ), self._key( 'processing' ), timeout, 'RIGHT', 'LEFT' )
+            else:
+                job_id = self.client.lmove(
+                    self._key( 'pending' ), self._key( 'processing' ), 'RIGHT', 'LEFT' )
+            if job_id is None: return None
+            if isinstance( job_id, bytes ): job_id = job_id.decode( 'utf8' )
+            data = self.client.hget( self._key( 'jobs' ), job_id )
+            if data is not None: break
+            logging.info( 'DROPPING JOB %s, WHICH HAS NO DESCRIPTION.' % job_id )
+            self.client.lrem( self._key( 'processing' ), 0, job_id )
+        self.client.zadd( self._key( 'leases' ), { job_id : time.time( ) + self.lease_secs } )
+        job = json.loads( data )
+        job[ 'attempts' ] += 1
+        job[ 'token' ] = str( uuid.uuid4( ) )
+        self.client.hset( self._key( 'jobs' ), job_id, json.dumps( job ) )
+        return job
+
+    def _get_job( self, job_id, token = None ):
+        data = self.client.hget( self._key( 'jobs' ), job_id )
+        if data is None: return None
+        job = json.loads( data )
+        if token is not None and job.get( 'token' ) != token: return None
+        return job
+
+    def heartbeat( self, job_id, token = None ):
+        """
+        Extends the lease of a claimed job.
+
+        :param str job_id: the job id.
+        :param str token: optional ``token`` of the claim. If given, then only extend the lease if this claim still holds it.
+        :returns: whether the job still belongs to this worker. If ``False``, then its lease ran out and it went back onto the pending list.
+        :rtype: bool
+        """
+        if token is not None and self._get_job( job_id, token = token ) is None: return False
+        return self.client.zadd(
+            self._key( 'leases' ), { job_id : time.time( ) + self.lease_secs }, xx = True, ch = True ) == 1
+
+    def _finish( self, job_id, status, result, token = None ):
+        import redis
+        while True:
+            with self.client.pipeline( ) as pipe:
+                try:
+                    #
+                    ## only finish a job that is still processing, under a lease that has not run out
+                    pipe.watch( self._key( 'jobs' ), self._key( 'processing' ), self._key( 'leases' ) )
+                    data = pipe.hget( self._key( 'jobs' ), job_id )
+                    job = json.loads( data ) if data is not None else None
+                    lease = pipe.zscore( self._key( 'leases' ), job_id )
+                    if any([ job is None,
+                             token is not None and job is not None and job.get( 'token' ) != token,
+                             pipe.lpos( self._key( 'processing' ), job_id ) is None,
+                             lease is None or lease < time.time( ) ]):
+                        pipe.unwatch( )
+                        logging.error( 'JOB %s IS NO LONGER HELD BY THIS WORKER, NOT MARKING IT %s.' % (
+                            job_id, status.upper( ) ) )
+                        return False
+                    job.update( { 'status' : status, 'result' : result, 'finished' : time.time( ) } )
+                    pipe.multi( )
+                    pipe.lrem( self._key( 'processing' ), 0, job_id )
+                    pipe.zrem( self._key( 'leases' ), job_id )
+                    pipe.srem( self._key( 'queued' ), job[ 'filename' ] )
+                    pipe.hdel( self._key( 'jobs' ), job_id )
+                    pipe.hset( self._key( status ), job_id, json.dumps( job ) )
+                    pipe.execute( )
+                    return True
+                except redis.WatchError: continue
+
+    def complete( self, job_id, result = None, token = None ):
+        """
+        Marks a claimed job as done, if it is still claimed and its lease has not run out.
+
+        :param str job_id: the job id.
+        :param result: optional JSON-serializable result, for instance the file sizes and encode time.
+        :param str token: optional ``token`` of the claim. If given, then only finish the job if this claim still holds it.
+        :returns: whether the job was marked as done.
+        :rtype: bool
+        """
+        return self._finish( job_id, 'done', result, token = token )
+
+    def fail( self, job_id, error = None, token = None ):
+        """
+        Marks a claimed job as failed for good, if it is still claimed and its lease has not run out.
+
+        :param str job_id: the job id.
+        :param str error: optional error message.
+        :param str token: optional ``token`` of the claim. If given, then only finish the job if this claim still holds it.
+        :returns: whether the job was marked as failed.
+        :rtype: bool
+        """
+        return self._finish( job_id, 'failed', error, token = token )
+
+    def requeue_expired( self ):
+        """
+        Puts claimed jobs whose leases ran out back onto the pending list, or fails them if they ran out of attempts. A claimed job with no lease yet -- because its worker died right after claiming it -- is given one, so it is requeued once that runs out. A claimed job id with no description is dropped. Any worker, or a separate process, may call this periodically.
+
+        :returns: the number of jobs requeued or failed.
+        :rtype: int
+        """
+        import redis
+        now = time.time( )
+        num_requeued = 0
+        for job_id in self.client.lrange( self._key( 'processing' ), 0, -1 ):
+            if isinstance( job_id, bytes ): job_id = job_id.decode( 'utf8' )
+            self.client.zadd( self._key( 'leases' ), { job_id : now + self.lease_secs }, nx = True )
+            with self.client.pipeline( ) as pipe:
+                try:
+                    pipe.watch( self._key( 'leases' ), self._key( 'jobs' ) )
+                    lease = pipe.zscore( self._key( 'leases' ), job_id )
+                    if lease is None or lease > now:
+                        pipe.unwatch( )
+                        continue
+                    data = pipe.hget( self._key( 'jobs' ), job_id )
+                    pipe.multi( )
+                    pipe.zrem( self._key( 'leases' ), job_id )
+                    pipe.lrem( self._key( 'processing' ), 0, job_id )
+                    if data is None:
+                        pipe.execute( )
+                        logging.info( 'DROPPING JOB %s, WHICH HAS NO DESCRIPTION.' % job_id )
+                        continue
+                    job = json.loads( data )
+                    if job[ 'attempts' ] < self.max_attempts:
+                        pipe.rpush( self._key( 'pending' ), job_id )
+                    else:
+                        job.update( { 'status' : 'failed', 'result' : 'lease expired %d times.' % job[ 'attempts' ],
+                                      'finished' : now } )
+                        pipe.srem( self._key( 'queued' ), job[ 'filename' ] )
+                        pipe.hdel( self._key( 'jobs' ), job_id )
+                        pipe.hset( self._key( 'failed' ), job_id, json.dumps( job ) )
+                    pipe.execute( )
+                    num_requeued += 1
+                    logging.info( 'LEASE OF JOB %s ON %s RAN OUT AFTER %d ATTEMPTS.' % (
+                        job_id, job[ 'filename' ], job[ 'attempts' ] ) )
+                except redis.WatchError: continue
+        return num_requeued
+
+    def get_status( self ):
+        """
+        :returns: a :py:class:`dict` of the number of ``pending``, ``processing``, ``done``, and ``failed`` jobs.
+        :rtype: dict
+        """
+        pipe = self.client.pipeline( )
+        pipe.llen( self._key( 'pending' ) )
+        pipe.llen( self._key( 'processing' ) )
+        pipe.hlen( self._key( 'done' ) )
+        pipe.hlen( self._key( 'failed' ) )
+        return dict( zip( ( 'pending', 'processing', 'done', 'failed' ), pipe.execute( ) ) )
+
+def run_worker( queue, job_func, worker_id = None, cores = None, poll_secs = 5, stop_event = None, max_jobs = None ):
+    """
+    Claims and runs jobs until the queue is empty, ``stop_event`` is set, or ``max_jobs`` jobs have run. While a job runs, a background thread heartbeats its lease. Expired leases of other workers are requeued between jobs.
+
+    :param queue: the :py:class:`TranscodeQueue <howdy_grabbag.utils.work_queue.TranscodeQueue>`.
+    :param job_func: the function that runs a single job, called as ``job_func( job, cores )``. Its return value, which must be JSON-serializable, is stored as the job's result. If it raises, then the job fails.
+    :param str worker_id: the worker id, for logging. Default is :py:meth:`get_worker_id <howdy_grabbag.utils.work_queue.get_worker_id>`.
+    :param cores: optional :py:class:`tuple` of core ids on which to run the jobs.
+    :param int poll_secs: the number of seconds to wait for a pending job before giving up. Default is 5.
+    :param stop_event: optional :py:class:`threading.Event` to stop the worker after its current job.
+    :param int max_jobs: optional maximum number of jobs to run.
+    :returns: the number of jobs run.
+    :rtype: int
+    """
+    if worker_id is None: worker_id = get_worker_id( )
+    num_jobs = 0
+    while ( stop_event is None or not stop_event.is_set( ) ) and ( max_jobs is None or num_jobs < max_jobs ):
+        queue.requeue_expired( )
+        job = queue.claim( timeout = poll_secs )
+        if job is None: break
+        logging.info( 'WORKER %s CLAIMED JOB %s ON %s (ATTEMPT %d).' % (
+            worker_id, job[ 'id' ], job[ 'filename' ], job[ 'attempts' ] ) )
+        #
+        ## heartbeat a third of the way through each lease. Once the lease is lost, the job belongs to the queue again, so do not finish it.
+        done_event = threading.Event( )
+        lost_event = threading.Event( )
+        def _heartbeat( ):
+            while not done_event.wait( queue.lease_secs / 3 ):
+                if not queue.heartbeat( job[ 'id' ], token = job[ 'token' ] ):
+                    logging.error( 'WORKER %s LOST THE LEASE OF JOB %s.' % ( worker_id, job[ 'id' ] ) )
+                    lost_event.set( )
+                    return
+        heartbeat_thread = threading.Thread( target = _heartbeat, daemon = True )
+        heartbeat_thread.start( )
+        try:
+            result = job_func( job, cores )
+            done_event.set( )
+            if not lost_event.is_set( ):
+                queue.complete( job[ 'id' ], result, token = job[ 'token' ] )
+        except Exception as e:
+            done_event.set( )
+            logging.error( 'WORKER %s FAILED JOB %s ON %s. ERROR MESSAGE = %s.' % (
+                worker_id, job[ 'id' ], job[ 'filename' ], str( e ) ) )
+            if not lost_event.is_set( ):
+                queue.fail( job[ 'id' ], str( e ), token = job[ 'token' ] )
+        heartbeat_thread.join( )
+        num_jobs += 1
+    return num_jobs
@@ -0,0 +1,72 @@
+import time, pytest
+from howdy_grabbag.utils.work_queue import TranscodeQueue, run_worker
+
+fakeredis = pytest.importorskip( 'fakeredis' )
+
+@pytest.fixture
+def queue( ):
+    return TranscodeQueue( fakeredis.FakeRedis( ), name = 'test', lease_secs = 1 )
+
+def test_claim_complete( queue ):
+    job_id = queue.enqueue( '/media/a.mkv', params = { 'qual' : 28 } )
+    assert( queue.enqueue( '/media/a.mkv' ) is None )
+    job = queue.claim( )
+    assert( job[ 'id' ] == job_id )
+    assert( job[ 'attempts' ] == 1 )
+    assert( queue.complete( job[ 'id' ], { 'size' : 1 }, token = job[ 'token' ] ) )
+    assert( queue.get_status( ) == { 'pending' : 0, 'processing' : 0, 'done' : 1, 'failed' : 0 } )
+    assert( queue.claim( ) is None )
+
+def test_stale_complete_after_requeue( queue ):
+    queue.enqueue( '/media/a.mkv' )
+    job = queue.claim( )
+    time.sleep( 1.1 )
+    assert( queue.requeue_expired( ) == 1 )
+    #
+    ## the worker whose lease ran out must not finish the job
+    assert( not queue.heartbeat( job[ 'id' ], token = job[ 'token' ] ) )
+    assert( not queue.complete( job[ 'id' ], 'stale', token = job[ 'token' ] ) )
+    assert( queue.get_status( ) == { 'pending' : 1, 'processing' : 0, 'done' : 0, 'failed' : 0 } )
+    job2 = queue.claim( )
+    assert( job2[ 'id' ] == job[ 'id' ] )
+    assert( job2[ 'attempts' ] == 2 )
+    #
+    ## nor may it finish the job once another worker has claimed it
+    assert( not queue.fail( job[ 'id' ], 'stale', token = job[ 'token' ] ) )
+    assert( queue.complete( job2[ 'id' ], token = job2[ 'token' ] ) )
+    assert( queue.get_status( ) == { 'pending' : 0, 'processing' : 0, 'done' : 1, 'failed' : 0 } )
+
+def test_claim_skips_ids_without_description( queue ):
+    queue.client.lpush( 'test:pending', 'orphan' )
+    job_id = queue.enqueue( '/media/a.mkv' )
+    queue.client.lpush( 'test:pending', 'orphan2' )
+    assert( queue.claim( )[ 'id' ] == job_id )
+    assert( queue.claim( ) is None )
+    queue.client.lpush( 'test:processing', 'orphan3' )
+    queue.client.zadd( 'test:leases', { 'orphan3' : 0 } )
+    queue.requeue_expired( )
+    assert( queue.get_status( )[ 'pending' ] == 0 )
+    assert( queue.client.lrange( 'test:processing', 0, -1 ) == [ job_id.encode( 'utf8' ) ] )
+
+def test_max_attempts( queue ):
+    queue.max_attempts = 1
+    queue.enqueue( '/media/a.mkv' )
+    queue.claim( )
+    time.sleep( 1.1 )
+    assert( queue.requeue_expired( ) == 1 )
+    assert( queue.get_status( ) == { 'pending' : 0, 'processing' : 0, 'done' : 0, 'failed' : 1 } )
+    assert( queue.enqueue( '/media/a.mkv' ) is not None )
+
+def test_run_worker_skips_finish_after_lost_lease( queue ):
+    queue.enqueue( '/media/a.mkv' )
+    def _job_func( job, cores ):
+        #
+        ## another worker requeues the job while this one is still running it
+        queue.client.zadd( 'test:leases', { job[ 'id' ] : 0 } )
+        queue.requeue_expired( )
+        time.sleep( 0.5 )
+        return 'done'
+    assert( run_worker( queue, _job_func, poll_secs = 0, max_jobs = 1 ) == 1 )
+    assert( queue.get_status( ) == { 'pending' : 1, 'processing' : 0, 'done' : 0, 'failed' : 0 } )
+    assert( run_worker( queue, lambda job, cores: 'done', poll_secs = 0 ) == 1 )
+    assert( queue.get_status( ) == { 'pending' : 0, 'processing' : 0, 'done' : 1, 'failed' : 0 } )